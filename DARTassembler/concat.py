@@ -1,51 +1,44 @@
 """
 This module concatenates multiple ligand databases into one.
 """
-import warnings
 from pathlib import Path
 from typing import Union
-from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.db_concat import concat_ligand_dbs, unique_name_key
 
 
-def concat(paths: list[str]) -> None:
+def concat(paths: list[str], outpath: Union[str, Path] = 'concat_ligand_db.jsonlines', dedupe_on: str = unique_name_key) -> list[dict]:
     """
-    Concatenate multiple ligand databases into one. The output will be saved in the current working directory as `concat_ligand_db.jsonlines`.
+    Concatenate multiple ligand databases into one. The output will be saved in the current working directory as `concat_ligand_db.jsonlines`. The databases are streamed entry by entry, so the memory needed does not grow with the size of the databases.
     :param paths: Paths to the ligand databases.
+    :param outpath: Path of the concatenated ligand database.
+    :param dedupe_on: Ligand property by which duplicates are recognized, e.g. `unique_name` or `graph_hash_with_metal`. Of several duplicates, only the first one is kept.
+    :return: List with a dictionary of statistics for each input database.
     """
     print(f"===============     CONCAT MODULE     =================")
-    print(f"This module concatenates multiple ligand databases into one. The output ligand db will be saved in the current working directory as `concat_ligand_db.jsonlines`.")
+    print(f"This module concatenates multiple ligand databases into one. The output ligand db will be saved in the current working directory as `{Path(outpath).name}`.")
 
     # Check if all paths are valid
     for path in paths:
         if not Path(path).exists():
             raise FileNotFoundError(f"File `{path}` not found.")
 
-    # Load all ligand databases
-    ligand_dbs = [LigandDB.load_from_json(path) for path in paths]
-
-    # Print number of ligands in each database
-    for i, db in enumerate(ligand_dbs):
-        print(f"Ligand database {i+1} contains {len(db.db)} ligands.")
-
     # Concatenate ligand databases
-    full_db = {}
-    for i, db in enumerate(ligand_dbs):
-        # Check if any ligands are duplicated
-        if len(set(db.db.keys()).intersection(full_db.keys())) > 0:
-            warnings.warn(f"Ligand database Nr {i} contains ligands already existing in previous databases. Duplicates will be overwritten. This should probably be ok since all ligands in the MetaLig are unique. If you want to avoid this warning, please remove duplicates from the ligand databases before concatenating them.")
-        full_db.update(db.db)
-    full_db = LigandDB(full_db)
-
-    # Print number of ligands in the concatenated database
-    print(f"The concatenated ligand database contains {len(full_db.db)} ligands.")
+    all_stats = concat_ligand_dbs(paths, outpath=outpath, dedupe_on=dedupe_on)
 
-    # Save concatenated ligand database
-    outpath = 'concat_ligand_db.jsonlines'
-    full_db.to_json(outpath)
+    # Print number of ligands and duplicates in each database
+    for i, stats in enumerate(all_stats):
+        print(f"Ligand database {i+1} contains {stats['n_entries']} ligands: {stats['n_written']} added, {stats['n_duplicates_in_previous_dbs']} duplicates of previous databases, {stats['n_duplicates_in_same_db']} duplicates within the same database.")
+    n_duplicates = sum(stats['n_duplicates_in_previous_dbs'] + stats['n_duplicates_in_same_db'] for stats in all_stats)
+    if n_duplicates > 0:
+        print(f"Removed {n_duplicates} duplicated ligands (same `{dedupe_on}`). Only the first occurrence of each ligand was kept.")
 
+    # Print number of ligands in the concatenated database
+    print(f"The concatenated ligand database contains {sum(stats['n_written'] for stats in all_stats)} ligands.")
     print(f"Concatenated ligand databases saved to `{outpath}`.")
     print(f"Done! Exiting concat module.")
 
+    return all_stats
+
 
 # Integration test, to check if everything is working and the same as before.
 if __name__ == "__main__":
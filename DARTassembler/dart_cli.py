@@ -1,4 +1,6 @@
 import argparse
+import cProfile
+from pathlib import Path
 from DARTassembler import ligandfilters, assembler, dbinfo, concat, installtest, configs
 
 init_cli_output = r"""================================================================================
@@ -21,11 +23,12 @@ def check_n_args(args, n):
 
 def main():
     desc = f"""DART command-line interface for assembling novel transition metal complexes from a database of ligands. Available modules: {", ".join(modules)}.
-Usage: dart <module> --path <path>
+Usage: dart <module> --path <path> [--profile]
 """
     parser = argparse.ArgumentParser(description=desc)
     parser.add_argument('module', choices=modules, help='DART module that you want to use')
     parser.add_argument('--path', required=True, help='Path to the input file(s)', nargs='*')
+    parser.add_argument('--profile', action='store_true', help='Save a cProfile of the run to `dart_<module>.prof` in the current directory. For the ligandfilters module, also save a profile of each filter. The times of each filter are measured while cProfile is running, so they include its overhead and are only meant for comparing the filters with each other.')
 
     args = parser.parse_args()
 
@@ -35,9 +38,22 @@ Usage: dart <module> --path <path>
     if args.path:
         print(f'Input path: {args.path[0] if len(args.path) == 1 else args.path}')
 
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run_module(args)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profile_path = Path(f'dart_{args.module}.prof').resolve()
+            profiler.dump_stats(profile_path)
+            print(f'cProfile of the run saved to `{profile_path}`. View it e.g. with `python -m pstats {profile_path.name}`.')
+
+def run_module(args: argparse.Namespace):
     if args.module == 'ligandfilters':
         check_n_args(args.path, 1)
-        ligandfilters(args.path[0])
+        ligandfilters(args.path[0], profile=args.profile)
     elif args.module == 'assembler':
         check_n_args(args.path, 1)
         assembler(args.path[0])
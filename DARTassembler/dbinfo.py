@@ -1,14 +1,17 @@
 """
-This module reads in a ligand db from file and saves a .csv file with an overview of the ligands.
+This module reads in a ligand db from file and saves a .csv file with an overview of the ligands. The ligand db is processed in a single streaming pass, so that memory stays constant even for the full MetaLig.
 """
 from typing import Union
 from pathlib import Path
+from warnings import warn
 
 from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+from DARTassembler.src.metalig.compressed_db import bz2_suffix
 from DARTassembler.src.constants.Paths import default_ligand_db_path
 
 import DARTassembler.src.constants.Paths
 from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.db_info import write_ligand_info
 
 def get_ligand_csv_output_path(output_path: Union[str, Path], input_path: Union[str, Path]):
     """
@@ -19,20 +22,25 @@ def get_ligand_csv_output_path(output_path: Union[str, Path], input_path: Union[
             raise ValueError(f"Input path {input_path} ends with .csv. Please specify an output path explicitly.")
         else:
             current_dir = Path.cwd()
-            output_path = current_dir.joinpath(Path(input_path).with_suffix('.csv').name)
+            input_path = Path(input_path)
+            if input_path.suffix == bz2_suffix:
+                input_path = input_path.with_suffix('')     # compressed files are named like `name.jsonlines.bz2`
+            output_path = current_dir.joinpath(input_path.with_suffix('.csv').name)
 
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     return output_path
 
-def dbinfo(input_path: Union[str, Path], output_path: Union[str, Path, None] = None, nmax: Union[int, None] = None):
+def dbinfo(input_path: Union[str, Path], output_path: Union[str, Path, None] = None, nmax: Union[int, None] = None, n_processes: Union[int, None] = 1, return_ligand_db: bool = False) -> Union[int, LigandDB]:
     """
-    Reads in the given ligand database and saves a .csv file and a concatenated .xyz file with an overview of the ligands.
+    Reads in the given ligand database and saves a .csv file and a concatenated .xyz file with an overview of the ligands. The ligands are read, processed and written one by one, so that the full database is never held in memory.
     :param input_path: Path to the ligand database
     :param output_path: Path to the output .csv file. If None, the output file will be saved in the same directory as the input file with the same name as the input file but with the .csv extension.
     :param nmax: Maximum number of ligands to be read in from the initial full ligand database. If None, all ligands are read in. This is useful for testing purposes.
-    :return: LigandDB object
+    :param n_processes: Number of processes used to process JSON Lines databases. If None, all available CPUs are used. Only used if all ligands are read in.
+    :param return_ligand_db: Deprecated. If True, the ligand database is loaded after writing the output files and returned as in earlier versions. This holds the full database in memory. Use `LigandDB.load_from_json()` instead if the ligands are needed.
+    :return: Number of ligands in the output files, or the LigandDB if `return_ligand_db` is True.
     """
     input_path = get_correct_ligand_db_path_from_input(input_path)
     if input_path is None:
@@ -40,21 +48,20 @@ def dbinfo(input_path: Union[str, Path], output_path: Union[str, Path, None] = N
 
     print(f"Starting DART DBinfo Module.")
     print(f'Input ligand database: {input_path.name}')
-    db = LigandDB.load_from_json(input_path, n_max=nmax)
 
-    print('Saving ligand info and structures...')
-
-    # Save to csv
     output_path = get_ligand_csv_output_path(output_path, input_path)
-    db.save_reduced_csv(output_path)
-    print(f'  - Saved .csv to {output_path.name}')
-
-    # Save to concatenated xyz file
     xyz_filename = str(Path(f'concat_{output_path.with_suffix("").name}.xyz'))
     xyz_output_path = output_path.parent.joinpath(xyz_filename)
-    db.save_concat_xyz(xyz_output_path, with_metal=True)
+
+    print('Saving ligand info and structures...')
+    n_ligands = write_ligand_info(input_path, csv_path=output_path, xyz_path=xyz_output_path, n_max=nmax, n_processes=n_processes, with_metal=True)
+    print(f'  - Saved .csv to {output_path.name}')
     print(f'  - Saved .xyz to {xyz_filename}')
 
     print(f"Done! All info files saved. Exiting DART DBinfo Module.")
 
-    return db
\ No newline at end of file
+    if return_ligand_db:
+        warn('Returning the LigandDB from `dbinfo()` is deprecated and will be removed in a future version, because it holds the full ligand database in memory. Please use `LigandDB.load_from_json(`path`)` instead to load the ligand database.', DeprecationWarning)
+        return LigandDB.load_from_json(input_path, n_max=nmax)
+
+    return n_ligands
@@ -10,16 +10,18 @@ try:    # Avoid error when running on server
 except ImportError:
     pass
 
-def ligandfilters(filter_input_path: Union[str, Path], nmax: Union[int, None] = None, outpath: Union[str, Path] = None, delete_output_dir: bool = False) -> LigandFilters:
+def ligandfilters(filter_input_path: Union[str, Path], nmax: Union[int, None] = None, outpath: Union[str, Path] = None, delete_output_dir: bool = False, n_processes: Union[int, None] = 1, profile: bool = False) -> LigandFilters:
     """
     Filter the full ligand database according to the specified filters. Should be run before assembly to reduce the number of ligands considered in the assembly to the ones that are interesting to the user.
     :param filter_input_path: Path to the filter input file
     :param nmax: Maximum number of ligands to be read in from the initial full ligand database. If None, all ligands are read in. This is useful for testing purposes.
     :param outpath: Path to the output ligand database. If None, the output ligand database is saved in the same directory as the input filter file.
     :param delete_output_dir: If True, the output directory is deleted before the new ligand database is saved. This is useful for testing purposes.
+    :param n_processes: Number of processes used to compute expensive ligand properties like the SMILES strings for SMARTS filters. If None, all available CPUs are used.
+    :param profile: If True, the wall time, CPU time, number of ligands and peak memory of each filter are measured and saved as csv and json file next to the info output.
     :return: LigandFilters object
     """
-    filter = LigandFilters(filepath=filter_input_path, max_number=nmax, output_ligand_db_path=outpath, delete_output_dir=delete_output_dir)
+    filter = LigandFilters(filepath=filter_input_path, max_number=nmax, output_ligand_db_path=outpath, delete_output_dir=delete_output_dir, n_processes=n_processes, profile=profile)
 
     filter.save_filtered_ligand_db()
 
@@ -17,6 +17,7 @@ from typing import Union, Any, Tuple
 from DARTassembler.src.ligand_extraction.io_custom import read_yaml
 from DARTassembler.src.ligand_extraction.utilities_Molecule import stoichiometry2atomslist
 from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+from DARTassembler.src.metalig.binary_db import is_binary_ligand_db
 
 allowed_topologies = ['mer-3-2-1', 'mer-4-1-1', '5-1', '2-1-1', '2-2']  # list all allowed topologies here, others will be rejected
 allowed_verbosities = [0, 1, 2, 3]
@@ -29,6 +30,7 @@ _concatenate_xyz = 'concatenate_xyz'
 _output_path = 'output_directory'
 _complex_name_length = 'complex_name_length'
 _same_isomer_names = 'same_isomer_names'
+_cache_dir = 'cache_directory'
 # Batch settings
 _batches = 'batches'
 _name = 'name'
@@ -113,6 +115,7 @@ assembler_gbl_defaults = {
     _output_path: 'DART',
     _complex_name_length: 8,
     _same_isomer_names: True,
+    _cache_dir: None,
 }
 def get_random_random_seed(start=1_000, end=9_999) -> int:
     return random.randint(start, end)
@@ -128,6 +131,7 @@ ligandfilters_gbl_defaults = {
     _ligand_db_path: 'metalig',
     _output_ligand_db_path: None,
     _output_ligands_info: True,
+    _cache_dir: None,
 }
 ligandfilters_filter_defaults = {
     _graph_hash_wm: {},
@@ -247,6 +251,18 @@ class BaseInput(object):
 
         return path
 
+    def ensure_ligand_db_present(self, path: Union[str, Path], varname: str) -> Path:
+        """
+        Checks if the path to the ligand database exists. The ligand database can be either a file or a binary ligand database directory.
+        """
+        path = self.get_path_from_input(path, varname=varname, allow_none=False)
+
+        if not (path.is_file() or is_binary_ligand_db(path)):
+            self.raise_error(message=f"The input ligand database '{path}' either doesn't exist or is not a valid ligand database.",
+                             varname=varname)
+
+        return path
+
     def get_bool_from_input(self, input: Union[str, bool], varname: str, allow_none=False) -> Union[bool,None]:
         """
         Returns a bool from a string or bool input.
@@ -460,6 +476,7 @@ class LigandFilterInput(BaseInput):
         _ligand_db_path: [str, Path, type(None)],
         _output_ligand_db_path: [str, Path, type(None)],
         _output_ligands_info: [bool, str],
+        _cache_dir: [str, Path, type(None)],
         _filters: [list, tuple],
     }
 
@@ -556,6 +573,7 @@ class LigandFilterInput(BaseInput):
 
         self.ligand_db_path = None
         self.output_ligand_db_path = None
+        self.cache_dir = None
         self.filters = None
         self.settings = self.set_and_check_settings()    # Set all settings and check if they are valid
 
@@ -588,6 +606,7 @@ class LigandFilterInput(BaseInput):
         self.output_ligand_db_path = self.get_path_from_input(path=settings[_output_ligand_db_path], varname=_output_ligand_db_path, allow_none=True)
         self.output_filtered_ligands = self.get_bool_from_input(input=settings[_output_ligands_info], varname=_output_ligands_info)
         self.output_ligand_db_path = self.output_ligand_db_path or self.get_output_ligand_db_path()
+        self.cache_dir = self.get_path_from_input(path=settings[_cache_dir], varname=_cache_dir, allow_none=True)
 
         # Check all input types
         self.filters = self.check_filters(all_filters=settings[_filters])
@@ -725,7 +744,7 @@ class LigandFilterInput(BaseInput):
         path = get_correct_ligand_db_path_from_input(path)
         if path is None:
             self.raise_error(f'Invalid ligand database filepath.', varname=_ligand_db_path)
-        self.ensure_file_present(path=path, varname=_ligand_db_path)
+        self.ensure_ligand_db_present(path=path, varname=_ligand_db_path)
 
         return Path(path)
 
@@ -764,6 +783,7 @@ class AssemblyInput(BaseInput):
                         _batches: [list, tuple, dict],
                         _complex_name_length: [int, str],
                         _same_isomer_names: [bool, str],
+                        _cache_dir: [str, Path, type(None)],
                         }
     # Batch settings
     batches_valid_keys = {
@@ -804,6 +824,7 @@ class AssemblyInput(BaseInput):
         self.Output_Path = None
         self.Batches = None
         self.complex_name_length = None
+        self.cache_dir = None
         self.check_and_set_global_settings()
         self.check_if_settings_not_recognized(actual_settings=self.global_settings, valid_settings=self.total_keys)
         self.check_batches_input()
@@ -827,6 +848,7 @@ class AssemblyInput(BaseInput):
         self.Batches =  self.get_batches_from_input(self.global_settings[_batches])
         self.complex_name_length = self.get_int_from_input(self.global_settings[_complex_name_length], varname=_complex_name_length)
         self.same_isomer_names = self.get_bool_from_input(self.global_settings[_same_isomer_names], varname=_same_isomer_names)
+        self.cache_dir = self.get_path_from_input(self.global_settings[_cache_dir], varname=_cache_dir, allow_none=True)
 
         # Check if the output path exists and is a directory.
         self.Output_Path = self.ensure_output_directory_valid(self.global_settings[_output_path], varname=_output_path)
@@ -999,7 +1021,7 @@ class AssemblyInput(BaseInput):
                 path = get_correct_ligand_db_path_from_input(input_path)
                 if path is None:
                     self.raise_error(f"Invalid ligand database filepath.", varname=varname)
-                path = Path(self.ensure_file_present(path, varname=varname))
+                path = Path(self.ensure_ligand_db_present(path, varname=varname))
                 output_ligand_db_path.append(path)
 
             # The first entry cannot be a keyword since the keywords always reference to the previous ligand db path.
@@ -8,6 +8,8 @@ from DARTassembler.src.assembly.utilities_assembly import generate_pronounceable
 from DARTassembler.src.constants.Periodic_Table import DART_Element
 from DARTassembler.src.assembly.Monkeypatch_stk import MONKEYPATCH_STK_SmartsFunctionalGroupFactory
 from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates, DenticityCondition
+from DARTassembler.src.ligand_extraction.db_cache import set_cache_dir, is_cache_enabled
 from DARTassembler.src.assembly.Assemble import PlacementRotation
 from DARTassembler.src.assembly.ligands import LigandChoice
 from DARTassembler.src.assembly.Isomer import BuildIsomers
@@ -59,6 +61,7 @@ class DARTAssembly(object):
         self.batches = self.settings.Batches
         self.n_batches = len(self.batches)
         self.same_isomer_names = self.settings.same_isomer_names
+        set_cache_dir(self.settings.cache_dir)
 
         if delete_output_dir:
             shutil.rmtree(self.output_path, ignore_errors=True)
@@ -88,6 +91,7 @@ class DARTAssembly(object):
         self.df_info = []
         self.assembled_complex_names = []
         self.last_ligand_db_path = None     # to avoid reloading the same ligand database in the next batch
+        self.last_ligand_db_denticities = None  # denticities which were loaded from the last ligand database
 
         logging.info('Starting DART Assembler Module.')
         logging.info(f'Output directory: `{self.output_path.name}`')
@@ -534,25 +538,37 @@ class DARTAssembly(object):
         else:
             reload_database = True
 
+        # Only the denticities of the topology are loaded, so the database also needs to be reloaded if the new topology has other denticities.
+        if not reload_database:
+            reload_database = not set(self.get_topology_denticities()).issubset(self.last_ligand_db_denticities)
+
         return reload_database
 
+    def get_topology_denticities(self) -> list[int]:
+        """
+        Returns the denticities in the topology of the current batch.
+        """
+        topology, _ = format_topologies(self.topology_similarity)
+        return sorted(set(topology))
+
     def get_ligand_db(self) -> Union[dict, list[dict]]:
         """
-        Load the ligand database from the json files.
+        Load the ligand database from the json files. Ligands are loaded lazily because usually only a small part of them is used for the assembly. Only ligands with a denticity of the topology are loaded.
         @return: ligand database or list of ligand databases. The db are in the format {denticity: {charge: [ligand, ligand, ...]}}
         """
-        if self.multiple_db:
-            ligand_db = []
-            for path in self.ligand_json:
-                ligand_db.append(LigandDB.load_from_json(path).get_lig_db_in_old_format())
-                if len(ligand_db[-1]) == 0:
-                    raise LigandCombinationError(
-                        f"No ligands found in the ligand database {path}. Please check your ligand database files.")
-        else:
-            ligand_db = LigandDB.load_from_json(self.ligand_json).get_lig_db_in_old_format()
-            if len(ligand_db) == 0:
+        denticities = self.get_topology_denticities()
+        paths = self.ligand_json if self.multiple_db else [self.ligand_json]
+        ligand_db = []
+        for path in paths:
+            predicates = LigandPredicates([DenticityCondition(denticities_of_interest=denticities)])
+            ligand_db.append(LigandDB.load_from_json(path, lazy=True, use_cache=is_cache_enabled(), predicates=predicates).get_lig_db_in_old_format())
+            # If ligands were only removed because of their denticity, the ligand choice raises a more specific error.
+            if len(ligand_db[-1]) == 0 and sum(predicates.n_rejected) == 0:
                 raise LigandCombinationError(
-                    f"No ligands found in the ligand database {self.ligand_json}. Please check your ligand database files.")
+                    f"No ligands found in the ligand database {path}. Please check your ligand database files.")
+        if not self.multiple_db:
+            ligand_db = ligand_db[0]
         self.last_ligand_db_path = self.ligand_json
+        self.last_ligand_db_denticities = denticities
 
         return ligand_db
@@ -17,6 +17,8 @@ from DARTassembler.src.ligand_extraction.utilities import angle_between_ab_ac_ve
 
 from DARTassembler.src.ligand_extraction.utilities_Molecule import original_metal_ligand
 from DARTassembler.src.ligand_extraction.Molecule import RCA_Molecule, RCA_Ligand
+from DARTassembler.src.ligand_extraction.array_graph import ArrayGraph
+from DARTassembler.src.ligand_extraction.atomic_props import AtomicProps
 from DARTassembler.src.ligand_extraction.utilities_graph import graphs_are_equal, \
     get_sorted_atoms_and_indices_from_graph, view_graph, graph_from_graph_dict, get_graph_hash
 from DARTassembler.src.assembly.utilities_assembly import generate_pronounceable_word
@@ -40,6 +42,7 @@ class TransitionMetalComplex(object):
                  metal_idx: int,
                  charge: int,
                  ligand_props: dict,
+                 array_graph: ArrayGraph = None,
                  ):
         """
         :param atomic_props: dict
@@ -48,6 +51,7 @@ class TransitionMetalComplex(object):
         :param metal_idx: int
         :param charge: int
         :param ligand_props: dict
+        :param array_graph: Optional ArrayGraph of the same graph. If given, the graph hash and the connectivity check are calculated on the arrays.
         """
         self.atomic_props = atomic_props
         self.graph = graph
@@ -55,7 +59,7 @@ class TransitionMetalComplex(object):
         self.metal_oxi_state = metal_oxi_state
         self.metal_idx = metal_idx
         self.charge = charge
-        self.graph_hash = get_graph_hash(self.graph)
+        self.graph_hash = get_graph_hash(array_graph if array_graph is not None else self.graph)
 
         self.metal = self.atomic_props["atoms"][self.metal_idx]
         self.metal_position = [self.atomic_props['x'][self.metal_idx], self.atomic_props['y'][self.metal_idx], self.atomic_props['z'][self.metal_idx]]
@@ -64,7 +68,7 @@ class TransitionMetalComplex(object):
         assert sorted(self.graph.nodes) == list(range(len(self.graph.nodes))), f"The graphs indices are not in order: {list(self.graph.nodes)}"
         graph_elements, indices = atoms, _ = get_sorted_atoms_and_indices_from_graph(self.graph)
         assert graph_elements == self.atomic_props["atoms"]
-        assert nx.is_connected(self.graph), "The graph is not fully connected!"
+        assert (array_graph.is_connected() if array_graph is not None else nx.is_connected(self.graph)), "The graph is not fully connected!"
 
         self.mol = RCA_Molecule.make_from_atomic_properties(
                                                             atomic_props_mol=self.atomic_props,
@@ -111,27 +115,42 @@ class TransitionMetalComplex(object):
         return name
 
     @staticmethod
-    def stk_Constructed_Mol_to_atomic_props(compl: stk.ConstructedMolecule) -> dict:
-        atomic_props = {
-            "x": [],
-            "y": [],
-            "z": [],
-            "atoms": []
-        }
+    def stk_Constructed_Mol_to_atomic_props(compl: stk.ConstructedMolecule) -> AtomicProps:
+        elements = [atom.get_atomic_number() for atom in compl.get_atoms()]
+        positions = compl.get_position_matrix()
+
+        return AtomicProps(positions=positions, elements=elements)
 
-        # to this end we first obtain the indices of interest
-        # indices_for_non_Hg = [i for i, atom in enumerate(compl._atoms) if atom.get_atomic_number() != atomic_number_Hg]
-        indices = list(range(len(compl._atoms)))
+    @staticmethod
+    def merge_array_graph_from_ligands(ligands, metal) -> Tuple[ArrayGraph, List, List]:
+        """
+        Same as `merge_graph_from_ligands()`, but the graphs are merged as ArrayGraphs without building or copying any networkx graph. Raises a ValueError if the ligand graphs can't be merged as ArrayGraphs.
+        :param ligands: dict[RCA_Ligand]
+        :param metal: str
+        :return: Tuple of the merged ArrayGraph of the complex, the indices of the ligand atoms and the indices of the ligand donor atoms
+        """
+        ligand_graphs = []
+        for lig in ligands.values():
+            ligand_graph = lig.get_array_graph() if isinstance(lig, RCA_Ligand) else ArrayGraph.from_networkx(lig.graph)
+            if np.any(np.diff(ligand_graph.node_ids) <= 0):
+                raise ValueError('The nodes of the ligand graph are not sorted.')
+            for i in lig.ligand_to_metal:
+                assert lig.atomic_props['atoms'][i] in lig.local_elements, f"Atom {lig.atomic_props['atoms'][i]} is not a donor atom of ligand {lig.name}!"
+            ligand_graphs.append(ligand_graph)
 
-        # Now we can extract the types of atoms
-        atomic_props["atoms"] = [element(compl._atoms[i].get_atomic_number()).symbol for i in indices]
+        # The index in ligand_to_metal is the index of the donor in the atomic_properties, which is the same as the position in the sorted ligand graph.
+        graph, ligand_indices, ligand_donor_indices = ArrayGraph.merge(ligand_graphs, center_label=metal, center_neighbors=[list(lig.ligand_to_metal) for lig in ligands.values()])
 
-        for (x, y, z) in compl.get_atomic_positions(indices):
-            atomic_props["x"].append(x)
-            atomic_props["y"].append(y)
-            atomic_props["z"].append(z)
+        # Check if everything is valid
+        all_donor_elements = [el for lig in ligands.values() for el in lig.local_elements]
+        labels = graph.get_labels()
+        metal_neighbors = graph.indices[graph.indptr[0]:graph.indptr[1]].tolist()
+        coordinated_elements = [labels[node] for node in metal_neighbors]
+        assert sorted(all_donor_elements) == sorted(coordinated_elements), f"Coordinated elements {coordinated_elements} do not match donor elements {all_donor_elements}!"
+        assert graph.is_connected(), "The graph is not fully connected!"
+        assert sorted(metal_neighbors) == sorted(i for lig in ligand_donor_indices for i in lig), "The metal is not connected to all donor atoms!"
 
-        return atomic_props
+        return graph, ligand_indices, ligand_donor_indices
 
     @staticmethod
     def merge_graph_from_ligands(ligands, metal) -> Tuple[nx.Graph, List, List]:
@@ -239,7 +258,12 @@ class TransitionMetalComplex(object):
         :param metal_charge: int
         """
         atomic_props = cls.stk_Constructed_Mol_to_atomic_props(compl)
-        graph, ligand_indices, ligand_donor_indices = cls.merge_graph_from_ligands(ligands, metal)
+        try:
+            array_graph, ligand_indices, ligand_donor_indices = cls.merge_array_graph_from_ligands(ligands, metal)
+            graph = array_graph.to_networkx()
+        except ValueError:
+            array_graph = None
+            graph, ligand_indices, ligand_donor_indices = cls.merge_graph_from_ligands(ligands, metal)
         charge = cls.get_total_charge(metal_charge, ligands)
 
         ligand_props = {
@@ -270,6 +294,7 @@ class TransitionMetalComplex(object):
             metal_oxi_state=metal_charge,
             metal_idx=metal_idx,
             charge=charge,
+            array_graph=array_graph,
         )
 
         return complex
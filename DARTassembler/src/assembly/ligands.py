@@ -2,6 +2,10 @@ import warnings
 from copy import deepcopy
 import random
 import itertools
+import math
+import bisect
+import heapq
+from collections import Counter
 from typing import Union
 import logging
 from DARTassembler.src.assembly.Assembly_Input import LigandCombinationError
@@ -24,6 +28,73 @@ class LigandChoice(object):
         self.max_rejected_ligand_combinations = 1_000  # If this many ligand combinations are rejected in a row, the random choice of ligands is exhausted and will be switched to iterative mode
         self.switched_to_iterative = False  # Flag to output a warning if the ligand choice method was switched to "all"
 
+        # Group the ligands of each site by charge to choose only ligand combinations with the correct sum of charges
+        self.site_ligand_lists = [ligand_list for ligand_list in self.ligand_lists if ligand_list != 'same_as_previous']
+        self.charge_buckets, self.site_multiplicities = self._get_charge_buckets()
+        self.valid_charge_combinations = self._get_valid_charge_combinations()
+        self.cum_charge_combination_weights = list(itertools.accumulate(self._get_number_of_ligand_combinations(charges) for charges in self.valid_charge_combinations))
+        self.reachable_charge_sums = self._get_reachable_charge_sums()
+        self.previous_interchangeable_sites, self.site_name_indices = self._get_interchangeable_sites()
+
+    def _get_charge_buckets(self) -> tuple[list[dict], list[int]]:
+        """
+        Groups the ligands of each site by their charge. Sites with the 'same_as_previous' instruction get the ligand of the previous site, so they are merged into the previous site, whose charge then counts multiple times.
+        :return: For each site which is not 'same_as_previous', a dictionary with the charges as keys and the sorted indices of the ligands of this charge in the ligand list of the site as values, and the number of sites which get the ligand of this site.
+        """
+        charge_buckets = []
+        site_multiplicities = []
+        for ligand_list in self.ligand_lists:
+            if ligand_list == 'same_as_previous':
+                site_multiplicities[-1] += 1
+                continue
+            buckets = {}
+            for idx, ligand in enumerate(ligand_list):
+                buckets.setdefault(ligand.pred_charge, []).append(idx)
+            charge_buckets.append(buckets)
+            site_multiplicities.append(1)
+
+        return charge_buckets, site_multiplicities
+
+    def _get_valid_charge_combinations(self) -> list[tuple]:
+        """
+        Returns all combinations of the charges of the sites for which the ligand charges sum up to the total charge minus the metal oxidation state.
+        """
+        target_charge = self.total_charge - self.metal_ox
+        all_charge_combinations = itertools.product(*[list(buckets) for buckets in self.charge_buckets])
+        valid_charge_combinations = [charges for charges in all_charge_combinations if sum(charge * multiplicity for charge, multiplicity in zip(charges, self.site_multiplicities)) == target_charge]
+
+        return valid_charge_combinations
+
+    def _get_number_of_ligand_combinations(self, charges: tuple) -> int:
+        """
+        Returns the number of ligand combinations with the given charges of the sites.
+        """
+        return math.prod(len(buckets[charge]) for buckets, charge in zip(self.charge_buckets, charges))
+
+    def _get_reachable_charge_sums(self) -> list[set]:
+        """
+        Returns for each site the set of all sums of charges which the ligands of this site and all following sites can have. The last entry is for no sites and is always {0}.
+        """
+        reachable_charge_sums = [{0}]
+        for buckets, multiplicity in zip(reversed(self.charge_buckets), reversed(self.site_multiplicities)):
+            reachable_charge_sums.insert(0, {charge * multiplicity + rest for charge in buckets for rest in reachable_charge_sums[0]})
+
+        return reachable_charge_sums
+
+    def _get_interchangeable_sites(self) -> tuple[list, Union[list[dict], None]]:
+        """
+        Finds the sites whose ligands can be swapped without changing the ligand combination, i.e. sites with the same ligand list and the same number of 'same_as_previous' sites.
+        :return: For each site the previous interchangeable site or None. If sites which are not interchangeable share ligands, also for each site a dictionary of the ligand names to their indices in the ligand list of the site, otherwise None.
+        """
+        site_names = [tuple(ligand.unique_name for ligand in ligand_list) for ligand_list in self.site_ligand_lists]
+        site_keys = list(zip(site_names, self.site_multiplicities))
+        previous_interchangeable_sites = [max((prev for prev in range(site) if site_keys[prev] == site_keys[site]), default=None) for site in range(len(site_keys))]
+
+        shared_ligands = any(set(site_names[site1]).intersection(site_names[site2]) for site1, site2 in itertools.combinations(range(len(site_keys)), 2) if site_keys[site1] != site_keys[site2])
+        site_name_indices = [{name: idx for idx, name in enumerate(names)} for names in site_names] if shared_ligands else None
+
+        return previous_interchangeable_sites, site_name_indices
+
     def _check_good_ligand_charges(self, ligand_combination: list):
         """
         Check if these ligands have the correct sum of charges.
@@ -43,16 +114,79 @@ class LigandChoice(object):
 
     def _choose_random_ligand_combination_from_db(self) -> list:
         """
-        Choose ligands randomly from the ligand databases.
+        Choose ligands randomly from the ligand databases. First, a valid combination of charges is chosen with a probability proportional to its number of ligand combinations, then a ligand with this charge is chosen for each site. Therefore, every ligand combination with the correct sum of charges is equally likely and no combination has to be rejected because of its charges.
         """
+        charges = random.choices(self.valid_charge_combinations, cum_weights=self.cum_charge_combination_weights)[0]
+        sites = iter(zip(self.charge_buckets, charges))
         ligand_combination = []
         for ligand_list in self.ligand_lists:
             # Choose ligands randomly and respect the "same_as_previous" instruction
-            chosen_ligand = random.choice(ligand_list) if ligand_list != 'same_as_previous' else ligand_combination[-1]
+            if ligand_list == 'same_as_previous':
+                chosen_ligand = ligand_combination[-1]
+            else:
+                buckets, charge = next(sites)
+                chosen_ligand = ligand_list[random.choice(buckets[charge])]
             ligand_combination.append(chosen_ligand)
 
         return ligand_combination
 
+    def _iterate_valid_ligand_combinations(self, site: int = 0, charge_sum: int = 0, indices: Union[list, None] = None):
+        """
+        Generator of all ligand combinations with the correct sum of charges in the same order as `itertools.product()` of the ligand lists which are not 'same_as_previous'. Each combination of ligands is yielded only once: if ligands are swapped between sites, only the first of these combinations is yielded. Only ligands which can still lead to a valid combination are tried at each site, so that the time is roughly proportional to the number of valid combinations.
+        :param site: Site to choose the ligand for. The ligands of all previous sites are already chosen.
+        :param charge_sum: Sum of the charges of the ligands of the previous sites
+        :param indices: Indices of the ligands of the previous sites in their ligand lists
+        """
+        indices = indices if indices is not None else []
+        if site == len(self.site_ligand_lists):
+            if self.site_name_indices is None or self._is_first_ligand_combination(indices):
+                yield tuple(ligand_list[idx] for ligand_list, idx in zip(self.site_ligand_lists, indices))
+            return
+
+        # The ligands of interchangeable sites must be in the order of the ligand list to yield each combination only once
+        previous_site = self.previous_interchangeable_sites[site]
+        start = indices[previous_site] if previous_site is not None else 0
+        multiplicity = self.site_multiplicities[site]
+        target_charge = self.total_charge - self.metal_ox
+        ligand_list = self.site_ligand_lists[site]
+        valid_buckets = [bucket[bisect.bisect_left(bucket, start):] for charge, bucket in self.charge_buckets[site].items() if target_charge - charge_sum - charge * multiplicity in self.reachable_charge_sums[site + 1]]
+        for idx in heapq.merge(*valid_buckets):
+            indices.append(idx)
+            yield from self._iterate_valid_ligand_combinations(site=site + 1, charge_sum=charge_sum + ligand_list[idx].pred_charge * multiplicity, indices=indices)
+            indices.pop()
+
+        return
+
+    def _is_first_ligand_combination(self, indices: list) -> bool:
+        """
+        Checks if the ligand combination with these indices is the first one in the order of `itertools.product()` which consists of the same ligands. Only needed if sites which are not interchangeable share ligands, e.g. a site with and a site without a following 'same_as_previous' site.
+        """
+        ligand_counts = Counter()
+        for site, idx in enumerate(indices):
+            ligand_counts[self.site_ligand_lists[site][idx].unique_name] += self.site_multiplicities[site]
+
+        return self._get_first_ligand_indices(ligand_counts) == indices
+
+    def _get_first_ligand_indices(self, ligand_counts: Counter, site: int = 0) -> Union[list, None]:
+        """
+        Returns the indices of the first ligand combination in the order of `itertools.product()` which consists of exactly these ligands, or None if there is none.
+        :param ligand_counts: Number of sites which still need each ligand
+        """
+        if site == len(self.site_ligand_lists):
+            return []
+
+        multiplicity = self.site_multiplicities[site]
+        name_indices = self.site_name_indices[site]
+        for idx in sorted(name_indices[name] for name, count in ligand_counts.items() if count >= multiplicity and name in name_indices):
+            name = self.site_ligand_lists[site][idx].unique_name
+            ligand_counts[name] -= multiplicity
+            rest = self._get_first_ligand_indices(ligand_counts, site=site + 1)
+            ligand_counts[name] += multiplicity
+            if rest is not None:
+                return [idx] + rest
+
+        return None
+
     def _choose_iterative_ligand_combination_from_db(self, all_combinations) -> list:
         """
         Choose ligands iteratively from the ligand databases.
@@ -119,14 +253,18 @@ class LigandChoice(object):
 
         # Setup all ligand combinations as iterable. Needed for the iterative ligand choice method.
         assert self.ligand_lists[-1] == 'same_as_previous' if 'same_as_previous' in self.ligand_lists else True, "The 'same_as_previous' instruction must always come last in the list of ligand lists!" # HARDCODED: If the 'same_as_previous' instruction is used, it always comes last in the list of ligand lists
-        all_valid_lists = [ligands for ligands in self.ligand_lists if ligands != 'same_as_previous']
-        all_ligand_combinations = itertools.product(*all_valid_lists)
+        all_ligand_combinations = self._iterate_valid_ligand_combinations()
 
-        chosen_ligand_combinations = set()  # Store all chosen ligand combinations to avoid duplicates
+        if len(self.valid_charge_combinations) == 0: # Output error because no valid ligand combinations exist
+            raise LigandCombinationError(
+                f'No valid ligand combinations found which fulfill the metal oxidation state MOS={self.metal_ox} and total charge Q={self.total_charge} requirement! This can happen when the provided metal oxidation state or total charge are too high/low. Please check your ligand database and/or your assembly input file.')
+
+        chosen_ligand_combinations = set()  # Store all randomly chosen ligand combinations to avoid duplicates. The iterative ligand choice yields each combination only once anyway.
         count_rejected_ligand_combinations_in_a_row = 0  # Count how many times the same ligand combination has been chosen in a row. If this number gets too high, the random choice of ligands is probably exhausted and the ligand choice method will be switched to "all".
         while True:     # infinite loop, will be broken by function if_make_more_complexes().
 
             # Choose ligands for a complex
+            is_random_choice = self.ligand_choice == 'random'
             if self.ligand_choice == 'random':
                 ligand_combination = self._choose_random_ligand_combination_from_db()
             elif self.ligand_choice == 'all':
@@ -147,14 +285,15 @@ class LigandChoice(object):
                 self.ligand_choice = 'all'
                 self.switched_to_iterative = True   # set flag for printing an info statement later
 
-            # Check if this combination has already been chosen before. Also important if ligand_choice == "all", because the same combination can be chosen multiple times at different ligand sites because of how itertools.product works.
+            # Check if this combination has already been chosen randomly before. The iterative ligand choice yields each combination only once, but it might repeat a combination which was chosen randomly before switching to iterative mode.
             ligand_names = tuple(sorted(ligand.unique_name for ligand in ligand_combination))   # Sort ligand names to make sure the same combination is always represented by the same tuple
             if ligand_names in chosen_ligand_combinations:  # This combination has already been chosen
                 count_rejected_ligand_combinations_in_a_row += 1
                 continue
             else:
                 count_rejected_ligand_combinations_in_a_row = 0
-                chosen_ligand_combinations.add(ligand_names)
+                if is_random_choice:
+                    chosen_ligand_combinations.add(ligand_names)
 
             # Final check if the ligand combination fulfills all constraints
             self._final_assertions_for_ligand_combination(ligand_combination)
@@ -166,10 +305,6 @@ class LigandChoice(object):
 
             yield ligands_out
 
-        if len(chosen_ligand_combinations) == 0: # Output error because no valid ligand combinations found
-            raise LigandCombinationError(
-                f'No valid ligand combinations found which fulfill the metal oxidation state MOS={self.metal_ox} and total charge Q={self.total_charge} requirement! This can happen when the provided metal oxidation state or total charge are too high/low. Please check your ligand database and/or your assembly input file.')
-
         if self.switched_to_iterative:
             logging.info(f'DART info: This batch was interrupted early because all possible complexes have already been made.')
 
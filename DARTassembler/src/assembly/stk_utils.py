@@ -1,6 +1,6 @@
 import numpy as np
 import stk
-from DARTassembler.src.constants.Periodic_Table import DART_Element
+from DARTassembler.src.ligand_extraction.atomic_props import get_element_numbers, get_positions
 import networkx as nx
 
 def create_placeholder_Hg_bb() -> stk.BuildingBlock:
@@ -20,20 +20,20 @@ def convert_RCA_to_stk_Molecule(mol):
     """
 
     # create a list of atoms
-    atom_list = [stk.Atom(id=i, atomic_number=DART_Element(atom).atomic_number) for i, atom in enumerate(mol.atomic_props["atoms"])]
+    atom_list = [stk.Atom(id=i, atomic_number=atomic_number) for i, atomic_number in enumerate(get_element_numbers(mol.atomic_props).tolist())]
 
     # Now we need the bonds from the graph
     # in fact this is good as we have full control that the stk molecules look according to the graphs
     # however, all of them will have default bond order 1
     edges = [e for e in mol.graph.edges]
-    nodes = [n for n in mol.graph.nodes]
+    node_positions = {n: pos for pos, n in enumerate(mol.graph.nodes)}
 
-    bond_list = [stk.Bond(atom1=atom_list[nodes.index(i)], atom2=atom_list[nodes.index(j)], order=1) for (i,j) in edges]
+    bond_list = [stk.Bond(atom1=atom_list[node_positions[i]], atom2=atom_list[node_positions[j]], order=1) for (i,j) in edges]
 
     # Finally the position matrix remains
-    A = [[mol.atomic_props["x"][i], mol.atomic_props["y"][i], mol.atomic_props["z"][i]] for i, _ in enumerate(mol.atomic_props["x"])]
+    A = get_positions(mol.atomic_props)
 
-    return stk.Molecule(atoms=atom_list, bonds=bond_list, position_matrix=np.array(A))
+    return stk.Molecule(atoms=atom_list, bonds=bond_list, position_matrix=A)
 
 
 def RCA_Mol_to_stkBB(mol):
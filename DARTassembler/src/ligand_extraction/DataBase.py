@@ -14,8 +14,15 @@ from DARTassembler.src.ligand_extraction.utilities import identify_metal_in_ase_
 from DARTassembler.src.ligand_extraction.utilities_Molecule import get_all_ligands_by_graph_hashes, group_list_without_hashing
 import networkx as nx
 from DARTassembler.src.ligand_extraction.Molecule import RCA_Molecule, RCA_Ligand, RCA_Complex
-from DARTassembler.src.ligand_extraction.io_custom import save_json, NumpyEncoder, load_unique_ligand_db, load_complex_db, iterate_over_json
-from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+from DARTassembler.src.ligand_extraction.io_custom import save_json, NumpyEncoder, load_unique_ligand_db, load_complex_db, iterate_over_json, get_mol_reader
+from DARTassembler.src.ligand_extraction.lazy_ligands import LazyLigand, LigandRecordLoader, default_cache_size
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates
+from DARTassembler.src.ligand_extraction.db_cache import get_cache_key, load_from_cache, save_to_cache
+from DARTassembler.src.ligand_extraction.db_index import get_index_entry, write_index, read_index, read_entries_at_offsets
+from DARTassembler.src.metalig.binary_db import BinaryLigandDB, is_binary_ligand_db
+from DARTassembler.src.metalig.sqlite_db import SQLiteLigandDB, is_sqlite_ligand_db
+from DARTassembler.src.metalig.compressed_db import is_bz2_file, is_block_compressed_bz2_file
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input, is_trusted_ligand_db
 from scipy.special import comb
 from typing import Union
 from pathlib import Path
@@ -233,18 +240,71 @@ class LigandDB(MoleculeDB):
     def __init__(self, dict_):
         super().__init__(dict_=dict_)
 
+    def to_json(self, path, desc: str='Save DB to json', json_lines: bool=False):
+        """
+        Same as `BaselineDB.to_json()`, but JSON Lines files also get a byte-offset index (see `db_index`), which is used to read single ligands without streaming through the whole file.
+        """
+        if not json_lines:
+            return super().to_json(path=path, desc=desc, json_lines=json_lines)
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write lines manually instead of using jsonlines to keep track of the byte offsets for the index file.
+        index_entries = {}
+        with open(path, 'wb') as file:
+            for key, mol in tqdm(self.db.items(), desc, file=sys.stdout):
+                index_entries[key] = get_index_entry(file.tell(), mol)
+                data = {'key': key, 'value': mol.write_to_mol_dict()}
+                file.write((json.dumps(data, cls=NumpyEncoder) + '\n').encode('utf-8'))
+        write_index(path, index_entries)
+
+        return
+
 
     @classmethod
-    def load_from_json(cls, path: Union[str, Path]='metalig', n_max: int=None, show_progress: bool=True, only_core_ligands: bool=False):
+    def load_from_json(cls, path: Union[str, Path]='metalig', n_max: int=None, show_progress: bool=True, only_core_ligands: bool=False, lazy: bool=False, cache_size: int=default_cache_size, n_processes: Union[int, None]=1, use_cache: bool=False, predicates: Union[LigandPredicates, None]=None, trusted: Union[bool, None]=None):
         """
         Load a JSON or JSON Lines file.
         :param path: Path to the .jsonlines file of the ligand database. Alternatively, the strings 'metalig' or 'test_metalig' can be used to load the default ligand database.
         :param n_max: Maximum number of ligands to load. If None, all ligands will be loaded.
         :param show_progress: If True, a progress bar will be shown.
         :param only_core_ligands: Deprecated for the MetaLig database. For other databases, this parameter specifies if outer-sphere ligands should be removed.
+        :param lazy: If True, the database holds LazyLigand objects which only build the full RCA_Ligand when it is needed. Recommended if only a small part of the ligands will be used.
+        :param cache_size: Maximum number of fully built ligands kept in memory in lazy mode, not counting the ligands which are kept alive because they could have been changed.
+        :param n_processes: Number of processes used to read and build the ligands of JSON Lines files. If None, all available CPUs are used. Ignored in lazy mode.
+        :param use_cache: If True, the loaded database is stored in a persistent cache keyed by the file content and DART version, so that loading the same database again is much faster. Only has an effect if a cache directory is set, see `db_cache`.
+        :param predicates: If given, only ligands which pass these cheap conditions (denticity, charge, atom count, donor elements, ...) are loaded. The conditions are checked on the raw ligand dictionary before the ligand is built. Afterwards, `predicates.n_rejected` contains the number of ligands rejected by each condition. `n_max` still counts all ligands in the database.
+        :param trusted: If True, the stored properties of each ligand are restored directly instead of being recomputed and checked, which is much faster. If None, this is done only for the ligand databases shipped with DART.
         :return: A LigandDB object
         """
-        db = load_unique_ligand_db(path=path, n_max=n_max, show_progress=show_progress, molecule='class')
+        cached = None
+        if predicates is not None:
+            predicates.reset_counts()
+        if use_cache:
+            path = get_correct_ligand_db_path_from_input(path)
+            cache_key = get_cache_key(path, n_max=n_max, lazy=lazy, predicates=predicates, trusted=trusted)
+            cached = load_from_cache(cache_key)
+            if cached is not None and predicates is not None:
+                cached, predicates.n_rejected = cached
+            if cached is not None and show_progress:
+                print(f'Loaded ligand db `{Path(path).name}` from cache.')
+
+        if lazy:
+            loader = LigandRecordLoader(path=path, cache_size=cache_size, trusted=trusted)
+            if cached is not None:
+                records = cached
+            elif predicates is not None:
+                records = list(loader.iterate_passing_index_records(predicates=predicates, n_max=n_max, show_progress=show_progress))
+            else:
+                records = list(loader.iterate_index_records(n_max=n_max, show_progress=show_progress))
+            db = {name: LazyLigand(index_record=record, loader=loader, locator=locator) for name, record, locator in records}
+        else:
+            db = cached if cached is not None else load_unique_ligand_db(path=path, n_max=n_max, show_progress=show_progress, molecule='class', n_processes=n_processes, predicates=predicates, trusted=trusted)
+
+        if use_cache and cached is None:
+            to_cache = records if lazy else db
+            save_to_cache(cache_key, to_cache if predicates is None else (to_cache, predicates.n_rejected))
 
         if only_core_ligands:
             # Remove all free ligands which were not connected to the metal.
@@ -252,6 +312,61 @@ class LigandDB(MoleculeDB):
 
         return cls(db)
 
+    @classmethod
+    def load_subset(cls, names: list[str], path: Union[str, Path]='metalig', show_progress: bool=False):
+        """
+        Load only the ligands with the given unique names from a ligand database. Instead of reading the whole database, the ligands are read directly using the byte-offset index of the database, which is built if it doesn't exist yet.
+        :param names: Unique names of the ligands to load.
+        :param path: Path to the ligand database. Alternatively, the strings 'metalig' or 'test_metalig' can be used.
+        :param show_progress: If True, a progress bar will be shown.
+        :return: A LigandDB object with the ligands in the order of `names`.
+        """
+        path = get_correct_ligand_db_path_from_input(path)
+        names = list(dict.fromkeys(names))  # remove duplicates but keep order
+        is_single_stream_bz2 = is_bz2_file(path) and not is_block_compressed_bz2_file(path)
+
+        if is_binary_ligand_db(path):
+            binary_db = BinaryLigandDB(path)
+            name_to_idx = {name: idx for idx, name in enumerate(binary_db.get_column('unique_name').tolist())}
+            missing = [name for name in names if not name in name_to_idx]
+        elif is_sqlite_ligand_db(path):
+            sqlite_db = SQLiteLigandDB(path)
+            name_to_idx = {name: sqlite_db.get_idx(name) for name in names}
+            missing = [name for name, idx in name_to_idx.items() if idx is None]
+        elif is_single_stream_bz2:
+            # Random access into a compressed file with a single stream would decompress the file up to each ligand, so the file is streamed once instead.
+            wanted = set(names)
+            found = {name: mol for name, mol in iterate_over_json(path, show_progress=False) if name in wanted}
+            missing = [name for name in names if not name in found]
+        else:
+            index = read_index(path)
+            missing = [name for name in names if not name in index]
+        if len(missing) > 0:
+            raise KeyError(f"Ligands not found in ligand database `{Path(path).name}`: {missing}")
+
+        if is_binary_ligand_db(path):
+            entries = (binary_db.get_mol_dict(name_to_idx[name]) for name in names)
+        elif is_sqlite_ligand_db(path):
+            entries = (sqlite_db.get_mol_dict(name_to_idx[name]) for name in names)
+        elif is_single_stream_bz2:
+            entries = ((name, found[name]) for name in names)
+        else:
+            entries = read_entries_at_offsets(path, offsets=[index[name][0] for name in names])
+        read_ligand = get_mol_reader(RCA_Ligand, trusted=is_trusted_ligand_db(path))
+        db = {name: read_ligand(mol) for name, mol in tqdm(entries, disable=not show_progress, desc='Load ligands', total=len(names), file=sys.stdout)}
+
+        return cls(db)
+
+    @classmethod
+    def get(cls, unique_name: str, path: Union[str, Path]='metalig') -> RCA_Ligand:
+        """
+        Get a single ligand from a ligand database by its unique name without reading the whole database.
+        :param unique_name: Unique name of the ligand.
+        :param path: Path to the ligand database. Alternatively, the strings 'metalig' or 'test_metalig' can be used.
+        :return: The ligand as RCA_Ligand.
+        """
+        return cls.load_subset(names=[unique_name], path=path).db[unique_name]
+
     def get_ligand_output_df(self, max_entries: int=5) -> pd.DataFrame:
         ligands = {uname: ligand.get_ligand_output_info(max_entries=max_entries) for uname, ligand in self.db.items()}
         df_ligand_info = pd.DataFrame.from_dict(ligands, orient='index')
@@ -669,13 +784,14 @@ class ComplexDB(MoleculeDB):
         return self == db
 
     @classmethod
-    def load_from_json(cls, path: Union[str, Path], n_max: int=None, show_progress: bool=True):
+    def load_from_json(cls, path: Union[str, Path], n_max: int=None, show_progress: bool=True, n_processes: Union[int, None]=1):
         """
         Load a JSON or JSON Lines file.
         :param path: Path to the JSON or JSON Lines file
+        :param n_processes: Number of processes used to read and build the complexes of JSON Lines files. If None, all available CPUs are used.
         :return: A ComplexDB object
         """
-        db = load_complex_db(path=path, n_max=n_max, show_progress=show_progress, molecule='class')
+        db = load_complex_db(path=path, n_max=n_max, show_progress=show_progress, molecule='class', n_processes=n_processes)
         return cls(db)
 
 
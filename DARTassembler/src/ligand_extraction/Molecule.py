@@ -30,14 +30,24 @@ from DARTassembler.src.ligand_extraction.utilities_graph import graph_from_graph
     get_graph_fragments, count_atoms_with_n_bonds, get_graph_hash, get_heavy_atoms_graph, \
     get_only_complex_graph_connected_to_metal, get_adjacency_matrix, assert_graph_and_coordinates_are_consistent, \
     remove_node_features_from_graph, make_multigraph_to_graph
+from DARTassembler.src.ligand_extraction.array_graph import ArrayGraph
+from DARTassembler.src.ligand_extraction.atomic_props import AtomicProps, make_atomic_props, get_coordinates_list, get_positions, get_elements, atomic_props_to_dict
 from DARTassembler.src.ligand_extraction.utilities import identify_metal_in_ase_mol, make_None_to_NaN, update_dict_with_warning_inplace, is_between
 from DARTassembler.src.ligand_extraction.utilities_Molecule import get_standardized_stoichiometry_from_atoms_list, \
     unknown_rdkit_bond_orders, calculate_angular_deviation_of_bond_axis_from_ligand_center, \
-    find_smallest_ring_with_specified_nodes, get_max_deviation_from_coplanarity, if_same_stoichiometries
+    find_smallest_ring_with_specified_nodes, get_max_deviation_from_coplanarity, if_same_stoichiometries, get_planarity, \
+    get_interatomic_distances
 from DARTassembler.src.assembly.stk_utils import RCA_Mol_to_stkBB, convert_RCA_to_stk_Molecule
 
 pseudo_metal = 'Cu'     # pseudo metal for display in ligand xyz files and for use in the SMARTS filter.
 
+# Properties which RCA_Ligand.__init__() recomputes if they are missing. Only if all of them are stored in a ligand dictionary, the ligand can be restored with `RCA_Ligand.read_from_trusted_mol_dict()`.
+trusted_ligand_props = ('n_atoms', 'n_hydrogens', 'n_protons', 'n_bonds', 'has_bond_order_attribute', 'has_unknown_bond_orders',
+                        'has_good_bond_orders', 'graph_hash', 'heavy_atoms_graph_hash', 'bond_order_graph_hash', 'stoichiometry',
+                        'is_centrosymmetric', 'centrosymmetry_ang_dev', 'graph_hash_with_metal', 'heavy_atoms_graph_hash_with_metal',
+                        'has_betaH', 'has_neighboring_coordinating_atoms', 'stats')
+trusted_ligand_global_props = ('CSD_code', 'n_atoms', 'n_elements', 'molecular_weight', 'n_C_H_bonds')
+
 class RCA_Molecule(object):
     """
     The idea of this class is to build a method which contains an ase molecule for visualization but also other convenient features, as a graph representation and all the global information we have at hand when creating a database
@@ -222,10 +232,7 @@ class RCA_Molecule(object):
 
     def get_mol_from_input(self, mol):
         if mol is None:
-            coord_list_3D = [[self.atomic_props[key_][i] for key_ in ["x", "y", "z"]] for i, _ in
-                             enumerate(self.atomic_props["x"])]
-            atom_list = self.atomic_props["atoms"]
-            mol = Atoms(atom_list, positions=coord_list_3D)
+            mol = Atoms(get_elements(self.atomic_props), positions=get_positions(self.atomic_props))
 
         return mol
 
@@ -240,9 +247,8 @@ class RCA_Molecule(object):
             assert len(coords) == 3, f"Coordinates for element {el} are not of length 3: {coords}"
             assert isinstance(el, str), f"Element {el} is not a string"
 
-        coord_list_3D = [[self.atomic_props[key_][i] for key_ in ["x", "y", "z"]] for i, _ in
-                         enumerate(self.atomic_props["x"])]
-        atom_list = self.atomic_props["atoms"]
+        coord_list_3D = get_coordinates_list(self.atomic_props)
+        atom_list = get_elements(self.atomic_props)
 
         # Remove specified elements
         if remove_elements:
@@ -464,11 +470,7 @@ class RCA_Molecule(object):
         the ase mol
         """
 
-        coord_list_3D = [[atomic_props_mol[key_][i] for key_ in ["x", "y", "z"]] for i, _ in
-                         enumerate(atomic_props_mol["x"])]
-        atom_list = atomic_props_mol["atoms"]
-
-        return cls(mol=Atoms(atom_list, positions=coord_list_3D),
+        return cls(mol=Atoms(get_elements(atomic_props_mol), positions=get_positions(atomic_props_mol)),
                    atomic_props=atomic_props_mol,
                    global_props=global_props_mol,
                    graph=graph,
@@ -488,10 +490,8 @@ class RCA_Molecule(object):
         """
         Returns the atomic positions of the atoms with the given indices.
         """
-        positions = []
-        for i in atomic_indices:
-            x, y, z = self.atomic_props['x'][i], self.atomic_props['y'][i], self.atomic_props['z'][i]
-            positions.append([x, y, z])
+        coords = get_coordinates_list(self.atomic_props)
+        positions = [coords[i] for i in atomic_indices]
 
         return positions
 
@@ -577,7 +577,7 @@ class RCA_Molecule(object):
         Returns a list of the elements in the molecule.
         :return: list of elements
         """
-        return self.atomic_props['atoms']
+        return get_elements(self.atomic_props)
 
 
     def calculate_planarity(self, only_donors=False) -> float:
@@ -586,19 +586,14 @@ class RCA_Molecule(object):
         @param only_donors: If True, only the donor atoms are considered for the calculation of the planarity. If False, all atoms are considered.
         @return: Planarity of the molecule as a float between 0 and 1. 0 means not planar at all (a sphere), 1 means perfectly planar.
         """
-        coordinates = self.get_coordinates_list()
-        deviation = get_max_deviation_from_coplanarity(points=coordinates)  # deviation is a float that is 0 if the molecule is perfectly planar and > 0 if it is not. The higher the value, the less planar the molecule is.
-        planarity = 1/ (1+ deviation)   # planarity is a float between 0 and 1. 0 means not planar at all (a sphere), 1 means perfectly planar.
-        planarity = round(planarity, 10)    # round to 10 decimal places to avoid floating point errors which happen with np.linalg.svd() in different versions of numpy
-
-        return planarity
+        return get_planarity(self.get_coordinates_list())
 
     def get_coordinates_list(self) -> list:
         """
         Returns the coordinates of the ligand without the metal.
         @return: Coordinates of the ligand without the metal in format [[x1, y1, z1], [x2, y2, z2], ...]
         """
-        coords = [[self.atomic_props['x'][i], self.atomic_props['y'][i], self.atomic_props['z'][i]] for i in range(len(self.atomic_props['x']))]
+        coords = get_coordinates_list(self.atomic_props)
 
         return coords
 
@@ -631,13 +626,7 @@ class RCA_Molecule(object):
         Returns the distances between all atoms in the molecule.
         @return: list of distances between all atoms in the molecule
         """
-        distances = self.get_atomic_distances_between_atoms()[2]
-        unique_distances = []
-        for i in range(len(distances)):
-            for j in range(i+1, len(distances)):
-                unique_distances.append(distances[i,j])
-
-        return unique_distances
+        return get_interatomic_distances(get_positions(self.atomic_props)).tolist()
 
     def __eq__(self, other):
         if not self.stoichiometry == other.stoichiometry:
@@ -655,8 +644,8 @@ class RCA_Molecule(object):
         """
         str_ = f"{len(self.atomic_props['x'])}\n"
         str_ += comment + '\n'
-        for i, _ in enumerate(self.atomic_props['x']):
-            str_ += f"{self.atomic_props['atoms'][i]}  {self.atomic_props['x'][i]}  {self.atomic_props['y'][i]}  {self.atomic_props['z'][i]} \n"
+        for el, (x, y, z) in zip(get_elements(self.atomic_props), get_coordinates_list(self.atomic_props)):
+            str_ += f"{el}  {x}  {y}  {z} \n"
 
         return str_
 
@@ -664,7 +653,7 @@ class RCA_Molecule(object):
         """
         returns a numpy array of the xyz coordinates. Shape: (n_atoms, 3)
         """
-        return np.array([self.atomic_props['x'], self.atomic_props['y'], self.atomic_props['z']]).T
+        return get_positions(self.atomic_props)
 
     def print_to_xyz(self, path: str):
         if not path.endswith(".xyz"):
@@ -736,7 +725,7 @@ class RCA_Molecule(object):
         Graph hash not that important for molecules I guess
         """
         return {
-            "atomic_props": self.atomic_props,
+            "atomic_props": atomic_props_to_dict(self.atomic_props),
             "global_props": self.global_props,
             "graph_dict": graph_to_dict_with_node_labels(self.graph),
             # "graph_hash": self.graph_hash
@@ -827,9 +816,8 @@ class RCA_Molecule(object):
 
     def to_pymatMol(self):
         from pymatgen.core.structure import Molecule as PyMatMol
-        return PyMatMol(species=self.atomic_props["atoms"],
-                        coords=[[self.atomic_props[key_][i] for key_ in ["x", "y", "z"]] for i, _ in
-                                enumerate(self.atomic_props["x"])])
+        return PyMatMol(species=get_elements(self.atomic_props),
+                        coords=get_coordinates_list(self.atomic_props))
 
 
 
@@ -853,9 +841,9 @@ class RCA_Ligand(RCA_Molecule):
         """
         :param graph: If None, it will be generated custom. Maybe only important for monodentates and reactant
         """
-        coord_list_3D = [[atomic_props[key_][i] for key_ in ["x", "y", "z"]] for i, _ in
-                         enumerate(atomic_props["x"])]
-        atom_list = atomic_props["atoms"]
+        atomic_props = make_atomic_props(atomic_props)  # compact arrays instead of lists if possible
+        coord_list_3D = get_coordinates_list(atomic_props)
+        atom_list = get_elements(atomic_props)
 
         super().__init__(mol=Atoms(atom_list, positions=coord_list_3D),
                          atomic_props=atomic_props,
@@ -917,6 +905,30 @@ class RCA_Ligand(RCA_Molecule):
 
         assert nx.is_connected(self.graph), f'Graph of ligand with name {self.name} is not fully connected.'
 
+    def __getattr__(self, item):
+        # Only called if normal attribute lookup fails. Ligands restored with `read_from_trusted_mol_dict()` build the networkx graph, the ase molecule and the coordinates dictionary only when they are needed.
+        if item == 'graph' and 'array_graph' in self.__dict__:
+            self.graph = self.array_graph.to_networkx()
+            return self.__dict__[item]
+        if item in ('mol', 'coordinates') and 'atomic_props' in self.__dict__:
+            atom_list = get_elements(self.atomic_props)
+            coord_list_3D = get_coordinates_list(self.atomic_props)
+            if item == 'mol':
+                self.mol = Atoms(atom_list, positions=coord_list_3D)
+            else:
+                self.coordinates = {i: [at, coord_list_3D[i]] for i, at in enumerate(atom_list)}
+            return self.__dict__[item]
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{item}'")
+
+    def get_array_graph(self) -> ArrayGraph:
+        """
+        Returns the graph of the ligand as ArrayGraph. If the networkx graph has been built, it is used because it might have been changed.
+        """
+        if 'graph' in self.__dict__ or not 'array_graph' in self.__dict__:
+            return ArrayGraph.from_networkx(self.graph)
+        return self.array_graph
+
     def get_smiles(self, with_metal: str=None) -> Union[str,None]:
         """
         Returns the SMILES string of the molecule.
@@ -1173,8 +1185,8 @@ class RCA_Ligand(RCA_Molecule):
             str_ += comment + '\n'
 
         # Add ligand atoms
-        for i, _ in enumerate(self.atomic_props['x']):
-            str_ += f"{self.atomic_props['atoms'][i]}  {self.atomic_props['x'][i]}  {self.atomic_props['y'][i]}  {self.atomic_props['z'][i]} \n"
+        for el, (x, y, z) in zip(get_elements(self.atomic_props), get_coordinates_list(self.atomic_props)):
+            str_ += f"{el}  {x}  {y}  {z} \n"
 
         return str_
 
@@ -1242,10 +1254,13 @@ class RCA_Ligand(RCA_Molecule):
             print("Wrong number of coordinates specified")
             raise ValueError
 
-        self.atomic_props["atoms"].append(symbol)
-        self.atomic_props["x"].append(coordinates[0])
-        self.atomic_props["y"].append(coordinates[1])
-        self.atomic_props["z"].append(coordinates[2])
+        if isinstance(self.atomic_props, AtomicProps):
+            self.atomic_props.add_atom(symbol, coordinates)
+        else:
+            self.atomic_props["atoms"].append(symbol)
+            self.atomic_props["x"].append(coordinates[0])
+            self.atomic_props["y"].append(coordinates[1])
+            self.atomic_props["z"].append(coordinates[2])
 
         # now we need to update the self.mol, graph wont be updated
         self.print_to_xyz(path="../tmp/tmp.xyz")
@@ -1375,12 +1390,16 @@ class RCA_Ligand(RCA_Molecule):
         d = {}
         # Manually initialize special fields
         if include_graph_dict:
-            d['graph_dict'] = graph_to_dict_with_node_labels(self.graph)
+            if 'graph' in self.__dict__ or not 'array_graph' in self.__dict__:
+                d['graph_dict'] = graph_to_dict_with_node_labels(self.graph)
+            else:
+                d['graph_dict'] = self.array_graph.to_graph_dict()
 
-        do_not_output_automatically = ['mol', 'node_label', 'rdkit_mol', 'graph', 'coordinates', 'hash', 'csd_code', 'graph_with_metal', 'atomic_index_to_graph_index', 'graph_index_to_atomic_index']
+        do_not_output_automatically = ['mol', 'node_label', 'rdkit_mol', 'graph', 'array_graph', 'coordinates', 'hash', 'csd_code', 'graph_with_metal', 'atomic_index_to_graph_index', 'graph_index_to_atomic_index']
         for prop, val in vars(self).items():
             if not prop in do_not_output_automatically:
                 d[prop] = val
+        d['atomic_props'] = atomic_props_to_dict(self.atomic_props)
 
         return d
 
@@ -1419,6 +1438,61 @@ class RCA_Ligand(RCA_Molecule):
             **kwargs
         )
 
+    @classmethod
+    def can_read_from_trusted_mol_dict(cls, dict_: dict) -> bool:
+        """
+        Checks if all properties which are otherwise recomputed are stored in the ligand dictionary.
+        """
+        return all(prop in dict_ for prop in trusted_ligand_props) and all(prop in dict_['global_props'] for prop in trusted_ligand_global_props) and isinstance(dict_.get('graph_dict'), dict)
+
+    @classmethod
+    def read_from_trusted_mol_dict(cls, dict_: dict):
+        """
+        Fast version of `read_from_mol_dict()` for ligand dictionaries from a trusted source like the MetaLig database shipped with DART. All stored properties are restored directly and nothing is recomputed or checked, i.e. no graph hashes, bond order checks, centrosymmetry, beta-H check, stats and no check if the graph is connected. The graph is stored as compact ArrayGraph in `self.array_graph`. The networkx graph, the ase molecule and the coordinates dictionary are only built when they are accessed. The resulting ligand has the same attributes as one from `read_from_mol_dict()`. If any of the otherwise recomputed properties is missing in the dictionary, this falls back to `read_from_mol_dict()`.
+        """
+        necessary_props = ["atomic_props", "global_props", "graph_dict", "denticity", "name", 'ligand_to_metal']
+        assert set(necessary_props).issubset(set(dict_.keys())), f'Any of the necessary keys {necessary_props} is not present.'
+        if not cls.can_read_from_trusted_mol_dict(dict_):
+            return cls.read_from_mol_dict(dict_)
+        try:
+            array_graph = ArrayGraph.from_graph_dict(dict_['graph_dict'])
+        except ValueError:
+            # e.g. node labels which are not element symbols
+            return cls.read_from_mol_dict(dict_)
+        if not 'warnings' in dict_:
+            dict_['warnings'] = []
+
+        # Set attributes in the same order as __init__() so that the ligand is written in the same way.
+        self = cls.__new__(cls)
+        self.warnings = dict_['warnings']
+        self.node_label = 'node_label'
+        self.atomic_props = dict_['atomic_props']
+        self.global_props = dict_['global_props']
+        if 'comment' in self.atomic_props:
+            self.global_props['comment'] = ''.join(self.atomic_props['comment'])
+            del self.atomic_props['comment']
+        self.atomic_props = make_atomic_props(self.atomic_props)
+        self.array_graph = array_graph
+        for prop, value in dict_.items():
+            if not prop in necessary_props:
+                setattr(self, prop, value)
+        self.hash = self.get_hash()
+
+        self.atomic_index_to_graph_index = {atm_idx: graph_idx for atm_idx, graph_idx in enumerate(sorted(self.array_graph.node_ids.tolist()))}
+        self.graph_index_to_atomic_index = {graph_idx: atm_idx for atm_idx, graph_idx in self.atomic_index_to_graph_index.items()}
+        self.denticity = dict_['denticity']
+        self.name = dict_['name']
+        self.original_complex_id = self.global_props['CSD_code']
+        self.ligand_to_metal = dict_['ligand_to_metal']
+        self.local_elements = self.get_local_elements()
+        self.was_connected_to_metal = len(self.local_elements) > 0
+        try:
+            self.original_metal_symbol = DART_Element(self.original_metal).symbol
+        except (ValueError, AttributeError):
+            pass
+
+        return self
+
     # some stk functionality
     def to_stk_bb(self):
         """
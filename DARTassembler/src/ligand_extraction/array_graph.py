@@ -0,0 +1,302 @@
+"""
+Compact array-backed graph representation of molecules.
+
+An ArrayGraph stores the graph of a molecule as CSR adjacency (`indptr`, `indices`) plus an array of element codes (atomic numbers) instead of a networkx graph with one dictionary per node and per edge. This needs about an order of magnitude less memory. The networkx graph can be built on demand with `to_networkx()` and is exactly the same graph as the one built by `graph_from_graph_dict()`, including the order of nodes and neighbors. Graph hashes, connectivity checks and merging of ligand graphs into a complex graph run directly on the arrays.
+"""
+import re
+from collections import Counter
+from hashlib import blake2b
+from typing import Union
+
+import networkx as nx
+import numpy as np
+from ase.data import atomic_numbers, chemical_symbols
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+node_label = 'node_label'   # node attribute with the element symbol
+_small_graph_size = 200     # graphs up to this size are checked for connectivity without scipy
+# Since networkx 3.5, the initial degree labels of graphs without attributes count as the first iteration of the graph hash.
+_degree_labels_are_first_iteration = tuple(int(v) for v in re.match(r'(\d+)\.(\d+)', nx.__version__).groups()) >= (3, 5)
+
+
+def _hash_label(label: str, digest_size: int) -> str:
+    # Same as in networkx.weisfeiler_lehman_graph_hash() to get exactly the same hashes.
+    return blake2b(label.encode('ascii'), digest_size=digest_size).hexdigest()
+
+
+class ArrayGraph(object):
+    """
+    Undirected molecular graph in CSR format. Nodes are addressed by their position 0..n-1, `node_ids` holds the original node labels of the networkx graph. The neighbors of each node are stored in the same order as in the adjacency of the networkx graph.
+    """
+    __slots__ = ('node_ids', 'elements', 'indptr', 'indices', 'edge_attributes', 'node_attributes')
+
+    def __init__(self, node_ids: np.ndarray, elements: np.ndarray, indptr: np.ndarray, indices: np.ndarray, edge_attributes: Union[dict, list, None] = None, node_attributes: Union[dict, None] = None):
+        """
+        :param node_ids: Original node labels, one per node.
+        :param elements: Atomic number of each node.
+        :param indptr: CSR index pointer, the neighbors of node i are `indices[indptr[i]:indptr[i+1]]`.
+        :param indices: CSR neighbor positions.
+        :param edge_attributes: Attributes of each entry in `indices`, either as {attribute: array} if all edges have the same integer attributes or as list of dictionaries otherwise.
+        :param node_attributes: Additional node attributes apart from the element as {attribute: list}.
+        """
+        self.node_ids = node_ids
+        self.elements = elements
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_attributes = edge_attributes if edge_attributes is not None else {}
+        self.node_attributes = node_attributes if node_attributes is not None else {}
+
+    @classmethod
+    def from_adjacency(cls, node_ids: list, labels: list, adjacency: list[list[int]], edge_data: list[list[dict]], other_node_attributes: Union[dict, None] = None) -> 'ArrayGraph':
+        """
+        Builds the graph from python lists. `adjacency[i]` are the positions of the neighbors of node i and `edge_data[i]` the corresponding edge attribute dictionaries.
+        """
+        try:
+            elements = np.array([atomic_numbers[label] for label in labels], dtype=np.uint8)
+        except KeyError as e:
+            raise ValueError(f'Node label {e} is not an element symbol.')
+        indptr = np.zeros(len(adjacency) + 1, dtype=np.int32)
+        indptr[1:] = np.cumsum([len(nbrs) for nbrs in adjacency])
+        indices = np.fromiter((nbr for nbrs in adjacency for nbr in nbrs), dtype=np.int32, count=int(indptr[-1]))
+
+        all_data = [data for node_data in edge_data for data in node_data]
+        keys = tuple(all_data[0].keys()) if len(all_data) > 0 else ()
+        if all(tuple(data.keys()) == keys and all(type(value) is int for value in data.values()) for data in all_data):
+            edge_attributes = {key: np.array([data[key] for data in all_data], dtype=np.int64) for key in keys}
+        else:
+            edge_attributes = [dict(data) for data in all_data]
+
+        return cls(node_ids=np.array(node_ids, dtype=np.int64), elements=elements, indptr=indptr, indices=indices, edge_attributes=edge_attributes, node_attributes=other_node_attributes)
+
+    @classmethod
+    def from_graph_dict(cls, graph_dict: dict) -> 'ArrayGraph':
+        """
+        Builds the graph from a graph dictionary as stored in the database. Gives the same graph as `graph_from_graph_dict()`, but doesn't change the input dictionary.
+        """
+        d = graph_dict['graph']
+        node_attrs = graph_dict['node_attributes']
+        node_ids = [int(node) for node in d]
+        assert sorted(node_ids) == node_ids, "Nodes are not sorted"
+        pos = {node: i for i, node in enumerate(d)}
+        if len(node_attrs) != len(d) or any(node not in pos for node in node_attrs):
+            raise ValueError('The nodes in the graph and in the node attributes are different.')
+
+        # Replicate the order of neighbors of `nx.from_dict_of_dicts()`, which adds the edges in the order of the dictionary.
+        adjacency = [[] for _ in d]
+        edge_data = [[] for _ in d]
+        seen = [set() for _ in d]
+        for node, nbrs in d.items():
+            u = pos[node]
+            for nbr, data in nbrs.items():
+                v = pos[nbr]
+                if v not in seen[u]:
+                    seen[u].add(v)
+                    adjacency[u].append(v)
+                    edge_data[u].append(data)
+                if u not in seen[v]:
+                    seen[v].add(u)
+                    adjacency[v].append(u)
+                    edge_data[v].append(data)
+
+        labels = [node_attrs[node][node_label] for node in d]
+        other_keys = [key for key in next(iter(node_attrs.values()), {}) if key != node_label]
+        other_node_attributes = {key: [node_attrs[node].get(key) for node in d] for key in other_keys}
+        if any(set(attrs.keys()) != {node_label, *other_keys} for attrs in node_attrs.values()):
+            raise ValueError('Not all nodes have the same attributes.')
+
+        return cls.from_adjacency(node_ids=node_ids, labels=labels, adjacency=adjacency, edge_data=edge_data, other_node_attributes=other_node_attributes)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph) -> 'ArrayGraph':
+        """
+        Builds the graph from a networkx graph, keeping the order of nodes and neighbors.
+        """
+        pos = {node: i for i, node in enumerate(graph.nodes)}
+        adjacency = [[pos[nbr] for nbr in nbrs] for nbrs in graph.adj.values()]
+        edge_data = [list(nbrs.values()) for nbrs in graph.adj.values()]
+        labels = [data[node_label] for _, data in graph.nodes(data=True)]
+        other_keys = [key for key in next(iter(graph.nodes.values()), {}) if key != node_label]
+        other_node_attributes = {key: [data.get(key) for _, data in graph.nodes(data=True)] for key in other_keys}
+
+        return cls.from_adjacency(node_ids=list(graph.nodes), labels=labels, adjacency=adjacency, edge_data=edge_data, other_node_attributes=other_node_attributes)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        n_self_loops = int(np.sum(self.indices == np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.indptr))))
+        return (len(self.indices) + n_self_loops) // 2
+
+    def get_labels(self) -> list[str]:
+        return [chemical_symbols[z] for z in self.elements.tolist()]
+
+    def get_degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def _get_neighbor_lists(self) -> list[list[int]]:
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        return [indices[indptr[i]:indptr[i + 1]] for i in range(len(self))]
+
+    def _get_edge_data(self, idx: int) -> dict:
+        """
+        Returns the attributes of the edge at position `idx` in `self.indices` as dictionary.
+        """
+        if isinstance(self.edge_attributes, list):
+            return dict(self.edge_attributes[idx])
+        return {key: values[idx].item() for key, values in self.edge_attributes.items()}
+
+    def _get_all_edge_data(self) -> list[dict]:
+        if isinstance(self.edge_attributes, list):
+            return [dict(data) for data in self.edge_attributes]
+        columns = {key: values.tolist() for key, values in self.edge_attributes.items()}
+        return [{key: values[idx] for key, values in columns.items()} for idx in range(len(self.indices))]
+
+    def _get_node_data(self) -> list[dict]:
+        labels = self.get_labels()
+        other = list(self.node_attributes.items())
+        return [{node_label: label, **{key: values[i] for key, values in other}} for i, label in enumerate(labels)]
+
+    def edges(self) -> list[tuple[int, int]]:
+        """
+        Returns the edges as pairs of original node labels in the same order as `networkx.Graph.edges`.
+        """
+        node_ids = self.node_ids.tolist()
+        edges = []
+        for u, nbrs in enumerate(self._get_neighbor_lists()):
+            for v in nbrs:
+                if v >= u:
+                    edges.append((node_ids[u], node_ids[v]))
+        return edges
+
+    def to_dict_of_dicts(self) -> dict:
+        node_ids = self.node_ids.tolist()
+        edge_data = self._get_all_edge_data()
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        return {node_ids[u]: {node_ids[indices[k]]: edge_data[k] for k in range(indptr[u], indptr[u + 1])} for u in range(len(self))}
+
+    def to_networkx(self) -> nx.Graph:
+        """
+        Returns the networkx graph. It is the same as the graph from `graph_from_graph_dict()`, including the order of nodes and neighbors.
+        """
+        graph = nx.from_dict_of_dicts(self.to_dict_of_dicts())
+        nx.set_node_attributes(graph, dict(zip(self.node_ids.tolist(), self._get_node_data())))
+        return graph
+
+    def to_graph_dict(self) -> dict:
+        """
+        Returns the graph dictionary for saving to the database. Same as `graph_to_dict_with_node_labels(self.to_networkx())`.
+        """
+        d = self.to_dict_of_dicts()
+        graph = {node: {nbr: {key: data[key] for key in sorted(data)} for nbr, data in sorted(nbrs.items())} for node, nbrs in sorted(d.items())}
+        node_data = dict(zip(self.node_ids.tolist(), self._get_node_data()))
+        node_attributes = {node: {key: data[key] for key in sorted(data)} for node, data in sorted(node_data.items())}
+
+        return {'graph': graph, 'node_attributes': node_attributes}
+
+    def is_connected(self) -> bool:
+        if len(self) == 0:
+            raise nx.NetworkXPointlessConcept('Connectivity is undefined for the null graph.')
+        if len(self) > _small_graph_size:
+            adjacency = csr_matrix((np.ones(len(self.indices), dtype=np.int8), self.indices, self.indptr), shape=(len(self), len(self)))
+            n_components, _ = connected_components(adjacency, directed=False)
+            return n_components == 1
+
+        # For small graphs, a plain breadth-first search is much faster than the overhead of scipy.
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        seen = {0}
+        frontier = [0]
+        while frontier:
+            u = frontier.pop()
+            for v in indices[indptr[u]:indptr[u + 1]]:
+                if v not in seen:
+                    seen.add(v)
+                    frontier.append(v)
+
+        return len(seen) == len(self)
+
+    def subgraph(self, mask: np.ndarray) -> 'ArrayGraph':
+        """
+        Returns the subgraph of all nodes where mask is True, keeping the order of nodes and neighbors.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        new_pos = np.cumsum(mask) - 1
+        entry_nodes = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        keep = mask[entry_nodes] & mask[self.indices]
+        indptr = np.zeros(int(mask.sum()) + 1, dtype=np.int32)
+        indptr[1:] = np.cumsum(np.bincount(new_pos[entry_nodes[keep]], minlength=int(mask.sum())))
+        if isinstance(self.edge_attributes, list):
+            edge_attributes = [data for data, k in zip(self.edge_attributes, keep) if k]
+        else:
+            edge_attributes = {key: values[keep] for key, values in self.edge_attributes.items()}
+        node_attributes = {key: [value for value, m in zip(values, mask) if m] for key, values in self.node_attributes.items()}
+
+        return ArrayGraph(node_ids=self.node_ids[mask], elements=self.elements[mask], indptr=indptr, indices=new_pos[self.indices[keep]].astype(np.int32), edge_attributes=edge_attributes, node_attributes=node_attributes)
+
+    def get_heavy_atoms_graph(self) -> 'ArrayGraph':
+        return self.subgraph(self.elements != atomic_numbers['H'])
+
+    def weisfeiler_lehman_graph_hash(self, node_attr: Union[str, None] = node_label, edge_attr: Union[str, None] = None, iterations: int = 3, digest_size: int = 16) -> str:
+        """
+        Same as `networkx.weisfeiler_lehman_graph_hash()` for the networkx version of this graph.
+        """
+        if node_attr == node_label:
+            labels = self.get_labels()
+        elif node_attr:
+            labels = [str(value) for value in self.node_attributes[node_attr]]
+        elif edge_attr:
+            labels = [''] * len(self)
+        else:
+            labels = [str(deg) for deg in self.get_degrees().tolist()]
+            if _degree_labels_are_first_iteration:
+                iterations -= 1
+
+        neighbors = self._get_neighbor_lists()
+        if edge_attr is not None:
+            edge_data = self._get_all_edge_data()
+            indptr = self.indptr.tolist()
+            prefixes = [[str(edge_data[k][edge_attr]) for k in range(indptr[u], indptr[u + 1])] for u in range(len(self))]
+
+        subgraph_hash_counts = []
+        for _ in range(iterations):
+            if edge_attr is None:
+                labels = [_hash_label(labels[u] + ''.join(sorted([labels[v] for v in nbrs])), digest_size) for u, nbrs in enumerate(neighbors)]
+            else:
+                labels = [_hash_label(labels[u] + ''.join(sorted(prefix + labels[v] for prefix, v in zip(prefixes[u], nbrs))), digest_size) for u, nbrs in enumerate(neighbors)]
+            counter = Counter(labels)
+            subgraph_hash_counts.extend(sorted(counter.items(), key=lambda x: x[0]))
+
+        return _hash_label(str(tuple(subgraph_hash_counts)), digest_size)
+
+    @classmethod
+    def merge(cls, graphs: list['ArrayGraph'], center_label: str, center_neighbors: list[list[int]]) -> tuple['ArrayGraph', list[list[int]], list[list[int]]]:
+        """
+        Merges several graphs into one graph with an additional center node, e.g. the ligand graphs into the graph of a complex with the metal as center. The center gets the node id 0, the nodes of the graphs are relabeled to 1..n in the order of the graphs. Edges to the center have no attributes, all other edge attributes are removed as well. Graphs with additional node attributes apart from the element are not supported.
+        :param graphs: Graphs to merge.
+        :param center_label: Element symbol of the center node.
+        :param center_neighbors: For each graph the positions of the nodes which are connected to the center.
+        :return: Merged graph, new node ids of each graph and new node ids of the center neighbors of each graph.
+        """
+        if any(len(graph.node_attributes) > 0 for graph in graphs):
+            raise ValueError('Merging graphs with additional node attributes is not supported.')
+        offsets = np.cumsum([1] + [len(graph) for graph in graphs])
+        node_indices = [list(range(offsets[i], offsets[i + 1])) for i in range(len(graphs))]
+        center_indices = [[int(offsets[i] + pos) for pos in center_neighbors[i]] for i in range(len(graphs))]
+
+        # The edges to the center are added after all other edges.
+        adjacency = [[idx for indices in center_indices for idx in indices]]
+        for graph, offset, indices in zip(graphs, offsets, center_indices):
+            is_center_neighbor = set(indices)
+            for pos, nbrs in enumerate(graph._get_neighbor_lists()):
+                nbrs = [int(offset) + nbr for nbr in nbrs]
+                if int(offset) + pos in is_center_neighbor:
+                    nbrs.append(0)
+                adjacency.append(nbrs)
+        edge_data = [[{}] * len(nbrs) for nbrs in adjacency]
+        labels = [center_label] + [label for graph in graphs for label in graph.get_labels()]
+
+        merged = cls.from_adjacency(node_ids=list(range(len(adjacency))), labels=labels, adjacency=adjacency, edge_data=edge_data)
+        return merged, node_indices, center_indices
@@ -0,0 +1,273 @@
+"""
+Struct-of-arrays storage of the atomic properties of a molecule.
+
+The atomic properties of a molecule are historically a dictionary of lists with the keys `x`, `y`, `z` and `atoms` and optionally further per-atom properties. AtomicProps stores the coordinates as one (n_atoms, 3) float64 array and the elements as an array of atomic numbers instead. This needs much less memory than lists of python floats and strings, and the coordinates are available as array without rebuilding them atom by atom.
+
+For compatibility with old code, AtomicProps behaves like the old dictionary: `atomic_props['x']` and `atomic_props['atoms']` return sequence views on the arrays, which can be indexed, iterated, compared with lists and modified in place. All other properties are stored as they are. Use `to_dict()` to get the old dictionary of lists, e.g. for writing to json.
+"""
+from abc import abstractmethod
+from collections.abc import MutableMapping, Sequence
+from typing import Union
+
+import numpy as np
+from ase.data import atomic_numbers, chemical_symbols
+
+coordinate_keys = ('x', 'y', 'z')
+element_key = 'atoms'
+
+
+class _ArrayColumn(Sequence):
+    """
+    Abstract base class of the list-like views on the columns of an AtomicProps. Slicing returns lists, not views. `Sequence` is an abstract base class, so subclasses can only be instantiated if they implement all abstract methods.
+    """
+    __slots__ = ('_props',)
+    __hash__ = None
+
+    def __init__(self, props: 'AtomicProps'):
+        self._props = props
+
+    @abstractmethod
+    def tolist(self) -> list:
+        """
+        Returns the column as list.
+        """
+
+    @abstractmethod
+    def _get_item(self, idx: int):
+        """
+        Returns the value of a single atom.
+        """
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.tolist()[idx]
+        return self._get_item(idx)
+
+    def __len__(self):
+        return len(self._props.elements)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __contains__(self, value):
+        return value in self.tolist()
+
+    def index(self, value, *args):
+        return self.tolist().index(value, *args)
+
+    def count(self, value):
+        return self.tolist().count(value)
+
+    def __eq__(self, other):
+        if isinstance(other, _ArrayColumn):
+            other = other.tolist()
+        if isinstance(other, list):
+            return self.tolist() == other
+        return NotImplemented
+
+    def __add__(self, other):
+        return self.tolist() + other
+
+    def __radd__(self, other):
+        return other + self.tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.tolist(), dtype=dtype)
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+
+class _CoordinateColumn(_ArrayColumn):
+    __slots__ = ('_axis',)
+
+    def __init__(self, props: 'AtomicProps', axis: int):
+        super().__init__(props)
+        self._axis = axis
+
+    def tolist(self) -> list:
+        return self._props.positions[:, self._axis].tolist()
+
+    def _get_item(self, idx: int) -> float:
+        return float(self._props.positions[idx, self._axis])
+
+    def __setitem__(self, idx, value):
+        self._props.positions[idx, self._axis] = value
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._props.positions[:, self._axis], dtype=dtype)
+
+
+class _ElementColumn(_ArrayColumn):
+    __slots__ = ()
+
+    def tolist(self) -> list:
+        return [chemical_symbols[z] for z in self._props.elements.tolist()]
+
+    def _get_item(self, idx: int) -> str:
+        return chemical_symbols[self._props.elements[idx]]
+
+    def __setitem__(self, idx, value):
+        if isinstance(idx, slice):
+            self._props.elements[idx] = get_atomic_numbers(value)
+        else:
+            self._props.elements[idx] = get_atomic_numbers([value])[0]
+
+
+def get_atomic_numbers(elements: list) -> np.ndarray:
+    """
+    Returns the atomic numbers of a list of element symbols. Raises a ValueError for unknown elements.
+    """
+    try:
+        return np.fromiter(map(atomic_numbers.__getitem__, elements), dtype=np.uint8, count=len(elements))
+    except (KeyError, TypeError):
+        raise ValueError(f'DART Error: Unknown element in {list(elements)}.')
+
+
+class AtomicProps(MutableMapping):
+    """
+    Atomic properties of a molecule with coordinates and elements stored as arrays. Behaves like the old dictionary of lists.
+    """
+    __slots__ = ('positions', 'elements', 'other', '_keys')
+
+    def __init__(self, positions: np.ndarray, elements: np.ndarray, other: Union[dict, None] = None, keys: Union[list, None] = None):
+        """
+        :param positions: Coordinates of all atoms, shape (n_atoms, 3)
+        :param elements: Atomic numbers of all atoms, shape (n_atoms,)
+        :param other: Other atomic properties as dictionary of lists
+        :param keys: Order of all keys as in the original dictionary
+        """
+        other = {} if other is None else other
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.elements = np.asarray(elements, dtype=np.uint8)
+        self.other = other
+        self._keys = list(keys) if keys is not None else [*coordinate_keys, element_key, *other.keys()]
+        if len(self.positions) != len(self.elements):
+            raise ValueError(f'DART Error: Got {len(self.positions)} positions but {len(self.elements)} elements.')
+
+    @classmethod
+    def from_dict(cls, atomic_props: dict) -> 'AtomicProps':
+        """
+        Makes an AtomicProps from the old dictionary of lists. Raises a ValueError if the dictionary can't be represented exactly, e.g. because of unknown elements or integer coordinates, which would become floats.
+        """
+        if isinstance(atomic_props, AtomicProps):
+            return atomic_props
+        if not all(key in atomic_props for key in (*coordinate_keys, element_key)):
+            raise ValueError(f'DART Error: The atomic properties need the keys {coordinate_keys + (element_key,)}.')
+        n_atoms = len(atomic_props[element_key])
+        if not all(len(atomic_props[key]) == n_atoms for key in coordinate_keys):
+            raise ValueError('DART Error: The coordinates and elements in the atomic properties have different lengths.')
+        all_coordinates = atomic_props['x'] + atomic_props['y'] + atomic_props['z']
+        if n_atoms > 0 and set(map(type, all_coordinates)) != {float}:
+            raise ValueError('DART Error: Only float coordinates can be stored exactly.')
+
+        positions = np.array(all_coordinates, dtype=np.float64).reshape(3, n_atoms).T
+        elements = get_atomic_numbers(atomic_props[element_key])
+        other = {key: value for key, value in atomic_props.items() if not key in coordinate_keys + (element_key,)}
+
+        return cls(positions=positions, elements=elements, other=other, keys=list(atomic_props.keys()))
+
+    @classmethod
+    def from_symbols_and_positions(cls, elements: list, positions: np.ndarray) -> 'AtomicProps':
+        return cls(positions=positions, elements=get_atomic_numbers(elements))
+
+    def to_dict(self) -> dict:
+        """
+        Returns the old dictionary of lists with the same order of keys.
+        """
+        return {key: (self[key].tolist() if key in coordinate_keys or key == element_key else self.other[key]) for key in self._keys}
+
+    def get_symbols(self) -> list[str]:
+        return [chemical_symbols[z] for z in self.elements.tolist()]
+
+    def add_atom(self, symbol: str, position: list[float]):
+        """
+        Appends an atom. Other atomic properties are not changed.
+        """
+        self.positions = np.vstack([self.positions, np.asarray(position, dtype=np.float64).reshape(1, 3)])
+        self.elements = np.append(self.elements, get_atomic_numbers([symbol]))
+
+    def __getitem__(self, key):
+        if key in coordinate_keys:
+            return _CoordinateColumn(self, coordinate_keys.index(key))
+        elif key == element_key:
+            return _ElementColumn(self)
+        return self.other[key]
+
+    def __setitem__(self, key, value):
+        if key in coordinate_keys:
+            self.positions[:, coordinate_keys.index(key)] = np.asarray(value, dtype=np.float64)
+        elif key == element_key:
+            self.elements[:] = get_atomic_numbers(value)
+        else:
+            self.other[key] = value
+            if not key in self._keys:
+                self._keys.append(key)
+
+    def __delitem__(self, key):
+        if key in coordinate_keys or key == element_key:
+            raise KeyError(f'DART Error: The atomic property `{key}` can not be deleted.')
+        del self.other[key]
+        self._keys.remove(key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def make_atomic_props(atomic_props: dict) -> Union[AtomicProps, dict]:
+    """
+    Returns the atomic properties as AtomicProps if they can be represented exactly, otherwise the dictionary itself.
+    """
+    try:
+        return AtomicProps.from_dict(atomic_props)
+    except ValueError:
+        return atomic_props
+
+def get_positions(atomic_props: Union[AtomicProps, dict]) -> np.ndarray:
+    """
+    Returns the coordinates of all atoms as array of shape (n_atoms, 3) for both AtomicProps and the old dictionary of lists.
+    """
+    if isinstance(atomic_props, AtomicProps):
+        return atomic_props.positions.copy()
+    return np.array([atomic_props[key] for key in coordinate_keys], dtype=np.float64).T.reshape(-1, 3)
+
+def get_coordinates_list(atomic_props: Union[AtomicProps, dict]) -> list[list[float]]:
+    """
+    Returns the coordinates of all atoms in format [[x1, y1, z1], [x2, y2, z2], ...] for both AtomicProps and the old dictionary of lists.
+    """
+    if isinstance(atomic_props, AtomicProps):
+        return atomic_props.positions.tolist()
+    return [list(coords) for coords in zip(*(atomic_props[key] for key in coordinate_keys))]
+
+def get_elements(atomic_props: Union[AtomicProps, dict]) -> list[str]:
+    """
+    Returns the element symbols of all atoms as list for both AtomicProps and the old dictionary of lists.
+    """
+    if isinstance(atomic_props, AtomicProps):
+        return atomic_props.get_symbols()
+    return list(atomic_props[element_key])
+
+def get_element_numbers(atomic_props: Union[AtomicProps, dict]) -> np.ndarray:
+    """
+    Returns the atomic numbers of all atoms as array for both AtomicProps and the old dictionary of lists.
+    """
+    if isinstance(atomic_props, AtomicProps):
+        return atomic_props.elements.copy()
+    return get_atomic_numbers(atomic_props[element_key])
+
+def atomic_props_to_dict(atomic_props: Union[AtomicProps, dict]) -> dict:
+    """
+    Returns the atomic properties as the old dictionary of lists.
+    """
+    if isinstance(atomic_props, AtomicProps):
+        return atomic_props.to_dict()
+    return atomic_props
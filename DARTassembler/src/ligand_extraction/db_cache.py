@@ -0,0 +1,225 @@
+"""
+Persistent warm-start cache for loaded ligand databases.
+
+Loading a ligand database means parsing json and building an RCA_Ligand for every ligand, which is slow for large databases. This module stores the loaded database as pickle file in a cache directory so that later processes can load the same database much faster. Cache entries are keyed by the content hash of the database file, the DART version and the load settings, so that a cache entry is never used if any of these change.
+
+The cache is disabled by default. It is enabled by setting a cache directory, either with the key `cache_directory` in the input file of the assembler or the ligand filters (see `set_cache_dir()`) or with the environment variable DART_CACHE_DIR. The input file takes precedence. Cache entries are pickle files, so they are only read from a directory which is owned by the current user and not writable by others.
+"""
+import gc
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Union, Any
+from warnings import warn
+
+_cache_dir_env_var = 'DART_CACHE_DIR'
+_hash_memo_filename = 'content_hashes.json'
+_configured_cache_dir = None    # set from the input file with `set_cache_dir()`
+max_cache_entries = 10   # The least recently used cache entries are deleted if there are more entries than this.
+max_cache_size = 4 * 1024**3    # The least recently used cache entries are deleted if all entries together have more bytes than this.
+
+
+def set_cache_dir(cache_dir: Union[str, Path, None]) -> None:
+    """
+    Sets the cache directory from the input file. If None, the cache directory is taken from the environment variable DART_CACHE_DIR.
+    """
+    global _configured_cache_dir
+    _configured_cache_dir = Path(cache_dir).expanduser() if cache_dir is not None else None
+
+    return
+
+def get_cache_dir() -> Union[Path, None]:
+    """
+    Returns the cache directory or None if caching is disabled.
+    """
+    if _configured_cache_dir is not None:
+        return _configured_cache_dir
+
+    cache_dir = os.environ.get(_cache_dir_env_var, None)
+    if cache_dir is None or cache_dir.strip().lower() in ('', 'none'):
+        return None
+
+    return Path(cache_dir).expanduser()
+
+def is_cache_enabled() -> bool:
+    return get_cache_dir() is not None
+
+def get_sidecar_cache_dir() -> Path:
+    """
+    Returns the directory for the sidecar files (e.g. index, fingerprints) of the ligand databases shipped with DART, so that they are never written into the installed package. This is the cache directory if caching is enabled and the user cache directory otherwise. Unlike the cache, sidecar files contain no pickles and can always be stored.
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is not None:
+        return cache_dir
+
+    return Path(os.environ.get('XDG_CACHE_HOME', '~/.cache'), 'DARTassembler').expanduser()
+
+def _is_safe_cache_dir(cache_dir: Path) -> bool:
+    """
+    Checks that the cache directory is owned by the current user and not writable by others, so that nobody else can place pickle files in it.
+    """
+    try:
+        stat = cache_dir.stat()
+    except OSError:
+        return False
+    if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+        return False
+
+    return not stat.st_mode & 0o022
+
+def get_dart_version() -> str:
+    from DARTassembler import __version__     # imported here to avoid circular imports
+    return __version__
+
+def _hash_file(path: Path, hasher) -> None:
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            hasher.update(chunk)
+
+    return
+
+def _get_file_stats(path: Path) -> list:
+    """
+    Returns size and modification time of all files which make up the database. Used to decide if the content hash needs to be recalculated.
+    """
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    return [[str(p.relative_to(path)) if path.is_dir() else p.name, p.stat().st_size, p.stat().st_mtime_ns] for p in files]
+
+def get_content_hash(path: Union[str, Path]) -> str:
+    """
+    Returns the sha256 hash of the content of a database file or directory. Hashes are memoized in the cache directory by path, size and modification time, so that unchanged files are only hashed once.
+    """
+    path = Path(path).resolve()
+    stats = _get_file_stats(path)
+
+    cache_dir = get_cache_dir()
+    memo_path = Path(cache_dir, _hash_memo_filename) if cache_dir is not None else None
+    memo = {}
+    if memo_path is not None and memo_path.is_file():
+        try:
+            with open(memo_path, 'r') as file:
+                memo = json.load(file)
+        except (json.JSONDecodeError, OSError):
+            memo = {}
+    entry = memo.get(str(path), None)
+    if entry is not None and entry['stats'] == stats:
+        return entry['hash']
+
+    hasher = hashlib.sha256()
+    if path.is_dir():
+        for relpath, _, _ in stats:
+            hasher.update(relpath.encode('utf-8'))
+            _hash_file(Path(path, relpath), hasher)
+    else:
+        _hash_file(path, hasher)
+    content_hash = hasher.hexdigest()
+
+    if memo_path is not None:
+        memo[str(path)] = {'stats': stats, 'hash': content_hash}
+        _atomic_write(memo_path, json.dumps(memo).encode('utf-8'))
+
+    return content_hash
+
+def get_cache_key(path: Union[str, Path], **settings) -> str:
+    """
+    Returns the cache key for a database file and the settings with which it was loaded.
+    """
+    key = {
+        'content_hash': get_content_hash(path),
+        'dart_version': get_dart_version(),
+        'settings': {name: repr(value) for name, value in sorted(settings.items())},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """
+    Writes data to a temporary file first and then renames it so that other processes never see a half written file.
+    """
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+    return
+
+def _get_cache_entry_path(key: str) -> Union[Path, None]:
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    return Path(cache_dir, f'{key}.pkl')
+
+def load_from_cache(key: str) -> Union[Any, None]:
+    """
+    Returns the cached object for the key or None if there is no valid cache entry.
+    """
+    path = _get_cache_entry_path(key)
+    if path is None or not path.is_file():
+        return None
+    if not _is_safe_cache_dir(path.parent):
+        warn(f'DART cache directory `{path.parent}` is ignored because it is not owned by the current user or writable by others.')
+        return None
+
+    # Disabling the garbage collector makes unpickling millions of small objects several times faster.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, 'rb') as file:
+            obj = pickle.load(file)
+    except Exception:
+        # Broken or incompatible cache entry, e.g. from an interrupted write or changed class definitions.
+        path.unlink(missing_ok=True)
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    os.utime(path)  # mark as recently used
+    return obj
+
+def save_to_cache(key: str, obj: Any) -> None:
+    """
+    Saves the object in the cache. Errors are ignored because the cache is only an optimization.
+    """
+    path = _get_cache_entry_path(key)
+    if path is None:
+        return
+
+    try:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > max_cache_size:
+            return
+        _atomic_write(path, data)
+        _remove_least_recently_used_entries(path.parent)
+    except (OSError, pickle.PicklingError):
+        pass
+
+    return
+
+def _remove_least_recently_used_entries(cache_dir: Path) -> None:
+    """
+    Deletes the least recently used cache entries until there are at most `max_cache_entries` entries with at most `max_cache_size` bytes in total.
+    """
+    entries = sorted(((p, p.stat()) for p in cache_dir.glob('*.pkl')), key=lambda entry: entry[1].st_mtime, reverse=True)
+    total_size = 0
+    for n, (path, stat) in enumerate(entries):
+        total_size += stat.st_size
+        if n >= max_cache_entries or total_size > max_cache_size:
+            path.unlink(missing_ok=True)
+
+    return
+
+def clear_cache() -> None:
+    """
+    Deletes all cache entries.
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None or not cache_dir.is_dir():
+        return
+    for path in cache_dir.glob('*.pkl'):
+        path.unlink(missing_ok=True)
+    Path(cache_dir, _hash_memo_filename).unlink(missing_ok=True)
+
+    return
@@ -0,0 +1,117 @@
+"""
+Streaming concatenation of ligand databases.
+
+The input databases are read entry by entry as raw ligand dictionaries and every entry is written to the output file directly, so that the memory needed doesn't grow with the size of the databases. Duplicates are recognized with a set of short digests of the deduplication key, which is much smaller than the ligands themselves. Entries of the ligand databases shipped with DART which contain all stored ligand properties are written as they are. All other entries are built as RCA_Ligand once, which recomputes all derived properties, exactly as if the database had been loaded and saved again.
+"""
+import json
+import os
+import sys
+from copy import deepcopy
+from hashlib import blake2b
+from pathlib import Path
+from typing import Union
+
+from tqdm import tqdm
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.db_index import get_index_entry, write_index
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json, NumpyEncoder
+from DARTassembler.src.metalig.metalig_utils import is_trusted_ligand_db
+
+unique_name_key = 'unique_name'
+
+
+class SeenSet(object):
+    """
+    Set of keys which stores only a 16 byte digest of each key instead of the key itself.
+    """
+
+    def __init__(self):
+        self._digests = set()
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+
+    def add(self, key: str) -> bool:
+        """
+        Adds the key and returns True if it was not in the set before.
+        """
+        digest = self._digest(key)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        return self._digest(key) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+
+def get_dedupe_key(name: str, mol_dict: dict, dedupe_on: str) -> str:
+    """
+    Returns the key by which duplicated ligands are recognized. For `unique_name`, this is the name of the entry in the database. For all other properties, the property is read from the raw ligand dictionary and only if it is missing there, the ligand is built to get it.
+    """
+    if dedupe_on == unique_name_key:
+        return name
+    if dedupe_on in mol_dict:
+        return mol_dict[dedupe_on]
+
+    return getattr(RCA_Ligand.read_from_mol_dict(deepcopy(mol_dict)), dedupe_on)
+
+def get_output_mol_dict(mol_dict: dict, trusted: bool) -> dict:
+    """
+    Returns the ligand dictionary as it is written by `LigandDB.to_jsonlines()`. Complete ligand dictionaries from a trusted database are the same as the written ones and are returned directly, all others are built as RCA_Ligand once so that their derived properties are recomputed.
+    :param trusted: If the ligand dictionary comes from one of the ligand databases shipped with DART, see `is_trusted_ligand_db()`.
+    """
+    if trusted and RCA_Ligand.can_read_from_trusted_mol_dict(mol_dict):
+        return mol_dict
+
+    return RCA_Ligand.read_from_mol_dict(mol_dict).write_to_mol_dict()
+
+def concat_ligand_dbs(paths: list[Union[str, Path]], outpath: Union[str, Path], dedupe_on: str = unique_name_key, show_progress: bool = True) -> list[dict]:
+    """
+    Concatenates ligand databases into one JSON Lines file in a streaming way. Of several ligands with the same deduplication key, only the first one is kept.
+    :param paths: Paths to the ligand databases
+    :param outpath: Path of the output JSON Lines file. Its byte-offset index is written as well, see `db_index`.
+    :param dedupe_on: Property by which duplicates are recognized, e.g. `unique_name` or `graph_hash_with_metal`.
+    :param show_progress: If True, show a progress bar for each database.
+    :return: List with a dictionary of statistics for each input database, with the keys `path`, `n_entries`, `n_written`, `n_duplicates_in_previous_dbs` and `n_duplicates_in_same_db`.
+    """
+    outpath = Path(outpath)
+    outpath.parent.mkdir(parents=True, exist_ok=True)
+    seen = SeenSet()
+    index_entries = {}
+    all_stats = []
+
+    # Write to a temporary file first so that an input database can also be the output file.
+    tmp_path = outpath.with_name(f'{outpath.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as file:
+            for path in paths:
+                stats = {'path': str(path), 'n_entries': 0, 'n_written': 0, 'n_duplicates_in_previous_dbs': 0, 'n_duplicates_in_same_db': 0}
+                seen_in_this_db = SeenSet()
+                trusted = is_trusted_ligand_db(path)
+                for name, mol_dict in tqdm(iterate_over_json(path, show_progress=False), disable=not show_progress, desc=f'Concat `{Path(path).name}`', file=sys.stdout, unit=' ligands'):
+                    stats['n_entries'] += 1
+                    # Untrusted ligands are rebuilt before deduplication so that stale stored properties are not used as key.
+                    mol_dict = get_output_mol_dict(mol_dict, trusted=trusted)
+                    key = get_dedupe_key(name, mol_dict, dedupe_on=dedupe_on)
+                    is_new_in_this_db = seen_in_this_db.add(key)
+                    if not seen.add(key):
+                        stats['n_duplicates_in_previous_dbs' if is_new_in_this_db else 'n_duplicates_in_same_db'] += 1
+                        continue
+
+                    index_entries[name] = get_index_entry(file.tell(), mol_dict)
+                    file.write((json.dumps({'key': name, 'value': mol_dict}, cls=NumpyEncoder) + '\n').encode('utf-8'))
+                    stats['n_written'] += 1
+                all_stats.append(stats)
+        os.replace(tmp_path, outpath)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+    write_index(outpath, index_entries)
+
+    return all_stats
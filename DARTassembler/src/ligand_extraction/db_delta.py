@@ -0,0 +1,289 @@
+"""
+Delta updates of ligand databases.
+
+A delta describes the difference between an old and a new version of a ligand database as a JSON Lines file (optionally bz2 compressed) with one operation per line:
+    - {"op": "header", "format_version": ..., "base": ..., "target": ..., "n_base_entries": ...}: always the first line
+    - {"op": "add", "key": <unique name>, "value": <ligand dict>}: new ligand, appended at the end of the database
+    - {"op": "remove", "key": <unique name>}: removed ligand
+    - {"op": "change", "key": <unique name>, "set": {<property>: <new value>}, "unset": [<property>]}: ligand with changed properties, which keeps its position
+    - {"op": "replace", "key": <unique name>, "value": <ligand dict>}: ligand which is replaced completely, used if the order of the properties changed
+
+Applying a delta patches an existing database. For JSON Lines databases, all unchanged lines are copied as raw bytes, so only the changed and removed ligands are parsed. The byte-offset index of the database is patched as well. SQLite ligand databases are patched in place with SQL statements. The persistent load cache needs no update because it is keyed by the content hash of the database. Binary ligand databases next to the patched JSON Lines file become outdated and are therefore ignored automatically until they are converted again.
+"""
+import bz2
+import json
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Union
+
+from tqdm import tqdm
+
+from DARTassembler.src.ligand_extraction.db_index import read_index, get_index_entry, write_index, read_entries_at_offsets, index_has_geometry
+from DARTassembler.src.ligand_extraction.io_custom import NumpyEncoder
+from DARTassembler.src.metalig.binary_db import is_binary_ligand_db
+from DARTassembler.src.metalig.sqlite_db import is_sqlite_ligand_db, get_ligand_row, SQLiteLigandDB
+from DARTassembler.src.metalig.compressed_db import is_bz2_file, open_ligand_db_file
+
+delta_format_version = 1
+delta_ops = ('add', 'remove', 'change', 'replace')
+compare_batch_size = 1000   # number of ligands of the new database for which the old ligands are read at once
+# Lines written by DART start with the key, which can be read without parsing the whole line.
+_line_key_pattern = re.compile(rb'^\{"key": ("(?:[^"\\]|\\.)*")')
+
+
+def _open_delta(path: Union[str, Path], mode: str):
+    path = Path(path)
+    if path.suffix == '.bz2':
+        return bz2.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode)
+
+def _dump_line(data: dict) -> bytes:
+    return (json.dumps(data, cls=NumpyEncoder) + '\n').encode('utf-8')
+
+def get_line_key(line: bytes) -> str:
+    """
+    Returns the key of a line of a JSON Lines database. Only the beginning of the line is parsed if possible.
+    """
+    match = _line_key_pattern.match(line)
+    if match is not None:
+        return json.loads(match.group(1))
+    return json.loads(line)['key']
+
+def _is_equal(old, new) -> bool:
+    # Compare the json representation if needed, because nan is not equal to itself.
+    return old == new or json.dumps(old) == json.dumps(new)
+
+def get_ligand_changes(old: dict, new: dict) -> Union[dict, None]:
+    """
+    Returns the delta operation which turns the old into the new ligand dictionary or None if they are the same.
+    """
+    if list(old) == list(new) and _is_equal(old, new):
+        return None
+    set_props = {key: value for key, value in new.items() if not key in old or not _is_equal(old[key], value)}
+    unset_props = [key for key in old if not key in new]
+    if list(patch_ligand(old, set_props, unset_props)) != list(new):
+        return {'op': 'replace', 'value': new}
+
+    return {'op': 'change', 'set': set_props, 'unset': unset_props}
+
+def patch_ligand(mol: dict, set_props: dict, unset_props: list) -> dict:
+    """
+    Returns the ligand dictionary with the new property values. Existing properties keep their position, new properties are appended.
+    """
+    mol = {key: value for key, value in mol.items() if not key in unset_props}
+    mol.update(set_props)
+
+    return mol
+
+def _iterate_old_and_new_ligands(old_path: Path, new_path: Path, old_index: dict, show_progress: bool) -> tuple[str, Union[dict, None], dict]:
+    """
+    Streams the new database and yields the key, the old ligand dictionary (None for new ligands) and the new ligand dictionary. The old ligands are read in batches sorted by their offset, so that the old file is read forward with one open file per batch.
+    """
+    def read_batch(batch):
+        offsets = sorted(old_index[key][0] for key, _ in batch if key in old_index)
+        old_mols = dict(read_entries_at_offsets(old_path, offsets))
+        for key, new in batch:
+            yield key, old_mols.get(key), new
+
+    batch = []
+    with open_ligand_db_file(new_path) as new_file:
+        for line in tqdm(new_file, disable=not show_progress, desc='Compare ligand dbs', file=sys.stdout, unit=' ligands'):
+            if not line.strip():
+                continue
+            line = json.loads(line)
+            batch.append((line['key'], line['value']))
+            if len(batch) >= compare_batch_size:
+                yield from read_batch(batch)
+                batch = []
+    yield from read_batch(batch)
+
+    return
+
+def make_ligand_db_delta(old_path: Union[str, Path], new_path: Union[str, Path], delta_path: Union[str, Path], show_progress: bool = True) -> dict:
+    """
+    Writes the delta between two versions of a JSON Lines ligand database. The new database is streamed and the old ligands are read in batches by seeking to them with the byte-offset index, so that neither database has to be held in memory. Applying the delta to the old database gives the new database if all ligands which are in both versions have the same order and new ligands are at the end.
+    :param old_path: Path to the old JSON Lines ligand database, either uncompressed or bz2 compressed
+    :param new_path: Path to the new JSON Lines ligand database, either uncompressed or bz2 compressed
+    :param delta_path: Path of the delta file. If it ends with `.bz2`, the delta is compressed.
+    :return: Number of added, removed and changed ligands
+    """
+    old_path, new_path = Path(old_path), Path(new_path)
+    for path in (old_path, new_path):
+        if not path.is_file() or is_binary_ligand_db(path) or is_sqlite_ligand_db(path):
+            raise ValueError(f"DART Error: Deltas can only be made between JSON Lines ligand databases, but got '{path}'.")
+    old_index = read_index(old_path)
+    new_keys = set()
+    stats = {'n_added': 0, 'n_removed': 0, 'n_changed': 0}
+
+    with _open_delta(delta_path, 'w') as delta_file:
+        header = {'op': 'header', 'format_version': delta_format_version, 'base': old_path.name, 'target': new_path.name, 'n_base_entries': len(old_index)}
+        delta_file.write(json.dumps(header) + '\n')
+        for key, old, new in _iterate_old_and_new_ligands(old_path, new_path, old_index, show_progress=show_progress):
+            new_keys.add(key)
+            if old is None:
+                operation = {'op': 'add', 'value': new}
+                stats['n_added'] += 1
+            else:
+                operation = get_ligand_changes(old, new)
+                if operation is None:
+                    continue
+                stats['n_changed'] += 1
+            delta_file.write(json.dumps({'op': operation.pop('op'), 'key': key, **operation}, cls=NumpyEncoder) + '\n')
+
+        for key in old_index:
+            if not key in new_keys:
+                delta_file.write(json.dumps({'op': 'remove', 'key': key}) + '\n')
+                stats['n_removed'] += 1
+
+    return stats
+
+def read_ligand_db_delta(delta_path: Union[str, Path]) -> tuple[dict, dict, list]:
+    """
+    Reads a delta file and checks it for consistency.
+    :return: The header, a dictionary of {key: operation} for removed and changed ligands and a list of the operations of added ligands
+    """
+    modifications, additions, added_keys = {}, [], set()
+    with _open_delta(delta_path, 'r') as file:
+        header = json.loads(file.readline())
+        if header.get('op') != 'header':
+            raise ValueError(f"DART Error: '{delta_path}' is not a ligand database delta file.")
+        if header['format_version'] != delta_format_version:
+            raise ValueError(f"DART Error: Delta file '{delta_path}' has format version {header['format_version']}, but this version of DART can only read version {delta_format_version}.")
+        for line in file:
+            if not line.strip():
+                continue
+            operation = json.loads(line)
+            if not operation['op'] in delta_ops:
+                raise ValueError(f"DART Error: Unknown operation '{operation['op']}' in delta file '{delta_path}'.")
+            if operation['key'] in modifications or operation['key'] in added_keys:
+                raise ValueError(f"DART Error: Ligand '{operation['key']}' occurs more than once in delta file '{delta_path}'.")
+            if operation['op'] == 'add':
+                additions.append(operation)
+                added_keys.add(operation['key'])
+            else:
+                modifications[operation['key']] = operation
+
+    return header, modifications, additions
+
+def _check_n_base_entries(db_path: Path, header: dict, n_entries: int) -> None:
+    if n_entries != header['n_base_entries']:
+        raise ValueError(f"DART Error: The delta doesn't fit to ligand database '{db_path}'. The delta was made for a database with {header['n_base_entries']} ligands, but the database has {n_entries} ligands.")
+
+def _apply_ligand_db_delta_to_jsonlines(db_path: Path, header: dict, modifications: dict, additions: list, show_progress: bool) -> None:
+    old_index = read_index(db_path, build_if_missing=False)
+    with_geometry = old_index is not None and index_has_geometry(old_index)     # keep the columns of the old index
+    new_index = {}
+    old_keys, found = set(), set()
+    tmp_path = db_path.with_name(f'{db_path.name}.{os.getpid()}.tmp')
+    try:
+        with open(db_path, 'rb') as old_file, open(tmp_path, 'wb') as new_file:
+            for line in tqdm(old_file, disable=not show_progress, desc=f'Patch ligand db `{db_path.name}`', file=sys.stdout, unit=' ligands'):
+                if not line.strip():
+                    continue
+                key = get_line_key(line)
+                old_keys.add(key)
+                offset = new_file.tell()
+                operation = modifications.get(key)
+                if operation is None:
+                    new_file.write(line if line.endswith(b'\n') else line + b'\n')
+                    if old_index is not None:
+                        new_index[key] = [offset] + old_index[key][1:]
+                    continue
+
+                found.add(key)
+                if operation['op'] == 'remove':
+                    continue
+                elif operation['op'] == 'replace':
+                    mol = operation['value']
+                else:
+                    mol = patch_ligand(json.loads(line)['value'], operation['set'], operation['unset'])
+                new_file.write(_dump_line({'key': key, 'value': mol}))
+                new_index[key] = get_index_entry(offset, mol, with_geometry=with_geometry)
+
+            _check_n_base_entries(db_path, header, len(old_keys))
+            missing = [key for key in modifications if not key in found]
+            if len(missing) > 0:
+                raise ValueError(f"DART Error: The delta doesn't fit to ligand database '{db_path}'. Ligands not found: {missing[:10]}.")
+            for operation in additions:
+                if operation['key'] in old_keys:
+                    raise ValueError(f"DART Error: The delta doesn't fit to ligand database '{db_path}'. Added ligand '{operation['key']}' already exists.")
+                new_index[operation['key']] = get_index_entry(new_file.tell(), operation['value'], with_geometry=with_geometry)
+                new_file.write(_dump_line({'key': operation['key'], 'value': operation['value']}))
+        os.replace(tmp_path, db_path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+    # Without the old index, the index of the unchanged ligands is unknown. It is then built again when it is needed.
+    if old_index is not None:
+        write_index(db_path, new_index)
+
+    return
+
+def _apply_ligand_db_delta_to_sqlite(db_path: Path, header: dict, modifications: dict, additions: list) -> None:
+    _check_n_base_entries(db_path, header, len(SQLiteLigandDB(db_path)))
+    connection = sqlite3.connect(db_path)
+    try:
+        with connection:    # one transaction, so that readers never see a half-patched database
+            for key, operation in modifications.items():
+                row = connection.execute('SELECT idx FROM ligands WHERE unique_name = ? ORDER BY idx LIMIT 1', (key,)).fetchone()
+                if row is None:
+                    raise ValueError(f"DART Error: The delta doesn't fit to ligand database '{db_path}'. Ligand not found: '{key}'.")
+                idx = row[0]
+                if operation['op'] == 'remove':
+                    connection.execute('DELETE FROM ligands WHERE idx = ?', (idx,))
+                    connection.execute('DELETE FROM records WHERE idx = ?', (idx,))
+                    continue
+                elif operation['op'] == 'replace':
+                    mol = operation['value']
+                else:
+                    record = connection.execute('SELECT record FROM records WHERE idx = ?', (idx,)).fetchone()[0]
+                    mol = patch_ligand(json.loads(record), operation['set'], operation['unset'])
+                _insert_sqlite_ligand(connection, idx, key, mol, replace=True)
+
+            next_idx = connection.execute('SELECT COALESCE(MAX(idx), -1) + 1 FROM ligands').fetchone()[0]
+            for idx, operation in enumerate(additions, start=next_idx):
+                if connection.execute('SELECT 1 FROM ligands WHERE unique_name = ?', (operation['key'],)).fetchone() is not None:
+                    raise ValueError(f"DART Error: The delta doesn't fit to ligand database '{db_path}'. Added ligand '{operation['key']}' already exists.")
+                _insert_sqlite_ligand(connection, idx, operation['key'], operation['value'], replace=False)
+
+            n_ligands = connection.execute('SELECT COUNT(*) FROM ligands').fetchone()[0]
+            connection.execute("UPDATE meta SET value = ? WHERE key = 'n_ligands'", (json.dumps(n_ligands),))
+    finally:
+        connection.close()
+
+    return
+
+def _insert_sqlite_ligand(connection: sqlite3.Connection, idx: int, key: str, mol: dict, replace: bool) -> None:
+    row = get_ligand_row(key, mol)
+    command = 'INSERT OR REPLACE' if replace else 'INSERT'
+    connection.execute(f'{command} INTO ligands VALUES ({", ".join("?" * (len(row) + 1))})', (idx, *row))
+    connection.execute(f'{command} INTO records VALUES (?, ?)', (idx, json.dumps(mol, cls=NumpyEncoder).encode('utf-8')))
+
+    return
+
+def apply_ligand_db_delta(db_path: Union[str, Path], delta_path: Union[str, Path], show_progress: bool = True) -> dict:
+    """
+    Patches a JSON Lines or SQLite ligand database in place with a delta file. If the delta doesn't fit to the database, e.g. because a changed ligand doesn't exist, a ValueError is raised and the database is left unchanged.
+    :param db_path: Path to the ligand database
+    :param delta_path: Path to the delta file as written by `make_ligand_db_delta()`
+    :return: Number of added, removed and changed ligands
+    """
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"DART Error: Ligand database file not found: '{db_path}'.")
+    if is_binary_ligand_db(db_path) or is_bz2_file(db_path):
+        raise ValueError(f"DART Error: Binary and compressed ligand databases can't be patched in place. Please apply the delta to the uncompressed JSON Lines database and convert or compress it again.")
+    header, modifications, additions = read_ligand_db_delta(delta_path)
+
+    if is_sqlite_ligand_db(db_path):
+        _apply_ligand_db_delta_to_sqlite(db_path, header, modifications, additions)
+    else:
+        _apply_ligand_db_delta_to_jsonlines(db_path, header, modifications, additions, show_progress=show_progress)
+
+    n_removed = sum(operation['op'] == 'remove' for operation in modifications.values())
+    stats = {'n_added': len(additions), 'n_removed': n_removed, 'n_changed': len(modifications) - n_removed}
+
+    return stats
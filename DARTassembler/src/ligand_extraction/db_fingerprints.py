@@ -0,0 +1,128 @@
+"""
+Substructure screening fingerprints for ligand databases.
+
+The fingerprint file lives next to the database file (`<db filename>.fps`) and stores the RDKit pattern fingerprint of every ligand, once for the ligand alone and once for the ligand connected to the pseudo metal, as used by the SMARTS filter. If a molecule contains a SMARTS pattern, all bits set in the fingerprint of the pattern are also set in the fingerprint of the molecule. Therefore, ligands which miss any bit of the pattern can be rejected with a few bitwise operations, without building their SMILES string and matching the pattern, which is by far the most expensive part of the SMARTS filter.
+
+Ligands without valid SMILES string have no fingerprint. The fingerprint file is a sidecar file of the database, which is stored in the DART cache directory if the directory of the database is not writable, see `db_sidecars`.
+"""
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from rdkit import Chem, DataStructs
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand, pseudo_metal
+from DARTassembler.src.ligand_extraction.db_sidecars import get_sidecar_paths, write_sidecar, read_sidecar, iterate_ligand_values
+from DARTassembler.src.ligand_extraction.utilities_Molecule import get_rdkit_mol_from_smiles, get_smarts_pattern
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+fingerprint_suffix = '.fps'
+fingerprint_cache_subdir = 'fingerprints'
+fingerprint_format_version = 1
+fingerprint_size = 2048     # bits per fingerprint
+fingerprint_variants = (None, pseudo_metal)   # fingerprints without and with metal, same order as `with_metal` in the SMARTS filter
+
+
+def get_fingerprint_paths(db_path: Union[str, Path]) -> list[Path]:
+    """
+    Returns the possible paths of the fingerprint file in the order of preference: next to the database and in the cache directory if caching is enabled.
+    """
+    return get_sidecar_paths(db_path, fingerprint_suffix, fingerprint_cache_subdir)
+
+def get_pattern_fingerprint(mol: Chem.Mol) -> np.ndarray:
+    """
+    Returns the RDKit pattern fingerprint of a molecule or of a SMARTS query as array of 64-bit words.
+    """
+    fingerprint = Chem.PatternFingerprint(mol, fpSize=fingerprint_size)
+    bits = np.zeros(fingerprint_size, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(fingerprint, bits)
+
+    return np.packbits(bits).view(np.uint64)
+
+def get_smarts_fingerprint(smarts: str) -> np.ndarray:
+    """
+    Returns the pattern fingerprint of a SMARTS query.
+    """
+    return get_pattern_fingerprint(get_smarts_pattern(smarts))
+
+def get_ligand_fingerprints(ligand: RCA_Ligand) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the fingerprints of the ligand for all `fingerprint_variants` and a mask which of them are valid. A fingerprint is invalid if the ligand has no valid SMILES string in this variant.
+    """
+    fingerprints = np.zeros((len(fingerprint_variants), fingerprint_size // 64), dtype=np.uint64)
+    valid = np.zeros(len(fingerprint_variants), dtype=bool)
+    for idx, with_metal in enumerate(fingerprint_variants):
+        smiles = ligand.get_smiles(with_metal=with_metal)
+        if smiles is not None:
+            fingerprints[idx] = get_pattern_fingerprint(get_rdkit_mol_from_smiles(smiles))
+            valid[idx] = True
+
+    return fingerprints, valid
+
+def can_contain_pattern(fingerprints: np.ndarray, pattern_fingerprint: np.ndarray) -> np.ndarray:
+    """
+    Returns a mask of all fingerprints which have all bits of the pattern set. Only molecules in this mask can contain the pattern.
+    """
+    return ((fingerprints & pattern_fingerprint) == pattern_fingerprint).all(axis=-1)
+
+def iterate_ligand_fingerprints(path: Union[str, Path], n_processes: Union[int, None] = 1, show_progress: bool = True) -> tuple[str, np.ndarray, np.ndarray]:
+    """
+    Iterates over a ligand database and yields the name, the fingerprints and the mask of valid fingerprints of each ligand in the order of the database.
+    :param path: Path to the ligand database
+    :param n_processes: Number of processes for JSON Lines files. If None, all available CPUs are used.
+    """
+    desc = f'Fingerprint ligand db `{Path(path).name}`'
+    for name, (fingerprints, valid) in iterate_ligand_values(path, get_ligand_fingerprints, n_processes=n_processes, show_progress=show_progress, desc=desc):
+        yield name, fingerprints, valid
+
+    return
+
+def _get_header() -> dict:
+    return {'format_version': fingerprint_format_version, 'fingerprint_size': fingerprint_size}
+
+def build_fingerprints(db_path: Union[str, Path], n_processes: Union[int, None] = 1, show_progress: bool = True) -> dict:
+    """
+    Computes the fingerprints of all ligands in a database and writes them to the fingerprint file, see `get_fingerprint_paths()`.
+    :param db_path: Path to the ligand database file. Alternatively, the strings 'metalig' or 'test_metalig' can be used for the default ligand database.
+    :param n_processes: Number of processes for JSON Lines files. If None, all available CPUs are used.
+    :return: Dictionary with the arrays 'names', 'fingerprints' and 'valid', see `read_fingerprints()`.
+    """
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    if db_path is None or not Path(db_path).is_file():
+        raise FileNotFoundError(f"DART Error: Ligand database file not found: '{db_path}'.")
+
+    names, fingerprints, valid = [], [], []
+    for name, ligand_fingerprints, ligand_valid in iterate_ligand_fingerprints(db_path, n_processes=n_processes, show_progress=show_progress):
+        names.append(name)
+        fingerprints.append(ligand_fingerprints)
+        valid.append(ligand_valid)
+    data = {
+        'names': np.array(names, dtype=str),
+        'fingerprints': np.array(fingerprints, dtype=np.uint64).reshape(len(names), len(fingerprint_variants), fingerprint_size // 64),
+        'valid': np.array(valid, dtype=bool).reshape(len(names), len(fingerprint_variants)),
+    }
+
+    write_sidecar(db_path, fingerprint_suffix, fingerprint_cache_subdir, header=_get_header(), data=data)
+
+    return data
+
+def read_fingerprints(db_path: Union[str, Path], build_if_missing: bool = False, n_processes: Union[int, None] = 1) -> Union[dict, None]:
+    """
+    Reads the fingerprints of a ligand database.
+    :param db_path: Path to the ligand database file. Alternatively, the strings 'metalig' or 'test_metalig' can be used for the default ligand database.
+    :param build_if_missing: If True, the fingerprints are built if they don't exist or are outdated. This needs to build all ligands of the database once.
+    :param n_processes: Number of processes for building the fingerprints. If None, all available CPUs are used.
+    :return: Dictionary with the names of the ligands, their fingerprints with shape (n_ligands, n_variants, n_words) and the mask of valid fingerprints with shape (n_ligands, n_variants). None if there are no valid fingerprints and build_if_missing is False.
+    """
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    if db_path is None or not Path(db_path).is_file():
+        return None
+
+    fingerprints = read_sidecar(db_path, fingerprint_suffix, fingerprint_cache_subdir, header=_get_header())
+    if fingerprints is not None:
+        return fingerprints
+
+    if build_if_missing:
+        return build_fingerprints(db_path, n_processes=n_processes)
+
+    return None
@@ -0,0 +1,152 @@
+"""
+Byte-offset sidecar index for JSON Lines databases.
+
+The index file is a sidecar file (see `db_sidecars`) which lives next to the database file (`<db filename>.idx`), or in the sidecar cache directory if the directory of the database is not writable and for the ligand databases shipped with DART. It maps the key of every entry to the byte offset of its line in the database, together with a few properties (denticity, charge, graph hash). Only if the ligand filters read the index with `with_geometry=True`, it additionally stores the geometric properties used by the filters (smallest and largest interatomic distance, planarity), which are computed once from the coordinates. Indices written when saving a database never contain them, because computing them is expensive for large molecules. With it, single entries can be read by seeking directly to their line instead of streaming through the whole file. For bz2 compressed databases, the offsets are virtual offsets as defined in `compressed_db`. The index stores the size and modification time of the database file and the DART version and is rebuilt automatically if they don't match anymore.
+"""
+import itertools
+import json
+from pathlib import Path
+from typing import Union, Iterable
+
+from DARTassembler.src.ligand_extraction.atomic_props import get_positions
+from DARTassembler.src.ligand_extraction.db_cache import get_dart_version
+from DARTassembler.src.ligand_extraction.db_sidecars import get_sidecar_paths, write_sidecar_file
+from DARTassembler.src.ligand_extraction.io_custom import NumpyEncoder
+from DARTassembler.src.ligand_extraction.utilities_Molecule import get_interatomic_distance_range, get_planarity
+from DARTassembler.src.metalig.binary_db import is_binary_ligand_db
+from DARTassembler.src.metalig.sqlite_db import is_sqlite_ligand_db
+from DARTassembler.src.metalig.compressed_db import iterate_lines_with_offsets, read_lines_at_offsets, is_bz2_file, is_block_compressed_bz2_file
+
+index_suffix = '.idx'
+index_cache_subdir = 'indices'
+index_format_version = 3
+index_columns = ('offset', 'denticity', 'pred_charge', 'graph_hash_with_metal')
+geometry_index_columns = ('min_distance', 'max_distance', 'planarity')   # optional columns after `index_columns`, which are computed from the coordinates
+
+
+def get_index_paths(db_path: Union[str, Path]) -> list[Path]:
+    """
+    Returns the possible paths of the index file in the order of preference, see `get_sidecar_paths()`.
+    """
+    return get_sidecar_paths(db_path, index_suffix, index_cache_subdir)
+
+def can_be_indexed(db_path: Union[str, Path]) -> bool:
+    """
+    Checks if the database is a JSON Lines file, either uncompressed or block-compressed bz2, for which an index can be built.
+    """
+    if is_binary_ligand_db(db_path) or is_sqlite_ligand_db(db_path) or (is_bz2_file(db_path) and not is_block_compressed_bz2_file(db_path)):
+        return False
+    lines = iterate_lines_with_offsets(db_path)
+    try:
+        _, line = next(lines)
+        line = json.loads(line)
+    except (StopIteration, json.JSONDecodeError, UnicodeDecodeError):
+        return False
+    finally:
+        lines.close()
+
+    return isinstance(line, dict) and set(line.keys()) == {'key', 'value'}
+
+def get_index_entry(offset: int, mol: Union[dict, object], with_geometry: bool = False) -> list:
+    """
+    Returns the index entry of a database entry, which can be either a dictionary or a molecule object.
+    :param with_geometry: If True, the geometric properties in `geometry_index_columns` are computed and appended.
+    """
+    property_columns = index_columns[1:]
+    if isinstance(mol, dict):
+        props = [mol.get(col, None) for col in property_columns]
+        atomic_props = mol.get('atomic_props', None)
+    else:
+        props = [getattr(mol, col, None) for col in property_columns]
+        atomic_props = getattr(mol, 'atomic_props', None)
+    entry = [offset] + props
+    if with_geometry:
+        entry += get_geometry_properties(atomic_props)
+
+    return entry
+
+def index_has_geometry(entries: dict) -> bool:
+    """
+    Checks if the index entries contain the columns in `geometry_index_columns`.
+    """
+    return any(len(entry) == len(index_columns) + len(geometry_index_columns) for entry in itertools.islice(entries.values(), 1))
+
+def get_geometry_properties(atomic_props: Union[dict, object, None]) -> list:
+    """
+    Returns the smallest and largest interatomic distance and the planarity of a molecule, the same as used by the ligand filters. All are None if the molecule has no coordinates.
+    """
+    if atomic_props is None:
+        return [None, None, None]
+    positions = get_positions(atomic_props)
+    min_distance, max_distance = get_interatomic_distance_range(positions)
+
+    return [min_distance, max_distance, get_planarity(positions.tolist())]
+
+def _get_db_file_stats(db_path: Path) -> list:
+    stat = Path(db_path).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+def write_index(db_path: Union[str, Path], entries: dict) -> Union[Path, None]:
+    """
+    Writes the index file of a database. Must be called after the database file is closed so that the file stats are final.
+    :param db_path: Path to the JSON Lines database
+    :param entries: Dictionary of {key: index entry}, where the index entry is obtained with `get_index_entry()`. Either all or none of the entries contain the geometric properties.
+    :return: Path to the index file or None if it couldn't be written
+    """
+    index = {
+        'format_version': index_format_version,
+        'dart_version': get_dart_version(),
+        'db_stats': _get_db_file_stats(db_path),
+        'columns': index_columns + geometry_index_columns if index_has_geometry(entries) else index_columns,
+        'entries': entries,
+    }
+
+    return write_sidecar_file(db_path, index_suffix, index_cache_subdir, write=lambda file: file.write(json.dumps(index, cls=NumpyEncoder).encode('utf-8')))
+
+def build_index(db_path: Union[str, Path], with_geometry: bool = False) -> dict:
+    """
+    Builds the index of a JSON Lines database by streaming through the file once and writes it with `write_index()`.
+    :param with_geometry: If True, the index also contains the geometric properties in `geometry_index_columns`.
+    :return: Dictionary of {key: index entry}
+    """
+    entries = {}
+    for offset, line in iterate_lines_with_offsets(db_path):
+        if line.strip():
+            line = json.loads(line)
+            entries[line['key']] = get_index_entry(offset, line['value'], with_geometry=with_geometry)
+    write_index(db_path, entries)
+
+    return entries
+
+def read_index(db_path: Union[str, Path], build_if_missing: bool = True, with_geometry: bool = False) -> Union[dict, None]:
+    """
+    Reads the index of a JSON Lines database. If the index doesn't exist or is outdated, it is rebuilt.
+    :param with_geometry: If True, the index must contain the geometric properties in `geometry_index_columns`. An index without them is treated as missing.
+    :return: Dictionary of {key: index entry} or None if there is no valid index and build_if_missing is False.
+    """
+    valid_columns = [index_columns + geometry_index_columns] if with_geometry else [index_columns, index_columns + geometry_index_columns]
+    for index_path in get_index_paths(db_path):
+        if not index_path.is_file():
+            continue
+        try:
+            with open(index_path, 'r') as file:
+                index = json.load(file)
+            if index['format_version'] == index_format_version and index['dart_version'] == get_dart_version() and index['db_stats'] == _get_db_file_stats(db_path) and tuple(index['columns']) in valid_columns:
+                return index['entries']
+        except (json.JSONDecodeError, KeyError, OSError):
+            pass
+
+    if build_if_missing:
+        return build_index(db_path, with_geometry=with_geometry)
+
+    return None
+
+def read_entries_at_offsets(db_path: Union[str, Path], offsets: Iterable[int]) -> tuple[str, dict]:
+    """
+    Reads the entries of a JSON Lines database at the given byte offsets and yields their key and value.
+    """
+    for line in read_lines_at_offsets(db_path, offsets):
+        line = json.loads(line)
+        yield line['key'], line['value']
+
+    return
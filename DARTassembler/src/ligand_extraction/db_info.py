@@ -0,0 +1,98 @@
+"""
+Streaming overview of a ligand database as used by the DBinfo module.
+
+The ligand database is read entry by entry. For each ligand, the row of the overview .csv file and the .xyz block are computed and appended directly to the output files, so that neither the ligands nor the output rows of the whole database are ever kept in memory. For JSON Lines files, the ligands can be processed by a pool of worker processes, each of which handles a byte range of the file. The results are written in the same order as in the database.
+
+The values are written in the same format as by `pandas.DataFrame.to_csv()`, so that the output is the same as from `LigandDB.save_reduced_csv()`.
+"""
+import csv
+import functools
+import math
+import sys
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from tqdm import tqdm
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json, get_mol_reader, check_if_parallel_loading_possible, map_over_jsonlines_parallel
+from DARTassembler.src.metalig.metalig_utils import is_trusted_ligand_db
+
+# Columns of the overview .csv file in the order of `RCA_Ligand.get_ligand_output_info()`. The header is written before the first ligand is read, so that it is also written for an empty database.
+ligand_info_columns = ('Ligand ID', 'Stoichiometry', 'Denticity', 'Formal Charge', 'Donors', 'Number of Atoms', 'Molecular Weight',
+                       'Ligand Planarity', 'Haptic', 'Beta-Hydrogen', 'Max. Interatomic Distance', 'Graph ID', 'CSD Occurrences',
+                       'CSD Complex IDs', 'CSD Metal Count')
+
+def format_csv_value(value) -> str:
+    """
+    Formats a single value as written by `pandas.DataFrame.to_csv()`: NaN and None become empty strings and floats are written with all digits.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (float, np.floating)):
+        return '' if math.isnan(value) else repr(float(value))
+    return str(value)
+
+def get_ligand_info_and_xyz(ligand: RCA_Ligand, max_entries: int = 5, with_metal: bool = True) -> tuple[dict, str]:
+    """
+    Returns the row of the ligand in the overview .csv file and the .xyz block of the ligand.
+    """
+    info = ligand.get_ligand_output_info(max_entries=max_entries)
+    xyz = ligand.get_xyz_file_format_string(comment=None, with_metal=with_metal)
+
+    return info, xyz
+
+def _get_ligand_info_of_entry(key: str, mol_dict: dict, trusted: bool, max_entries: int, with_metal: bool) -> tuple[dict, str]:
+    """
+    Entry function for `iterate_ligand_info()` in worker processes. Builds the ligand and returns its row and .xyz block.
+    """
+    ligand = get_mol_reader(RCA_Ligand, trusted=trusted)(mol_dict)
+    return get_ligand_info_and_xyz(ligand, max_entries=max_entries, with_metal=with_metal)
+
+def iterate_ligand_info(path: Union[str, Path], n_max: Union[int, None] = None, n_processes: Union[int, None] = 1, max_entries: int = 5, with_metal: bool = True, trusted: Union[bool, None] = None, show_progress: bool = True) -> tuple[dict, str]:
+    """
+    Iterates over a ligand database and yields the row of the overview .csv file and the .xyz block of each ligand in the order of the database.
+    :param path: Path to the ligand database
+    :param n_max: Maximum number of ligands. If None, all ligands are used.
+    :param n_processes: Number of processes for JSON Lines files. If None, all available CPUs are used. Only used if all ligands are read.
+    :param max_entries: Maximum number of CSD complex IDs and metals listed per ligand
+    :param with_metal: If True, the original metal is added to the .xyz block of each ligand.
+    :param trusted: If True, ligands are built with `RCA_Ligand.read_from_trusted_mol_dict()`. If None, this is done only for the ligand databases shipped with DART.
+    :return: Tuple of the row as dictionary and the .xyz block as string
+    """
+    path = Path(path)
+    if trusted is None:
+        trusted = is_trusted_ligand_db(path)
+    desc = f'Process ligand db `{path.name}`'
+
+    if check_if_parallel_loading_possible(path, n_max=n_max, n_processes=n_processes):
+        get_info = functools.partial(_get_ligand_info_of_entry, trusted=trusted, max_entries=max_entries, with_metal=with_metal)
+        yield from map_over_jsonlines_parallel(path, get_info, n_processes=n_processes, show_progress=show_progress, desc=desc, unit=' ligands')
+        return
+
+    read_ligand = get_mol_reader(RCA_Ligand, trusted=trusted)
+    for _, mol_dict in tqdm(iterate_over_json(path, n_max=n_max, show_progress=False), disable=not show_progress, desc=desc, file=sys.stdout, unit=' ligands'):
+        yield get_ligand_info_and_xyz(read_ligand(mol_dict), max_entries=max_entries, with_metal=with_metal)
+
+    return
+
+def write_ligand_info(path: Union[str, Path], csv_path: Union[str, Path], xyz_path: Union[str, Path], n_max: Union[int, None] = None, n_processes: Union[int, None] = 1, max_entries: int = 5, with_metal: bool = True, trusted: Union[bool, None] = None, show_progress: bool = True) -> int:
+    """
+    Writes the overview .csv file and the concatenated .xyz file of a ligand database in a single pass over the database.
+    :param path: Path to the ligand database
+    :param csv_path: Path of the output .csv file
+    :param xyz_path: Path of the output .xyz file
+    :return: Number of written ligands
+    """
+    n_ligands = 0
+    with open(csv_path, 'w', newline='') as csv_file, open(xyz_path, 'w') as xyz_file:
+        writer = csv.writer(csv_file, lineterminator='\n')
+        writer.writerow(ligand_info_columns)
+        for info, xyz in iterate_ligand_info(path, n_max=n_max, n_processes=n_processes, max_entries=max_entries, with_metal=with_metal, trusted=trusted, show_progress=show_progress):
+            assert tuple(info) == ligand_info_columns, f'Columns of the ligand info {list(info)} differ from the header of the .csv file.'
+            writer.writerow([format_csv_value(value) for value in info.values()])
+            xyz_file.write(xyz)
+            n_ligands += 1
+
+    return n_ligands
@@ -0,0 +1,125 @@
+"""
+Sidecar files with precomputed data of all ligands of a ligand database.
+
+Some data needed by the ligand filters is expensive to compute from the ligands, e.g. the substructure screening fingerprints (`db_fingerprints`), the bitsets of the ligand predicates (`ligand_bitsets`) or the byte-offset index (`db_index`). Such data is computed once for the whole database and stored next to the database file (`<db filename><suffix>`), e.g. as numpy `.npz` file. If the directory of the database is not writable, the file is stored in the sidecar cache directory instead, see `get_sidecar_cache_dir()`. For the ligand databases shipped with DART, the file is always stored in the sidecar cache directory, so that nothing is written into the installed package.
+
+Each sidecar file stores a header, e.g. its format version, the DART version and the size and modification time of the database file. It is not used anymore if any of them doesn't match.
+"""
+import functools
+import hashlib
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Union, Callable, BinaryIO
+
+import numpy as np
+from tqdm import tqdm
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.db_cache import get_sidecar_cache_dir, get_dart_version
+from DARTassembler.src.ligand_extraction.io_custom import iterate_unique_ligand_db, get_mol_reader, check_if_parallel_loading_possible, map_over_jsonlines_parallel
+from DARTassembler.src.metalig.metalig_utils import is_trusted_ligand_db
+
+
+def get_cached_sidecar_path(db_path: Union[str, Path], suffix: str, cache_subdir: str, cache_dir: Union[str, Path]) -> Path:
+    """
+    Returns the path of a sidecar file in the subdirectory of the cache directory. The filename contains a hash of the absolute database path so that databases with the same filename don't overwrite each other.
+    """
+    db_path = Path(db_path)
+    path_hash = hashlib.sha256(str(db_path.resolve()).encode('utf-8')).hexdigest()[:16]
+
+    return Path(cache_dir, cache_subdir, f'{path_hash}_{db_path.name}{suffix}')
+
+def get_sidecar_paths(db_path: Union[str, Path], suffix: str, cache_subdir: str) -> list[Path]:
+    """
+    Returns the possible paths of a sidecar file in the order of preference: next to the database and in the subdirectory of the sidecar cache directory. For the ligand databases shipped with DART, only the path in the sidecar cache directory is returned.
+    """
+    db_path = Path(db_path)
+    cached_path = get_cached_sidecar_path(db_path, suffix, cache_subdir, get_sidecar_cache_dir())
+    if is_trusted_ligand_db(db_path):
+        return [cached_path]
+
+    return [db_path.with_name(db_path.name + suffix), cached_path]
+
+def get_db_file_stats(db_path: Union[str, Path]) -> np.ndarray:
+    stat = Path(db_path).stat()
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+def write_sidecar_file(db_path: Union[str, Path], suffix: str, cache_subdir: str, write: Callable[[BinaryIO], None]) -> Union[Path, None]:
+    """
+    Writes a sidecar file to the first writable path of `get_sidecar_paths()`. The file is written to a temporary file first and then renamed, so that other processes never see a half written file. If no path is writable, a warning is logged, because the sidecar data then has to be computed again in the next run.
+    :param write: Function which writes the content to the opened binary file
+    :return: Path of the written sidecar file or None if it couldn't be written
+    """
+    sidecar_paths = get_sidecar_paths(db_path, suffix, cache_subdir)
+    for sidecar_path in sidecar_paths:
+        tmp_path = sidecar_path.with_name(f'{sidecar_path.name}.{os.getpid()}.tmp')
+        try:
+            sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as file:
+                write(file)
+            os.replace(tmp_path, sidecar_path)
+            return sidecar_path
+        except OSError:
+            # e.g. read-only directory, try the next path
+            if tmp_path.is_file():
+                tmp_path.unlink()
+
+    logging.warning(f"DART warning: Could not write the `{suffix}` file of the ligand database `{Path(db_path).name}` to any of {[str(path) for path in sidecar_paths]}. It has to be computed again in the next run.")
+    return None
+
+def write_sidecar(db_path: Union[str, Path], suffix: str, cache_subdir: str, header: dict, data: dict) -> Union[Path, None]:
+    """
+    Writes a numpy sidecar file with `write_sidecar_file()`.
+    :param header: Scalars which must match when reading the file, e.g. the format version. The DART version is added automatically.
+    :param data: Arrays to store
+    :return: Path of the written sidecar file or None if it couldn't be written
+    """
+    header = dict(header, dart_version=get_dart_version())
+    db_stats = get_db_file_stats(db_path)
+
+    return write_sidecar_file(db_path, suffix, cache_subdir, write=lambda file: np.savez(file, db_stats=db_stats, **header, **data))
+
+def read_sidecar(db_path: Union[str, Path], suffix: str, cache_subdir: str, header: dict) -> Union[dict, None]:
+    """
+    Reads a sidecar file written with `write_sidecar()`.
+    :return: Dictionary of the stored arrays or None if there is no sidecar file with matching header, DART version and database file stats.
+    """
+    header = dict(header, dart_version=get_dart_version())
+    for sidecar_path in get_sidecar_paths(db_path, suffix, cache_subdir):
+        if not sidecar_path.is_file():
+            continue
+        try:
+            with np.load(sidecar_path, allow_pickle=False) as file:
+                if all(key in file and file[key] == value for key, value in header.items()) and np.array_equal(file['db_stats'], get_db_file_stats(db_path)):
+                    return {key: file[key] for key in file.files if key != 'db_stats' and not key in header}
+        except (OSError, KeyError, ValueError):
+            pass
+
+    return None
+
+def _get_values_of_entry(key: str, mol_dict: dict, trusted: bool, getter: Callable) -> tuple[str, object]:
+    """
+    Entry function for `iterate_ligand_values()` in worker processes. Builds the ligand and returns its name and value.
+    """
+    return key, getter(get_mol_reader(RCA_Ligand, trusted=trusted)(mol_dict))
+
+def iterate_ligand_values(path: Union[str, Path], getter: Callable, n_processes: Union[int, None] = 1, show_progress: bool = True, desc: str = 'Process ligand db') -> tuple[str, object]:
+    """
+    Iterates over a ligand database and yields the name and `getter(ligand)` of each ligand in the order of the database.
+    :param path: Path to the ligand database
+    :param getter: Module level function which gets the values from a ligand, so that it can be sent to other processes
+    :param n_processes: Number of processes for JSON Lines files. If None, all available CPUs are used.
+    """
+    path = Path(path)
+
+    if check_if_parallel_loading_possible(path, n_max=None, n_processes=n_processes):
+        get_values = functools.partial(_get_values_of_entry, trusted=is_trusted_ligand_db(path), getter=getter)
+        yield from map_over_jsonlines_parallel(path, get_values, n_processes=n_processes, show_progress=show_progress, desc=desc, unit=' ligands')
+        return
+
+    for name, ligand in tqdm(iterate_unique_ligand_db(path, molecule='class'), disable=not show_progress, desc=desc, file=sys.stdout, unit=' ligands'):
+        yield name, getter(ligand)
+
+    return
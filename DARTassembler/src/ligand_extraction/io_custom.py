@@ -4,37 +4,46 @@ Utility functions for input and output.
 import bz2
 import json
 import sys
+from copy import deepcopy
 import yaml
 
-from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input, is_trusted_ligand_db
+from DARTassembler.src.metalig.binary_db import BinaryLigandDB, is_binary_ligand_db, get_binary_ligand_db_path
+from DARTassembler.src.metalig.sqlite_db import SQLiteLigandDB, is_sqlite_ligand_db
+from DARTassembler.src.metalig.compressed_db import is_bz2_file, open_ligand_db_file
 from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand, RCA_Complex
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates
+from DARTassembler.src.ligand_extraction.atomic_props import AtomicProps
 import numpy as np
 from datetime import datetime, date, timedelta
 from DARTassembler.src.ligand_extraction.utilities import get_duration_string
-from typing import Union
+from typing import Union, Callable, Iterator
 from pathlib import Path, PurePath
 import jsonlines
 from tqdm import tqdm
 import functools
+from concurrent.futures import ProcessPoolExecutor
 import ase
 import zipfile
 import shutil
 import os
 from DARTassembler.src.constants.Paths import default_ligand_db_path, test_ligand_db_path
 
-def check_if_MetaLig_exists_else_uncompress_from_zip(delete_zip=False):
+def check_if_MetaLig_exists_else_uncompress_from_zip(delete_zip=False, uncompress: bool=False):
     """
-    Checks if the MetaLig database exists as uncompressed file, and if not uncompresses it.
+    Checks if the MetaLig database exists as uncompressed, compressed or binary file. Compressed files are read directly as stream, so they are only uncompressed to disk if `uncompress` is True.
     """
     files = [default_ligand_db_path, test_ligand_db_path]
 
     for unzipped_file in files:
         zip_file = Path(str(unzipped_file) + '.bz2')
 
-        if not unzipped_file.exists():
+        if not unzipped_file.exists() and not is_binary_ligand_db(get_binary_ligand_db_path(unzipped_file)):
             name = Path(zip_file).name
             if not Path(zip_file).exists():
                 raise FileNotFoundError(f"DART Error: Could not find MetaLig database file {name} at {Path(zip_file).resolve()}.")
+            if not uncompress:
+                continue
 
             db_dir = Path(zip_file).parent
             try:
@@ -99,7 +108,9 @@ class NumpyEncoder(json.JSONEncoder):
     dumped = json.dump(dic, cls=NumpyEncoder)
     """
     def default(self, obj):
-        if isinstance(obj, np.integer):
+        if isinstance(obj, AtomicProps):
+            return obj.to_dict()
+        elif isinstance(obj, np.integer):
             return int(obj)
         elif isinstance(obj, np.floating):
             return float(obj)
@@ -160,11 +171,21 @@ def load_json(path: Union[str, Path], n_max: int=None, show_progress: bool=True)
 
 def iterate_over_json(path: Union[str, Path], n_max: int=None, show_progress: bool=True) -> tuple[str, dict]:
     """
-    Iterate over a JSON or JSON Lines file and yield the key and value of each entry.
+    Iterate over a JSON or JSON Lines file and yield the key and value of each entry. Binary and SQLite ligand databases and bz2 compressed files are supported as well.
     :param path: Path to the JSON or JSON Lines file
     :return: Tuple with the key and value of each entry
     """
     path = ensure_path_exists(path)
+    if is_binary_ligand_db(path):
+        yield from BinaryLigandDB(path).iterate(n_max=n_max, show_progress=show_progress)
+        return
+    if is_sqlite_ligand_db(path):
+        yield from SQLiteLigandDB(path).iterate(n_max=n_max, show_progress=show_progress)
+        return
+    if is_bz2_file(path):
+        yield from _iterate_over_compressed_json(path, n_max=n_max, show_progress=show_progress)
+        return
+
     try:
         # Try to load as normal JSON file first
         with open(path, 'r') as file:
@@ -192,6 +213,32 @@ def iterate_over_json(path: Union[str, Path], n_max: int=None, show_progress: bo
 
     return
 
+def _iterate_over_compressed_json(path: Path, n_max: int=None, show_progress: bool=True) -> tuple[str, dict]:
+    """
+    Iterate over a bz2 compressed JSON or JSON Lines file without decompressing it to disk. JSON Lines files are streamed line by line.
+    """
+    with open_ligand_db_file(path) as file:
+        try:
+            line = json.loads(file.readline())
+            is_jsonlines = isinstance(line, dict) and set(line.keys()) == {'key', 'value'}
+        except json.JSONDecodeError:
+            is_jsonlines = False
+        file.seek(0)
+
+        if is_jsonlines:
+            lines = (json.loads(line) for line in file if line.strip())
+            entries = ((line['key'], line['value']) for line in lines)
+        else:
+            entries = iter(json.load(file).items())
+
+        for i, (key, value) in tqdm(enumerate(entries), disable=not show_progress, desc='Load json'):
+            if check_if_return_entry(i, n_max):
+                yield key, value
+            else:
+                return
+
+    return
+
 def iterate_over_jsonlines(path: Union[str, Path], n_max: int=None, show_progress: bool=True) -> tuple[str, dict]:
     """
     Iterate over a JSON Lines file and yield the key and value of each entry.
@@ -209,12 +256,139 @@ def iterate_over_jsonlines(path: Union[str, Path], n_max: int=None, show_progres
 
     return
 
+def get_jsonlines_byte_ranges(path: Union[str, Path], n_ranges: int) -> list[tuple[int, int]]:
+    """
+    Splits a JSON Lines file into byte ranges of roughly equal size. Each range starts at the beginning of a line and ends at the beginning of the next range, so that every line is in exactly one range.
+    :param path: Path to the JSON Lines file
+    :param n_ranges: Number of byte ranges. Might be less for very small files.
+    :return: List of (start, end) byte positions
+    """
+    size = Path(path).stat().st_size
+    starts = [0]
+    with open(path, 'rb') as file:
+        for i in range(1, n_ranges):
+            file.seek(max(i * size // n_ranges, starts[-1]))
+            file.readline()     # move to the start of the next line
+            pos = file.tell()
+            if pos >= size:
+                break
+            if pos > starts[-1]:
+                starts.append(pos)
+    ends = starts[1:] + [size]
+
+    return list(zip(starts, ends))
+
+def _map_jsonlines_byte_range(args: tuple) -> list:
+    """
+    Worker function for `map_over_jsonlines_parallel()`. Decodes all lines in the byte range and returns `function(key, value)` of each entry.
+    """
+    path, start, end, function = args
+    results = []
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while file.tell() < end:
+            line = file.readline()
+            if not line.strip():
+                continue
+            line = json.loads(line)
+            results.append(function(line['key'], line['value']))
+
+    return results
+
+def map_over_jsonlines_parallel(path: Union[str, Path], function: Callable, n_processes: Union[int, None]=1, n_ranges_per_process: int=16, show_progress: bool=True, desc: str='Process jsonlines', unit: str=' entries') -> Iterator:
+    """
+    Calls `function(key, value)` for every entry of a JSON Lines file using a pool of processes and yields the results in the same order as in the file. The file is split into byte ranges which are decoded by the processes.
+    :param path: Path to the JSON Lines file
+    :param function: Module level function or `functools.partial` of one, so that it can be sent to other processes
+    :param n_processes: Number of processes. If None, all available CPUs are used.
+    :param n_ranges_per_process: Number of byte ranges per process. More ranges balance the load better and keep the memory of the not yet yielded results smaller, but add overhead.
+    :return: Result of `function(key, value)` of each entry
+    """
+    n_processes = get_n_processes(n_processes)
+    ranges = get_jsonlines_byte_ranges(path, n_ranges=n_ranges_per_process * n_processes)
+    args = [(path, start, end, function) for start, end in ranges]
+
+    with ProcessPoolExecutor(max_workers=n_processes) as executor:
+        with tqdm(disable=not show_progress, desc=desc, file=sys.stdout, unit=unit) as pbar:
+            for results in executor.map(_map_jsonlines_byte_range, args):     # map() returns results in order
+                yield from results
+                pbar.update(len(results))
+
+    return
+
+def _read_jsonlines_entry(key: str, value: dict, mol_class: Union[type, None], predicates: Union[LigandPredicates, None], trusted: bool) -> tuple[str, Union[dict, RCA_Ligand, RCA_Complex, None], Union[int, None]]:
+    """
+    Entry function for `iterate_over_jsonlines_parallel()`. Optionally builds the molecule class and returns the key, the value and the index of the first failed predicate condition. The value of rejected entries is None.
+    """
+    if predicates is not None:
+        value, failed = get_ligand_if_passing(value, predicates=predicates, mol_class=mol_class, trusted=trusted)
+        return key, value, failed
+    if mol_class is not None:
+        value = get_mol_reader(mol_class, trusted=trusted)(value)
+
+    return key, value, None
+
+def iterate_over_jsonlines_parallel(path: Union[str, Path], mol_class: Union[type, None]=None, n_processes: Union[int, None]=1, show_progress: bool=True, desc: str='Load jsonlines', predicates: Union[LigandPredicates, None]=None, trusted: bool=False) -> tuple[str, Union[dict, RCA_Ligand, RCA_Complex]]:
+    """
+    Iterate over a JSON Lines file using a pool of processes and yield the key and value of each entry in the same order as in the file, see `map_over_jsonlines_parallel()`.
+    :param path: Path to the JSON Lines file
+    :param mol_class: If given, each value is converted by `mol_class.read_from_mol_dict()` in the worker processes, e.g. RCA_Ligand or RCA_Complex.
+    :param n_processes: Number of processes. If None, all available CPUs are used.
+    :param predicates: Only for ligand databases. If given, only entries passing the predicates are yielded and the rejected entries are counted in `predicates.n_rejected`.
+    :param trusted: Only for ligand databases. If True, ligands are built with `RCA_Ligand.read_from_trusted_mol_dict()`.
+    :return: Tuple with the key and value of each entry
+    """
+    path = ensure_path_exists(path)
+    read_entry = functools.partial(_read_jsonlines_entry, mol_class=mol_class, predicates=predicates, trusted=trusted)
+    # Built molecules are large, so fewer of them are kept in memory before they are yielded.
+    for key, value, failed in map_over_jsonlines_parallel(path, read_entry, n_processes=n_processes, n_ranges_per_process=4, show_progress=show_progress, desc=desc):
+        if failed is not None:
+            predicates.n_rejected[failed] += 1
+            continue
+        yield key, value
+
+    return
+
+def get_n_available_cpus() -> int:
+    """
+    Returns the number of CPUs this process is allowed to run on. Unlike `os.cpu_count()`, this respects the CPU affinity, e.g. of a cluster job with only a part of the CPUs of a node.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def get_n_processes(n_processes: Union[int, None]) -> int:
+    """
+    Returns the number of processes to use, where None means all available CPUs.
+    """
+    return n_processes or get_n_available_cpus()
+
+def check_if_parallel_loading_possible(path: Union[str, Path], n_max: Union[int, None], n_processes: Union[int, None]) -> bool:
+    """
+    Parallel loading is only done for JSON Lines files if more than one process is requested and all entries are loaded.
+    """
+    all_entries = check_if_return_entry(np.inf, n_max)    # n_max is disabled
+    if n_processes == 1 or not all_entries or is_binary_ligand_db(path) or is_sqlite_ligand_db(path) or is_bz2_file(path):
+        return False
+    with open(path, 'rb') as file:
+        try:
+            line = json.loads(file.readline())
+        except json.JSONDecodeError:
+            return False
+
+    return isinstance(line, dict) and set(line.keys()) == {'key', 'value'}
+
 def get_n_entries_of_json_db(path: Union[str, Path]) -> int:
     """
     Get the number of entries in a JSON or JSON Lines file.
     :param path: Path to the JSON or JSON Lines file
     :return: Number of entries in the file
     """
+    if is_binary_ligand_db(path):
+        return len(BinaryLigandDB(path))
+    if is_sqlite_ligand_db(path):
+        return len(SQLiteLigandDB(path))
+
     n_entries = 0
     for _ in iterate_over_json(path):
         n_entries += 1
@@ -248,16 +422,21 @@ def check_molecule_value(output: str):
 
     return
 
-def iterate_complex_db(path: Union[str, Path], molecule: str='dict', n_max=None, show_progress: bool=True) -> dict:
+def iterate_complex_db(path: Union[str, Path], molecule: str='dict', n_max=None, show_progress: bool=True, n_processes: Union[int, None]=1) -> dict:
     check_molecule_value(molecule)  # Check if the molecule value is valid
+    if check_if_parallel_loading_possible(path, n_max=n_max, n_processes=n_processes):
+        mol_class = RCA_Complex if molecule == 'class' else None
+        yield from iterate_over_jsonlines_parallel(path, mol_class=mol_class, n_processes=n_processes, show_progress=show_progress, desc='Load complex db')
+        return
+
     for name, mol in tqdm(iterate_over_json(path, n_max=n_max, show_progress=False), disable=not show_progress, desc='Load complex db'):
         if molecule == 'class':
             mol = RCA_Complex.read_from_mol_dict(mol)
         yield name, mol
 
 
-def load_complex_db(path: Union[str, Path], molecule: str='dict', n_max=None, show_progress: bool=True) -> dict:
-    db = {name: mol for name, mol in iterate_complex_db(path=path, molecule=molecule, n_max=n_max, show_progress=show_progress)}
+def load_complex_db(path: Union[str, Path], molecule: str='dict', n_max=None, show_progress: bool=True, n_processes: Union[int, None]=1) -> dict:
+    db = {name: mol for name, mol in iterate_complex_db(path=path, molecule=molecule, n_max=n_max, show_progress=show_progress, n_processes=n_processes)}
     return db
 
 def load_full_ligand_db(path: Union[str, Path], molecule: str='dict') -> dict:
@@ -281,25 +460,106 @@ def load_full_ligand_db(path: Union[str, Path], molecule: str='dict') -> dict:
     print(f'Loaded full ligand db. Time: {duration}. ')
     return db
 
-def iterate_unique_ligand_db(path: Union[str, Path], molecule: str= 'dict', n_max=None, show_progress: bool=False) -> dict:
+def get_mol_reader(mol_class: type, trusted: bool=False):
+    """
+    Returns the function which builds a molecule of the given class from its dictionary. Trusted ligand dictionaries are read without recomputing their stored properties.
+    """
+    if trusted and issubclass(mol_class, RCA_Ligand):
+        return mol_class.read_from_trusted_mol_dict
+    return mol_class.read_from_mol_dict
+
+def get_ligand_if_passing(mol_dict: dict, predicates: LigandPredicates, mol_class: Union[type, None]=None, trusted: bool=False) -> tuple[Union[dict, RCA_Ligand, None], Union[int, None]]:
+    """
+    Checks the predicates on the raw ligand dictionary and only builds the ligand if it passes. If a property needed by the predicates is missing in the dictionary, the ligand is built first and the predicates are checked on the ligand object.
+    :param mol_dict: Raw ligand dictionary as stored in the database
+    :param predicates: Predicates which the ligand has to pass
+    :param mol_class: If given, the ligand is returned as `mol_class.read_from_mol_dict(mol_dict)`, otherwise as dictionary.
+    :param trusted: If True, the ligand is built with `mol_class.read_from_trusted_mol_dict(mol_dict)` instead.
+    :return: Tuple of the ligand (None if rejected) and the index of the first failed condition (None if passed)
+    """
+    try:
+        failed = predicates.get_first_failed(mol_dict)
+    except KeyError:
+        ligand = RCA_Ligand.read_from_mol_dict(deepcopy(mol_dict))
+        failed = predicates.get_first_failed(ligand)
+        if failed is None and mol_class is not None:
+            return ligand, None
+
+    if failed is not None:
+        return None, failed
+    if mol_class is not None:
+        return get_mol_reader(mol_class, trusted=trusted)(mol_dict), None
+
+    return mol_dict, None
+
+def _iterate_binary_ligand_db_with_predicates(path: Path, predicates: LigandPredicates, n_max=None) -> tuple[str, dict]:
+    """
+    Iterates over a binary ligand database and checks the predicates on the memory-mapped columns, so that the records of rejected ligands are never read.
+    """
+    binary_db = BinaryLigandDB(path)
+    for idx in range(len(binary_db)):
+        if not check_if_return_entry(idx, n_max):
+            return
+        try:
+            failed = predicates.get_first_failed(binary_db.get_column_values(idx))
+        except KeyError:
+            failed = None   # checked again on the full ligand dictionary
+        if failed is not None:
+            predicates.n_rejected[failed] += 1
+            continue
+        yield binary_db.get_mol_dict(idx)
+
+    return
+
+def iterate_unique_ligand_db(path: Union[str, Path], molecule: str= 'dict', n_max=None, show_progress: bool=False, n_processes: Union[int, None]=1, predicates: Union[LigandPredicates, None]=None, trusted: Union[bool, None]=None) -> dict:
+    """
+    Iterate over a ligand database and yield the unique name and the ligand.
+    :param predicates: If given, only ligands passing the predicates are yielded. The predicates are checked on the raw ligand dictionary before the ligand is built. The number of rejected ligands per condition is counted in `predicates.n_rejected`. `n_max` still counts all entries of the database.
+    :param trusted: If True, ligands are built with `RCA_Ligand.read_from_trusted_mol_dict()`, which restores all stored properties without recomputing or checking them. If None, this is done only for the ligand databases shipped with DART.
+    """
     check_molecule_value(molecule)  # Check if the molecule value is valid
     db_path = get_correct_ligand_db_path_from_input(path)
     if db_path is None:
         raise ValueError(f'Invalid ligand database path specified: {path}')
+    if trusted is None:
+        trusted = is_trusted_ligand_db(db_path)
 
     filename = Path(db_path).name
-    for name, mol_dict in tqdm(iterate_over_json(db_path, n_max=n_max, show_progress=False), disable=not show_progress, desc=f'Load ligand db `{filename}`', file=sys.stdout, unit=' ligands'):
-        if molecule == 'class':
-            try:
-                mol = RCA_Ligand.read_from_mol_dict(mol_dict)
-            except Exception as e:
-                raise ValueError(f"Error: the provided file '{db_path}' seems to not be a valid ligand database file. Internal error message:\n{e}.")
-        else:
-            mol = mol_dict
+    mol_class = RCA_Ligand if molecule == 'class' else None
+    if check_if_parallel_loading_possible(db_path, n_max=n_max, n_processes=n_processes):
+        try:
+            yield from iterate_over_jsonlines_parallel(db_path, mol_class=mol_class, n_processes=n_processes, show_progress=show_progress, desc=f'Load ligand db `{filename}`', predicates=predicates, trusted=trusted)
+        except Exception as e:
+            raise ValueError(f"Error: the provided file '{db_path}' seems to not be a valid ligand database file. Internal error message:\n{e}.")
+        return
+
+    check_predicates = predicates   # predicates which still need to be checked on each entry
+    if predicates is not None and is_binary_ligand_db(db_path):
+        entries = _iterate_binary_ligand_db_with_predicates(db_path, predicates=predicates, n_max=n_max)
+    elif predicates is not None and is_sqlite_ligand_db(db_path):
+        # The predicates are evaluated by SQLite, so only passing ligands are read.
+        entries = SQLiteLigandDB(db_path).iterate(n_max=n_max, predicates=predicates)
+        check_predicates = None
+    else:
+        entries = iterate_over_json(db_path, n_max=n_max, show_progress=False)
+
+    for name, mol_dict in tqdm(entries, disable=not show_progress, desc=f'Load ligand db `{filename}`', file=sys.stdout, unit=' ligands'):
+        try:
+            if check_predicates is not None:
+                mol, failed = get_ligand_if_passing(mol_dict, predicates=predicates, mol_class=mol_class, trusted=trusted)
+                if failed is not None:
+                    predicates.n_rejected[failed] += 1
+                    continue
+            elif molecule == 'class':
+                mol = get_mol_reader(RCA_Ligand, trusted=trusted)(mol_dict)
+            else:
+                mol = mol_dict
+        except Exception as e:
+            raise ValueError(f"Error: the provided file '{db_path}' seems to not be a valid ligand database file. Internal error message:\n{e}.")
         yield name, mol
 
-def load_unique_ligand_db(path: Union[str, Path], molecule: str='dict', n_max=None, show_progress: bool=True) -> dict:
-    db = {name: mol for name, mol in iterate_unique_ligand_db(path=path, molecule=molecule, n_max=n_max, show_progress=show_progress)}
+def load_unique_ligand_db(path: Union[str, Path], molecule: str='dict', n_max=None, show_progress: bool=True, n_processes: Union[int, None]=1, predicates: Union[LigandPredicates, None]=None, trusted: Union[bool, None]=None) -> dict:
+    db = {name: mol for name, mol in iterate_unique_ligand_db(path=path, molecule=molecule, n_max=n_max, show_progress=show_progress, n_processes=n_processes, predicates=predicates, trusted=trusted)}
     return db
 
 def save_complex_db(db: dict, path: Union[str, Path]):
@@ -0,0 +1,219 @@
+"""
+Lazy loading of ligands from a ligand database.
+
+In lazy mode, the LigandDB holds one lightweight LazyLigand per ligand which only knows a few cheap properties (denticity, charge, unique name, ...). The full RCA_Ligand with its ASE molecule, graph etc. is only built the first time any other attribute is accessed. Built ligands are kept in a bounded cache, so that memory stays limited if only immutable properties of many ligands are read. As soon as a ligand could be changed, i.e. an attribute is set or a mutable attribute or method is accessed, the LazyLigand keeps its full ligand alive, so that changes are never lost when the ligand is evicted from the cache.
+"""
+import json
+import sys
+from collections import OrderedDict
+from copy import deepcopy
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from tqdm import tqdm
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json, check_if_return_entry, get_mol_reader
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates
+from DARTassembler.src.metalig.binary_db import BinaryLigandDB, is_binary_ligand_db, column_dtypes
+from DARTassembler.src.metalig.sqlite_db import SQLiteLigandDB, is_sqlite_ligand_db
+from DARTassembler.src.metalig.compressed_db import open_ligand_db_file, iterate_lines_with_offsets, read_lines_at_offsets, is_bz2_file, is_block_compressed_bz2_file
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input, is_trusted_ligand_db
+
+# Cheap ligand properties which are available without building the full ligand
+index_keys = tuple(column_dtypes.keys())
+default_cache_size = 1000
+# Attribute values of these types can't be changed in place, so reading them doesn't need to keep the full ligand alive.
+immutable_types = (str, bytes, int, float, complex, bool, type(None), np.generic)
+
+
+class LigandRecordLoader(object):
+    """
+    Reads index records of all ligands in a ligand database and builds full RCA_Ligand objects on demand. Each ligand is identified by a locator, which is the row index for binary and SQLite ligand databases, the byte offset of the line for jsonlines files (the virtual offset for compressed files) and the ligand dictionary itself for all other files.
+    """
+
+    def __init__(self, path: Union[str, Path], cache_size: int = default_cache_size, trusted: Union[bool, None] = None):
+        """
+        :param trusted: If True, ligands are built with `RCA_Ligand.read_from_trusted_mol_dict()`. If None, this is done only for the ligand databases shipped with DART.
+        """
+        self.path = get_correct_ligand_db_path_from_input(path)
+        if self.path is None:
+            raise ValueError(f'Invalid ligand database path specified: {path}')
+        self.trusted = is_trusted_ligand_db(self.path) if trusted is None else trusted
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.n_built_ligands = 0    # for statistics only
+
+        self.binary_db = BinaryLigandDB(self.path) if is_binary_ligand_db(self.path) else None
+        self.sqlite_db = SQLiteLigandDB(self.path) if is_sqlite_ligand_db(self.path) else None
+        # Random access into compressed files is only fast if they are block compressed. Other compressed files are handled like json files.
+        self.is_jsonlines = self.binary_db is None and self.sqlite_db is None and self._check_if_jsonlines(self.path) and (not is_bz2_file(self.path) or is_block_compressed_bz2_file(self.path))
+
+    @staticmethod
+    def _check_if_jsonlines(path: Path) -> bool:
+        """
+        Checks if the file is a JSON Lines file by checking if the first line is a complete json entry with keys `key` and `value`.
+        """
+        with open_ligand_db_file(path) as file:
+            try:
+                line = json.loads(file.readline())
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return False
+
+        return isinstance(line, dict) and set(line.keys()) == {'key', 'value'}
+
+    def iterate_index_records(self, n_max: Union[int, None] = None, show_progress: bool = False) -> tuple[str, dict, object]:
+        """
+        Iterates over all ligands in the database and yields the unique name, the index record and the locator of each ligand.
+        """
+        desc = f'Load ligand db `{self.path.name}`'
+        if self.binary_db is not None:
+            n = len(self.binary_db)
+            for idx in tqdm(range(n), disable=not show_progress, desc=desc, file=sys.stdout, unit=' ligands'):
+                if not check_if_return_entry(idx, n_max):
+                    return
+                record = self.binary_db.get_column_values(idx)
+                yield record['unique_name'], record, idx
+
+        elif self.sqlite_db is not None:
+            yield from self.sqlite_db.iterate_index_records(n_max=n_max, show_progress=show_progress)
+
+        elif self.is_jsonlines:
+            with tqdm(disable=not show_progress, desc=desc, file=sys.stdout, unit=' ligands') as pbar:
+                for idx, (offset, line) in enumerate(iterate_lines_with_offsets(self.path)):
+                    if not check_if_return_entry(idx, n_max):
+                        return
+                    if line.strip():
+                        line = json.loads(line)
+                        yield line['key'], self.get_index_record(line['value']), offset
+                    pbar.update()
+
+        else:
+            for name, mol_dict in tqdm(iterate_over_json(self.path, n_max=n_max, show_progress=False), disable=not show_progress, desc=desc, file=sys.stdout, unit=' ligands'):
+                yield name, self.get_index_record(mol_dict), mol_dict
+
+        return
+
+    def iterate_passing_index_records(self, predicates: LigandPredicates, n_max: Union[int, None] = None, show_progress: bool = False) -> tuple[str, dict, object]:
+        """
+        Same as `iterate_index_records()`, but only yields ligands which pass the predicates. The predicates are checked on the index record. Only if a needed property is missing in the index record, the full ligand is built to check the predicates. For SQLite ligand databases, the predicates are evaluated as indexed query instead. Rejected ligands are counted in `predicates.n_rejected`.
+        """
+        if self.sqlite_db is not None:
+            yield from self.sqlite_db.iterate_index_records(n_max=n_max, predicates=predicates, show_progress=show_progress)
+            return
+
+        for name, record, locator in self.iterate_index_records(n_max=n_max, show_progress=show_progress):
+            try:
+                failed = predicates.get_first_failed(record)
+            except KeyError:
+                failed = predicates.get_first_failed(self.load(locator))
+            if failed is not None:
+                predicates.n_rejected[failed] += 1
+                continue
+            yield name, record, locator
+
+        return
+
+    @staticmethod
+    def get_index_record(mol_dict: dict) -> dict:
+        return {key: mol_dict[key] for key in index_keys if key in mol_dict}
+
+    def read_mol_dict(self, locator) -> dict:
+        if self.binary_db is not None:
+            return self.binary_db.get_mol_dict(locator)[1]
+        elif self.sqlite_db is not None:
+            return self.sqlite_db.get_mol_dict(locator)[1]
+        elif self.is_jsonlines:
+            return json.loads(next(read_lines_at_offsets(self.path, [locator])))['value']
+        else:
+            return deepcopy(locator)
+
+    def load(self, locator) -> RCA_Ligand:
+        """
+        Returns the full RCA_Ligand for the given locator, either from the cache or by building it.
+        """
+        key = locator if not isinstance(locator, dict) else id(locator)
+        try:
+            ligand = self.cache[key]
+            self.cache.move_to_end(key)
+            return ligand
+        except KeyError:
+            pass
+
+        try:
+            ligand = get_mol_reader(RCA_Ligand, trusted=self.trusted)(self.read_mol_dict(locator))
+        except (AssertionError, KeyError, TypeError, ValueError) as e:    # missing or malformed ligand properties, including json decode errors
+            raise ValueError(f"Error: the provided file '{self.path}' seems to not be a valid ligand database file. Internal error message:\n{e}.") from e
+        self.n_built_ligands += 1
+
+        self.cache[key] = ligand
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return ligand
+
+
+class LazyLigand(object):
+    """
+    Lightweight stand-in for an RCA_Ligand. The properties in the index record are available directly (mutable ones as copies), accessing any other attribute builds the full RCA_Ligand and forwards the access to it. If an attribute is set or the accessed attribute is mutable (e.g. a dictionary, array or method), the full ligand is kept alive by this object so that changes are never lost. `isinstance(lazy_ligand, RCA_Ligand)` is True.
+    """
+    __slots__ = ('_index', '_loader', '_locator', '_pinned')
+
+    def __init__(self, index_record: dict, loader: LigandRecordLoader, locator):
+        object.__setattr__(self, '_index', index_record)
+        object.__setattr__(self, '_loader', loader)
+        object.__setattr__(self, '_locator', locator)
+        object.__setattr__(self, '_pinned', None)
+
+    def load(self) -> RCA_Ligand:
+        """
+        Returns the full RCA_Ligand.
+        """
+        if self._pinned is not None:
+            return self._pinned
+        return self._loader.load(self._locator)
+
+    def _pin(self) -> RCA_Ligand:
+        """
+        Returns the full RCA_Ligand and keeps it alive as long as this object.
+        """
+        ligand = self.load()
+        object.__setattr__(self, '_pinned', ligand)
+        return ligand
+
+    @property
+    def __class__(self):
+        # Makes isinstance() checks for RCA_Ligand work with lazy ligands.
+        return RCA_Ligand
+
+    def __getattr__(self, item):
+        # Only called if normal attribute lookup fails
+        index = object.__getattribute__(self, '_index')
+        if item in index and object.__getattribute__(self, '_pinned') is None:
+            value = index[item]
+            return value if isinstance(value, immutable_types) else deepcopy(value)     # changing a copy can't make the index record inconsistent with the full ligand
+        if item.startswith('__'):
+            raise AttributeError(item)
+        ligand = self.load()
+        value = getattr(ligand, item)
+        if not isinstance(value, immutable_types):
+            object.__setattr__(self, '_pinned', ligand)
+
+        return value
+
+    def __setattr__(self, key, value):
+        setattr(self._pin(), key, value)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self.load(), memo)
+
+    def __reduce__(self):
+        return _return_object, (self.load(),)
+
+    def __repr__(self):
+        return f'LazyLigand({self._index.get("unique_name")})'
+
+
+def _return_object(obj):
+    return obj
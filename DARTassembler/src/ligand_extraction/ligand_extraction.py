@@ -40,6 +40,7 @@ class LigandExtraction:
                  only_complexes_with_os: bool = False,
                  unique_ligand_id: str = 'graph_hash_with_metal',
                  store_database_in_memory: bool = False,
+                 n_processes: Union[int, None] = 1,
                  ):
 
         self.ligand_to_unique_ligand = None
@@ -57,6 +58,7 @@ class LigandExtraction:
         self.test_complexes = None
         self.n_pred_charges = None
         self.store_database_in_memory = store_database_in_memory
+        self.n_processes = n_processes  # number of processes for loading the intermediate databases, None means all available CPUs
         self.exclude_charged_complexes = exclude_charged_complexes
         self.only_complexes_with_os = only_complexes_with_os
         self.test_complexes = CHARGE_BENCHMARKED_COMPLEXES if not testing == False else []
@@ -590,7 +592,7 @@ class LigandExtraction:
         try:
             self.complex_db
         except AttributeError:
-            self.complex_db = ComplexDB.from_json(self.output_complexes_json)
+            self.complex_db = ComplexDB.load_from_json(self.output_complexes_json, n_processes=self.n_processes)
 
         return
 
@@ -598,7 +600,7 @@ class LigandExtraction:
         try:
             self.unique_ligand_db
         except AttributeError:
-            self.unique_ligand_db = LigandDB.from_json(self.unique_ligands_json)
+            self.unique_ligand_db = LigandDB.load_from_json(self.unique_ligands_json, n_processes=self.n_processes)
 
         return
 
@@ -606,7 +608,7 @@ class LigandExtraction:
         try:
             self.full_ligand_db
         except AttributeError:
-            self.full_ligand_db = LigandDB.from_json(self.full_ligands_json)
+            self.full_ligand_db = LigandDB.load_from_json(self.full_ligands_json, n_processes=self.n_processes)
 
         return
 
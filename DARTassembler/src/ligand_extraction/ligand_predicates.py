@@ -0,0 +1,260 @@
+"""
+Cheap predicates which are checked on the raw ligand dictionary while loading a ligand database.
+
+Building an RCA_Ligand is expensive, but many filters only look at properties which are stored directly in the database entry (denticity, charge, atom count, donor elements). With these predicates, ligands are rejected before any object is constructed. Each condition reproduces the exact behaviour of the corresponding filter in `FilterStage`, so that filtering while loading gives the same ligands as loading everything and filtering afterwards.
+
+All conditions work on the raw ligand dictionary, on the index records of lazy and binary ligand databases and on RCA_Ligand objects. Additionally, they can be translated into SQL expressions on the columns of SQLite ligand databases.
+"""
+import itertools
+from abc import ABC, abstractmethod
+from typing import Union
+
+import numpy as np
+
+all_denticities = list(range(-10, 100))    # same as `FilterStage.ensure_denticities_is_list(None)`
+donor_instructions = ('must_contain_and_only_contain', 'must_at_least_contain', 'must_exclude', 'must_only_contain_in_any_amount')
+
+
+def get_ligand_property(mol: Union[dict, object], key: str):
+    """
+    Returns a property of a raw ligand dictionary or a ligand object. Raises a KeyError if the property is not available.
+    """
+    if isinstance(mol, dict):
+        return mol[key]
+    try:
+        return getattr(mol, key)
+    except AttributeError:
+        raise KeyError(key)
+
+def get_sql_placeholders(values: list) -> str:
+    return ', '.join('?' * len(values))
+
+def ensure_denticities_is_list(denticities: Union[int, list, None]) -> list:
+    if isinstance(denticities, int):
+        denticities = [denticities]
+    elif denticities is None:
+        denticities = all_denticities
+
+    return list(denticities)
+
+def check_elements(elements: Union[list, tuple], atoms_of_interest: list, instruction: str) -> bool:
+    """
+    Checks a list of elements (e.g. the donor elements of a ligand) against the elements of interest with one of the instructions in `donor_instructions`. Unknown instructions never pass.
+    """
+    elements = list(elements)
+    if instruction == 'must_contain_and_only_contain':
+        return sorted(elements) == sorted(atoms_of_interest)
+    elif instruction == 'must_at_least_contain':
+        return all(elem in elements for elem in atoms_of_interest)
+    elif instruction == 'must_exclude':
+        return not any(elem in elements for elem in atoms_of_interest)
+    elif instruction == 'must_only_contain_in_any_amount':
+        return all(elem in atoms_of_interest for elem in elements)
+
+    return False    # unknown instructions remove all ligands, same as in the FilterStage
+
+
+class LigandCondition(ABC):
+    """
+    Abstract base class of a single condition. The condition only applies to ligands with one of the given denticities, all other ligands pass.
+    """
+    name = 'condition'
+
+    def __init__(self, denticities: Union[int, list, None] = None):
+        self.denticities = ensure_denticities_is_list(denticities)
+
+    def applies_to(self, mol: Union[dict, object]) -> bool:
+        return get_ligand_property(mol, 'denticity') in self.denticities
+
+    @abstractmethod
+    def check(self, mol: Union[dict, object]) -> bool:
+        """
+        Returns True if a ligand to which the condition applies passes it.
+        """
+
+    def get_check_sql(self) -> tuple[str, list]:
+        """
+        Returns the check as SQL expression on the columns of a SQLite ligand database and the parameters of the expression. Raises a NotImplementedError if the check can't be translated.
+        """
+        raise NotImplementedError
+
+    def get_sql(self) -> tuple[str, list]:
+        """
+        Returns the whole condition including the denticities it applies to as SQL expression and its parameters.
+        """
+        sql, params = self.get_check_sql()
+        if self.denticities == all_denticities:
+            return sql, params
+
+        return f'(denticity NOT IN ({get_sql_placeholders(self.denticities)}) OR ({sql}))', [int(denticity) for denticity in self.denticities] + params
+
+    def __call__(self, mol: Union[dict, object]) -> bool:
+        """
+        Returns True if the ligand passes the condition.
+        """
+        return not self.applies_to(mol) or self.check(mol)
+
+    def __repr__(self):
+        attrs = ', '.join(f'{key}={value!r}' for key, value in self.__dict__.items() if not (key == 'denticities' and value == all_denticities))
+        return f'{type(self).__name__}({attrs})'
+
+
+class ConfidentChargeCondition(LigandCondition):
+    """
+    Same as `FilterStage.filter_charge_confidence('confident')`.
+    """
+    name = 'confident charge'
+
+    def __init__(self):
+        super().__init__(denticities=None)
+
+    def applies_to(self, mol: Union[dict, object]) -> bool:
+        return True
+
+    def check(self, mol: Union[dict, object]) -> bool:
+        return bool(get_ligand_property(mol, 'pred_charge_is_confident'))
+
+    def get_check_sql(self) -> tuple[str, list]:
+        return 'pred_charge_is_confident = 1', []
+
+
+class ConnectedLigandCondition(LigandCondition):
+    """
+    Same as `FilterStage.filter_unconnected_ligands()`.
+    """
+    name = 'connected'
+
+    def __init__(self):
+        super().__init__(denticities=None)
+
+    def applies_to(self, mol: Union[dict, object]) -> bool:
+        return True
+
+    def check(self, mol: Union[dict, object]) -> bool:
+        return get_ligand_property(mol, 'denticity') > 0
+
+    def get_check_sql(self) -> tuple[str, list]:
+        return 'denticity > 0', []
+
+
+class DenticityCondition(LigandCondition):
+    """
+    Same as `FilterStage.denticity_of_interest_filter()`.
+    """
+    name = 'denticity'
+
+    def __init__(self, denticities_of_interest: Union[int, list]):
+        super().__init__(denticities=None)
+        self.denticities_of_interest = ensure_denticities_is_list(denticities_of_interest)
+
+    def applies_to(self, mol: Union[dict, object]) -> bool:
+        return True
+
+    def check(self, mol: Union[dict, object]) -> bool:
+        return get_ligand_property(mol, 'denticity') in self.denticities_of_interest
+
+    def get_check_sql(self) -> tuple[str, list]:
+        return f'denticity IN ({get_sql_placeholders(self.denticities_of_interest)})', [int(denticity) for denticity in self.denticities_of_interest]
+
+
+class ChargeCondition(LigandCondition):
+    """
+    Same as `FilterStage.filter_ligand_charges()`.
+    """
+    name = 'charge'
+
+    def __init__(self, charges: Union[int, list], denticities: Union[int, list, None] = None):
+        super().__init__(denticities=denticities)
+        self.charges = list(charges) if isinstance(charges, (list, tuple)) else [charges]
+
+    def check(self, mol: Union[dict, object]) -> bool:
+        return get_ligand_property(mol, 'pred_charge') in self.charges
+
+    def get_check_sql(self) -> tuple[str, list]:
+        charges = [float(charge) for charge in self.charges if not np.isnan(charge)]   # nan charges never match, same as in python
+        return f'pred_charge IN ({get_sql_placeholders(charges)})', charges
+
+
+class AtomCountCondition(LigandCondition):
+    """
+    Same as `FilterStage.filter_atom_count()`. A min or max of None or nan means no limit.
+    """
+    name = 'atom count'
+
+    def __init__(self, min: Union[int, None] = None, max: Union[int, None] = None, denticities: Union[int, list, None] = None):
+        super().__init__(denticities=denticities)
+        self.min = -np.inf if min is None or np.isnan(min) else min
+        self.max = np.inf if max is None or np.isnan(max) else max
+
+    def check(self, mol: Union[dict, object]) -> bool:
+        return self.min <= get_ligand_property(mol, 'n_atoms') <= self.max
+
+    def get_check_sql(self) -> tuple[str, list]:
+        return 'n_atoms BETWEEN ? AND ?', [float(self.min), float(self.max)]
+
+
+class DonorElementsCondition(LigandCondition):
+    """
+    Same as `FilterStage.filter_coordinating_group_atoms()`.
+    """
+    name = 'donor elements'
+
+    def __init__(self, atoms_of_interest: Union[str, list], instruction: str, denticities: Union[int, list, None] = None):
+        super().__init__(denticities=denticities)
+        self.atoms_of_interest = [atoms_of_interest] if isinstance(atoms_of_interest, str) else list(atoms_of_interest)
+        self.instruction = instruction
+
+    def check(self, mol: Union[dict, object]) -> bool:
+        return check_elements(get_ligand_property(mol, 'local_elements'), atoms_of_interest=self.atoms_of_interest, instruction=self.instruction)
+
+    def get_check_sql(self) -> tuple[str, list]:
+        elements = sorted(set(self.atoms_of_interest))
+        contains = "instr(',' || donor_set || ',', ?) > 0"
+        if self.instruction == 'must_contain_and_only_contain':
+            return 'sorted_donors = ?', [','.join(sorted(self.atoms_of_interest))]
+        elif self.instruction == 'must_at_least_contain':
+            return ' AND '.join([contains] * len(elements)) or 'donor_set IS NOT NULL', [f',{elem},' for elem in elements]
+        elif self.instruction == 'must_exclude':
+            return ' AND '.join([f'NOT {contains}'] * len(elements)) or 'donor_set IS NOT NULL', [f',{elem},' for elem in elements]
+        elif self.instruction == 'must_only_contain_in_any_amount':
+            # The set of donor elements must be one of the subsets of the elements of interest, which can be looked up in the index.
+            subsets = [','.join(subset) for n in range(len(elements) + 1) for subset in itertools.combinations(elements, n)]
+            return f'donor_set IN ({get_sql_placeholders(subsets)})', subsets
+
+        return '0', []
+
+
+class LigandPredicates(object):
+    """
+    Ordered list of conditions which a ligand has to pass to be loaded. For every condition, the number of ligands rejected by it is counted, where each rejected ligand is attributed to the first condition it fails. This gives the same numbers as applying the corresponding filters one after another.
+    """
+
+    def __init__(self, conditions: list[LigandCondition]):
+        self.conditions = list(conditions)
+        self.n_rejected = [0] * len(self.conditions)
+
+    def get_first_failed(self, mol: Union[dict, object]) -> Union[int, None]:
+        """
+        Returns the index of the first condition the ligand fails or None if it passes all conditions. Raises a KeyError if a property is missing in the raw ligand dictionary.
+        """
+        for idx, condition in enumerate(self.conditions):
+            if not condition(mol):
+                return idx
+
+        return None
+
+    def __call__(self, mol: Union[dict, object]) -> bool:
+        return self.get_first_failed(mol) is None
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def __bool__(self):
+        return True
+
+    def reset_counts(self):
+        self.n_rejected = [0] * len(self.conditions)
+
+    def __repr__(self):
+        # Used in the cache key of loaded databases, therefore must not contain the counts.
+        return f'LigandPredicates({self.conditions!r})'
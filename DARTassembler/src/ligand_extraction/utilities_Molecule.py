@@ -1,4 +1,6 @@
 import collections
+import functools
+from typing import Union
 import networkx as nx
 from rdkit import Chem
 import numpy as np
@@ -20,18 +22,30 @@ def get_rdkit_mol_from_smiles(smiles: str, sanitize: bool=False) -> Chem.Mol:
 
     return mol
 
-def has_smarts_pattern(smarts: str, smiles: str) -> bool:
+@functools.lru_cache(maxsize=None)
+def get_smarts_pattern(smarts: str) -> Chem.Mol:
+    """
+    Returns the RDKit query molecule of a SMARTS pattern. Each pattern is only parsed once.
+    @param smarts: SMARTS pattern.
+    @return: RDKit query molecule.
+    """
+    pattern = Chem.MolFromSmarts(smarts)
+    if pattern is None:
+        raise ValueError(f'Invalid SMARTS pattern: {smarts}')
+
+    return pattern
+
+def has_smarts_pattern(smarts: str, smiles: Union[str, Chem.Mol]) -> bool:
     """
     Checks whether the molecule matches the given SMARTS pattern.
     @param smarts: SMARTS pattern to match.
+    @param smiles: SMILES string of the molecule or the RDKit molecule already parsed with `get_rdkit_mol_from_smiles()`.
     @return: True if the molecule matches the SMARTS pattern, False otherwise.
     """
-    mol = get_rdkit_mol_from_smiles(smiles)
+    mol = get_rdkit_mol_from_smiles(smiles) if isinstance(smiles, str) else smiles
 
     # Check if the molecule matches the SMARTS pattern.
-    pattern = Chem.MolFromSmarts(smarts)
-    if pattern is None:
-        raise ValueError(f'Invalid SMARTS pattern: {smarts}')
+    pattern = get_smarts_pattern(smarts)
     match = mol.HasSubstructMatch(pattern)
 
     return match
@@ -105,6 +119,36 @@ def get_max_deviation_from_coplanarity(points: list[tuple]) -> float:
 
     return max_dist
 
+def get_planarity(points: list[tuple]) -> float:
+    """
+    Returns the planarity of a list of 3D coordinates as a float between 0 and 1. 0 means not planar at all (a sphere), 1 means perfectly planar.
+    """
+    deviation = get_max_deviation_from_coplanarity(points=points)  # deviation is a float that is 0 if the molecule is perfectly planar and > 0 if it is not. The higher the value, the less planar the molecule is.
+    planarity = 1/ (1+ deviation)
+    planarity = round(planarity, 10)    # round to 10 decimal places to avoid floating point errors which happen with np.linalg.svd() in different versions of numpy
+
+    return planarity
+
+def get_interatomic_distances(points: Union[list[tuple], np.ndarray]) -> np.ndarray:
+    """
+    Returns the distances between all pairs of points (i, j) with i < j in the condensed order of scipy's pdist(), computed with vectorized numpy instead of the full distance matrix.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    i, j = np.triu_indices(len(points), k=1)
+    differences = points[j] - points[i]
+
+    return np.sqrt((differences**2).sum(axis=1))
+
+def get_interatomic_distance_range(points: Union[list[tuple], np.ndarray]) -> tuple[float, float]:
+    """
+    Returns the minimal and maximal distance between any two points. Less than two points get a range of (inf, -inf), so that they pass every min/max check.
+    """
+    distances = get_interatomic_distances(points)
+    if len(distances) == 0:
+        return np.inf, -np.inf
+
+    return float(distances.min()), float(distances.max())     # min and max propagate nan
+
 def are_points_coplanar(points, dist=0.1):
     """
     Check if a list of 3D coordinates are approximately coplanar based on a specified cutoff.
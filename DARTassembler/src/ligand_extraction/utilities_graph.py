@@ -16,6 +16,7 @@ except ImportError:
 import matplotlib.pyplot as plt
 from typing import Union
 from networkx import weisfeiler_lehman_graph_hash as graph_hash
+from DARTassembler.src.ligand_extraction.array_graph import ArrayGraph
 
 
 def get_only_complex_graph_connected_to_metal(graph, metal: str, atom_label='node_label') -> nx.Graph:
@@ -72,12 +73,14 @@ def assert_graph_and_coordinates_are_consistent(graph: nx.Graph, atoms: list[str
 def get_graph_hash(graph, node_attr='node_label', iterations=3, digest_size=16, edge_attr=None) -> str:
     """
     Returns the graph hash of a graph
-    @param graph: graph
+    @param graph: networkx graph or ArrayGraph. For an ArrayGraph, the hash is calculated directly on the arrays.
     @param node_attr: node attribute to be used for the hash
     @param iterations: iterations of the hash
     @param digest_size: digest size of the hash
     @return: graph hash
     """
+    if isinstance(graph, ArrayGraph):
+        return graph.weisfeiler_lehman_graph_hash(node_attr=node_attr, edge_attr=edge_attr, iterations=iterations, digest_size=digest_size)
     return graph_hash(graph, node_attr=node_attr, edge_attr=edge_attr, iterations=iterations, digest_size=digest_size)
 
 def smiles2nx(smiles_str: str, explicit_H: bool = True):
@@ -3,24 +3,32 @@ from pathlib import Path
 from copy import deepcopy
 import numpy as np
 
-from DARTassembler.src.constants.Periodic_Table import DART_Element
 from DARTassembler.src.ligand_extraction.DataBase import MoleculeDB, LigandDB
 from typing import Union
 
-from DARTassembler.src.ligand_extraction.Molecule import pseudo_metal
+from DARTassembler.src.ligand_extraction.ligand_predicates import check_elements
 from DARTassembler.src.ligand_filters.constant_Ligands import get_monodentate_list
-from DARTassembler.src.ligand_extraction.utilities_Molecule import has_smarts_pattern
+from DARTassembler.src.ligand_extraction.utilities_Molecule import has_smarts_pattern, get_smarts_pattern, if_same_stoichiometries
+from DARTassembler.src.ligand_filters.ligand_property_table import LigandPropertyTable
+from DARTassembler.src.ligand_extraction.Molecule import pseudo_metal
 
 
 class FilterStage:
 
     def __init__(self,
                  database: [MoleculeDB, LigandDB],
-                 safe_path: [str, Path] = None):
+                 safe_path: [str, Path] = None,
+                 n_processes: Union[int, None] = 1):
         """
         :param database:
         :param safe_path:   The path we want to safe the filtered databases to. If None, no saving at all
+        :param n_processes: Number of processes used to compute expensive ligand properties like the SMILES strings. If None, all available CPUs are used.
         """
+        self.n_processes = n_processes
+        self.fingerprints = None    # substructure screening fingerprints of the database, see `set_fingerprints()`
+        self.index = None   # byte-offset index of the database with stored geometric properties, see `set_index()`
+        self.bitsets = None # bitsets of the common ligand properties of the database, see `set_bitsets()`
+
         # The object we are working on. Is hopefully saved, because the filter stage doesnt make copy itself of it
         self.database = database
 
@@ -28,6 +36,110 @@ class FilterStage:
         self.safe = True if self.safe_path is not None else False
         self.filter_tracking = {}
 
+    @property
+    def database(self) -> Union[MoleculeDB, LigandDB]:
+        """
+        The database with only the ligands which passed all filters so far. The filters only update the mask of passed ligands in the property table, the database dictionary itself is sliced here once when it is needed.
+        """
+        table = self._table
+        if table is not None and table.db is self._database.db and not table.passed.all():
+            self._database.db = table.get_passed_db()
+            self._table = table.get_passed_table(self._database.db)
+
+        return self._database
+
+    @database.setter
+    def database(self, database: Union[MoleculeDB, LigandDB]):
+        self._database = database
+        self._table = None
+
+    @property
+    def table(self) -> LigandPropertyTable:
+        """
+        The property table of the ligands in the database. The table is built again if the database dictionary was changed from outside.
+        """
+        db = self._database.db
+        if self._table is None or self._table.db is not db or len(self._table) != len(db):
+            self._table = LigandPropertyTable(db, n_processes=self.n_processes)
+            if self.fingerprints is not None:
+                self._table.set_fingerprints(self.fingerprints)
+            if self.index is not None:
+                self._table.set_index(self.index)
+            if self.bitsets is not None:
+                self._table.set_bitsets(self.bitsets)
+
+        return self._table
+
+    def get_n_passed(self) -> int:
+        """
+        Returns the number of ligands which passed all filters so far without slicing the database.
+        """
+        return self.table.get_n_passed()
+
+    def get_passed_names(self) -> np.ndarray:
+        """
+        Returns the unique names of all ligands which passed all filters so far without slicing the database.
+        """
+        table = self.table
+        return table.names[table.passed]
+
+    def set_fingerprints(self, fingerprints: dict):
+        """
+        Sets the substructure screening fingerprints of the database as returned by `read_fingerprints()`, which are used by the SMARTS filter.
+        """
+        self.fingerprints = fingerprints
+        self.table.set_fingerprints(fingerprints)
+
+    def set_index(self, index: dict):
+        """
+        Sets the byte-offset index of the database as returned by `read_index(with_geometry=True)`, whose stored geometric properties are used by the planarity and interatomic distances filters.
+        """
+        self.index = index
+        self.table.set_index(index)
+
+    def set_bitsets(self, bitsets: dict):
+        """
+        Sets the bitsets of the common ligand properties of the database as returned by `read_bitsets()`, which are used by the filters on these properties.
+        """
+        self.bitsets = bitsets
+        self.table.set_bitsets(bitsets)
+
+    def get_n_ligands(self) -> int:
+        """
+        Returns the number of ligands in the property table, including the ones which were filtered out.
+        """
+        return len(self.table)
+
+    def get_names(self) -> np.ndarray:
+        """
+        Returns the unique names of all ligands in the property table, including the ones which were filtered out.
+        """
+        return self.table.names
+
+    def set_filter_position(self, position: int):
+        """
+        Sets the position of the next filter in the order of the user. Filters which are applied in a different order still remove the same ligands as if they had been applied in the order of their positions.
+        """
+        self.table.position = position
+
+    def get_n_failed(self, position: int) -> int:
+        """
+        Returns the number of ligands removed by the filter at this position in the order of the user.
+        """
+        return self.table.get_n_failed(position)
+
+    def set_failed_positions(self, failed_at: np.ndarray):
+        """
+        Sets for each ligand the position of the first filter it failed, e.g. from the results of an earlier run, in the same order as `get_names()`.
+        """
+        self.table.failed_at = np.array(failed_at, dtype=np.int64)
+
+    def get_failed_positions(self) -> np.ndarray:
+        """
+        Returns for each ligand the position of the first filter it failed, in the same order as `get_names()`. Ligands which passed all filters have the position `not_failed`.
+        """
+        return self.table.failed_at
+
     def safe_and_document_after_filterstep(self, filtering_step_name: str):
 
         print(f"Filtering step {filtering_step_name} succesfull applied")
@@ -39,12 +151,9 @@ class FilterStage:
         self.database.to_json(path=f"{self.safe_path}/DB_after_{filtering_step_name}.json")
 
     def stoichiometry_filter(self, stoichiometry, denticities: Union[list[int], None] = None):
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            if denticities is None or ligand.denticity in denticities:
-                if not ligand.if_same_stoichiometry(stoichiometry):
-                    to_delete.append(unq_name)
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        rows = self.table.get_rows(denticities)
+        same_stoichiometry = self.table.get_mask_of_values('stoichiometry', lambda stoi: if_same_stoichiometries(stoi, stoichiometry), rows)
+        self.table.remove(rows & ~same_stoichiometry)
 
     def metals_of_interest_filter(self, metals_of_interest: [str, list[str]], denticity: int = None):
         """
@@ -56,36 +165,21 @@ class FilterStage:
         if isinstance(metals_of_interest, str):
             metals_of_interest = [metals_of_interest]
 
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            # Iterate through each ligand. If the denticity matches
-            # the one specified by the user {denticity: int}, but it was never part of
-            # complex with a metal specified by the user {metals_of_interest: [str, list[str]]} then it is
-            # removed
-            if ligand.denticity in denticity:
-                # print(list(ligand.count_metals))
-                metal_of_interest_present = False
-                for metal in metals_of_interest:
-                    if metal in list(ligand.count_metals):
-                        # print("Matching Metal: " + str(metal))
-                        metal_of_interest_present = True
-                if not metal_of_interest_present:
-                    to_delete.append(unq_name)
-                    # print("Metal of Interest Fail -> Deleting ligand")
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        # If the denticity of a ligand matches the one specified by the user {denticity: int}, but it was never part of
+        # complex with a metal specified by the user {metals_of_interest: [str, list[str]]} then it is removed
+        rows = self.table.get_rows(denticity)
+        metal_of_interest_present = self.table.get_mask_of_any_item('metals', metals_of_interest, rows)
+        self.table.remove(rows & ~metal_of_interest_present)
 
         # self.db = {identifier: ligand for identifier, ligand in self.db.items() if om in metals_of_interest or om is None}
         self.filter_tracking[len(self.filter_tracking)] = f"Metals of interest filter with {metals_of_interest}"
         # self.safe_and_document_after_filterstep(filtering_step_name="Metal_of_Interest")
 
     def graph_hash_with_metal_filter(self, graph_hashes_with_metal: list):
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            if ligand.graph_hash_with_metal not in graph_hashes_with_metal:
-                to_delete.append(unq_name)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        graph_hashes = set(graph_hashes_with_metal)
+        rows = self.table.get_rows()
+        hash_present = self.table.get_mask_of_values('graph_hash_with_metal', lambda graph_hash: graph_hash in graph_hashes, rows)
+        self.table.remove(rows & ~hash_present)
         self.filter_tracking[len(self.filter_tracking)] = f"Graph IDs: {graph_hashes_with_metal}"
 
         return
@@ -98,26 +192,16 @@ class FilterStage:
         if isinstance(denticity_of_interest, int):
             denticity_of_interest = [denticity_of_interest]
 
-        to_delete = []
-        for identifier, ligand in self.database.db.items():
-            if not ligand.denticity in denticity_of_interest:
-                to_delete.append(identifier)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
-
-        # old: self.database.db = {identifier: ligand for identifier, ligand in self.database.db.items() if ligand.denticity in denticity_of_interest}
+        rows = self.table.get_rows()
+        self.table.remove(rows & ~self.table.get_rows(denticity_of_interest))
 
         self.filter_tracking[len(self.filter_tracking)] = f"Metals of interest filter with {denticity_of_interest}"
 
         # self.safe_and_document_after_filterstep(filtering_step_name="Denticity_of_Interest")
 
     def filter_unconnected_ligands(self):
-        to_delete = []
-        for identifier, ligand in self.database.db.items():
-            if ligand.denticity <= 0:
-                to_delete.append(identifier)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        rows = self.table.get_rows()
+        self.table.remove(rows & (self.table.get_column('denticity') <= 0))
 
         self.filter_tracking[len(self.filter_tracking)] = f"Unconnected Ligand Filter"
 
@@ -140,25 +224,10 @@ class FilterStage:
         if isinstance(atoms_of_interest, str):
             atoms_of_interest = [atoms_of_interest]
 
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            # print("\n")
-            # print(unq_name)
-            # print(sorted(list(ligand.local_elements)))
-            if ligand.denticity in denticity:
-                coordinating_atoms_present = False
-                # If the denticity of the ligand matches that specified by the user
-                if ((sorted(list(ligand.local_elements)) == sorted(atoms_of_interest)) and instruction == "must_contain_and_only_contain") or \
-                        (all(elem in list(ligand.local_elements) for elem in atoms_of_interest) and instruction == "must_at_least_contain") or \
-                        ((any(elem in list(ligand.local_elements) for elem in atoms_of_interest) == False) and instruction == "must_exclude") or \
-                        ((all(elem in atoms_of_interest for elem in list(ligand.local_elements))) and instruction == "must_only_contain_in_any_amount"):
-                    coordinating_atoms_present = True
-
-                if not coordinating_atoms_present:
-                    # print("Matching Coordinating groups Fail")
-                    to_delete.append(unq_name)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        # If the denticity of the ligand matches that specified by the user, the instruction is checked once for each distinct set of donor elements
+        rows = self.table.get_rows(denticity)
+        coordinating_atoms_present = self.table.get_mask_of_values('donors', lambda donors: check_elements(donors, atoms_of_interest=atoms_of_interest, instruction=instruction), rows)
+        self.table.remove(rows & ~coordinating_atoms_present)
         self.filter_tracking[len(self.filter_tracking)] = f"Functional Atom filter with {atoms_of_interest}"
 
         # self.safe_and_document_after_filterstep(filtering_step_name="FunctionalAtoms_of_Interest")
@@ -181,24 +250,10 @@ class FilterStage:
         if isinstance(atoms_of_interest, str):
             atoms_of_interest = [atoms_of_interest]
 
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            # print("\n")
-            # print(unq_name)
-            # print(sorted(list(ligand.atomic_props["atoms"])))
-            if ligand.denticity in denticity:
-                coordinating_atoms_present = False
-                # If the denticity of the ligand matches that specified by the user
-                if ((sorted(list(ligand.atomic_props["atoms"])) == sorted(atoms_of_interest)) and instruction == "must_contain_and_only_contain") or \
-                        (all(elem in list(ligand.atomic_props["atoms"]) for elem in atoms_of_interest) and instruction == "must_at_least_contain") or \
-                        ((any(elem in list(ligand.atomic_props["atoms"]) for elem in atoms_of_interest) == False) and instruction == "must_exclude") or \
-                        ((all(elem in atoms_of_interest for elem in list(ligand.atomic_props["atoms"]))) and instruction == "must_only_contain_in_any_amount"):
-                    coordinating_atoms_present = True
-
-                if not coordinating_atoms_present:
-                    to_delete.append(unq_name)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        # If the denticity of the ligand matches that specified by the user, the instruction is checked once for each distinct composition
+        rows = self.table.get_rows(denticity)
+        atoms_present = self.table.get_mask_of_values('atoms', lambda atoms: check_elements(atoms, atoms_of_interest=atoms_of_interest, instruction=instruction), rows)
+        self.table.remove(rows & ~atoms_present)
 
         self.filter_tracking[len(self.filter_tracking)] = f"Functional Atom filter with {atoms_of_interest}"
 
@@ -208,77 +263,78 @@ class FilterStage:
         """
         Filter out all ligands with beta Hydrogen in it
         """
-        to_delete = []
         denticities = self.ensure_denticities_is_list(denticities)
 
-        for unq_name, ligand in self.database.db.items():
-            if ligand.denticity not in denticities:
-                continue
-
-            betaH_present = ligand.betaH_check()
-            if betaH_present:
-                to_delete.append(unq_name)
-
-        for unq_name in to_delete:
-            del self.database.db[unq_name]
+        rows = self.table.get_rows(denticities)
+        betaH_present = self.table.get_column('has_betaH', rows).astype(bool)
+        self.table.remove(rows & betaH_present)
 
         self.filter_tracking[len(self.filter_tracking)] = f"betaH Filter"
 
     def filter_neighbouring_coordinating_atoms(self, denticities: list = None):
-        to_delete = []
         denticities = self.ensure_denticities_is_list(denticities)
 
-        for unq_name, ligand in self.database.db.items():
-            if ligand.denticity not in denticities:
-                continue
-
-            if ligand.check_for_neighboring_coordinating_atoms():
-                to_delete.append(unq_name)
-
-        for unq_name in to_delete:
-            del self.database.db[unq_name]
+        rows = self.table.get_rows(denticities)
+        neighbors_present = self.table.get_column('has_neighboring_coordinating_atoms', rows).astype(bool)
+        self.table.remove(rows & neighbors_present)
 
         self.filter_tracking[len(self.filter_tracking)] = f"Neighbouring Atom Filter: {0.2}"
 
-    def filter_min_max_value(self, get_value_from_ligand, min: float = None, max: float = None, denticities: list = None):
-        to_delete = []
-        denticities = self.ensure_denticities_is_list(denticities)
-
+    @staticmethod
+    def get_min_max(min: Union[float, None], max: Union[float, None]) -> tuple[float, float]:
         # If the user doesn't specify min or max this is set to infinity or -infinity respectively to be ignored
         if min is None or np.isnan(min):
             min = -np.inf
         if max is None or np.isnan(max):
             max = np.inf
 
-        for unq_name, ligand in self.database.db.items():
-            if ligand.denticity not in denticities:
-                continue
+        return min, max
+
+    def filter_min_max_value(self, get_value_from_ligand, min: float = None, max: float = None, denticities: list = None):
+        """
+        Filters out all ligands for which the value is not between min and max. The value can be a number or a list of numbers, which all have to be between min and max.
+        @param get_value_from_ligand: Either a function which gets the value from a ligand or the name of a numeric column of the property table.
+        """
+        denticities = self.ensure_denticities_is_list(denticities)
+        min, max = self.get_min_max(min, max)
+        rows = self.table.get_rows(denticities)
+
+        if isinstance(get_value_from_ligand, str):
+            values = self.table.get_column(get_value_from_ligand, rows)
+            self.table.remove(rows & ~((min <= values) & (values <= max)))
+            return
 
-            value = get_value_from_ligand(ligand)
+        to_delete = np.zeros(len(self.table), dtype=bool)
+        for idx in np.flatnonzero(rows):
+            value = get_value_from_ligand(self.table.ligands[idx])
             try:
-                if not (min <= value <= max):
-                    to_delete.append(unq_name)
+                to_delete[idx] = not (min <= value <= max)
             except TypeError:
-                if not all(min <= v <= max for v in value):
-                    to_delete.append(unq_name)
-
-        for unq_name in to_delete:
-            del self.database.db[unq_name]
+                to_delete[idx] = not all(min <= v <= max for v in value)
+        self.table.remove(to_delete)
 
     def filter_occurrences(self, min: int = None, max: int = None, denticities: list = None):
-        self.filter_min_max_value(lambda ligand: ligand.occurrences, min, max, denticities)
+        self.filter_min_max_value('occurrences', min, max, denticities)
 
     def filter_atom_count(self, min: int = None, max: int = None, denticities: list = None):
-        self.filter_min_max_value(lambda ligand: ligand.n_atoms, min, max, denticities)
+        self.filter_min_max_value('n_atoms', min, max, denticities)
 
     def filter_molecular_weight(self, min: float = None, max: float = None, denticities: list = None):
-        self.filter_min_max_value(lambda ligand: ligand.global_props['molecular_weight'], min, max, denticities)
+        self.filter_min_max_value('molecular_weight', min, max, denticities)
 
     def filter_planarity(self, min: float = None, max: float = None, denticities: list = None):
-        self.filter_min_max_value(lambda ligand: ligand.calculate_planarity(), min, max, denticities)
+        self.filter_min_max_value('planarity', min, max, denticities)
 
     def filter_interatomic_distances(self, min: float = None, max: float = None, denticities: list = None):
-        self.filter_min_max_value(lambda ligand: ligand.get_all_inter_atomic_distances_as_list(), min, max, denticities)
+        # All distances are between min and max if the smallest and the largest distance are.
+        denticities = self.ensure_denticities_is_list(denticities)
+        min, max = self.get_min_max(min, max)
+        rows = self.table.get_rows(denticities)
+        idx = np.flatnonzero(rows)
+        distance_ranges = np.array(self.table.get_column('interatomic_distance_range', rows)[idx].tolist(), dtype=float).reshape(-1, 2)
+        to_delete = np.zeros(len(self.table), dtype=bool)
+        to_delete[idx] = ~((min <= distance_ranges[:, 0]) & (distance_ranges[:, 1] <= max))
+        self.table.remove(to_delete)
 
 
 
@@ -288,26 +344,13 @@ class FilterStage:
         :param filter_for: "confident" or "not_confident"
         """
 
-        to_delete = []
         if (filter_for is None) or (filter_for != ("confident" or "not_confident")):
             print("!!!Warning!!! -> Arguments specified incorrectly  -> Proceeding to next filter")
 
         else:
-            confident = 0
-            not_confident = 0
-            for unq_name, ligand in self.database.db.items():
-                confidence = ligand.pred_charge_is_confident
-
-                if confidence:
-                    confident += 1
-                elif not confidence:
-                    not_confident += 1
-                    to_delete.append(unq_name)
-                else:
-                    print("!!!Fatal Error!!! -> Charge Confidence Incorrectly Specified  -> Aborting Program")
-            # print("Charge Assignment Confident:" + str(confident))
-            # print("Charge Assignment Not Confident:" + str(not_confident))
-            self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+            rows = self.table.get_rows()
+            confident = self.table.get_column('pred_charge_is_confident', rows).astype(bool)
+            self.table.remove(rows & ~confident)
             self.filter_tracking[len(self.filter_tracking)] = f"Charge Filter: {filter_for}"
 
 
@@ -319,57 +362,37 @@ class FilterStage:
         print("Adding constant Ligands")
 
         # for lig in get_monodentate_list() + get_reactant():
+        db = self.database.db
         for lig in get_monodentate_list():
-            self.database.db[lig.name] = lig
+            db[lig.name] = lig
+        self._table = None  # ligands might have been replaced, so the property table is outdated
 
         # self.db.to_json(path=f"{self.safe_path}/DB_after_Adding_Const_Ligands.json")
 
     def filter_even_odd_electron(self, filter_for: str):
         # filter_for = even --> This will extract all ligands with an even number of electrons
         # filter_for = odd  --> This will extract all ligands with an odd number of electrons
-        to_delete = []
         if (filter_for != "even") and (filter_for != "odd"):
             print("!!!Warning!!! -> Arguments specified incorrectly  -> Proceeding to next filter")
 
         else:
-            for unq_name, ligand in self.database.db.items():
-                # print(ligand)
-                electrons = 0
-                for atom in ligand.atomic_props['atoms']:
-                    Z = DART_Element(atom).atomic_number
-                    electrons += Z
-                electrons = electrons * (-1)
-                num_electrons = electrons + ligand.pred_charge
-
-                if ((num_electrons % 2 == 0) and (filter_for == "even")) or ((num_electrons % 2 != 0) and (filter_for == "odd")):
-                    pass
-                    # print("PASS")
-                    # RCA_Ligand.view_3d(ligand)
-                    # print("")
-                else:
-                    # print("Fail")
-                    # RCA_Ligand.view_3d(ligand)
-                    # print("")
-                    to_delete.append(unq_name)
-
-            self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+            rows = self.table.get_rows()
+            num_electrons = self.table.get_column('n_electrons', rows)
+            is_even = np.mod(num_electrons, 2) == 0
+            self.table.remove(rows & (~is_even if filter_for == "even" else is_even))
             self.filter_tracking[len(self.filter_tracking)] = f"even_odd_electron_filter: {filter_for}"
 
     def filter_ligand_charges(self,  charge: Union[list, int], denticity: int = None):
         denticity = self.ensure_denticities_is_list(denticity)
 
-        if not charge is None:
-            if not isinstance(charge, (list,tuple)):
-                charge = [charge]
-
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            ligand_charge = ligand.pred_charge
-            if ligand.denticity in denticity:
-                if ligand_charge not in charge:
-                    to_delete.append(unq_name)
+        if charge is None:
+            raise TypeError('DART Error: The ligand charge filter needs a charge or a list of charges, but got None.')
+        if not isinstance(charge, (list,tuple)):
+            charge = [charge]
 
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        rows = self.table.get_rows(denticity)
+        ligand_charges = self.table.get_column('pred_charge', rows)
+        self.table.remove(rows & ~np.isin(ligand_charges, charge))
         self.filter_tracking[len(self.filter_tracking)] = f"Ligand Charge Filter: [{denticity}] [{charge}]"
 
     def filter_atomic_neighbors(self, atom: str, neighbors: list, denticities: int = None):
@@ -383,13 +406,10 @@ class FilterStage:
         """
         denticities = self.ensure_denticities_is_list(denticities)
 
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            if ligand.denticity in denticities:
-                if ligand.has_specified_atomic_neighbors(atom, neighbors):
-                    to_delete.append(unq_name)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        rows = self.table.get_rows(denticities)
+        key = f'has_atomic_neighbors {atom} {list(neighbors)}'
+        neighbors_present = self.table.get_column(key, rows, getter=lambda ligand: ligand.has_specified_atomic_neighbors(atom, neighbors)).astype(bool)
+        self.table.remove(rows & neighbors_present)
         self.filter_tracking[len(self.filter_tracking)] = f"Atomic Neighbors Filter: {atom} {neighbors}"
 
     def filter_smarts_substructure_search(self, smarts: str, should_be_present: bool, include_metal: bool = False, denticities: list = None):
@@ -403,81 +423,28 @@ class FilterStage:
         """
         denticities = self.ensure_denticities_is_list(denticities)
 
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            if ligand.denticity in denticities:
-                with_metal = pseudo_metal if include_metal else None        # Optionally include the metal center in the SMILES string.
-                smiles = ligand.get_smiles(with_metal=with_metal)
-                if smiles is None:  # If the ligand has no valid SMILES string, pass it through.
-                    continue
+        get_smarts_pattern(smarts)  # check the pattern before computing any SMILES strings
 
-                has_pattern = has_smarts_pattern(smarts=smarts, smiles=smiles)
-                if has_pattern != should_be_present:
-                    to_delete.append(unq_name)
+        rows = self.table.get_rows(denticities)
+        # Ligands without fingerprint bits of the pattern can't contain it, so their SMILES strings are never built.
+        no_smiles, no_match = self.table.screen_smarts_pattern(smarts, with_metal=pseudo_metal if include_metal else None, rows=rows)
+        passes = no_smiles | (no_match & (not should_be_present))
 
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        smiles_column = 'smiles_with_metal' if include_metal else 'smiles'  # Optionally include the metal center in the SMILES string.
+        # If the ligand has no valid SMILES string, pass it through. The pattern is searched only once per distinct SMILES string and the parsed molecules are shared with other SMARTS filters.
+        passes |= self.table.get_mask_of_values(smiles_column, lambda smiles: smiles is None or has_smarts_pattern(smarts=smarts, smiles=self.table.get_rdkit_mol(smiles)) == should_be_present, rows & ~no_smiles & ~no_match)
+        self.table.remove(rows & ~passes)
         self.filter_tracking[len(self.filter_tracking)] = f"SMARTS Filter: {smarts} {should_be_present}"
 
     def filter_symmetric_monodentate_ligands(self, instruction: str = None, threshold: float = None):
-        to_delete = []
         if (instruction != "Add") and (instruction != "Remove"):
             print("!!!Warning!!! -> Arguments specified incorrectly  -> Proceeding to next filter")
 
         else:
-            for unq_name, ligand in self.database.db.items():
-                if ligand.denticity == 1:
-                    x_centroid_list = []
-                    x_COM_list = []
-                    y_centroid_list = []
-                    y_COM_list = []
-                    z_centroid_list = []
-                    z_COM_list = []
-                    all_atomic_masses = []
-                    for atom_index in ligand.coordinates:
-                        atom_pos = ligand.coordinates[atom_index]
-                        atom_type = atom_pos[0]
-
-                        x = atom_pos[1][0]
-                        x_centroid_list.append(x)
-                        x_COM_list.append(x * DART_Element(atom_type).atomic_mass)
-
-                        y = atom_pos[1][1]
-                        y_centroid_list.append(y)
-                        y_COM_list.append(y * DART_Element(atom_type).atomic_mass)
-
-                        z = atom_pos[1][2]
-                        z_centroid_list.append(z)
-                        z_COM_list.append(z * DART_Element(atom_type).atomic_mass)
-
-                        all_atomic_masses.append(DART_Element(atom_type).atomic_mass)
-
-                    # [coord_atom_pos,  centre_of_points, centre_of_mass]
-                    coord_atom_pos = np.array(ligand.coordinates[ligand.ligand_to_metal[0]][1])
-                    centre_of_points = np.array([sum(x_centroid_list) / len(x_centroid_list), sum(y_centroid_list) / len(y_centroid_list), sum(z_centroid_list) / len(z_centroid_list)])
-                    centre_of_mass = np.array([sum(x_COM_list) / sum(all_atomic_masses), sum(y_COM_list) / sum(all_atomic_masses), sum(z_COM_list) / sum(all_atomic_masses)])
-
-                    v1 = coord_atom_pos
-                    v2 = centre_of_points
-                    v3 = v2 - v1
-                    if all(v1 != v2):
-                        cosine = np.dot(v1 * (-1), v3) / (np.linalg.norm(v1 * (-1)) * np.linalg.norm(v3))
-                        angle = np.arccos(cosine)
-                        angle = np.degrees(angle)
-                    else:
-                        angle = 180
-
-                    if (abs(180 - angle) < threshold) or (abs(0 - angle) < threshold):
-                        # print("sucess")
-                        # ligand.view_3d()
-                        pass
-                    else:
-                        # print("failure")
-                        to_delete.append(unq_name)
-                        # ligand.view_3d()
-
-                else:
-                    pass
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+            rows = self.table.get_rows(denticities=[1])
+            angle = self.table.get_column('monodentate_angle', rows)
+            is_symmetric = (np.abs(180 - angle) < threshold) | (np.abs(0 - angle) < threshold)
+            self.table.remove(rows & ~is_symmetric)
         self.filter_tracking[len(self.filter_tracking)] = f"monodentate_filter: {threshold}"
 
     def ensure_denticities_is_list(self, denticities):
@@ -494,11 +461,7 @@ class FilterStage:
         """
         denticities = self.ensure_denticities_is_list(denticities)
 
-        to_delete = []
-        for unq_name, ligand in self.database.db.items():
-            if ligand.denticity in denticities:
-                if not ligand.has_good_bond_orders:
-                    to_delete.append(unq_name)
-
-        self.database.db = {unq_name: ligand for unq_name, ligand in self.database.db.items() if unq_name not in to_delete}
+        rows = self.table.get_rows(denticities)
+        good_bond_orders = self.table.get_column('has_good_bond_orders', rows).astype(bool)
+        self.table.remove(rows & ~good_bond_orders)
         self.filter_tracking[len(self.filter_tracking)] = f"Missing Bond Order Filter"
@@ -3,9 +3,18 @@ import sys
 
 from tqdm import tqdm
 from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates, LigandCondition, ConfidentChargeCondition, \
+    ConnectedLigandCondition, DenticityCondition, ChargeCondition, AtomCountCondition, DonorElementsCondition
 from DARTassembler.src.constants.Paths import project_path
 from DARTassembler.src.ligand_filters.FilteringStage import FilterStage
+from DARTassembler.src.ligand_extraction.db_cache import set_cache_dir, is_cache_enabled
+from DARTassembler.src.ligand_extraction.db_fingerprints import read_fingerprints
+from DARTassembler.src.ligand_extraction.db_index import read_index, can_be_indexed
+from DARTassembler.src.ligand_filters.ligand_bitsets import read_bitsets
+from DARTassembler.src.ligand_filters.filter_cache import get_filter_prefix_keys, load_filter_results, save_filter_results
+from DARTassembler.src.ligand_filters.filter_profiling import FilterProfiler, save_profile_report, get_profile_report_string
 from pathlib import Path
+import numpy as np
 import pandas as pd
 pd.options.mode.chained_assignment = None   # silence pandas SettingWithCopyWarning
 from typing import Union
@@ -16,21 +25,58 @@ from DARTassembler.src.assembly.Assembly_Input import LigandFilterInput, _mw, _f
     _interatomic_distances, _occurrences, _planarity, _remove_missing_bond_orders, _atm_neighbors, \
     _atom, _neighbors, _smarts_filter, _smarts, _should_be_present, _include_metal
 
-
-
+# Estimated relative cost per ligand of each filter. Filters below `max_cheap_filter_cost` only compare stored ligand properties and are evaluated for all ligands at once, all others compute something from the structure of each ligand.
+filter_costs = {
+    _denticities_of_interest: 1,
+    _ligand_charges: 1,
+    _acount: 1,
+    _occurrences: 1,
+    _mw: 1,
+    _graph_hash_wm: 1,
+    _remove_missing_bond_orders: 1,
+    _metals_of_interest: 2,
+    _coords: 2,
+    _ligcomp: 2,
+    _stoichiometry: 2,
+    _remove_ligands_with_neighboring_coordinating_atoms: 10,
+    _planarity: 20,
+    _interatomic_distances: 30,
+    _atm_neighbors: 30,
+    _remove_ligands_with_beta_hydrogens: 40,
+    _smarts_filter: 100,
+}
+max_cheap_filter_cost = 10
+bitset_filters = [_remove_ligands_with_beta_hydrogens]  # filters on properties in the ligand bitsets which are expensive to compute
+
+
+def plan_filter_order(filters: list[dict]) -> list[int]:
+    """
+    Returns the indices of the filters in the order in which they should be applied. Cheap filters are applied first, sorted by their cost, and expensive filters afterwards in the order of the user.
+
+    All filters only remove ligands and are evaluated only on the ligands which didn't fail a filter before them in the order of the user, so every order gives the same ligands and the same counts per filter. Expensive filters are kept in the order of the user because with these counts, each filter has to check all ligands which reach it in the order of the user anyway, and applying an expensive filter before one that comes earlier in the order of the user would only check ligands which the earlier filter removes.
+    """
+    costs = [filter_costs.get(filter[_filter], np.inf) for filter in filters]   # unknown filters are expensive, so that they raise an error at their position
+    cheap = sorted((idx for idx, cost in enumerate(costs) if cost < max_cheap_filter_cost), key=lambda idx: costs[idx])
+    expensive = [idx for idx, cost in enumerate(costs) if cost >= max_cheap_filter_cost]
+
+    return cheap + expensive
 
 
 class LigandFilters(object):
 
-    def __init__(self, filepath: Union[str, Path], max_number: Union[int, None] = None, output_ligand_db_path: Union[None, str, Path] = None, delete_output_dir: bool = False):
+    def __init__(self, filepath: Union[str, Path], max_number: Union[int, None] = None, output_ligand_db_path: Union[None, str, Path] = None, delete_output_dir: bool = False, n_processes: Union[int, None] = 1, profile: bool = False):
         self.filepath = filepath
         self.max_number = max_number
+        self.n_processes = n_processes  # number of processes for computing expensive ligand properties, None means all available CPUs
+        self.profiler = FilterProfiler(enabled=profile)     # measures time and memory of each filter, see `save_profile_report()`
+        self.profile_rows = []
         self.input = LigandFilterInput(path=self.filepath)
 
         self.ligand_db_path = self.input.ligand_db_path
         self.output_ligand_db_path = output_ligand_db_path or self.input.output_ligand_db_path  # Overwrite the output path if specified
         self.output_info = self.input.output_filtered_ligands
         self.filters = self.input.filters
+        set_cache_dir(self.input.cache_dir)
 
         if delete_output_dir:
             shutil.rmtree(self.output_ligand_db_path.parent, ignore_errors=True)
@@ -47,146 +93,258 @@ class LigandFilters(object):
 
         self.filter_tracking = []
 
+    @staticmethod
+    def get_filter_condition(filter: dict) -> Union[LigandCondition, None]:
+        """
+        Returns the condition which applies the filter to the raw ligand dictionary while loading the database, or None if the filter needs the full ligand.
+        """
+        filtername = filter[_filter]
+        if filtername == _denticities_of_interest:
+            return DenticityCondition(denticities_of_interest=filter[_denticities_of_interest])
+        elif filtername == _ligand_charges and filter[_ligand_charges] is not None:
+            return ChargeCondition(charges=filter[_ligand_charges], denticities=filter[_denticities])
+        elif filtername == _acount:
+            return AtomCountCondition(min=filter[_acount_min], max=filter[_acount_max], denticities=filter[_denticities])
+        elif filtername == _coords:
+            return DonorElementsCondition(atoms_of_interest=filter[_ligcomp_atoms_of_interest], instruction=filter[_ligcomp_instruction], denticities=filter[_denticities])
+
+        return None
+
+    def get_predicates(self) -> LigandPredicates:
+        """
+        Returns the predicates for loading the ligand database, which consist of the mandatory filters and all filters at the start of the filter list which can be checked on the raw ligand dictionary. Filters after the first filter that needs the full ligand are applied after loading as usual.
+        """
+        conditions = [ConfidentChargeCondition(), ConnectedLigandCondition()]
+        for filter in self.filters:
+            condition = self.get_filter_condition(filter)
+            if condition is None:
+                break
+            conditions.append(condition)
+
+        return LigandPredicates(conditions)
+
     def get_filtered_db(self) -> LigandDB:
         print(f"Starting DART Ligand Filters Module.")
         print(f"Input ligand db file: `{self.ligand_db_path.name}`")
         print(f"Output ligand db file: `{self.output_ligand_db_path.name}`")
 
-        db = LigandDB.load_from_json(
-            self.ligand_db_path,
-            n_max=self.max_number,
-        )
-
-        self.Filter = FilterStage(db)
-        self.n_ligands_before = len(self.Filter.database.db)
-        self.df_all_ligands = self.get_ligand_df()
-        self.df_all_ligands['Filter'] = None    # initialize column for filter tracking
-        if self.output_info:
-            self.all_xyz_strings = {ligand_id: ligand.get_xyz_file_format_string(comment=None, with_metal=True) for ligand_id, ligand in self.Filter.database.db.items()}   # save xyz strings for outputting later and keep a placeholder comment for replacing later
+        # The info output needs all ligands including the filtered out ones, so filters are only pushed down into loading the database if there is no info output.
+        predicates = self.get_predicates() if not self.output_info else None
+        n_mandatory_filters = 2
+        n_pushed_down_filters = len(predicates) - n_mandatory_filters if predicates is not None else 0
+
+        with self.profiler.measure('load'):
+            db = LigandDB.load_from_json(
+                self.ligand_db_path,
+                n_max=self.max_number,
+                use_cache=is_cache_enabled(),
+                predicates=predicates,
+            )
+
+        self.Filter = FilterStage(db, n_processes=self.n_processes)
+
+        self.n_ligands_before = len(self.Filter.database.db) + (sum(predicates.n_rejected) if predicates is not None else 0)
+        # Keep all ligands for the info output. Their overview rows and xyz strings are only generated when the info output is written.
+        self.all_ligands = dict(self.Filter.database.db) if self.output_info else None
+        self.df_all_ligands = None
+
+        with self.profiler.measure('prepare'):
+            # Take over the results of the filters which were already applied with the same settings in an earlier run.
+            prefix_keys = get_filter_prefix_keys(self.ligand_db_path, self.filters, n_max=self.max_number)
+            cached = load_filter_results(prefix_keys, self.Filter.get_names(), n_mandatory_filters) if prefix_keys is not None else None
+            n_cached_filters = -1   # -1 means that not even the mandatory filters are cached
+            if cached is not None:
+                n_cached_filters, failed_at = cached
+                self.Filter.set_failed_positions(failed_at)
+            n_skipped_filters = max(n_pushed_down_filters, n_cached_filters)
+
+            if any(filter[_filter] == _smarts_filter for filter in self.filters[n_skipped_filters:]):
+                # The fingerprints are built for the whole database, so only build them if the whole database is read anyway.
+                fingerprints = read_fingerprints(self.ligand_db_path, build_if_missing=self.max_number is None, n_processes=self.n_processes)
+                if fingerprints is not None:
+                    self.Filter.set_fingerprints(fingerprints)
+            if any(filter[_filter] in (_planarity, _interatomic_distances) for filter in self.filters[n_skipped_filters:]) and can_be_indexed(self.ligand_db_path):
+                # The index stores the planarity and the interatomic distances of all ligands. Same as the fingerprints, only build it if the whole database is read anyway.
+                index = read_index(self.ligand_db_path, build_if_missing=self.max_number is None, with_geometry=True)
+                if index is not None:
+                    self.Filter.set_index(index)
+            if n_skipped_filters < len(self.filters):
+                # The bitsets are cheap to read and only worth building if a filter needs one of their expensive properties.
+                build_bitsets = self.max_number is None and any(filter[_filter] in bitset_filters for filter in self.filters[n_skipped_filters:])
+                bitsets = read_bitsets(self.ligand_db_path, build_if_missing=build_bitsets, n_processes=self.n_processes)
+                if bitsets is not None:
+                    self.Filter.set_bitsets(bitsets)
 
         # mandatory filters
-        self.Filter.filter_charge_confidence(filter_for="confident")
-        self.Filter.filter_unconnected_ligands()
-
-        for idx, filter in tqdm(enumerate(self.filters), desc="Applying filters", unit=" filters", total=len(self.filters), file=sys.stdout):
+        if predicates is None and cached is None:
+            with self.profiler.measure('mandatory'):
+                self.Filter.filter_charge_confidence(filter_for="confident")
+                self.Filter.filter_unconnected_ligands()
+        if predicates is not None:
+            n_ligands_after_mandatory_filters = self.n_ligands_before - sum(predicates.n_rejected[:n_mandatory_filters])
+        else:
+            n_ligands_after_mandatory_filters = self.Filter.get_n_ligands() - sum(self.Filter.get_n_failed(position) for position in range(n_mandatory_filters))
+
+        # The filters are applied in the order of the planner, but each filter is numbered by its position in the order of the user, which gives the same ligands and counts as applying them in the order of the user. The database is sliced only once after all filters.
+        filter_order = [idx for idx in plan_filter_order(self.filters) if idx >= n_skipped_filters]    # pushed down filters were already applied while loading the database
+        for idx in tqdm(filter_order, desc="Applying filters", unit=" filters", file=sys.stdout):
+            self.Filter.set_filter_position(n_mandatory_filters + idx)
+            with self.profiler.measure(idx):
+                self.apply_filter(self.filters[idx])
+        if prefix_keys is not None:
+            save_filter_results(prefix_keys, self.Filter.get_names(), self.Filter.get_failed_positions())
+
+        n_ligands_before = n_ligands_after_mandatory_filters
+        for idx, filter in enumerate(self.filters):
             filtername = filter[_filter]
             unique_filtername = f"Filter {idx+1:02d}: {filtername}"    # name for printing filters for the user
-            n_ligands_before = len(self.Filter.database.db)
-
-            if filtername == _denticities_of_interest:
-                self.Filter.denticity_of_interest_filter(denticity_of_interest=filter[_denticities_of_interest])
-
-            elif filtername == _graph_hash_wm:
-                self.Filter.graph_hash_with_metal_filter(graph_hashes_with_metal=filter[_graph_hash_wm])
-
-            elif filtername == _remove_ligands_with_neighboring_coordinating_atoms:
-                if filter[_remove_ligands_with_neighboring_coordinating_atoms]:
-                    self.Filter.filter_neighbouring_coordinating_atoms(denticities=filter[_denticities])
-
-            elif filtername == _remove_ligands_with_beta_hydrogens:
-                if filter[_remove_ligands_with_beta_hydrogens]:
-                    self.Filter.filter_betaHs(denticities=filter[_denticities])
-
-            # ====== Denticity dependent filters ======
-            elif filtername == _acount:
-                self.Filter.filter_atom_count(min=filter[_acount_min], max=filter[_acount_max], denticities=filter[_denticities])
-
-            elif filtername == _ligcomp:
-                self.Filter.filter_ligand_atoms(
-                    denticity=filter[_denticities],
-                    atoms_of_interest=filter[_ligcomp_atoms_of_interest],
-                    instruction=filter[_ligcomp_instruction])
-
-            elif filtername == _metals_of_interest:
-                self.Filter.metals_of_interest_filter(
-                    denticity=filter[_denticities],
-                    metals_of_interest=filter[_metals_of_interest])
-
-            elif filtername == _ligand_charges:
-                self.Filter.filter_ligand_charges(
-                    denticity=filter[_denticities],
-                    charge=filter[_ligand_charges])
-
-            elif filtername == _coords:
-                self.Filter.filter_coordinating_group_atoms(
-                    denticity=filter[_denticities],
-                    atoms_of_interest=filter[_ligcomp_atoms_of_interest],
-                    instruction=filter[_ligcomp_instruction])
-
-            elif filtername == _mw:
-                self.Filter.filter_molecular_weight(
-                    min=filter[_mw_min],
-                    max=filter[_mw_max],
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _occurrences:
-                self.Filter.filter_occurrences(
-                    min=filter[_min],
-                    max=filter[_max],
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _interatomic_distances:
-                self.Filter.filter_interatomic_distances(
-                    min=filter[_min],
-                    max=filter[_max],
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _planarity:
-                self.Filter.filter_planarity(
-                    min=filter[_min],
-                    max=filter[_max],
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _stoichiometry:  # deprecated
-                self.Filter.stoichiometry_filter(
-                    stoichiometry=filter[_stoichiometry],
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _remove_missing_bond_orders:
-                self.Filter.filter_missing_bond_orders(
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _atm_neighbors:
-                self.Filter.filter_atomic_neighbors(
-                    atom=filter[_atom],
-                    neighbors=filter[_neighbors],
-                    denticities=filter[_denticities]
-                )
-            elif filtername == _smarts_filter:
-                self.Filter.filter_smarts_substructure_search(
-                    smarts=filter[_smarts],
-                    should_be_present=filter[_should_be_present],
-                    include_metal=filter[_include_metal],
-                    denticities=filter[_denticities]
-                )
-            else:
-                raise ValueError(f"Unknown filter: {filtername}")
 
-            # To the dataframe with all ligands, add a column specifying which filter was applied to filter this ligand. This is important for outputting a csv with all filtered out ligands later.
-            ligand_was_filtered = ~self.df_all_ligands.index.isin(self.Filter.database.db.keys()) & (self.df_all_ligands['Filter'].isna())
-            self.df_all_ligands.loc[ligand_was_filtered, 'Filter'] = unique_filtername
+            if idx < n_pushed_down_filters:
+                # Filter was already applied while loading the database, only the numbers are taken over here.
+                n_ligands_after = n_ligands_before - predicates.n_rejected[n_mandatory_filters + idx]
+                applied = 'while loading'
+            else:
+                n_ligands_after = n_ligands_before - self.Filter.get_n_failed(n_mandatory_filters + idx)
+                applied = 'from cache' if idx < n_cached_filters else 'yes'
 
-            n_ligands_after = len(self.Filter.database.db)
             self.filter_tracking.append({
                 "filter": filtername,
                 "unique_filtername": unique_filtername,
                 "n_ligands_before": n_ligands_before,
                 "n_ligands_after": n_ligands_after,
                 "n_ligands_removed": n_ligands_before - n_ligands_after,
+                "applied": applied,
                 "full_filter_options": {name: option for name, option in filter.items() if name != _filter}
             })
+            n_ligands_before = n_ligands_after
+
+        # Rows of the profiling report in the order of the run, with the filters in the order of the user
+        mandatory_applied = 'while loading' if predicates is not None else 'from cache' if cached is not None else 'yes'
+        self.profile_rows = [
+            {'step': 'load', 'name': 'Load ligand db', 'applied': 'yes', 'n_ligands_before': self.n_ligands_before, 'n_ligands_after': self.Filter.get_n_ligands()},
+            {'step': 'prepare', 'name': 'Prepare filters', 'applied': 'yes', 'n_ligands_before': None, 'n_ligands_after': None},
+            {'step': 'mandatory', 'name': 'Mandatory filters', 'applied': mandatory_applied, 'n_ligands_before': self.n_ligands_before, 'n_ligands_after': n_ligands_after_mandatory_filters},
+        ]
+        for idx, tracking in enumerate(self.filter_tracking):
+            self.profile_rows.append({'step': idx, 'name': tracking['unique_filtername'], 'applied': tracking['applied'], 'n_ligands_before': tracking['n_ligands_before'], 'n_ligands_after': tracking['n_ligands_after']})
 
-        self.n_ligands_after = len(self.Filter.database.db)
+        if self.output_info:
+            # Build the dataframe with all ligands and a column specifying which filter filtered out each ligand. This is important for outputting a csv with all filtered out ligands later. Ligands removed by the mandatory filters are attributed to the first applied filter.
+            filter_names = {n_mandatory_filters + idx: tracking['unique_filtername'] for idx, tracking in enumerate(self.filter_tracking)}
+            if n_pushed_down_filters < len(self.filter_tracking):
+                first_applied_filtername = self.filter_tracking[n_pushed_down_filters]['unique_filtername']
+                filter_names.update({position: first_applied_filtername for position in range(n_mandatory_filters)})
+            failed_at = pd.Series(self.Filter.get_failed_positions(), index=self.Filter.get_names())
+            self.df_all_ligands = self.get_ligand_df(self.all_ligands)
+            self.df_all_ligands['Filter'] = failed_at.reindex(self.df_all_ligands.index).map(filter_names)
+
+            # Clean up the ligand df
+            self.df_all_ligands.fillna({'Filter': 'Passed'}, inplace=True)      # fill in 'Passed' for ligands that were not filtered out
+            self.df_all_ligands.set_index('Ligand ID', inplace=True)    # set index to ligand ID, making sure that the column in the csv is named 'Ligand ID'
+            columns = ['Filter'] + [col for col in self.df_all_ligands.columns if col != 'Filter']
+            self.df_all_ligands = self.df_all_ligands[columns]                # move 'Filter' column to the front
+            self.df_all_ligands = self.df_all_ligands.sort_values(by='Filter')# sort by filter name
 
-        # Clean up the ligand df
-        self.df_all_ligands.fillna({'Filter': 'Passed'}, inplace=True)      # fill in 'Passed' for ligands that were not filtered out
-        self.df_all_ligands.set_index('Ligand ID', inplace=True)    # set index to ligand ID, making sure that the column in the csv is named 'Ligand ID'
-        columns = ['Filter'] + [col for col in self.df_all_ligands.columns if col != 'Filter']
-        self.df_all_ligands = self.df_all_ligands[columns]                # move 'Filter' column to the front
-        self.df_all_ligands = self.df_all_ligands.sort_values(by='Filter')# sort by filter name
+        self.n_ligands_after = len(self.Filter.database.db)
 
         return self.Filter.database
 
+    def apply_filter(self, filter: dict) -> None:
+        """
+        Applies a single filter from the input file to the ligands in the filter stage.
+        """
+        filtername = filter[_filter]
+        if filtername == _denticities_of_interest:
+            self.Filter.denticity_of_interest_filter(denticity_of_interest=filter[_denticities_of_interest])
+
+        elif filtername == _graph_hash_wm:
+            self.Filter.graph_hash_with_metal_filter(graph_hashes_with_metal=filter[_graph_hash_wm])
+
+        elif filtername == _remove_ligands_with_neighboring_coordinating_atoms:
+            if filter[_remove_ligands_with_neighboring_coordinating_atoms]:
+                self.Filter.filter_neighbouring_coordinating_atoms(denticities=filter[_denticities])
+
+        elif filtername == _remove_ligands_with_beta_hydrogens:
+            if filter[_remove_ligands_with_beta_hydrogens]:
+                self.Filter.filter_betaHs(denticities=filter[_denticities])
+
+        # ====== Denticity dependent filters ======
+        elif filtername == _acount:
+            self.Filter.filter_atom_count(min=filter[_acount_min], max=filter[_acount_max], denticities=filter[_denticities])
+
+        elif filtername == _ligcomp:
+            self.Filter.filter_ligand_atoms(
+                denticity=filter[_denticities],
+                atoms_of_interest=filter[_ligcomp_atoms_of_interest],
+                instruction=filter[_ligcomp_instruction])
+
+        elif filtername == _metals_of_interest:
+            self.Filter.metals_of_interest_filter(
+                denticity=filter[_denticities],
+                metals_of_interest=filter[_metals_of_interest])
+
+        elif filtername == _ligand_charges:
+            self.Filter.filter_ligand_charges(
+                denticity=filter[_denticities],
+                charge=filter[_ligand_charges])
+
+        elif filtername == _coords:
+            self.Filter.filter_coordinating_group_atoms(
+                denticity=filter[_denticities],
+                atoms_of_interest=filter[_ligcomp_atoms_of_interest],
+                instruction=filter[_ligcomp_instruction])
+
+        elif filtername == _mw:
+            self.Filter.filter_molecular_weight(
+                min=filter[_mw_min],
+                max=filter[_mw_max],
+                denticities=filter[_denticities]
+            )
+        elif filtername == _occurrences:
+            self.Filter.filter_occurrences(
+                min=filter[_min],
+                max=filter[_max],
+                denticities=filter[_denticities]
+            )
+        elif filtername == _interatomic_distances:
+            self.Filter.filter_interatomic_distances(
+                min=filter[_min],
+                max=filter[_max],
+                denticities=filter[_denticities]
+            )
+        elif filtername == _planarity:
+            self.Filter.filter_planarity(
+                min=filter[_min],
+                max=filter[_max],
+                denticities=filter[_denticities]
+            )
+        elif filtername == _stoichiometry:  # deprecated
+            self.Filter.stoichiometry_filter(
+                stoichiometry=filter[_stoichiometry],
+                denticities=filter[_denticities]
+            )
+        elif filtername == _remove_missing_bond_orders:
+            self.Filter.filter_missing_bond_orders(
+                denticities=filter[_denticities]
+            )
+        elif filtername == _atm_neighbors:
+            self.Filter.filter_atomic_neighbors(
+                atom=filter[_atom],
+                neighbors=filter[_neighbors],
+                denticities=filter[_denticities]
+            )
+        elif filtername == _smarts_filter:
+            self.Filter.filter_smarts_substructure_search(
+                smarts=filter[_smarts],
+                should_be_present=filter[_should_be_present],
+                include_metal=filter[_include_metal],
+                denticities=filter[_denticities]
+            )
+        else:
+            raise ValueError(f"Unknown filter: {filtername}")
+
+        return
+
     def get_filter_tracking_string(self) -> str:
         df_filters = pd.DataFrame(self.filter_tracking)
         df_filters = df_filters[['unique_filtername', 'n_ligands_removed', 'n_ligands_after', 'full_filter_options']]
@@ -232,16 +390,37 @@ class LigandFilters(object):
 
         if not self.output_ligand_db_path.parent.exists():
             self.output_ligand_db_path.parent.mkdir(parents=True)
-        filtered_db.to_json(self.output_ligand_db_path, json_lines=True, desc=f'Save ligand db to `{self.output_ligand_db_path.name}`')
+        with self.profiler.measure('save'):
+            filtered_db.to_json(self.output_ligand_db_path, json_lines=True, desc=f'Save ligand db to `{self.output_ligand_db_path.name}`')
 
         self.output = self.get_filter_tracking_string()
 
         # Optionally output filtered ligands info
         if self.output_info:
-            self.save_filtered_ligands_output()
+            with self.profiler.measure('info'):
+                self.save_filtered_ligands_output()
 
         print(self.output)
 
+        if self.profiler.enabled:
+            self.save_profile_report()
+
+        return
+
+    def save_profile_report(self) -> None:
+        """
+        Saves the profiling report of the run as csv and json file to the info directory, or to the directory of the output ligand db if there is no info output, and prints it.
+        """
+        rows = self.profile_rows + [{'step': 'save', 'name': 'Save ligand db', 'applied': 'yes', 'n_ligands_before': None, 'n_ligands_after': self.n_ligands_after}]
+        if self.output_info:
+            rows.append({'step': 'info', 'name': 'Save info output', 'applied': 'yes', 'n_ligands_before': None, 'n_ligands_after': None})
+        report = self.profiler.get_report(rows)
+
+        outdir = self.outdir if self.output_info else self.output_ligand_db_path.parent
+        save_profile_report(report, outdir)
+        print(get_profile_report_string(report))
+        print(f"Profile of the ligand filters saved to directory `{outdir.name}`.")
+
         return
 
     def save_filtered_ligands_output(self) -> None:
@@ -256,7 +435,7 @@ class LigandFilters(object):
         # Save a csv with an overview of all ligands to info directory
         self.df_all_ligands.to_csv(Path(self.outdir, "ligands_overview.csv"), index=True)
 
-        # Save concatenated xyz files
+        # Save concatenated xyz files. The xyz string of each ligand is generated right before it is written, so that they are never all in memory at once.
         modes = ['Passed'] + [filter['unique_filtername'] for filter in self.filter_tracking]
         for mode in modes:
             # Get ligand IDs that were filtered out with this filter or passed
@@ -269,14 +448,19 @@ class LigandFilters(object):
             # Write concatenated xyz file
             with open(xyz_filepath, 'w') as f:
                 for ligand_id in filtered_ligand_ids:
-                    xyz_string = self.all_xyz_strings[ligand_id]
+                    xyz_string = self.all_ligands[ligand_id].get_xyz_file_format_string(comment=None, with_metal=True)
                     f.write(xyz_string)
 
         return
 
-    def get_ligand_df(self):
-        db = self.Filter.database
-        ligands = {uname: ligand.get_ligand_output_info(max_entries=5) for uname, ligand in db.db.items()}
+    def get_ligand_df(self, ligands: Union[dict, None] = None):
+        """
+        Returns a dataframe with the output info of the ligands.
+        :param ligands: Dictionary of {unique name: ligand}. Defaults to the ligands which passed all filters so far.
+        """
+        if ligands is None:
+            ligands = self.Filter.database.db
+        ligands = {uname: ligand.get_ligand_output_info(max_entries=5) for uname, ligand in ligands.items()}
         return pd.DataFrame.from_dict(ligands, orient='index')
 
     def save_ligand_info_csv(self):
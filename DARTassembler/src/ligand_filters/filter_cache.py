@@ -0,0 +1,97 @@
+"""
+Cache of ligand filter results.
+
+Filter input files are usually tuned by running the ligand filters many times on the same database with only the last filters changed. For every run, this module stores for each ligand the position of the first filter it failed, together with a key for each prefix of the filters. The key of a prefix is built from the content hash of the database, the DART version, the maximum number of ligands and the canonical form of the settings of all filters in the prefix. A later run looks up the longest prefix of its filters which it shares with a cached run, takes over which ligands failed the filters in this prefix and only applies the remaining filters.
+
+The results are stored in the persistent cache of `db_cache`, so this cache is disabled together with it.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+from DARTassembler.src.ligand_extraction.db_cache import get_cache_dir, get_content_hash, get_dart_version, load_from_cache, save_to_cache
+from DARTassembler.src.ligand_filters.ligand_property_table import not_failed
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+filter_cache_format_version = 1
+max_cached_runs = 10    # number of runs per database for which the results are kept
+
+
+def _hash(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+def get_filter_prefix_keys(db_path: Union[str, Path], filters: list[dict], n_max: Union[int, None] = None) -> Union[list[str], None]:
+    """
+    Returns the keys of all prefixes of the filters. The first key only stands for the database and the mandatory filters, the key at index i for the mandatory filters and the first i filters.
+    :param db_path: Path to the ligand database
+    :param filters: Filters in the order of the user as read from the filter input file
+    :param n_max: Maximum number of ligands read from the database
+    :return: List of len(filters) + 1 keys or None if the cache is disabled.
+    """
+    if get_cache_dir() is None:
+        return None
+
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    key = _hash({
+        'content_hash': get_content_hash(db_path),
+        'dart_version': get_dart_version(),
+        'n_max': n_max,
+        'format_version': filter_cache_format_version,
+    })
+    keys = [key]
+    for filter in filters:
+        key = _hash({'prefix': key, 'filter': filter})
+        keys.append(key)
+
+    return keys
+
+def _get_cache_key(prefix_keys: list[str]) -> str:
+    # All runs on the same database are stored in one cache entry.
+    return _hash({'filter_results': prefix_keys[0]})
+
+def load_filter_results(prefix_keys: list[str], names: np.ndarray, n_mandatory_filters: int) -> Union[tuple[int, np.ndarray], None]:
+    """
+    Looks up the cached run which shares the longest prefix of filters and contains all given ligands.
+    :param prefix_keys: Keys of all prefixes of the filters from `get_filter_prefix_keys()`
+    :param names: Unique names of the ligands
+    :param n_mandatory_filters: Number of mandatory filters before the filters of the user
+    :return: Number of filters of the user with cached results and for each ligand the position of the first of these filters or of the mandatory filters it failed. None if there are no cached results.
+    """
+    runs = load_from_cache(_get_cache_key(prefix_keys)) or []
+
+    best_run, best_length = None, 0
+    for run in runs:
+        length = 0
+        for key, cached_key in zip(prefix_keys, run['prefix_keys']):
+            if key != cached_key:
+                break
+            length += 1
+        if length > best_length:
+            positions = dict(zip(run['names'].tolist(), run['failed_at'].tolist()))
+            if all(name in positions for name in names.tolist()):     # ligands which were not read in the cached run, e.g. because the filters were applied while loading
+                best_run, best_length = positions, length
+    if best_run is None:
+        return None
+
+    n_cached_filters = best_length - 1
+    failed_at = np.array([best_run[name] for name in names.tolist()], dtype=np.int64)
+    failed_at[failed_at >= n_mandatory_filters + n_cached_filters] = not_failed     # results of later filters might have changed
+
+    return n_cached_filters, failed_at
+
+def save_filter_results(prefix_keys: list[str], names: np.ndarray, failed_at: np.ndarray) -> None:
+    """
+    Stores the results of a run of the ligand filters.
+    :param prefix_keys: Keys of all prefixes of the filters from `get_filter_prefix_keys()`
+    :param names: Unique names of the ligands
+    :param failed_at: For each ligand, the position of the first filter it failed
+    """
+    key = _get_cache_key(prefix_keys)
+    runs = [run for run in (load_from_cache(key) or []) if run['prefix_keys'] != prefix_keys]
+    runs.append({'prefix_keys': prefix_keys, 'names': np.asarray(names), 'failed_at': np.array(failed_at, dtype=np.int64)})
+    save_to_cache(key, runs[-max_cached_runs:])
+
+    return
@@ -0,0 +1,154 @@
+"""
+Profiling of the steps of a ligand filters run.
+
+For each step, e.g. loading the database or applying a filter, the profiler measures the wall time, the CPU time of the main process and the peak memory during the step relative to the memory at its start. The memory is the resident set size of the main process. On Linux, its peak is reset at the start of each step. If this is not permitted, a warning is given. On other Unix systems or if the peak can't be reset, only the growth of the peak of the whole run is measured, which can be smaller than the peak of the step. On Windows, the memory is not measured.
+"""
+import json
+import sys
+import time
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+import pandas as pd
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+profile_csv_filename = 'filter_profile.csv'
+profile_json_filename = 'filter_profile.json'
+_proc_status_path = Path('/proc/self/status')
+_proc_clear_refs_path = Path('/proc/self/clear_refs')
+
+
+def _read_proc_memory() -> Union[tuple[int, int], None]:
+    """
+    Returns the current and the peak resident set size of the process in bytes from the proc filesystem on Linux, or None if it is not available.
+    """
+    try:
+        memory = {}
+        with open(_proc_status_path, 'r') as file:
+            for line in file:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key, value = line.split(':')
+                    memory[key] = int(value.split()[0]) * 1024     # kB
+        return memory['VmRSS'], memory['VmHWM']
+    except (OSError, KeyError, ValueError):
+        return None
+
+def reset_peak_memory() -> Union[int, None]:
+    """
+    Resets the peak memory of the process if possible and returns the memory in bytes from which the peak memory delta is measured, or None if the memory can't be measured.
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            with open(_proc_clear_refs_path, 'w') as file:
+                file.write('5')     # resets the peak resident set size, see `man proc`
+        except OSError as e:
+            warnings.warn(f'DART Warning: The peak memory can\'t be reset because `{_proc_clear_refs_path}` can\'t be written ({e}). The peak memory delta of each step is measured from the peak of the whole run and can be smaller than the peak of the step.')
+        else:
+            memory = _read_proc_memory()
+            if memory is not None:
+                return memory[0]
+
+    return get_peak_memory()
+
+def get_peak_memory() -> Union[int, None]:
+    """
+    Returns the peak memory of the process in bytes since the last reset, or since the start of the process if it can't be reset. None if the memory can't be measured.
+    """
+    memory = _read_proc_memory()
+    if memory is not None:
+        return memory[1]
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)     # bytes on macOS, kB otherwise
+
+    return None
+
+
+class FilterProfiler(object):
+    """
+    Collects the measurements of the steps of a ligand filters run. If disabled, all methods do nothing.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.steps = {}     # step -> measurements
+
+    @contextmanager
+    def measure(self, step: Union[str, int]):
+        """
+        Context manager which measures the code in its block as the given step. Steps must not be nested.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start_memory = reset_peak_memory()
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time, cpu_time = time.perf_counter() - start_wall_time, time.process_time() - start_cpu_time
+            peak_memory = get_peak_memory()
+            self.steps[step] = {
+                'wall_time': wall_time,
+                'cpu_time': cpu_time,
+                'peak_memory_delta': peak_memory - start_memory if start_memory is not None and peak_memory is not None else None,
+            }
+
+    def get_report(self, rows: list[dict]) -> pd.DataFrame:
+        """
+        Returns the report of the run with one row per step.
+        :param rows: One dictionary per row with the keys 'step' (as given to `measure()`), 'name', 'applied', 'n_ligands_before' and 'n_ligands_after'. Steps which were not measured get empty measurements.
+        """
+        report = []
+        for row in rows:
+            measurements = self.steps.get(row['step'], {})
+            report.append({
+                'Step': row['name'],
+                'Applied': row['applied'],
+                'Ligands in': row['n_ligands_before'],
+                'Ligands out': row['n_ligands_after'],
+                'Wall time [s]': measurements.get('wall_time', None),
+                'CPU time [s]': measurements.get('cpu_time', None),
+                'Peak memory delta [MB]': measurements['peak_memory_delta'] / 1e6 if measurements.get('peak_memory_delta', None) is not None else None,
+            })
+
+        report = pd.DataFrame(report)
+        report[['Ligands in', 'Ligands out']] = report[['Ligands in', 'Ligands out']].astype('Int64')     # integers with missing values
+
+        return report
+
+def save_profile_report(report: pd.DataFrame, outdir: Union[str, Path]) -> None:
+    """
+    Saves the profiling report as csv and json file to the output directory.
+    """
+    report.to_csv(Path(outdir, profile_csv_filename), index=False)
+    with open(Path(outdir, profile_json_filename), 'w') as file:
+        json.dump(json.loads(report.to_json(orient='records')), file, indent=4)     # pandas converts NaN to null
+
+    return
+
+def get_profile_report_string(report: pd.DataFrame) -> str:
+    """
+    Returns the profiling report as summary table for printing.
+    """
+    report = report.copy()
+    total = report[['Wall time [s]', 'CPU time [s]']].sum()
+    for column in ('Wall time [s]', 'CPU time [s]'):
+        report[column] = report[column].map(lambda value: '' if pd.isna(value) else f'{value:.3f}')
+    report['Peak memory delta [MB]'] = report['Peak memory delta [MB]'].map(lambda value: '' if pd.isna(value) else f'{value:.1f}')
+    for column in ('Ligands in', 'Ligands out'):
+        report[column] = report[column].astype(object).map(lambda value: '' if pd.isna(value) else f'{value}')
+
+    output = f"{'  Filter Profile  ':=^80}\n"
+    width = report['Step'].str.len().max()
+    output += report.to_string(index=False, justify='center', formatters={'Step': lambda step: f'{step:<{width}}'}) + '\n'
+    output += f"Total wall time:   {total['Wall time [s]']:.3f} s\n"
+    output += f"Total CPU time:    {total['CPU time [s]']:.3f} s (main process only)\n"
+
+    return output
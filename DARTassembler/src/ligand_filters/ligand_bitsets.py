@@ -0,0 +1,114 @@
+"""
+Bitsets of the ligand properties which are used by the common ligand filters.
+
+For each property in `bitset_columns` and each distinct value of it in the database, the bitset file stores a bitset with one bit per ligand which is set if the ligand has this value. The values are the same as the columns of the same name in the `LigandPropertyTable`, e.g. the tuple of donor elements. A filter on one of these properties reduces to the bitwise OR of the bitsets of all values which pass it, see `LigandPropertyTable.get_mask_of_values()`. Properties in `item_bitset_columns` are tuples with many distinct combinations, e.g. the metals in `count_metals`, so they get one bitset per item instead, see `LigandPropertyTable.get_mask_of_any_item()`. Most of these properties are stored in the database anyway, but the beta-hydrogen check needs the graph of every ligand and is by far the most expensive of them.
+
+The bitset file is a sidecar file of the database (`<db filename>.bits`), see `db_sidecars`. Each value is stored as JSON string.
+"""
+import json
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.db_sidecars import write_sidecar, read_sidecar, iterate_ligand_values
+from DARTassembler.src.ligand_extraction.io_custom import NumpyEncoder
+from DARTassembler.src.ligand_filters.ligand_property_table import ligand_columns
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+bitset_suffix = '.bits'
+bitset_cache_subdir = 'bitsets'
+bitset_format_version = 1
+bitset_columns = ('denticity', 'pred_charge', 'pred_charge_is_confident', 'donors', 'has_betaH', 'has_neighboring_coordinating_atoms', 'has_good_bond_orders')
+item_bitset_columns = ('metals',)     # columns with a tuple of items per ligand, with one bitset per item instead of per value
+
+
+def encode_value(value) -> str:
+    return json.dumps(value, cls=NumpyEncoder)
+
+def decode_value(value: str):
+    """
+    Returns the value of a column from its JSON string. Lists are converted back to tuples.
+    """
+    value = json.loads(value)
+    if isinstance(value, list):
+        value = tuple(value)
+
+    return value
+
+def get_ligand_bitset_values(ligand: RCA_Ligand) -> tuple[tuple[str]]:
+    """
+    Returns the JSON strings of the values of all `bitset_columns` and of the items of all `item_bitset_columns` of a ligand.
+    """
+    values = tuple((encode_value(ligand_columns[key][0](ligand)),) for key in bitset_columns)
+    items = tuple(tuple(encode_value(item) for item in ligand_columns[key][0](ligand)) for key in item_bitset_columns)
+
+    return values + items
+
+def build_bitsets(db_path: Union[str, Path], n_processes: Union[int, None] = 1, show_progress: bool = True) -> dict:
+    """
+    Computes the bitsets of all ligands in a database and writes them to the bitset file.
+    :param db_path: Path to the ligand database file. Alternatively, the strings 'metalig' or 'test_metalig' can be used for the default ligand database.
+    :param n_processes: Number of processes for JSON Lines files. If None, all available CPUs are used.
+    :return: Dictionary with the array 'names' and for each column the arrays 'values_<column>' with the distinct values as JSON strings and 'bits_<column>' with the bitsets of these values packed with `np.packbits()`, see `read_bitsets()`.
+    """
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    if db_path is None or not Path(db_path).is_file():
+        raise FileNotFoundError(f"DART Error: Ligand database file not found: '{db_path}'.")
+
+    all_columns = bitset_columns + item_bitset_columns
+    names = []
+    set_bits = {key: ([], []) for key in all_columns}     # codes and indices of the ligands of all set bits
+    distinct_values = {key: {} for key in all_columns}    # JSON string -> code
+    desc = f'Bitsets of ligand db `{Path(db_path).name}`'
+    for idx, (name, ligand_values) in enumerate(iterate_ligand_values(db_path, get_ligand_bitset_values, n_processes=n_processes, show_progress=show_progress, desc=desc)):
+        names.append(name)
+        for key, values in zip(all_columns, ligand_values):
+            for value in values:
+                set_bits[key][0].append(distinct_values[key].setdefault(value, len(distinct_values[key])))
+                set_bits[key][1].append(idx)
+
+    data = {'names': np.array(names, dtype=str)}
+    for key in all_columns:
+        values = list(distinct_values[key])
+        bits = np.zeros((len(values), len(names)), dtype=bool)
+        bits[np.array(set_bits[key][0], dtype=int), np.array(set_bits[key][1], dtype=int)] = True
+        data[f'values_{key}'] = np.array(values, dtype=str)
+        data[f'bits_{key}'] = np.packbits(bits, axis=1)
+    write_sidecar(db_path, bitset_suffix, bitset_cache_subdir, header=_get_header(), data=data)
+
+    return data
+
+def _get_header() -> dict:
+    return {'format_version': bitset_format_version, 'columns': encode_value([bitset_columns, item_bitset_columns])}
+
+def read_bitsets(db_path: Union[str, Path], build_if_missing: bool = False, n_processes: Union[int, None] = 1) -> Union[dict, None]:
+    """
+    Reads the bitsets of a ligand database.
+    :param db_path: Path to the ligand database file. Alternatively, the strings 'metalig' or 'test_metalig' can be used for the default ligand database.
+    :param build_if_missing: If True, the bitsets are built if they don't exist or are outdated. This needs to build all ligands of the database once.
+    :param n_processes: Number of processes for building the bitsets. If None, all available CPUs are used.
+    :return: Dictionary with the names of the ligands and the values and bitsets of each column, see `build_bitsets()`. None if there are no valid bitsets and build_if_missing is False.
+    """
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    if db_path is None or not Path(db_path).is_file():
+        return None
+
+    bitsets = read_sidecar(db_path, bitset_suffix, bitset_cache_subdir, header=_get_header())
+    if bitsets is not None:
+        return bitsets
+
+    if build_if_missing:
+        return build_bitsets(db_path, n_processes=n_processes)
+
+    return None
+
+def get_value_bitsets(bitsets: dict, key: str) -> tuple[list, np.ndarray]:
+    """
+    Returns the distinct values or items of a column and their bitsets as boolean array with shape (n_values, n_ligands).
+    """
+    values = [decode_value(value) for value in bitsets[f'values_{key}'].tolist()]
+    bits = np.unpackbits(bitsets[f'bits_{key}'], axis=1, count=len(bitsets['names'])).astype(bool)
+
+    return values, bits
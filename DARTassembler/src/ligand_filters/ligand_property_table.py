@@ -0,0 +1,385 @@
+"""
+Columnar table of ligand properties for the FilterStage.
+
+Each ligand filter only looks at one or two properties per ligand. Instead of looping over the database dictionary in each filter and rebuilding the dictionary afterwards, the FilterStage keeps one table with a column per property. Each filter is evaluated as a boolean mask over the columns, and the database dictionary is sliced only once in the end.
+
+For every ligand, the table stores the position of the first filter it failed. Filters are numbered in the order given by the user and a filter is only evaluated on the ligands which didn't fail any filter before it in this order. Therefore, the filters can be applied in any order and still give the same ligands and the same number of removed ligands per filter as if they had been applied in the order of the user.
+
+Columns are computed on first use and only for the ligands which are still needed, so that expensive properties like the planarity or the SMILES are never computed for ligands which were filtered out before, the same as with the old filters. Conditions on properties with only few distinct values, like the donor elements, are evaluated once per distinct value. The geometric properties are stored in the byte-offset index of the database, from which they can be taken over with `set_index()`.
+
+The SMILES strings are by far the most expensive properties, so they are computed by a pool of processes for many ligands. The RDKit molecules parsed from them are kept in the table, so that several SMARTS filters share them. If the substructure screening fingerprints of the database are set, SMARTS filters only build the SMILES strings of ligands which can contain the pattern. Similarly, if the bitsets of the database are set, filters on the common ligand properties like the donor elements or the metals are evaluated with bitwise operations.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Callable
+
+import numpy as np
+from rdkit import Chem
+
+from DARTassembler.src.constants.Periodic_Table import DART_Element
+from DARTassembler.src.ligand_extraction.Molecule import pseudo_metal
+from DARTassembler.src.ligand_extraction.atomic_props import get_positions
+from DARTassembler.src.ligand_extraction.utilities_Molecule import get_rdkit_mol_from_smiles, get_interatomic_distance_range
+from DARTassembler.src.ligand_extraction.db_fingerprints import fingerprint_variants, get_smarts_fingerprint, can_contain_pattern
+from DARTassembler.src.ligand_extraction.db_index import index_columns, geometry_index_columns
+from DARTassembler.src.ligand_extraction.io_custom import get_n_processes
+
+not_failed = np.iinfo(np.int64).max     # position of the first failed filter of ligands which passed all filters
+
+
+def get_n_electrons(ligand) -> float:
+    """
+    Returns the number of electrons of the ligand with a negative sign, same as in the original even/odd electron filter.
+    """
+    electrons = 0
+    for atom in ligand.atomic_props['atoms']:
+        electrons += DART_Element(atom).atomic_number
+
+    return electrons * (-1) + ligand.pred_charge
+
+def get_monodentate_angle(ligand) -> float:
+    """
+    Returns the angle in degrees between the vector from the origin to the coordinating atom and the vector from the coordinating atom to the centroid of a monodentate ligand.
+    """
+    x_centroid_list = []
+    y_centroid_list = []
+    z_centroid_list = []
+    for atom_index in ligand.coordinates:
+        atom_pos = ligand.coordinates[atom_index]
+        x_centroid_list.append(atom_pos[1][0])
+        y_centroid_list.append(atom_pos[1][1])
+        z_centroid_list.append(atom_pos[1][2])
+
+    coord_atom_pos = np.array(ligand.coordinates[ligand.ligand_to_metal[0]][1])
+    centre_of_points = np.array([sum(x_centroid_list) / len(x_centroid_list), sum(y_centroid_list) / len(y_centroid_list), sum(z_centroid_list) / len(z_centroid_list)])
+
+    v1 = coord_atom_pos
+    v2 = centre_of_points
+    v3 = v2 - v1
+    if all(v1 != v2):
+        cosine = np.dot(v1 * (-1), v3) / (np.linalg.norm(v1 * (-1)) * np.linalg.norm(v3))
+        angle = np.degrees(np.arccos(cosine))
+    else:
+        angle = 180
+
+    return angle
+
+def factorize(values: Union[np.ndarray, list]) -> tuple[np.ndarray, list]:
+    """
+    Returns the code of each value and the list of distinct values in order of appearance. Unlike `pandas.factorize()`, None stays None.
+    """
+    distinct = {}
+    codes = np.fromiter((distinct.setdefault(value, len(distinct)) for value in values), dtype=int, count=len(values))
+
+    return codes, list(distinct)
+
+
+# Columns of the table: name -> (function which gets the value from a ligand, numpy dtype of the column)
+ligand_columns = {
+    'denticity': (lambda ligand: ligand.denticity, float),
+    'pred_charge': (lambda ligand: ligand.pred_charge, float),
+    'pred_charge_is_confident': (lambda ligand: ligand.pred_charge_is_confident, object),
+    'donors': (lambda ligand: tuple(sorted(ligand.local_elements)), object),
+    'atoms': (lambda ligand: tuple(sorted(ligand.atomic_props['atoms'])), object),
+    'stoichiometry': (lambda ligand: ligand.stoichiometry, object),
+    'metals': (lambda ligand: tuple(ligand.count_metals), object),
+    'graph_hash_with_metal': (lambda ligand: ligand.graph_hash_with_metal, object),
+    'n_atoms': (lambda ligand: ligand.n_atoms, float),
+    'molecular_weight': (lambda ligand: ligand.global_props['molecular_weight'], float),
+    'occurrences': (lambda ligand: ligand.occurrences, float),
+    'n_electrons': (get_n_electrons, float),
+    'planarity': (lambda ligand: ligand.calculate_planarity(), float),
+    'interatomic_distance_range': (lambda ligand: get_interatomic_distance_range(get_positions(ligand.atomic_props)), object),
+    'monodentate_angle': (get_monodentate_angle, float),
+    'has_betaH': (lambda ligand: ligand.betaH_check(), object),
+    'has_neighboring_coordinating_atoms': (lambda ligand: ligand.check_for_neighboring_coordinating_atoms(), object),
+    'has_good_bond_orders': (lambda ligand: ligand.has_good_bond_orders, object),
+    'smiles': (lambda ligand: ligand.get_smiles(with_metal=None), object),
+    'smiles_with_metal': (lambda ligand: ligand.get_smiles(with_metal=pseudo_metal), object),
+}
+# Columns which are expensive enough to be worth sending the ligands to other processes
+parallel_columns = ['smiles', 'smiles_with_metal']
+min_ligands_per_process = 50
+
+
+def _get_column_values(args: tuple) -> list:
+    """
+    Worker function for `LigandPropertyTable.get_column()`. Returns the values of a column in `ligand_columns` for the given ligands.
+    """
+    key, ligands = args
+    getter = ligand_columns[key][0]
+
+    return [getter(ligand) for ligand in ligands]
+
+
+class LigandPropertyTable(object):
+    """
+    Table of ligand properties with one row per ligand in the order of the database dictionary, and the position of the first filter which each ligand failed.
+    """
+
+    def __init__(self, db: dict, n_processes: Union[int, None] = 1):
+        """
+        :param db: Dictionary of the ligand database
+        :param n_processes: Number of processes used to compute the columns in `parallel_columns`. If None, all available CPUs are used.
+        """
+        self.db = db    # dictionary the table was built from
+        self.n_processes = n_processes
+        self.names = np.array(list(db.keys()), dtype=object)
+        self.ligands = list(db.values())
+        self.failed_at = np.full(len(self.names), not_failed, dtype=np.int64)
+        self.position = 0   # position of the current filter in the order of the user
+        self.columns = {}
+        self.computed = {}
+        self.rdkit_mols = {}    # SMILES string -> RDKit molecule
+        self.fingerprints = None    # substructure screening fingerprints, see `set_fingerprints()`
+        self.fingerprint_valid = None
+        self.bitsets = {}   # column -> (distinct values, bitsets in the order of the table packed with np.packbits()), see `set_bitsets()`
+        self.item_bitsets = {}  # column -> (distinct items, bitsets in the order of the table packed with np.packbits())
+        self.bitset_known = np.zeros(len(self.names), dtype=bool)   # ligands which are in the bitsets
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def passed(self) -> np.ndarray:
+        """
+        Mask of the ligands which passed all filters so far.
+        """
+        return self.failed_at == not_failed
+
+    @property
+    def candidates(self) -> np.ndarray:
+        """
+        Mask of the ligands on which the current filter has to be evaluated, i.e. which didn't fail any filter before the current position.
+        """
+        return self.failed_at > self.position
+
+    def get_n_passed(self) -> int:
+        return int(self.passed.sum())
+
+    def get_n_failed(self, position: int) -> int:
+        """
+        Returns the number of ligands for which the filter at this position was the first one they failed.
+        """
+        return int((self.failed_at == position).sum())
+
+    def get_column(self, key: str, rows: Union[np.ndarray, None] = None, getter: Union[Callable, None] = None, dtype: type = object) -> np.ndarray:
+        """
+        Returns the column of a ligand property. The values are only computed for the given rows and only once per ligand. Values of other rows are undefined.
+        :param key: Name of the column, either one in `ligand_columns` or a custom one if `getter` is given.
+        :param rows: Boolean mask of the rows for which the values are needed. Defaults to all candidates of the current filter.
+        :param getter: Function which gets the value from a ligand, only needed for columns which are not in `ligand_columns`.
+        :param dtype: Numpy dtype of a custom column, either float or object.
+        """
+        if getter is None:
+            getter, dtype = ligand_columns[key]
+        self.add_column(key, dtype)
+
+        column = self.columns[key]
+        computed = self.computed[key]
+        rows = self.candidates if rows is None else rows
+        missing = np.flatnonzero(rows & ~computed)
+        if key in parallel_columns and getter is ligand_columns[key][0]:
+            values = self.compute_values_in_parallel(key, missing)
+        else:
+            values = (getter(self.ligands[idx]) for idx in missing)
+        for idx, value in zip(missing, values):
+            column[idx] = np.nan if value is None and dtype is float else value
+        computed[missing] = True
+
+        return column
+
+    def add_column(self, key: str, dtype: type) -> None:
+        """
+        Adds an empty column if it doesn't exist yet.
+        """
+        if key not in self.columns:
+            self.columns[key] = np.full(len(self), np.nan) if dtype is float else np.full(len(self), None, dtype=object)
+            self.computed[key] = np.zeros(len(self), dtype=bool)
+
+    def set_index(self, index: dict) -> None:
+        """
+        Takes over the planarity and the range of interatomic distances which are stored in the byte-offset index of the database as returned by `read_index(with_geometry=True)`, so that they are not computed again. These properties are computed as usual for ligands which are not in the index.
+        """
+        planarity_col, min_distance_col, max_distance_col = ((index_columns + geometry_index_columns).index(col) for col in ('planarity', 'min_distance', 'max_distance'))
+        self.add_column('planarity', float)
+        self.add_column('interatomic_distance_range', object)
+        for idx, name in enumerate(self.names.tolist()):
+            entry = index.get(name)
+            if entry is None or entry[planarity_col] is None:
+                continue
+            self.columns['planarity'][idx] = entry[planarity_col]
+            self.columns['interatomic_distance_range'][idx] = (entry[min_distance_col], entry[max_distance_col])
+            self.computed['planarity'][idx] = True
+            self.computed['interatomic_distance_range'][idx] = True
+
+    def compute_values_in_parallel(self, key: str, idc: np.ndarray) -> list:
+        """
+        Computes the values of a column in `ligand_columns` for the ligands at the given indices using a pool of processes. Falls back to a single process if there are only few ligands.
+        """
+        ligands = [self.ligands[idx] for idx in idc]
+        n_processes = min(get_n_processes(self.n_processes), len(ligands) // min_ligands_per_process)
+        if n_processes <= 1:
+            return _get_column_values((key, ligands))
+
+        # Use more chunks than processes to balance the load.
+        n_chunks = min(4 * n_processes, len(ligands) // min_ligands_per_process)
+        chunks = np.array_split(np.arange(len(ligands)), n_chunks)
+        args = [(key, ligands[chunk[0]:chunk[-1] + 1]) for chunk in chunks]
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            values = [value for chunk_values in executor.map(_get_column_values, args) for value in chunk_values]   # map() returns results in order
+
+        return values
+
+    def get_rdkit_mol(self, smiles: str) -> Chem.Mol:
+        """
+        Returns the RDKit molecule of a SMILES string. Each SMILES string is only parsed once per table.
+        """
+        mol = self.rdkit_mols.get(smiles)
+        if mol is None:
+            mol = self.rdkit_mols[smiles] = get_rdkit_mol_from_smiles(smiles)
+
+        return mol
+
+    def set_fingerprints(self, fingerprints: dict) -> None:
+        """
+        Sets the substructure screening fingerprints of the ligands as returned by `read_fingerprints()`. Ligands which are not in the fingerprints are never screened.
+        """
+        positions = {name: idx for idx, name in enumerate(fingerprints['names'].tolist())}
+        idc = np.array([positions.get(name, -1) for name in self.names], dtype=int)
+        known = idc >= 0
+        self.fingerprints = np.zeros((len(self),) + fingerprints['fingerprints'].shape[1:], dtype=np.uint64)
+        self.fingerprints[known] = fingerprints['fingerprints'][idc[known]]
+        self.fingerprint_valid = np.full((len(self), len(fingerprint_variants)), None, dtype=object)     # None if unknown
+        self.fingerprint_valid[known] = fingerprints['valid'][idc[known]]
+
+    def set_bitsets(self, bitsets: dict) -> None:
+        """
+        Sets the bitsets of the ligand properties as returned by `read_bitsets()`. The columns of these properties are taken over from the bitsets and filters on them are evaluated as bitwise OR of the bitsets of the passing values. Ligands which are not in the bitsets are computed as usual.
+        """
+        from DARTassembler.src.ligand_filters.ligand_bitsets import bitset_columns, item_bitset_columns, get_value_bitsets     # imported here because the bitsets module depends on this module
+
+        positions = {name: idx for idx, name in enumerate(bitsets['names'].tolist())}
+        idc = np.array([positions.get(name, -1) for name in self.names], dtype=int)
+        self.bitset_known = idc >= 0
+        known_idc = np.flatnonzero(self.bitset_known)
+        self.bitsets, self.item_bitsets = {}, {}
+        for key in bitset_columns + item_bitset_columns:
+            values, db_bits = get_value_bitsets(bitsets, key)
+            bits = np.zeros((len(values), len(self)), dtype=bool)
+            bits[:, known_idc] = db_bits[:, idc[known_idc]]
+            if key in item_bitset_columns:
+                self.item_bitsets[key] = (values, np.packbits(bits, axis=1))
+                continue
+            self.bitsets[key] = (values, np.packbits(bits, axis=1))
+
+            # Each ligand has exactly one of the values
+            dtype = ligand_columns[key][1]
+            self.add_column(key, dtype)
+            value_array = np.empty(len(values), dtype=object)
+            for code, value in enumerate(values):
+                value_array[code] = np.nan if value is None and dtype is float else value
+            self.columns[key][known_idc] = value_array[bits[:, known_idc].argmax(axis=0)] if len(values) > 0 else []
+            self.computed[key][known_idc] = True
+
+    def screen_smarts_pattern(self, smarts: str, with_metal: Union[str, None], rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Screens the ligands in the given rows with their fingerprints. Returns the mask of ligands without valid SMILES string and the mask of ligands which can't contain the SMARTS pattern. Both are empty if no fingerprints are set.
+        :param with_metal: Metal which the ligands are connected to, either None or the pseudo metal.
+        """
+        no_smiles = np.zeros(len(self), dtype=bool)
+        no_match = np.zeros(len(self), dtype=bool)
+        if self.fingerprints is None:
+            return no_smiles, no_match
+
+        variant = fingerprint_variants.index(with_metal)
+        valid = self.fingerprint_valid[:, variant]
+        known = rows & (valid != None)
+        has_fingerprint = known & (valid == True)
+        no_smiles[known & ~has_fingerprint] = True
+        no_match[has_fingerprint] = ~can_contain_pattern(self.fingerprints[has_fingerprint, variant], get_smarts_fingerprint(smarts))
+
+        return no_smiles, no_match
+
+    def get_rows(self, denticities: Union[list, None] = None) -> np.ndarray:
+        """
+        Returns the mask of all candidates of the current filter which have one of the given denticities.
+        """
+        rows = self.candidates
+        if denticities is None:
+            return rows
+
+        return rows & np.isin(self.get_column('denticity', rows), denticities)
+
+    def get_mask_of_values(self, key: str, check: Callable, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the mask of all ligands in the given rows for which `check(value)` is True. The check is done only once per distinct value of the column. If the column has bitsets, the mask of the ligands in the bitsets is the bitwise OR of the bitsets of all values which pass the check.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        if key in self.bitsets:
+            values, bits = self.bitsets[key]
+            passing = [code for code, value in enumerate(values) if bool(check(value))]
+            if len(passing) > 0:
+                mask = np.unpackbits(np.bitwise_or.reduce(bits[passing], axis=0), count=len(self)).astype(bool)
+            mask &= rows
+            rows = rows & ~self.bitset_known
+
+        idx = np.flatnonzero(rows)
+        codes, values = factorize(self.get_column(key, rows)[idx])
+        results = np.array([bool(check(value)) for value in values], dtype=bool)
+        mask[idx] = results[codes]
+
+        return mask
+
+    def get_mask_of_any_item(self, key: str, items: list, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the mask of all ligands in the given rows whose value of the column, a tuple of items, contains any of the given items. If the column has item bitsets, the mask of the ligands in the bitsets is the bitwise OR of the bitsets of the items.
+        """
+        if not key in self.item_bitsets:
+            return self.get_mask_of_values(key, lambda value: any(item in value for item in items), rows)
+
+        values, bits = self.item_bitsets[key]
+        codes = [code for code, value in enumerate(values) if value in items]
+        mask = np.zeros(len(self), dtype=bool)
+        if len(codes) > 0:
+            mask = np.unpackbits(np.bitwise_or.reduce(bits[codes], axis=0), count=len(self)).astype(bool)
+        mask &= rows
+        unknown = rows & ~self.bitset_known
+        if unknown.any():
+            mask |= self.get_mask_of_values(key, lambda value: any(item in value for item in items), unknown)
+
+        return mask
+
+    def remove(self, mask: np.ndarray) -> None:
+        """
+        Marks all candidates in the mask as filtered out by the filter at the current position. Afterwards, the position moves on to the next filter, so that filters which are applied one after another without setting the position are numbered in the order they are applied.
+        """
+        self.failed_at[mask & self.candidates] = self.position
+        self.position += 1
+
+    def get_passed_db(self) -> dict:
+        """
+        Returns the database dictionary with only the ligands which passed.
+        """
+        return {name: ligand for name, ligand, passed in zip(self.names, self.ligands, self.passed) if passed}
+
+    def get_passed_table(self, db: dict) -> 'LigandPropertyTable':
+        """
+        Returns a new table of only the ligands which passed, which keeps all computed columns. `db` must be the dictionary returned by `get_passed_db()`.
+        """
+        table = LigandPropertyTable.__new__(LigandPropertyTable)
+        table.db = db
+        table.n_processes = self.n_processes
+        table.rdkit_mols = self.rdkit_mols
+        table.fingerprints = self.fingerprints[self.passed] if self.fingerprints is not None else None
+        table.fingerprint_valid = self.fingerprint_valid[self.passed] if self.fingerprint_valid is not None else None
+        table.bitsets = {key: (values, np.packbits(np.unpackbits(bits, axis=1, count=len(self))[:, self.passed], axis=1)) for key, (values, bits) in self.bitsets.items()}
+        table.item_bitsets = {key: (values, np.packbits(np.unpackbits(bits, axis=1, count=len(self))[:, self.passed], axis=1)) for key, (values, bits) in self.item_bitsets.items()}
+        table.bitset_known = self.bitset_known[self.passed]
+        table.names = self.names[self.passed]
+        table.ligands = [ligand for ligand, passed in zip(self.ligands, self.passed) if passed]
+        table.columns = {key: column[self.passed] for key, column in self.columns.items()}
+        table.computed = {key: computed[self.passed] for key, computed in self.computed.items()}
+        table.failed_at = np.full(len(table.names), not_failed, dtype=np.int64)
+        table.position = 0
+
+        return table
@@ -0,0 +1,284 @@
+"""
+Binary columnar format for ligand databases.
+
+A binary ligand database is a directory (suffix `.ligdb`) which contains:
+    - meta.json: format version, number of ligands and the names and dtypes of all columns
+    - columns/<name>.npy: one array per scalar ligand property (denticity, pred_charge, ...)
+    - coords.npy, atomic_numbers.npy, atom_offsets.npy: the coordinates and elements of all ligands concatenated into single arrays. The atoms of ligand i are at atom_offsets[i]:atom_offsets[i+1].
+    - records.jsonlines, record_offsets.npy: all remaining, nested ligand properties (graph, stats, ...) as one json line per ligand and the byte offset of each line for random access.
+    - history.jsonlines, history_offsets.npy: the bulky information about all occurrences of each ligand in the CSD (`identical_ligand_info` etc.). This is kept separate because it makes up most of the file size but is rarely needed, so it can be skipped when loading.
+
+All arrays are memory-mapped on loading, so that opening a database is almost instantaneous and only the parts which are actually accessed are read from disk.
+"""
+import json
+import sys
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from ase.data import atomic_numbers, chemical_symbols
+from tqdm import tqdm
+
+from DARTassembler.src.metalig.compressed_db import open_ligand_db_file
+
+binary_ligand_db_suffix = '.ligdb'
+binary_ligand_db_format_version = 1
+_meta_filename = 'meta.json'
+_columns_dirname = 'columns'
+_records_filename = 'records.jsonlines'
+_history_filename = 'history.jsonlines'
+
+# Scalar ligand properties which are stored as columns. Properties are only stored as columns if they are present in every ligand of the database, otherwise they stay in the json records.
+column_dtypes = {
+    'unique_name': str,
+    'name': str,
+    'denticity': np.int16,
+    'pred_charge': np.float64,
+    'pred_charge_is_confident': np.bool_,
+    'n_atoms': np.int32,
+    'n_hydrogens': np.int32,
+    'occurrences': np.int32,
+    'stoichiometry': str,
+    'graph_hash': str,
+    'graph_hash_with_metal': str,
+    'heavy_atoms_graph_hash_with_metal': str,
+    'has_betaH': np.bool_,
+    'has_neighboring_coordinating_atoms': np.bool_,
+    'has_good_bond_orders': np.bool_,
+    'local_elements': list,  # donor atoms, stored as comma separated string
+}
+_coordinate_keys = ('x', 'y', 'z')
+# Bulky ligand properties which are stored separately from the other json records.
+history_keys = ('identical_ligand_info', 'all_ligand_names', 'all_ligands_metals')
+
+
+def is_binary_ligand_db(path: Union[str, Path]) -> bool:
+    """
+    Checks if the path points to a binary ligand database.
+    """
+    try:
+        path = Path(path)
+    except TypeError:
+        return False
+
+    return path.is_dir() and Path(path, _meta_filename).is_file()
+
+def get_binary_ligand_db_path(path: Union[str, Path]) -> Path:
+    """
+    Returns the default path of the binary version of a jsonlines ligand database, which lives next to the jsonlines file.
+    """
+    path = Path(path)
+    if path.suffix == '.bz2':
+        path = path.with_suffix('')
+
+    return path.with_suffix(binary_ligand_db_suffix)
+
+def _is_column_value(value, dtype) -> bool:
+    if dtype is list:
+        return isinstance(value, list) and all(isinstance(el, str) and not ',' in el for el in value)
+    if dtype is str:
+        return isinstance(value, str)
+    if dtype is np.bool_:
+        return isinstance(value, bool)
+    if np.issubdtype(dtype, np.integer):
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _iterate_over_jsonlines_records(path: Path, show_progress: bool, desc: str):
+    with open_ligand_db_file(path) as file:
+        for line in tqdm(file, disable=not show_progress, desc=desc, file=sys.stdout, unit=' ligands'):
+            if line.strip():
+                line = json.loads(line)
+                yield line['key'], line['value']
+
+def convert_jsonlines_to_binary_ligand_db(input_path: Union[str, Path], output_path: Union[str, Path, None] = None, show_progress: bool = True) -> Path:
+    """
+    Converts a ligand database in jsonlines format, either uncompressed or bz2 compressed, into the binary columnar format. The jsonlines file is read twice so that it never has to be held in memory completely.
+    :param input_path: Path to the jsonlines ligand database.
+    :param output_path: Path to the output directory. Defaults to the input path with suffix `.ligdb`.
+    :return: Path to the binary ligand database.
+    """
+    input_path = Path(input_path)
+    if not input_path.is_file():
+        raise FileNotFoundError(f"DART Error: Ligand database file not found: '{input_path}'.")
+    output_path = Path(output_path) if output_path is not None else get_binary_ligand_db_path(input_path)
+    if output_path.exists() and not is_binary_ligand_db(output_path):
+        raise FileExistsError(f"DART Error: Output path '{output_path}' exists and is not a binary ligand database.")
+
+    # First pass: find out which properties can be stored as columns and how many atoms there are in total.
+    columns = dict(column_dtypes)
+    n_ligands, n_total_atoms = 0, 0
+    for _, mol in _iterate_over_jsonlines_records(input_path, show_progress, desc='Scan ligand db'):
+        n_ligands += 1
+        n_total_atoms += len(mol['atomic_props']['atoms'])
+        for key, dtype in list(columns.items()):
+            if key not in mol or not _is_column_value(mol[key], dtype):
+                del columns[key]
+
+    # Second pass: fill the columns and write everything else into the json records.
+    column_values = {key: [] for key in columns}
+    coords = np.empty((n_total_atoms, 3), dtype=np.float64)
+    elements = np.empty(n_total_atoms, dtype=np.uint8)
+    atom_offsets = np.zeros(n_ligands + 1, dtype=np.int64)
+    record_offsets = np.zeros(n_ligands, dtype=np.int64)
+    history_offsets = np.zeros(n_ligands, dtype=np.int64)
+
+    Path(output_path, _columns_dirname).mkdir(parents=True, exist_ok=True)
+    with open(Path(output_path, _records_filename), 'wb') as records_file, open(Path(output_path, _history_filename), 'wb') as history_file:
+        for idx, (name, mol) in enumerate(_iterate_over_jsonlines_records(input_path, show_progress, desc='Convert ligand db')):
+            atomic_props = mol['atomic_props']
+            start = atom_offsets[idx]
+            end = start + len(atomic_props['atoms'])
+            atom_offsets[idx + 1] = end
+            coords[start:end] = np.array([atomic_props[key] for key in _coordinate_keys], dtype=np.float64).T
+            elements[start:end] = [atomic_numbers[el] for el in atomic_props['atoms']]
+
+            record = {key: value for key, value in mol.items() if not key in columns and not key in history_keys}
+            history = {key: value for key, value in mol.items() if key in history_keys}
+            record['atomic_props'] = {key: value for key, value in atomic_props.items() if not key in _coordinate_keys + ('atoms',)}
+            for key, dtype in columns.items():
+                column_values[key].append(','.join(mol[key]) if dtype is list else mol[key])
+
+            record_offsets[idx] = records_file.tell()
+            records_file.write((json.dumps({'key': name, 'value': record}) + '\n').encode('utf-8'))
+            history_offsets[idx] = history_file.tell()
+            history_file.write((json.dumps(history) + '\n').encode('utf-8'))
+
+    np.save(Path(output_path, 'coords.npy'), coords)
+    np.save(Path(output_path, 'atomic_numbers.npy'), elements)
+    np.save(Path(output_path, 'atom_offsets.npy'), atom_offsets)
+    np.save(Path(output_path, 'record_offsets.npy'), record_offsets)
+    np.save(Path(output_path, 'history_offsets.npy'), history_offsets)
+    for key, dtype in columns.items():
+        np.save(Path(output_path, _columns_dirname, f'{key}.npy'), np.array(column_values[key], dtype=str if dtype is list else dtype))
+
+    meta = {
+        'format_version': binary_ligand_db_format_version,
+        'n_ligands': n_ligands,
+        'n_atoms': n_total_atoms,
+        'columns': {key: 'list' if dtype is list else np.dtype(dtype).name for key, dtype in columns.items()},
+        'source': input_path.name,
+    }
+    with open(Path(output_path, _meta_filename), 'w') as file:
+        json.dump(meta, file, indent=2)
+
+    return output_path
+
+
+class BinaryLigandDB(object):
+    """
+    Read-only access to a binary ligand database. All arrays are memory-mapped, so that instantiating this class is cheap and scalar properties of all ligands can be read without parsing any json.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        if not is_binary_ligand_db(self.path):
+            raise FileNotFoundError(f"DART Error: '{self.path}' is not a binary ligand database.")
+        with open(Path(self.path, _meta_filename), 'r') as file:
+            self.meta = json.load(file)
+        if self.meta['format_version'] != binary_ligand_db_format_version:
+            raise ValueError(f"DART Error: Binary ligand database '{self.path}' has format version {self.meta['format_version']}, but this version of DART can only read version {binary_ligand_db_format_version}. Please convert the jsonlines database again.")
+
+        self.coords = self._load_array('coords.npy')
+        self.atomic_numbers = self._load_array('atomic_numbers.npy')
+        self.atom_offsets = self._load_array('atom_offsets.npy')
+        self.record_offsets = self._load_array('record_offsets.npy')
+        self.history_offsets = self._load_array('history_offsets.npy')
+        self.columns = {key: self._load_array(_columns_dirname, f'{key}.npy') for key in self.meta['columns']}
+
+    def _load_array(self, *relpath) -> np.ndarray:
+        return np.load(Path(self.path, *relpath), mmap_mode='r', allow_pickle=False)
+
+    def __len__(self) -> int:
+        return self.meta['n_ligands']
+
+    def get_column(self, key: str) -> np.ndarray:
+        """
+        Returns the values of a scalar ligand property for all ligands. Donor atoms (`local_elements`) are returned as comma separated strings.
+        """
+        try:
+            return self.columns[key]
+        except KeyError:
+            raise KeyError(f"Property '{key}' is not stored as column in binary ligand database '{self.path}'. Available columns are {list(self.columns.keys())}.")
+
+    def get_coordinates(self, idx: int) -> np.ndarray:
+        return np.asarray(self.coords[self.atom_offsets[idx]:self.atom_offsets[idx + 1]])
+
+    def get_elements(self, idx: int) -> list:
+        return [chemical_symbols[num] for num in self.atomic_numbers[self.atom_offsets[idx]:self.atom_offsets[idx + 1]].tolist()]
+
+    def get_column_values(self, idx: int) -> dict:
+        """
+        Returns the values of all columns of the ligand at index idx as python objects.
+        """
+        values = {}
+        for key, dtype in self.meta['columns'].items():
+            value = self.columns[key][idx].item()
+            if dtype == 'list':
+                value = value.split(',') if value != '' else []
+            values[key] = value
+
+        return values
+
+    def _get_mol_dict_from_record(self, idx: int, record: dict, column_values: Union[dict, None] = None) -> dict:
+        """
+        Merges the json record of a ligand with its columns and coordinates into the original ligand dictionary.
+        """
+        mol = record
+        coords = self.get_coordinates(idx)
+        atomic_props = {key: coords[:, i].tolist() for i, key in enumerate(_coordinate_keys)}
+        atomic_props['atoms'] = self.get_elements(idx)
+        atomic_props.update(mol.get('atomic_props', {}))
+        mol['atomic_props'] = atomic_props
+        mol.update(column_values if column_values is not None else self.get_column_values(idx))
+
+        return mol
+
+    def get_mol_dict(self, idx: int, with_history: bool = True) -> tuple[str, dict]:
+        """
+        Returns the unique name and the full ligand dictionary of the ligand at index idx by seeking directly to its record.
+        :param with_history: If False, the bulky properties in `history_keys` are not loaded.
+        """
+        with open(Path(self.path, _records_filename), 'rb') as file:
+            file.seek(self.record_offsets[idx])
+            line = json.loads(file.readline())
+        if with_history:
+            with open(Path(self.path, _history_filename), 'rb') as file:
+                file.seek(self.history_offsets[idx])
+                line['value'].update(json.loads(file.readline()))
+
+        return line['key'], self._get_mol_dict_from_record(idx, line['value'])
+
+    def iterate(self, n_max: Union[int, None] = None, show_progress: bool = False, with_history: bool = True) -> tuple[str, dict]:
+        """
+        Iterates over all ligands in file order and yields the unique name and full ligand dictionary of each ligand.
+        :param with_history: If False, the bulky properties in `history_keys` are not loaded, which makes loading several times faster.
+        """
+        n = len(self) if n_max is None or n_max is False or n_max is np.inf else min(int(n_max), len(self))
+        # Reading whole columns at once is much faster than reading single values from the memory-mapped arrays.
+        columns = {key: np.asarray(self.columns[key][:n]).tolist() for key in self.meta['columns']}
+        list_columns = [key for key, dtype in self.meta['columns'].items() if dtype == 'list']
+        history_file = open(Path(self.path, _history_filename), 'rb') if with_history else None
+        try:
+            with open(Path(self.path, _records_filename), 'rb') as file:
+                for idx in tqdm(range(n), disable=not show_progress, desc='Load binary ligand db', file=sys.stdout, unit=' ligands'):
+                    line = json.loads(file.readline())
+                    if with_history:
+                        line['value'].update(json.loads(history_file.readline()))
+                    column_values = {key: values[idx] for key, values in columns.items()}
+                    for key in list_columns:
+                        column_values[key] = column_values[key].split(',') if column_values[key] != '' else []
+                    yield line['key'], self._get_mol_dict_from_record(idx, line['value'], column_values)
+        finally:
+            if history_file is not None:
+                history_file.close()
+
+        return
+
+
+if __name__ == '__main__':
+
+    from DARTassembler.src.constants.Paths import test_ligand_db_path
+    outpath = convert_jsonlines_to_binary_ligand_db(test_ligand_db_path)
+    db = BinaryLigandDB(outpath)
+    print(f'Converted {len(db)} ligands to {outpath}.')
@@ -0,0 +1,201 @@
+"""
+Direct access to bz2 compressed ligand databases.
+
+Compressed JSON Lines databases (`.jsonlines.bz2`) are read as streams, so they never have to be decompressed to disk. For random access, every line of a compressed file is located by a virtual offset, which combines the byte offset of the bz2 stream in which the line starts with the position of the line in the decompressed stream. Reading a line at a virtual offset only decompresses from the start of its bz2 stream.
+
+A normal bz2 file consists of a single stream, so reading a line would mean decompressing everything before it. A block-compressed ligand database is a valid bz2 file which consists of many small, independently compressed streams, each of which contains only complete lines. It can be read by every bz2 tool, but random access only needs to decompress one small block. Use `compress_ligand_db_to_blocked_bz2()` to write one.
+"""
+import bz2
+import json
+import sys
+from pathlib import Path
+from typing import Union, Iterable
+
+from tqdm import tqdm
+
+bz2_suffix = '.bz2'
+default_block_size = 250_000    # uncompressed bytes per bz2 stream. Compresses only about 1% worse than a single stream, but random access is about 100 times faster.
+_bz2_magic = b'BZh'
+_chunk_size = 256 * 1024
+_stream_offset_shift = 48   # virtual offset = (stream offset << 48) | position in the decompressed stream
+_max_block_stream_size = 1024 * 1024    # compressed size up to which the first bz2 stream counts as block
+
+
+def is_bz2_file(path: Union[str, Path]) -> bool:
+    """
+    Checks if the path points to a bz2 compressed file.
+    """
+    try:
+        path = Path(path)
+        if not path.is_file():
+            return False
+        with open(path, 'rb') as file:
+            return file.read(len(_bz2_magic)) == _bz2_magic
+    except (TypeError, OSError):
+        return False
+
+def open_ligand_db_file(path: Union[str, Path]):
+    """
+    Opens a ligand database file for reading in binary mode and decompresses it on the fly if it is bz2 compressed.
+    """
+    if is_bz2_file(path):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+def is_block_compressed_bz2_file(path: Union[str, Path]) -> bool:
+    """
+    Checks if a bz2 file consists of small streams, so that random access is fast. Only the first stream is checked, which is cheap because decompressing is stopped after a few blocks for single stream files.
+    """
+    decompressor = bz2.BZ2Decompressor()
+    with open(path, 'rb') as file:
+        while file.tell() < _max_block_stream_size:
+            data = file.read(_chunk_size)
+            if not data:
+                return True     # small file
+            decompressor.decompress(data)
+            if decompressor.eof:
+                return True
+
+    return False
+
+def make_virtual_offset(stream_offset: int, position: int) -> int:
+    return (stream_offset << _stream_offset_shift) | position
+
+def split_virtual_offset(offset: int) -> tuple[int, int]:
+    return offset >> _stream_offset_shift, offset & ((1 << _stream_offset_shift) - 1)
+
+def _iterate_decompressed_chunks(file, start: int = 0) -> tuple[int, int, bytes]:
+    """
+    Decompresses a bz2 file with possibly several streams starting at the stream at byte offset `start`. Yields the byte offset of the current stream, the position of the chunk in the decompressed stream and the decompressed chunk.
+    """
+    file.seek(start)
+    stream_offset = data_offset = start
+    decompressor = bz2.BZ2Decompressor()
+    position = 0
+    data = b''
+    while True:
+        if not data:
+            data = file.read(_chunk_size)
+            if not data:
+                return
+        chunk = decompressor.decompress(data)
+        if chunk:
+            yield stream_offset, position, chunk
+            position += len(chunk)
+        if decompressor.eof:
+            # The rest of the data belongs to the next stream.
+            unused_data = decompressor.unused_data
+            stream_offset = data_offset = data_offset + len(data) - len(unused_data)
+            data = unused_data
+            decompressor = bz2.BZ2Decompressor()
+            position = 0
+        else:
+            data_offset += len(data)
+            data = b''
+
+def iterate_lines_with_offsets(path: Union[str, Path]) -> tuple[int, bytes]:
+    """
+    Iterates over all lines of a file and yields the offset and the line. The offset is the byte offset for uncompressed files and the virtual offset for bz2 compressed files.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(_bz2_magic)) != _bz2_magic:
+            file.seek(0)
+            offset = 0
+            for line in iter(file.readline, b''):
+                yield offset, line
+                offset += len(line)
+            return
+
+        pending, pending_offset = b'', None
+        for stream_offset, position, chunk in _iterate_decompressed_chunks(file):
+            start = 0
+            while start < len(chunk):
+                if pending_offset is None:
+                    pending_offset = make_virtual_offset(stream_offset, position + start)
+                end = chunk.find(b'\n', start)
+                if end == -1:
+                    pending += chunk[start:]
+                    break
+                yield pending_offset, pending + chunk[start:end + 1]
+                pending, pending_offset = b'', None
+                start = end + 1
+        if pending:
+            yield pending_offset, pending
+
+    return
+
+def read_lines_at_offsets(path: Union[str, Path], offsets: Iterable[int]) -> bytes:
+    """
+    Reads the lines at the given offsets as obtained from `iterate_lines_with_offsets()` and yields them.
+    """
+    with open(path, 'rb') as file:
+        compressed = file.read(len(_bz2_magic)) == _bz2_magic
+        for offset in offsets:
+            if not compressed:
+                file.seek(offset)
+                yield file.readline()
+                continue
+
+            stream_offset, position = split_virtual_offset(offset)
+            line = b''
+            for _, chunk_position, chunk in _iterate_decompressed_chunks(file, start=stream_offset):
+                # The line might continue in the next streams, for which the positions start at 0 again.
+                if not line and chunk_position + len(chunk) <= position:
+                    continue
+                chunk = chunk[max(position - chunk_position, 0):] if not line else chunk
+                end = chunk.find(b'\n')
+                if end != -1:
+                    line += chunk[:end + 1]
+                    break
+                line += chunk
+            yield line
+
+    return
+
+def compress_ligand_db_to_blocked_bz2(input_path: Union[str, Path], output_path: Union[str, Path, None] = None, block_size: int = default_block_size, compresslevel: int = 9, show_progress: bool = True) -> Path:
+    """
+    Compresses a JSON Lines ligand database into a block-compressed bz2 file, which consists of independent bz2 streams of about `block_size` uncompressed bytes with only complete lines. The byte-offset index of the compressed file is written as well.
+    :param input_path: Path to the JSON Lines ligand database, either uncompressed or bz2 compressed.
+    :param output_path: Path to the output file. Defaults to the input path with suffix `.bz2`.
+    :param block_size: Minimal number of uncompressed bytes per bz2 stream. Smaller blocks make random access faster, but compress a bit worse.
+    :return: Path to the block-compressed file.
+    """
+    # Imported here because the index module depends on this module.
+    from DARTassembler.src.ligand_extraction.db_index import get_index_entry, write_index
+
+    input_path = Path(input_path)
+    if not input_path.is_file():
+        raise FileNotFoundError(f"DART Error: Ligand database file not found: '{input_path}'.")
+    output_path = Path(output_path) if output_path is not None else Path(str(input_path) + bz2_suffix)
+    if output_path.resolve() == input_path.resolve():
+        raise ValueError(f"DART Error: The output path must be different from the input path '{input_path}'.")
+
+    index_entries = {}
+    block, block_entries = [], []
+    with open_ligand_db_file(input_path) as input_file, open(output_path, 'wb') as output_file:
+
+        def write_block():
+            stream_offset = output_file.tell()
+            for key, position, value in block_entries:
+                index_entries[key] = get_index_entry(make_virtual_offset(stream_offset, position), value)
+            output_file.write(bz2.compress(b''.join(block), compresslevel))
+
+        position = 0
+        for line in tqdm(input_file, disable=not show_progress, desc='Compress ligand db', file=sys.stdout, unit=' ligands'):
+            if not line.strip():
+                continue
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            entry = json.loads(line)
+            block.append(line)
+            block_entries.append((entry['key'], position, entry['value']))
+            position += len(line)
+            if position >= block_size:
+                write_block()
+                block, block_entries, position = [], [], 0
+        if block:
+            write_block()
+
+    write_index(output_path, index_entries)
+
+    return output_path
@@ -1,26 +1,64 @@
+import functools
 from pathlib import Path
 from typing import Union
 
 from DARTassembler.src.constants.Paths import default_ligand_db_path, test_ligand_db_path
+from DARTassembler.src.metalig.binary_db import is_binary_ligand_db, get_binary_ligand_db_path
+from DARTassembler.src.metalig.compressed_db import bz2_suffix
+from DARTassembler.src.metalig.sqlite_db import get_sqlite_ligand_db_path
 
 
+@functools.lru_cache(maxsize=None)
+def get_trusted_ligand_db_paths() -> frozenset[Path]:
+    """
+    Returns the resolved paths of the ligand databases shipped with DART, i.e. the MetaLig and the test MetaLig database, and of their compressed, binary and SQLite versions in the data directory of DART.
+    """
+    paths = set()
+    for path in (default_ligand_db_path, test_ligand_db_path):
+        path = Path(path).resolve()
+        paths.update([path, Path(str(path) + bz2_suffix), get_binary_ligand_db_path(path), get_sqlite_ligand_db_path(path)])
+
+    return frozenset(paths)
+
+def is_trusted_ligand_db(path: Union[str, Path]) -> bool:
+    """
+    Checks if the path is one of the ligand databases shipped with DART. Ligands from these databases can be restored without recomputing and checking their properties. All other files are untrusted, whatever their name.
+    """
+    return Path(path).resolve() in get_trusted_ligand_db_paths()
+
+def get_preferred_ligand_db_format(path: Union[str, Path]) -> Path:
+    """
+    Returns the path to the binary version of a jsonlines ligand database if it exists and is up to date, otherwise the path to the jsonlines file itself. If the jsonlines file only exists bz2 compressed, the path to the compressed file is returned, which is read directly as stream.
+    """
+    path = Path(path)
+    binary_path = get_binary_ligand_db_path(path)
+    if is_binary_ligand_db(binary_path):
+        if not path.is_file() or Path(binary_path, 'meta.json').stat().st_mtime >= path.stat().st_mtime:
+            return binary_path
+
+    compressed_path = Path(str(path) + bz2_suffix)
+    if not path.exists() and compressed_path.is_file():
+        return compressed_path
+
+    return path
+
 def get_correct_ligand_db_path_from_input(path) -> Union[Path]:
     """
     Returns either a valid path to a ligand database file or None if the path is not valid.
     """
     path = str(path)
     if path.lower() in ('', 'none', 'null', 'default', 'metalig'):
-        path = default_ligand_db_path
-        assert Path(path).is_file(), f"Default ligand database file '{path}' not found."
+        path = get_preferred_ligand_db_format(default_ligand_db_path)
+        assert Path(path).exists(), f"Default ligand database file '{path}' not found."
     elif path.lower() in ('test_metalig', 'test'):
-        path = test_ligand_db_path
-        assert Path(path).is_file(), f"Test ligand database file '{path}' not found."
+        path = get_preferred_ligand_db_format(test_ligand_db_path)
+        assert Path(path).exists(), f"Test ligand database file '{path}' not found."
     else:
         try:
             path = Path(path)
         except TypeError:
             raise ValueError(f"Invalid ligand database path string '{path}'.")
-        if not path.is_file():
+        if not (path.is_file() or is_binary_ligand_db(path)):
             raise FileNotFoundError(f"Ligand database filepath not found: '{path}'.")
 
     return Path(path)
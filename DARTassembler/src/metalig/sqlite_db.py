@@ -0,0 +1,314 @@
+"""
+SQLite format for ligand databases.
+
+A SQLite ligand database is a single file (suffix `.sqlite`) with the tables:
+    - meta: format version, number of ligands and the name of the source file
+    - ligands: one row per ligand with the unique name and the indexed scalar properties denticity, pred_charge, pred_charge_is_confident, donor atoms, graph_hash_with_metal, n_atoms and molecular_weight
+    - records: the full ligand dictionary of each ligand as json blob
+
+The scalar properties are stored separately from the bulky json records, so that queries only touch the small `ligands` table. Ligand predicates are translated into SQL, so that loading a filtered database is an indexed query instead of a scan in python. The file is opened read-only, so that several processes and users can query the same file at once without loading it into memory.
+"""
+import json
+import math
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+from tqdm import tqdm
+
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates
+from DARTassembler.src.metalig.compressed_db import open_ligand_db_file
+
+sqlite_ligand_db_suffix = '.sqlite'
+sqlite_ligand_db_format_version = 1
+_sqlite_header = b'SQLite format 3\x00'
+
+# Indexed columns of the `ligands` table. Donor atoms are stored three times as comma separated strings: in the original order, sorted, and as sorted set of elements.
+_column_definitions = {
+    'unique_name': 'TEXT NOT NULL',
+    'denticity': 'INTEGER',
+    'pred_charge': 'REAL',
+    'pred_charge_is_confident': 'INTEGER',
+    'donors': 'TEXT',
+    'sorted_donors': 'TEXT',
+    'donor_set': 'TEXT',
+    'graph_hash_with_metal': 'TEXT',
+    'n_atoms': 'INTEGER',
+    'molecular_weight': 'REAL',
+}
+_indices = {
+    'unique_name': ('unique_name',),
+    'denticity_charge': ('denticity', 'pred_charge'),
+    'pred_charge': ('pred_charge',),
+    'pred_charge_is_confident': ('pred_charge_is_confident',),
+    'sorted_donors': ('sorted_donors',),
+    'donor_set': ('donor_set',),
+    'graph_hash_with_metal': ('graph_hash_with_metal',),
+    'n_atoms': ('n_atoms',),
+    'molecular_weight': ('molecular_weight',),
+}
+
+
+def is_sqlite_ligand_db(path: Union[str, Path]) -> bool:
+    """
+    Checks if the path points to a SQLite ligand database.
+    """
+    try:
+        path = Path(path)
+        if not path.is_file():
+            return False
+        with open(path, 'rb') as file:
+            return file.read(len(_sqlite_header)) == _sqlite_header
+    except (TypeError, OSError):
+        return False
+
+def get_sqlite_ligand_db_path(path: Union[str, Path]) -> Path:
+    """
+    Returns the default path of the SQLite version of a jsonlines ligand database, which lives next to the jsonlines file.
+    """
+    path = Path(path)
+    if path.suffix == '.bz2':
+        path = path.with_suffix('')
+
+    return path.with_suffix(sqlite_ligand_db_suffix)
+
+def get_ligand_row(name: str, mol: dict) -> tuple:
+    """
+    Returns the values of all columns of the `ligands` table for a raw ligand dictionary. Missing properties are stored as NULL.
+    """
+    donors = mol.get('local_elements')
+    pred_charge = mol.get('pred_charge')
+    confident = mol.get('pred_charge_is_confident')
+    row = (
+        name,
+        mol.get('denticity'),
+        None if pred_charge is None or math.isnan(pred_charge) else pred_charge,
+        None if confident is None else int(bool(confident)),
+        None if donors is None else ','.join(donors),
+        None if donors is None else ','.join(sorted(donors)),
+        None if donors is None else ','.join(sorted(set(donors))),
+        mol.get('graph_hash_with_metal'),
+        mol.get('n_atoms'),
+        mol.get('global_props', {}).get('molecular_weight'),
+    )
+
+    return row
+
+def convert_jsonlines_to_sqlite_ligand_db(input_path: Union[str, Path], output_path: Union[str, Path, None] = None, show_progress: bool = True, batch_size: int = 1000) -> Path:
+    """
+    Converts a ligand database in jsonlines format, either uncompressed or bz2 compressed, into a SQLite ligand database. The jsonlines file is streamed, so that it never has to be held in memory completely.
+    :param input_path: Path to the jsonlines ligand database.
+    :param output_path: Path to the output file. Defaults to the input path with suffix `.sqlite`. An existing SQLite ligand database is overwritten.
+    :param batch_size: Number of ligands inserted per transaction.
+    :return: Path to the SQLite ligand database.
+    """
+    input_path = Path(input_path)
+    if not input_path.is_file():
+        raise FileNotFoundError(f"DART Error: Ligand database file not found: '{input_path}'.")
+    output_path = Path(output_path) if output_path is not None else get_sqlite_ligand_db_path(input_path)
+    if output_path.exists() and not is_sqlite_ligand_db(output_path):
+        raise FileExistsError(f"DART Error: Output path '{output_path}' exists and is not a SQLite ligand database.")
+
+    # Write to a temporary file first so that readers of an existing database never see a half-written file.
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f'{output_path.name}.tmp')
+    tmp_path.unlink(missing_ok=True)
+    columns = ', '.join(f'{key} {definition}' for key, definition in _column_definitions.items())
+    placeholders = ', '.join('?' * (len(_column_definitions) + 1))
+    n_ligands = 0
+    try:
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            connection.execute(f'CREATE TABLE ligands (idx INTEGER PRIMARY KEY, {columns})')
+            connection.execute('CREATE TABLE records (idx INTEGER PRIMARY KEY, record BLOB NOT NULL)')
+
+            rows, records = [], []
+            with open_ligand_db_file(input_path) as file:
+                for line in tqdm(file, disable=not show_progress, desc='Convert ligand db', file=sys.stdout, unit=' ligands'):
+                    if not line.strip():
+                        continue
+                    line = json.loads(line)
+                    rows.append((n_ligands, *get_ligand_row(line['key'], line['value'])))
+                    records.append((n_ligands, json.dumps(line['value']).encode('utf-8')))
+                    n_ligands += 1
+                    if len(rows) >= batch_size:
+                        with connection:
+                            connection.executemany(f'INSERT INTO ligands VALUES ({placeholders})', rows)
+                            connection.executemany('INSERT INTO records VALUES (?, ?)', records)
+                        rows, records = [], []
+
+            with connection:
+                connection.executemany(f'INSERT INTO ligands VALUES ({placeholders})', rows)
+                connection.executemany('INSERT INTO records VALUES (?, ?)', records)
+                # Indices are created after inserting all ligands, which is much faster than updating them for every row.
+                for name, index_columns in _indices.items():
+                    connection.execute(f'CREATE INDEX idx_{name} ON ligands ({", ".join(index_columns)})')
+                meta = {'format_version': sqlite_ligand_db_format_version, 'n_ligands': n_ligands, 'source': input_path.name}
+                connection.executemany('INSERT INTO meta VALUES (?, ?)', [(key, json.dumps(value)) for key, value in meta.items()])
+            connection.execute('ANALYZE')
+        finally:
+            connection.close()
+        tmp_path.replace(output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return output_path
+
+def get_predicates_sql(predicates: LigandPredicates) -> Union[list[tuple[str, list]], None]:
+    """
+    Translates each condition of the predicates into a SQL expression on the `ligands` table. Returns None if any condition can't be translated. NULL values, i.e. missing properties, fail every condition.
+    """
+    try:
+        return [(f'COALESCE(({sql}), 0)', params) for sql, params in (condition.get_sql() for condition in predicates.conditions)]
+    except NotImplementedError:
+        return None
+
+
+class SQLiteLigandDB(object):
+    """
+    Read-only access to a SQLite ligand database. The database file is opened read-only, so that any number of processes can read it at the same time.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        if not is_sqlite_ligand_db(self.path):
+            raise FileNotFoundError(f"DART Error: '{self.path}' is not a SQLite ligand database.")
+        self._connection = None
+        try:
+            self.meta = {key: json.loads(value) for key, value in self.connection.execute('SELECT key, value FROM meta')}
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"DART Error: '{self.path}' is not a valid SQLite ligand database: {e}")
+        if self.meta['format_version'] != sqlite_ligand_db_format_version:
+            raise ValueError(f"DART Error: SQLite ligand database '{self.path}' has format version {self.meta['format_version']}, but this version of DART can only read version {sqlite_ligand_db_format_version}. Please convert the jsonlines database again.")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(f'{self.path.resolve().as_uri()}?mode=ro', uri=True)
+        return self._connection
+
+    def __getstate__(self):
+        # Connections can't be pickled, they are opened again when needed.
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def __len__(self) -> int:
+        return self.meta['n_ligands']
+
+    @staticmethod
+    def _get_n_max_sql(n_max: Union[int, None]) -> tuple[str, list]:
+        """
+        Returns the SQL condition which selects the first n_max ligands. The row indices can have gaps, e.g. after ligands were removed with a delta, so the first rows are selected with LIMIT.
+        """
+        if n_max is None or n_max is False or n_max is np.inf:
+            return '1', []
+        return 'idx IN (SELECT idx FROM ligands ORDER BY idx LIMIT ?)', [int(n_max)]
+
+    @staticmethod
+    def _get_index_record(row: tuple) -> dict:
+        """
+        Returns the cheap ligand properties of a row of the `ligands` table as python objects in the same format as in the ligand dictionary.
+        """
+        name, denticity, pred_charge, confident, donors, graph_hash_with_metal, n_atoms = row
+        record = {
+            'unique_name': name,
+            'denticity': denticity,
+            'pred_charge': np.nan if pred_charge is None else pred_charge,
+            'pred_charge_is_confident': None if confident is None else bool(confident),
+            'local_elements': None if donors is None else (donors.split(',') if donors != '' else []),
+            'graph_hash_with_metal': graph_hash_with_metal,
+            'n_atoms': n_atoms,
+        }
+
+        return {key: value for key, value in record.items() if value is not None}
+
+    def count_rejected(self, predicates: LigandPredicates, n_max: Union[int, None] = None) -> list[int]:
+        """
+        Returns the number of ligands rejected by each condition of the predicates, where each ligand is attributed to the first condition it fails.
+        """
+        conditions = get_predicates_sql(predicates)
+        n_rejected = [0] * len(predicates)
+        if conditions is None:
+            raise NotImplementedError('Not all conditions can be translated to SQL.')
+        if len(conditions) == 0:
+            return n_rejected
+        n_max_sql, params = self._get_n_max_sql(n_max)
+        cases = ' '.join(f'WHEN NOT {sql} THEN {idx}' for idx, (sql, _) in enumerate(conditions))
+        params = [param for _, condition_params in conditions for param in condition_params] + params
+        for failed, count in self.connection.execute(f'SELECT CASE {cases} ELSE -1 END AS failed, COUNT(*) FROM ligands WHERE {n_max_sql} GROUP BY failed', params):
+            if failed >= 0:
+                n_rejected[failed] = count
+
+        return n_rejected
+
+    def iterate_index_records(self, n_max: Union[int, None] = None, predicates: Union[LigandPredicates, None] = None, show_progress: bool = False) -> tuple[str, dict, int]:
+        """
+        Iterates over all ligands in file order and yields the unique name, the cheap properties and the row index of each ligand. If predicates are given, only passing ligands are yielded and the rejected ligands are counted in `predicates.n_rejected`. The predicates are evaluated by SQLite using the indices if possible, otherwise in python on the cheap properties and, if needed, on the full ligand dictionaries.
+        """
+        where, params = self._get_n_max_sql(n_max)
+        conditions = get_predicates_sql(predicates) if predicates is not None else []
+        if conditions is not None and len(conditions) > 0:
+            counts = self.count_rejected(predicates, n_max=n_max)
+            predicates.n_rejected = [n + count for n, count in zip(predicates.n_rejected, counts)]
+            where = ' AND '.join([where] + [sql for sql, _ in conditions])
+            params = params + [param for _, condition_params in conditions for param in condition_params]
+
+        query = f'SELECT idx, unique_name, denticity, pred_charge, pred_charge_is_confident, donors, graph_hash_with_metal, n_atoms FROM ligands WHERE {where} ORDER BY idx'
+        for idx, *row in tqdm(self.connection.execute(query, params), disable=not show_progress, desc=f'Load ligand db `{self.path.name}`', file=sys.stdout, unit=' ligands'):
+            record = self._get_index_record(row)
+            if conditions is None:
+                try:
+                    failed = predicates.get_first_failed(record)
+                except KeyError:
+                    failed = predicates.get_first_failed(self.get_mol_dict(idx)[1])
+                if failed is not None:
+                    predicates.n_rejected[failed] += 1
+                    continue
+            yield record['unique_name'], record, idx
+
+        return
+
+    def get_mol_dict(self, idx: int) -> tuple[str, dict]:
+        """
+        Returns the unique name and the full ligand dictionary of the ligand at row index idx.
+        """
+        row = self.connection.execute('SELECT ligands.unique_name, records.record FROM ligands JOIN records USING (idx) WHERE idx = ?', (int(idx),)).fetchone()
+        if row is None:
+            raise IndexError(f"DART Error: No ligand with index {idx} in SQLite ligand database '{self.path}'.")
+
+        return row[0], json.loads(row[1])
+
+    def get_idx(self, unique_name: str) -> Union[int, None]:
+        """
+        Returns the row index of the first ligand with this unique name or None if there is no such ligand.
+        """
+        row = self.connection.execute('SELECT idx FROM ligands WHERE unique_name = ? ORDER BY idx LIMIT 1', (unique_name,)).fetchone()
+        return None if row is None else row[0]
+
+    def iterate(self, n_max: Union[int, None] = None, predicates: Union[LigandPredicates, None] = None, show_progress: bool = False) -> tuple[str, dict]:
+        """
+        Iterates over all ligands in file order and yields the unique name and full ligand dictionary of each ligand. If predicates are given, only passing ligands are yielded, see `iterate_index_records()`.
+        """
+        if predicates is not None:
+            for name, _, idx in self.iterate_index_records(n_max=n_max, predicates=predicates, show_progress=show_progress):
+                yield self.get_mol_dict(idx)
+            return
+
+        where, params = self._get_n_max_sql(n_max)
+        query = f'SELECT ligands.unique_name, records.record FROM ligands JOIN records USING (idx) WHERE {where} ORDER BY idx'
+        for name, record in tqdm(self.connection.execute(query, params), disable=not show_progress, desc=f'Load ligand db `{self.path.name}`', file=sys.stdout, unit=' ligands'):
+            yield name, json.loads(record)
+
+        return
+
+
+if __name__ == '__main__':
+
+    from DARTassembler.src.constants.Paths import test_ligand_db_path
+    outpath = convert_jsonlines_to_sqlite_ligand_db(test_ligand_db_path)
+    db = SQLiteLigandDB(outpath)
+    print(f'Converted {len(db)} ligands to {outpath}.')
@@ -0,0 +1,98 @@
+"""
+Benchmark of the array-backed ligand graphs (`ArrayGraph`) against the networkx graphs: memory per ligand graph, pickling, graph hashing, connectivity checks and merging of ligand graphs into a complex graph.
+"""
+import pickle
+import random
+import time
+import tracemalloc
+from copy import deepcopy
+
+import networkx as nx
+
+from DARTassembler.src.assembly.TransitionMetalComplex import TransitionMetalComplex
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.array_graph import ArrayGraph
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json
+from DARTassembler.src.ligand_extraction.utilities_graph import get_graph_hash, graph_from_graph_dict
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def time_per_call(function, args: list, n_repeats: int=3) -> float:
+    """
+    Returns the best time per call in seconds over several repeats.
+    """
+    best = float('inf')
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        for arg in args:
+            function(arg)
+        best = min(best, (time.perf_counter() - start) / len(args))
+
+    return best
+
+def memory_per_graph(build_function, mol_dicts: list[dict]) -> float:
+    """
+    Returns the memory in bytes per graph which is kept alive by the built graphs.
+    """
+    graph_dicts = [deepcopy(mol_dict['graph_dict']) for mol_dict in mol_dicts]     # graph_from_graph_dict() modifies the dicts in place
+    tracemalloc.start()
+    graphs = [build_function(graph_dict) for graph_dict in graph_dicts]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return memory / len(graphs)
+
+def benchmark_array_graph(db_path='test_metalig', n_max: int=1000, n_complexes: int=500, n_repeats: int=3) -> dict:
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    mol_dicts = [mol_dict for _, mol_dict in iterate_over_json(db_path, n_max=n_max, show_progress=False)]
+    nx_ligands = [RCA_Ligand.read_from_mol_dict(deepcopy(mol_dict)) for mol_dict in mol_dicts]
+    array_ligands = [RCA_Ligand.read_from_trusted_mol_dict(deepcopy(mol_dict)) for mol_dict in mol_dicts]
+    nx_graphs = [ligand.graph for ligand in nx_ligands]
+    array_graphs = [ligand.array_graph for ligand in array_ligands]
+
+    # Random combinations of connected ligands as for the assembly of complexes
+    random.seed(0)
+    idc_connected = [idx for idx, ligand in enumerate(nx_ligands) if ligand.denticity > 0]
+    combinations = [random.sample(idc_connected, random.randint(1, 4)) for _ in range(n_complexes)]
+    nx_combinations = [{i: nx_ligands[idx] for i, idx in enumerate(comb)} for comb in combinations]
+    array_combinations = [{i: array_ligands[idx] for i, idx in enumerate(comb)} for comb in combinations]
+
+    results = {
+        'memory bytes/graph': (
+            memory_per_graph(graph_from_graph_dict, mol_dicts),
+            memory_per_graph(ArrayGraph.from_graph_dict, mol_dicts),
+        ),
+        'pickle µs/graph': (
+            time_per_call(lambda graph: pickle.loads(pickle.dumps(graph)), nx_graphs, n_repeats=n_repeats) * 1e6,
+            time_per_call(lambda graph: pickle.loads(pickle.dumps(graph)), array_graphs, n_repeats=n_repeats) * 1e6,
+        ),
+        'graph hash µs/graph': (
+            time_per_call(get_graph_hash, nx_graphs, n_repeats=n_repeats) * 1e6,
+            time_per_call(get_graph_hash, array_graphs, n_repeats=n_repeats) * 1e6,
+        ),
+        'is_connected µs/graph': (
+            time_per_call(nx.is_connected, [graph for graph in nx_graphs if len(graph) > 0], n_repeats=n_repeats) * 1e6,
+            time_per_call(lambda graph: graph.is_connected(), [graph for graph in array_graphs if len(graph) > 0], n_repeats=n_repeats) * 1e6,
+        ),
+        'merge µs/complex': (
+            time_per_call(lambda ligands: TransitionMetalComplex.merge_graph_from_ligands(ligands, 'Fe'), nx_combinations, n_repeats=n_repeats) * 1e6,
+            time_per_call(lambda ligands: TransitionMetalComplex.merge_array_graph_from_ligands(ligands, 'Fe'), array_combinations, n_repeats=n_repeats) * 1e6,
+        ),
+    }
+
+    print(f'Graphs of {len(mol_dicts)} ligands from `{db_path.name}` (best of {n_repeats}):')
+    print(f'    {"": <25}{"networkx":>12}{"ArrayGraph":>12}{"ratio":>8}')
+    for name, (nx_value, array_value) in results.items():
+        print(f'    {name: <25}{nx_value:12.1f}{array_value:12.1f}{nx_value / array_value:7.1f}x')
+
+    return results
+
+
+if __name__ == '__main__':
+
+    db_path = 'test_metalig'
+    n_max = 1000
+    n_complexes = 500
+    n_repeats = 3
+
+    benchmark_array_graph(db_path=db_path, n_max=n_max, n_complexes=n_complexes, n_repeats=n_repeats)
@@ -0,0 +1,50 @@
+"""
+Benchmark of the per-ligand construction cost of RCA_Ligand from stored ligand dictionaries, comparing the normal constructor `RCA_Ligand.read_from_mol_dict()` with the trusted fast path `RCA_Ligand.read_from_trusted_mol_dict()`.
+The json decoding is done beforehand and not part of the timings.
+"""
+import time
+from copy import deepcopy
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def time_construction(read_function, mol_dicts: list[dict], n_repeats: int=3) -> float:
+    """
+    Returns the best time per ligand in seconds over several repeats.
+    """
+    best = float('inf')
+    for _ in range(n_repeats):
+        dicts = deepcopy(mol_dicts)     # the constructors modify the dicts in place
+        start = time.perf_counter()
+        for mol_dict in dicts:
+            read_function(mol_dict)
+        best = min(best, (time.perf_counter() - start) / len(dicts))
+
+    return best
+
+def benchmark_ligand_construction(db_path='test_metalig', n_max: int=1000, n_repeats: int=3) -> dict:
+    db_path = get_correct_ligand_db_path_from_input(db_path)
+    mol_dicts = [mol_dict for _, mol_dict in iterate_over_json(db_path, n_max=n_max, show_progress=False)]
+
+    results = {
+        'read_from_mol_dict': time_construction(RCA_Ligand.read_from_mol_dict, mol_dicts, n_repeats=n_repeats),
+        'read_from_trusted_mol_dict': time_construction(RCA_Ligand.read_from_trusted_mol_dict, mol_dicts, n_repeats=n_repeats),
+    }
+
+    print(f'Construction of {len(mol_dicts)} ligands from `{db_path.name}` (best of {n_repeats}):')
+    for name, seconds in results.items():
+        print(f'    {name: <30}{seconds * 1e6:10.1f} µs/ligand')
+    print(f'    Speedup: {results["read_from_mol_dict"] / results["read_from_trusted_mol_dict"]:.1f}x')
+
+    return results
+
+
+if __name__ == '__main__':
+
+    db_path = 'test_metalig'
+    n_max = 1000
+    n_repeats = 3
+
+    benchmark_ligand_construction(db_path=db_path, n_max=n_max, n_repeats=n_repeats)
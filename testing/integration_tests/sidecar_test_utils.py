@@ -0,0 +1,57 @@
+"""
+Shared scaffold for the integration tests of the sidecar files of a ligand database (`db_sidecars`), e.g. the fingerprints and the bitsets. Each test only adds the checks specific to its sidecar data.
+"""
+import shutil
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+
+import numpy as np
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction import db_sidecars
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def build_and_check_sidecar(test_dir: str, read: Callable, build: Callable, n_ligands: int = 300) -> tuple[Path, dict, LigandDB]:
+    """
+    Copies the first ligands of the test MetaLig database into `<test_dir>/data_output` and checks the behaviour which all sidecar files share: There is no sidecar before it is built, the built sidecar has the ligand names in the order of the database, it is read back unchanged and it is not used anymore if the database or the DART version changes. The sidecar is built again for the unchanged database afterwards.
+    :param test_dir: Name of the directory of the test in `testing/integration_tests`
+    :param read: Function which reads the sidecar, e.g. `read_fingerprints()`
+    :param build: Function which builds the sidecar, e.g. `build_fingerprints()`
+    :return: Path of the copied database, the built sidecar data and the loaded database
+    """
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    db_path = project_path().extend('testing', 'integration_tests', test_dir, 'data_output', 'test_metalig.jsonlines')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(db_path.parent, ignore_errors=True)
+    db_path.parent.mkdir(parents=True)
+    with open(input_path, 'r') as input_file, open(db_path, 'w') as output_file:
+        for _ in range(n_ligands):
+            output_file.write(input_file.readline())
+
+    assert read(db_path) is None
+    data = build(db_path, n_processes=1, show_progress=False)
+    db = LigandDB.load_from_json(db_path, show_progress=False)
+    assert data['names'].tolist() == list(db.db.keys())
+
+    # The stored data is read back and not used anymore if the DART version or the database changes.
+    stored = read(db_path)
+    for key, value in data.items():
+        assert np.array_equal(stored[key], value)
+    with patch.object(db_sidecars, 'get_dart_version', return_value='0.0.0'):
+        assert read(db_path) is None
+    content = db_path.read_bytes()
+    with open(db_path, 'a') as file:
+        file.write('\n')
+    assert read(db_path) is None
+    db_path.write_bytes(content)
+    data = build(db_path, n_processes=1, show_progress=False)
+
+    # Sidecars of the databases shipped with DART are never written into the package.
+    for sidecar_path in db_sidecars.get_sidecar_paths(input_path, '.test', 'test'):
+        assert not sidecar_path.is_relative_to(input_path.parent)
+
+    return db_path, data, db
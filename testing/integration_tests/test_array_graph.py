@@ -0,0 +1,46 @@
+"""
+Integration test for the array-backed molecular graphs. For all ligands of the test database, the ArrayGraph must give exactly the same graph, graph hashes and connectivity as networkx.
+"""
+import networkx as nx
+import pytest
+
+from DARTassembler.src.ligand_extraction.array_graph import ArrayGraph, node_label
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json
+from DARTassembler.src.ligand_extraction.utilities_graph import graph_from_graph_dict
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def assert_same_networkx_graph(graph1: nx.Graph, graph2: nx.Graph):
+    assert nx.utils.graphs_equal(graph1, graph2)
+    # Also the order of nodes and neighbors must be the same, because it determines the order of atoms in assembled complexes.
+    assert list(graph1.nodes(data=True)) == list(graph2.nodes(data=True))
+    assert [list(nbrs.items()) for nbrs in graph1.adj.values()] == [list(nbrs.items()) for nbrs in graph2.adj.values()]
+
+def test_array_graph():
+    n_ligands = 0
+    for _, mol_dict in iterate_over_json(get_correct_ligand_db_path_from_input('test_metalig'), show_progress=False):
+        array_graph = ArrayGraph.from_graph_dict(mol_dict['graph_dict'])
+        graph = graph_from_graph_dict(mol_dict['graph_dict'])
+
+        # Conversion to networkx and back gives the same graph.
+        assert_same_networkx_graph(array_graph.to_networkx(), graph)
+        assert_same_networkx_graph(ArrayGraph.from_networkx(graph).to_networkx(), graph)
+        assert array_graph.to_graph_dict() == mol_dict['graph_dict']
+
+        # Graph hashes and connectivity are the same as with networkx.
+        assert array_graph.weisfeiler_lehman_graph_hash() == nx.weisfeiler_lehman_graph_hash(graph, node_attr=node_label, iterations=3, digest_size=16)
+        assert array_graph.weisfeiler_lehman_graph_hash(edge_attr='bond_type') == nx.weisfeiler_lehman_graph_hash(graph, node_attr=node_label, edge_attr='bond_type', iterations=3, digest_size=16)
+        assert array_graph.weisfeiler_lehman_graph_hash(node_attr=None) == nx.weisfeiler_lehman_graph_hash(graph, iterations=3, digest_size=16)
+        heavy_graph = graph.subgraph([node for node, label in graph.nodes(data=node_label) if label != 'H'])
+        if len(heavy_graph) > 0:
+            assert array_graph.get_heavy_atoms_graph().weisfeiler_lehman_graph_hash() == nx.weisfeiler_lehman_graph_hash(heavy_graph, node_attr=node_label, iterations=3, digest_size=16)
+        assert array_graph.is_connected() == nx.is_connected(graph)
+        n_ligands += 1
+
+    assert n_ligands == 1000
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
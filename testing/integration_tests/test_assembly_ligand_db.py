@@ -0,0 +1,59 @@
+"""
+Integration test for loading the ligand database in the assembly. Only the ligands with a denticity of the topology of a batch are loaded, so the database must be loaded again if a later batch needs other denticities.
+"""
+import shutil
+
+import pytest
+
+from DARTassembler.src.assembly.DART_Assembly import DARTAssembly
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def test_reload_ligand_db(monkeypatch):
+    outdir = project_path().extend('testing', 'integration_tests', 'assembly_ligand_db', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+    all_denticities = {ligand.denticity for ligand in LigandDB.load_from_json('test_metalig', show_progress=False).db.values()}
+
+    # Only the handling of the ligand database is tested, so no input file is read.
+    assembly = DARTAssembly.__new__(DARTAssembly)
+    assembly.ligand_json = get_correct_ligand_db_path_from_input('test_metalig')
+    assembly.multiple_db = False
+    assembly.last_ligand_db_path = None
+    assembly.last_ligand_db_denticities = None
+
+    # Topologies of the batches one after another, and if the database has to be loaded again for them.
+    batches = [
+        ('[2, 1, 1]--[1, 2, 2]', True),
+        ('[1, 1, 1, 1]--[1, 1, 1, 1]', False),  # subset of the loaded denticities
+        ('[3, 2, 1]--[1, 2, 3]', True),
+        ('[2, 2]--[1, 2]', False),
+        ('[4, 1, 1]--[1, 2, 2]', True),
+    ]
+    for topology_similarity, expected_reload in batches:
+        assembly.topology_similarity = topology_similarity
+        reload = assembly.check_if_reload_database()
+        assert reload == expected_reload, topology_similarity
+        if reload:
+            ligand_db = assembly.get_ligand_db()
+            assert set(ligand_db.keys()) == set(assembly.get_topology_denticities()) & all_denticities
+        assert set(assembly.get_topology_denticities()) & all_denticities <= set(ligand_db.keys())
+
+    # A different database is always loaded again, even if the denticities are a subset of the loaded ones.
+    other_path = outdir / 'other_ligand_db.jsonlines'
+    shutil.copyfile(assembly.ligand_json, other_path)
+    assembly.ligand_json = other_path
+    assert assembly.check_if_reload_database()
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,89 @@
+"""
+Integration test for the array storage of the atomic properties. AtomicProps must behave like the old dictionary of lists, also when written to json, compared, copied and pickled.
+"""
+import json
+import pickle
+import shutil
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.atomic_props import AtomicProps, get_positions, get_elements, _ArrayColumn
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json, NumpyEncoder
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def test_atomic_props(n_ligands=50):
+    for _, mol_dict in iterate_over_json(get_correct_ligand_db_path_from_input('test_metalig'), n_max=n_ligands, show_progress=False):
+        old_props = deepcopy(mol_dict['atomic_props'])
+        ligand = RCA_Ligand.read_from_mol_dict(mol_dict)
+        props = ligand.atomic_props
+        assert isinstance(props, AtomicProps)
+
+        # The json encoding is the same as of the old dictionary of lists, including the order of the keys.
+        assert json.dumps(props, cls=NumpyEncoder) == json.dumps(old_props)
+        assert json.dumps(ligand.write_to_mol_dict()['atomic_props'], cls=NumpyEncoder) == json.dumps(old_props)
+
+        # Comparison with the old dictionary works in both directions.
+        assert props == old_props and old_props == props
+        assert list(props.keys()) == list(old_props.keys())
+        changed_props = deepcopy(old_props)
+        changed_props['x'][0] += 1.0
+        assert props != changed_props and changed_props != props
+
+        # Deep copies and pickled copies are equal but independent of the original.
+        for copied in (deepcopy(props), pickle.loads(pickle.dumps(props))):
+            assert isinstance(copied, AtomicProps)
+            assert copied == props and list(copied.keys()) == list(props.keys())
+            copied['x'][0] += 1.0
+            assert copied != props and props == old_props
+        copied_ligand = pickle.loads(pickle.dumps(ligand))
+        assert copied_ligand.atomic_props == old_props
+        assert deepcopy(ligand).atomic_props == old_props
+
+    # The base class of the columns is abstract.
+    with pytest.raises(TypeError, match='abstract'):
+        _ArrayColumn(props)
+
+    return
+
+def test_add_atom(monkeypatch, n_ligands=5):
+    outdir = project_path().extend('testing', 'integration_tests', 'atomic_props', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    Path(outdir, 'tmp').mkdir(parents=True)
+    Path(outdir, 'cwd').mkdir()
+    monkeypatch.chdir(Path(outdir, 'cwd'))   # `add_atom()` writes the molecule to `../tmp/tmp.xyz`
+
+    # Adding an atom gives the same molecule for AtomicProps and for the old dictionary of lists, which is changed with `.append()`.
+    for _, mol_dict in iterate_over_json(get_correct_ligand_db_path_from_input('test_metalig'), n_max=n_ligands, show_progress=False):
+        array_ligand = RCA_Ligand.read_from_mol_dict(deepcopy(mol_dict))
+        dict_ligand = RCA_Ligand.read_from_mol_dict(deepcopy(mol_dict))
+        dict_ligand.atomic_props = dict_ligand.atomic_props.to_dict()
+        n_atoms = len(array_ligand.atomic_props['atoms'])
+
+        for ligand in (array_ligand, dict_ligand):
+            ligand.add_atom('Cl', [1.5, -2.0, 0.25])
+        assert isinstance(array_ligand.atomic_props, AtomicProps) and isinstance(dict_ligand.atomic_props, dict)
+        assert array_ligand.atomic_props == dict_ligand.atomic_props
+        assert get_elements(dict_ligand.atomic_props) == get_elements(mol_dict['atomic_props']) + ['Cl']
+        assert np.array_equal(get_positions(dict_ligand.atomic_props)[n_atoms], [1.5, -2.0, 0.25])
+        assert array_ligand.mol.get_chemical_symbols() == dict_ligand.mol.get_chemical_symbols()
+        assert np.allclose(array_ligand.mol.get_positions(), dict_ligand.mol.get_positions())
+
+    with pytest.raises(ValueError):
+        array_ligand.add_atom('Cl', [1.0, 2.0])
+
+    monkeypatch.undo()
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,48 @@
+"""
+Integration test for converting a ligand database to the binary columnar format and reading it back.
+"""
+import json
+import shutil
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json
+from DARTassembler.src.metalig.binary_db import convert_jsonlines_to_binary_ligand_db, BinaryLigandDB
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input, is_trusted_ligand_db
+
+
+def test_binary_ligand_db():
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    output_path = project_path().extend('testing', 'integration_tests', 'binary_db', 'data_output', 'test_metalig.ligdb')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(output_path.parent, ignore_errors=True)
+
+    convert_jsonlines_to_binary_ligand_db(input_path, output_path, show_progress=False)
+    assert get_correct_ligand_db_path_from_input(output_path) == output_path
+
+    # Only the databases shipped with DART are trusted, not copies of them with the same name elsewhere.
+    assert is_trusted_ligand_db(input_path)
+    assert not is_trusted_ligand_db(output_path)
+    assert not is_trusted_ligand_db(output_path.with_name(input_path.name))
+
+    # The binary database must contain exactly the same ligands in the same order as the jsonlines database.
+    jsonlines_db = list(iterate_over_json(input_path, show_progress=False))
+    binary_db = list(iterate_over_json(output_path, show_progress=False))
+    assert [name for name, _ in jsonlines_db] == [name for name, _ in binary_db]
+    for (_, old), (_, new) in zip(jsonlines_db, binary_db):
+        assert json.dumps(old, sort_keys=True) == json.dumps(new, sort_keys=True)
+
+    # Random access and columns
+    db = BinaryLigandDB(output_path)
+    name, mol = db.get_mol_dict(len(db) - 1)
+    assert name == jsonlines_db[-1][0]
+    assert list(db.get_column('denticity')) == [mol['denticity'] for _, mol in jsonlines_db]
+
+    shutil.rmtree(output_path.parent, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+
+    test_binary_ligand_db()
@@ -0,0 +1,128 @@
+"""
+Integration test for bz2 compressed ligand databases. Compressed databases must give the same ligands as the uncompressed database, both when streamed and when single ligands are read at their virtual offsets.
+"""
+import bz2
+import json
+import shutil
+
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction import DataBase
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.db_index import read_index, build_index
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json, NumpyEncoder
+from DARTassembler.src.metalig.compressed_db import compress_ligand_db_to_blocked_bz2, iterate_lines_with_offsets, read_lines_at_offsets, is_bz2_file, is_block_compressed_bz2_file, split_virtual_offset
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def copy_test_ligand_db(outdir, n_ligands):
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    db_path = outdir / 'test_metalig.jsonlines'
+    with open(input_path, 'r') as input_file, open(db_path, 'w') as output_file:
+        for _ in range(n_ligands):
+            output_file.write(input_file.readline())
+
+    return db_path
+
+def get_mol_dict_string(ligand) -> str:
+    return json.dumps(ligand.write_to_mol_dict(), cls=NumpyEncoder, sort_keys=True)
+
+def test_compressed_offsets(n_ligands=200, block_size=20_000):
+    outdir = project_path().extend('testing', 'integration_tests', 'compressed_db', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    db_path = copy_test_ligand_db(outdir, n_ligands)
+    with open(db_path, 'rb') as file:
+        lines = file.readlines()
+
+    # Compress into many small streams. The index written during compression is the same as the one built by streaming through the compressed file.
+    blocked_path = compress_ligand_db_to_blocked_bz2(db_path, show_progress=False, block_size=block_size)
+    assert blocked_path == outdir / 'test_metalig.jsonlines.bz2'
+    assert is_bz2_file(blocked_path) and is_block_compressed_bz2_file(blocked_path) and not is_bz2_file(db_path)
+    with open(blocked_path, 'rb') as file:
+        assert bz2.decompress(file.read()) == b''.join(lines)
+    index = read_index(blocked_path, build_if_missing=False)
+    assert index is not None and index == build_index(blocked_path)
+
+    # Iterating with offsets gives all lines, which are spread over many streams.
+    offsets, iterated_lines = zip(*iterate_lines_with_offsets(blocked_path))
+    assert list(iterated_lines) == lines
+    assert list(offsets) == [entry[0] for entry in index.values()]
+    assert len({split_virtual_offset(offset)[0] for offset in offsets}) > 10
+
+    # Random reads in any order give the lines at these offsets, also when jumping back and forth between streams.
+    order = list(range(0, n_ligands, 3))[::-1] + list(range(1, n_ligands, 7)) + [n_ligands - 1, 0, n_ligands - 1]
+    assert list(read_lines_at_offsets(blocked_path, [offsets[i] for i in order])) == [lines[i] for i in order]
+
+    # Streams can also end within a line, e.g. if files were compressed separately and concatenated. Then the lines continue in the next stream.
+    data = b''.join(lines)
+    split_points = [0, 1000, len(lines[0]) + 5, len(data) // 2, len(data) - 3, len(data)]
+    split_path = outdir / 'split_streams.jsonlines.bz2'
+    with open(split_path, 'wb') as file:
+        for start, end in zip(split_points[:-1], split_points[1:]):
+            file.write(bz2.compress(data[start:end]))
+    split_offsets, split_lines = zip(*iterate_lines_with_offsets(split_path))
+    assert list(split_lines) == lines
+    split_order = [n_ligands // 2, 0, 1, n_ligands // 2 - 1, n_ligands - 1]   # reading from the large streams is slow
+    assert list(read_lines_at_offsets(split_path, [split_offsets[i] for i in split_order])) == [lines[i] for i in split_order]
+
+    # Loading single ligands from the block-compressed database gives the same ligands as from the uncompressed one.
+    names = list(index.keys())[::-11]
+    subset = LigandDB.load_subset(names, path=blocked_path)
+    uncompressed_subset = LigandDB.load_subset(names, path=db_path)
+    assert list(subset.db.keys()) == names
+    assert all(get_mol_dict_string(subset.db[name]) == get_mol_dict_string(uncompressed_subset.db[name]) for name in names)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+def test_compressed_streaming(monkeypatch):
+    outdir = project_path().extend('testing', 'integration_tests', 'compressed_db', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    db_path = get_correct_ligand_db_path_from_input('test_metalig')
+    with open(db_path, 'rb') as file:
+        data = file.read()
+    entries = list(iterate_over_json(db_path, show_progress=False))
+
+    # A normal bz2 file with a single stream is too large for fast random access.
+    single_stream_path = outdir / 'test_metalig.jsonlines.bz2'
+    with open(single_stream_path, 'wb') as file:
+        file.write(bz2.compress(data))
+    assert is_bz2_file(single_stream_path) and not is_block_compressed_bz2_file(single_stream_path)
+
+    # Streaming compressed JSON Lines and JSON files gives the same entries as the uncompressed JSON Lines file.
+    assert list(iterate_over_json(single_stream_path, show_progress=False)) == entries
+    assert list(iterate_over_json(single_stream_path, n_max=10, show_progress=False)) == entries[:10]
+    json_path = outdir / 'test_metalig.json.bz2'
+    with open(json_path, 'wb') as file:
+        file.write(bz2.compress(json.dumps(dict(entries)).encode('utf-8')))
+    assert list(iterate_over_json(json_path, show_progress=False)) == entries
+
+    # Loading a subset from a single stream file streams through the file once instead of using the index.
+    def fail(*args, **kwargs):
+        raise AssertionError('The index must not be used for bz2 files with a single stream.')
+    names = [entries[500][0], entries[3][0], entries[-1][0]]
+    expected = LigandDB.load_subset(names, path=db_path)
+    with monkeypatch.context() as m:
+        m.setattr(DataBase, 'read_index', fail)
+        m.setattr(DataBase, 'read_entries_at_offsets', fail)
+        subset = LigandDB.load_subset(names, path=single_stream_path)
+        with pytest.raises(KeyError, match='unknown_ligand'):
+            LigandDB.load_subset([names[0], 'unknown_ligand'], path=single_stream_path)
+    assert list(subset.db.keys()) == names
+    assert all(get_mol_dict_string(subset.db[name]) == get_mol_dict_string(expected.db[name]) for name in names)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
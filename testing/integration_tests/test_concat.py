@@ -0,0 +1,79 @@
+"""
+Integration test for the streaming concatenation of ligand databases. The output must be the same as loading all databases and saving them again.
+"""
+import itertools
+import json
+import shutil
+
+from DARTassembler.concat import concat
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json, iterate_unique_ligand_db
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def write_ligand_db(path, entries: list[tuple[str, dict]]):
+    with open(path, 'w') as file:
+        for name, mol_dict in entries:
+            file.write(json.dumps({'key': name, 'value': mol_dict}) + '\n')
+
+    return
+
+def concat_by_loading_and_saving(paths: list, outpath):
+    """
+    Reference implementation: load all ligands of all databases and save them again. Of several ligands with the same name, only the first one is kept.
+    """
+    full_db = {}
+    for path in paths:
+        for name, ligand in iterate_unique_ligand_db(path, molecule='class', trusted=False):
+            full_db.setdefault(name, ligand)
+    LigandDB(full_db).to_jsonlines(outpath)
+
+    return
+
+def read_entries(path) -> list[tuple[str, str]]:
+    return [(name, json.dumps(mol_dict, sort_keys=True)) for name, mol_dict in iterate_over_json(path, show_progress=False)]
+
+def test_concat(n_ligands=30):
+    outdir = project_path().extend('testing', 'integration_tests', 'concat', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    entries = list(itertools.islice(iterate_over_json(get_correct_ligand_db_path_from_input('test_metalig'), show_progress=False), 2 * n_ligands))
+    first, second = entries[:n_ligands], entries[n_ligands // 2:]
+
+    # The second database contains a duplicate of its own first ligand, another version of a ligand which is also in the first database and an incomplete ligand.
+    second = second + [second[0]]
+    changed_name, mol_dict = second[1]
+    second[1] = (changed_name, dict(mol_dict, stoichiometry='C1000'))
+    incomplete_name, mol_dict = second[-2]
+    second[-2] = (incomplete_name, {key: value for key, value in mol_dict.items() if key != 'has_betaH'})
+    paths = [outdir / 'first.jsonlines', outdir / 'second.jsonlines']
+    write_ligand_db(paths[0], first)
+    write_ligand_db(paths[1], second)
+
+    stats = concat(paths, outpath=outdir / 'concat.jsonlines')
+    assert [(s['n_entries'], s['n_written'], s['n_duplicates_in_previous_dbs'], s['n_duplicates_in_same_db']) for s in stats] == [
+        (n_ligands, n_ligands, 0, 0),
+        (len(second), len(second) - n_ligands // 2 - 1, n_ligands // 2, 1),
+    ]
+
+    # The first occurrence of each ligand is kept and all ligands are the same as if the databases had been loaded and saved again.
+    concat_by_loading_and_saving(paths, outdir / 'reference.jsonlines')
+    concatenated = read_entries(outdir / 'concat.jsonlines')
+    assert concatenated == read_entries(outdir / 'reference.jsonlines')
+    assert [name for name, _ in concatenated] == list(dict.fromkeys(name for name, _ in first + second))
+    ligands = {name: json.loads(mol_dict) for name, mol_dict in concatenated}
+    assert ligands[changed_name]['stoichiometry'] != 'C1000'
+    assert 'has_betaH' in ligands[incomplete_name]
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__])
@@ -0,0 +1,75 @@
+"""
+Integration test for the persistent cache of loaded ligand databases. The cache must be disabled by default, and databases loaded from the cache must be the same as databases loaded from the file.
+"""
+import os
+import shutil
+
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction import db_cache
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+
+
+def test_db_cache(monkeypatch, n_ligands=50):
+    outdir = project_path().extend('testing', 'integration_tests', 'db_cache', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+    monkeypatch.setattr(db_cache, '_configured_cache_dir', None)
+
+    # The cache is disabled by default, so nothing is written.
+    assert db_cache.get_cache_dir() is None and not db_cache.is_cache_enabled()
+    db_cache.save_to_cache('key', [1, 2, 3])
+    assert db_cache.load_from_cache('key') is None
+
+    # The environment variable enables the cache and the input file takes precedence.
+    env_cache_dir = outdir / 'env_cache'
+    monkeypatch.setenv('DART_CACHE_DIR', str(env_cache_dir))
+    assert db_cache.get_cache_dir() == env_cache_dir
+    cache_dir = outdir / 'cache'
+    db_cache.set_cache_dir(cache_dir)
+    assert db_cache.get_cache_dir() == cache_dir
+
+    # A database loaded from the cache is the same as a database loaded from the file.
+    db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False, use_cache=True)
+    assert len(list(cache_dir.glob('*.pkl'))) == 1
+    assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+    cached_db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False, use_cache=True)
+    assert list(cached_db.db.keys()) == list(db.db.keys())
+    for name, ligand in db.db.items():
+        assert cached_db.db[name].atomic_props == ligand.atomic_props
+        assert cached_db.db[name].graph_hash == ligand.graph_hash
+    lazy_db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False, use_cache=True, lazy=True)
+    assert list(lazy_db.db.keys()) == list(db.db.keys())
+    assert len(list(cache_dir.glob('*.pkl'))) == 2     # different load settings are different entries
+
+    # Entries which are too large are not saved and the least recently used entries are deleted.
+    monkeypatch.setattr(db_cache, 'max_cache_size', 1000)
+    db_cache.save_to_cache('too_large', list(range(1000)))
+    assert db_cache.load_from_cache('too_large') is None
+    monkeypatch.setattr(db_cache, 'max_cache_entries', 2)
+    for idx in range(3):
+        db_cache.save_to_cache(f'entry{idx}', idx)
+        os.utime(cache_dir / f'entry{idx}.pkl', (idx, idx))  # distinct access times, even on file systems with coarse timestamps
+    assert [db_cache.load_from_cache(f'entry{idx}') for idx in range(3)] == [None, 1, 2]
+
+    # Cache entries are ignored if others can write to the cache directory.
+    os.chmod(cache_dir, 0o777)
+    with pytest.warns(UserWarning, match='not owned by the current user or writable by others'):
+        assert db_cache.load_from_cache('entry2') is None
+    os.chmod(cache_dir, 0o700)
+
+    db_cache.clear_cache()
+    assert list(cache_dir.glob('*.pkl')) == []
+    db_cache.set_cache_dir(None)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
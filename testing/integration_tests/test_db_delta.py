@@ -0,0 +1,97 @@
+"""
+Integration test for making delta files between two versions of a ligand database and applying them to JSON Lines and SQLite ligand databases.
+"""
+import bz2
+import itertools
+import json
+import shutil
+
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction import db_delta
+from DARTassembler.src.ligand_extraction.db_delta import make_ligand_db_delta, apply_ligand_db_delta
+from DARTassembler.src.ligand_extraction.db_index import read_index, build_index
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json
+from DARTassembler.src.metalig.sqlite_db import convert_jsonlines_to_sqlite_ligand_db, SQLiteLigandDB
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def write_ligand_db(path, entries: list[tuple[str, dict]]):
+    with open(path, 'w') as file:
+        for name, mol_dict in entries:
+            file.write(json.dumps({'key': name, 'value': mol_dict}) + '\n')
+
+    return
+
+def test_db_delta(monkeypatch, n_ligands=40):
+    outdir = project_path().extend('testing', 'integration_tests', 'db_delta', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    entries = list(itertools.islice(iterate_over_json(get_correct_ligand_db_path_from_input('test_metalig'), show_progress=False), n_ligands + 5))
+    old = entries[:n_ligands]
+    # The new database has two removed, one changed, one replaced and five added ligands.
+    new = old[:3] + old[5:]
+    changed_name, mol_dict = new[3]
+    new[3] = (changed_name, {key: ('C1000' if key == 'stoichiometry' else value) for key, value in mol_dict.items() if key != 'has_betaH'})
+    replaced_name, mol_dict = new[4]
+    new[4] = (replaced_name, dict(reversed(mol_dict.items())))
+    new = new + entries[n_ligands:]
+    old_path, new_path, delta_path = outdir / 'old.jsonlines', outdir / 'new.jsonlines', outdir / 'delta.jsonlines.bz2'
+    write_ligand_db(old_path, old)
+    write_ligand_db(new_path, new)
+
+    # Compare in several batches to check that the batches are put together correctly.
+    monkeypatch.setattr(db_delta, 'compare_batch_size', 7)
+    stats = make_ligand_db_delta(old_path, new_path, delta_path, show_progress=False)
+    assert stats == {'n_added': 5, 'n_removed': 2, 'n_changed': 2}
+    with bz2.open(delta_path, 'rt') as file:
+        operations = {operation['key']: operation['op'] for operation in map(json.loads, itertools.islice(file, 1, None))}
+    assert operations[changed_name] == 'change' and operations[replaced_name] == 'replace'
+
+    # Applying the delta to the old JSON Lines database gives exactly the new database and the patched index is the same as a new one.
+    patched_path = outdir / 'patched.jsonlines'
+    shutil.copy(old_path, patched_path)
+    read_index(patched_path)
+    assert apply_ligand_db_delta(patched_path, delta_path, show_progress=False) == stats
+    assert patched_path.read_bytes() == new_path.read_bytes()
+    assert read_index(patched_path, build_if_missing=False) == build_index(new_path)
+
+    # Applying the delta to the SQLite database gives the same ligands. The first ligands are selected correctly although the row indices have gaps.
+    sqlite_path = convert_jsonlines_to_sqlite_ligand_db(old_path, outdir / 'patched.sqlite', show_progress=False)
+    assert apply_ligand_db_delta(sqlite_path, delta_path, show_progress=False) == stats
+    sqlite_db = SQLiteLigandDB(sqlite_path)
+    assert len(sqlite_db) == len(new)
+    assert [(name, json.dumps(mol, sort_keys=True)) for name, mol in sqlite_db.iterate()] == [(name, json.dumps(mol, sort_keys=True)) for name, mol in new]
+    assert [name for name, _ in sqlite_db.iterate(n_max=10)] == [name for name, _ in new[:10]]
+    assert [name for name, _, _ in sqlite_db.iterate_index_records(n_max=10)] == [name for name, _ in new[:10]]
+
+    # Deltas which don't fit to the database are rejected and the database is left unchanged.
+    for db_path in (patched_path, sqlite_path):
+        content = db_path.read_bytes()
+        with pytest.raises(ValueError, match="doesn't fit"):
+            apply_ligand_db_delta(db_path, delta_path, show_progress=False)
+        assert db_path.read_bytes() == content
+    other_path = outdir / 'other.jsonlines'
+    write_ligand_db(other_path, old[:3] + [entries[-1]] + old[4:])
+    content = other_path.read_bytes()
+    with pytest.raises(ValueError, match='Ligands not found'):
+        apply_ligand_db_delta(other_path, delta_path, show_progress=False)
+    assert other_path.read_bytes() == content
+    with pytest.raises(ValueError, match='not a ligand database delta file'):
+        apply_ligand_db_delta(other_path, new_path, show_progress=False)
+    compressed_path = outdir / 'old.jsonlines.bz2'
+    compressed_path.write_bytes(bz2.compress(old_path.read_bytes()))
+    with pytest.raises(ValueError, match="can't be patched in place"):
+        apply_ligand_db_delta(compressed_path, delta_path, show_progress=False)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
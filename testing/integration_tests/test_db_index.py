@@ -0,0 +1,128 @@
+"""
+Integration test for the byte-offset index of JSON Lines ligand databases. The index is a sidecar file, so it is stored next to the database if possible and in the sidecar cache directory otherwise.
+"""
+import json
+import logging
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction import db_cache, db_index
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.db_index import read_index, build_index, get_index_paths, read_entries_at_offsets, index_columns, geometry_index_columns, get_geometry_properties
+from DARTassembler.src.ligand_extraction.io_custom import NumpyEncoder
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def copy_test_ligand_db(outdir, n_ligands):
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    db_path = outdir / 'test_metalig.jsonlines'
+    with open(input_path, 'r') as input_file, open(db_path, 'w') as output_file:
+        for _ in range(n_ligands):
+            output_file.write(input_file.readline())
+
+    return db_path
+
+def get_mol_dict_string(ligand) -> str:
+    return json.dumps(ligand.write_to_mol_dict(), cls=NumpyEncoder, sort_keys=True)
+
+def test_index(n_ligands=60):
+    outdir = project_path().extend('testing', 'integration_tests', 'db_index', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    db_path = copy_test_ligand_db(outdir, n_ligands)
+    db = LigandDB.load_from_json(db_path, show_progress=False)
+
+    # Round trip of the index without the geometric properties. It is not valid if they are requested.
+    index = build_index(db_path)
+    assert list(index.keys()) == list(db.db.keys())
+    assert all(len(entry) == len(index_columns) for entry in index.values())
+    assert read_index(db_path, build_if_missing=False) == index
+    assert read_index(db_path, build_if_missing=False, with_geometry=True) is None
+    assert [name for name, _ in read_entries_at_offsets(db_path, [entry[0] for entry in index.values()])] == list(index.keys())
+
+    # Round trip of the index with the geometric properties, which is also valid if they are not requested.
+    geometry_index = read_index(db_path, with_geometry=True)
+    assert all(len(entry) == len(index_columns) + len(geometry_index_columns) for entry in geometry_index.values())
+    assert all(entry[:len(index_columns)] == index[name] for name, entry in geometry_index.items())
+    for name, ligand in db.db.items():
+        assert geometry_index[name][len(index_columns):] == pytest.approx(get_geometry_properties(ligand.atomic_props))
+    assert read_index(db_path, build_if_missing=False, with_geometry=True) == geometry_index
+    assert read_index(db_path, build_if_missing=False) == geometry_index
+
+    # An index is stale if the database or the DART version changes and is then built again.
+    with patch.object(db_index, 'get_dart_version', return_value='0.0.0'):
+        assert read_index(db_path, build_if_missing=False) is None
+    with open(db_path, 'r') as file:
+        lines = file.readlines()
+    with open(db_path, 'w') as file:
+        file.writelines(lines[n_ligands // 2:] + lines[:n_ligands // 2])
+    assert read_index(db_path, build_if_missing=False) is None
+    new_index = read_index(db_path)
+    assert list(new_index.keys()) == list(index.keys())[n_ligands // 2:] + list(index.keys())[:n_ligands // 2]
+    assert [name for name, _ in read_entries_at_offsets(db_path, [entry[0] for entry in new_index.values()])] == list(new_index.keys())
+    assert read_index(db_path, build_if_missing=False) == new_index
+
+    # Reading single ligands with the index gives the same ligands as loading the whole database.
+    names = list(db.db.keys())[::-7] + [list(db.db.keys())[0]]
+    subset = LigandDB.load_subset(names, path=db_path)
+    assert list(subset.db.keys()) == names
+    for name in names:
+        assert get_mol_dict_string(subset.db[name]) == get_mol_dict_string(db.db[name])
+    assert get_mol_dict_string(LigandDB.get(names[1], path=db_path)) == get_mol_dict_string(db.db[names[1]])
+    with pytest.raises(KeyError, match='unknown_ligand'):
+        LigandDB.load_subset(['unknown_ligand'], path=db_path)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+def test_index_location(monkeypatch, caplog, n_ligands=50):
+    outdir = project_path().extend('testing', 'integration_tests', 'db_index', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+    monkeypatch.setattr(db_cache, '_configured_cache_dir', None)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(outdir / 'xdg_cache'))
+    db_path = copy_test_ligand_db(outdir, n_ligands)
+
+    # The index is written next to the database.
+    local_path, cached_path = get_index_paths(db_path)
+    assert local_path == outdir / 'test_metalig.jsonlines.idx'
+    assert cached_path.is_relative_to(outdir / 'xdg_cache' / 'DARTassembler')
+    index = read_index(db_path)
+    assert local_path.is_file() and not cached_path.exists()
+    assert read_index(db_path, build_if_missing=False) == index
+
+    # If it can't be written next to the database, it is written to the sidecar cache directory and read from there. A directory in the way of the index file works even for root, for whom all files are writable.
+    local_path.unlink()
+    local_path.mkdir()
+    assert read_index(db_path) == index
+    assert cached_path.is_file()
+    assert read_index(db_path, build_if_missing=False) == index
+
+    # If it can't be written anywhere, a warning is logged.
+    cached_path.unlink()
+    monkeypatch.setenv('XDG_CACHE_HOME', str(db_path))
+    with caplog.at_level(logging.WARNING):
+        assert read_index(db_path) == index
+    assert 'Could not write the `.idx` file' in caplog.text
+    assert read_index(db_path, build_if_missing=False) is None
+
+    # The index of the databases shipped with DART is never written into the package.
+    metalig_path = get_correct_ligand_db_path_from_input('test_metalig')
+    assert all(not path.is_relative_to(metalig_path.parent) for path in get_index_paths(metalig_path))
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -3,8 +3,13 @@ Integration test for outputting a csv file of the ligand database.
 """
 import shutil
 
+import pytest
+
 from DARTassembler.dbinfo import dbinfo
 from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.db_info import write_ligand_info, ligand_info_columns
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
 from pathlib import Path
 
 
@@ -14,7 +19,8 @@ def test_make_ligand_db_csv(nmax=1000):
     # Delete output directory so that the test detects if files are not written.
     shutil.rmtree(output_path.parent, ignore_errors=True)
 
-    db = dbinfo(input_path='metalig', output_path=output_path, nmax=nmax)
+    n_ligands = dbinfo(input_path='metalig', output_path=output_path, nmax=nmax)
+    assert n_ligands == nmax
 
     #%% ==============    Doublecheck refactoring    ==================
     from dev.test.Integration_Test import IntegrationTest
@@ -26,11 +32,68 @@ def test_make_ligand_db_csv(nmax=1000):
     else:
         print(f'ATTENTION: could not find benchmark folder "{old_dir}"!')
 
-    return db
+    return
+
+def test_streamed_ligand_info(n_ligands=100):
+    """
+    The streamed .csv and .xyz files must be the same as saved from the loaded LigandDB, also if they are computed in parallel.
+    """
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    outdir = project_path().extend('testing', 'integration_tests', 'dbinfo', 'streamed_data_output')
+    db_path = outdir / 'test_metalig.jsonlines'
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    with open(input_path, 'r') as input_file, open(db_path, 'w') as output_file:
+        for _ in range(n_ligands):
+            output_file.write(input_file.readline())
+
+    db = LigandDB.load_from_json(db_path, show_progress=False)
+    db.save_reduced_csv(outdir / 'expected.csv')
+    db.save_concat_xyz(outdir / 'expected.xyz', with_metal=True)
+    for n_processes in (1, 2):
+        csv_path, xyz_path = outdir / f'streamed_{n_processes}.csv', outdir / f'streamed_{n_processes}.xyz'
+        assert write_ligand_info(db_path, csv_path=csv_path, xyz_path=xyz_path, n_processes=n_processes, show_progress=False) == n_ligands
+        assert csv_path.read_text() == (outdir / 'expected.csv').read_text()
+        assert xyz_path.read_text() == (outdir / 'expected.xyz').read_text()
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+def test_dbinfo_empty_db_and_return_value(n_ligands=10):
+    """
+    The .csv file of an empty ligand database only has the header. Returning the LigandDB is deprecated, but still gives the same ligands as in the output files.
+    """
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    outdir = project_path().extend('testing', 'integration_tests', 'dbinfo', 'empty_data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    empty_db_path = outdir / 'empty.jsonlines'
+    empty_db_path.touch()
+    assert dbinfo(input_path=empty_db_path, output_path=outdir / 'empty.csv') == 0
+    assert (outdir / 'empty.csv').read_text() == ','.join(ligand_info_columns) + '\n'
+    assert (outdir / 'concat_empty.xyz').read_text() == ''
+
+    with pytest.warns(DeprecationWarning, match='dbinfo'):
+        db = dbinfo(input_path=input_path, output_path=outdir / 'ligands.csv', nmax=n_ligands, return_ligand_db=True)
+    assert isinstance(db, LigandDB)
+    db.save_reduced_csv(outdir / 'expected.csv')
+    assert (outdir / 'ligands.csv').read_text() == (outdir / 'expected.csv').read_text()
+    assert len(db.db) == n_ligands
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
 
 
 if __name__ == "__main__":
     nmax = 1000
 
-    db = test_make_ligand_db_csv(nmax=nmax)
-
+    test_make_ligand_db_csv(nmax=nmax)
+    test_streamed_ligand_info()
+    test_dbinfo_empty_db_and_return_value()
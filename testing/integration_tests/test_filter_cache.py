@@ -0,0 +1,88 @@
+"""
+Integration test for the cache of ligand filter results. Runs which take over cached results must give exactly the same output as runs without cache.
+"""
+import filecmp
+import shutil
+
+import yaml
+
+from DARTassembler.ligandfilters import ligandfilters
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction import db_cache
+from DARTassembler.src.ligand_extraction.io_custom import read_yaml
+
+
+def assert_same_output(dir1, dir2):
+    files1 = sorted(path.relative_to(dir1) for path in dir1.rglob('*') if path.is_file() and path.suffix != '.idx')
+    files2 = sorted(path.relative_to(dir2) for path in dir2.rglob('*') if path.is_file() and path.suffix != '.idx')
+    assert files1 == files2
+    for path in files1:
+        assert filecmp.cmp(dir1 / path, dir2 / path, shallow=False), f'File {path} differs.'
+
+    return
+
+def test_filter_cache(monkeypatch, nmax=300):
+    input_path = project_path().extend('testing', 'integration_tests', 'ligandfilters', 'data_input', 'ligandfilters.yml')
+    outdir = project_path().extend('testing', 'integration_tests', 'filter_cache', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    # Same filters as the ligand filters test with the info output, and a second input file in which one of the last filters lets more ligands pass.
+    settings = read_yaml(input_path)
+    settings['output_ligands_info'] = True
+    changed_settings = read_yaml(input_path)
+    changed_settings['output_ligands_info'] = True
+    changed_settings['filters'][-2]['smarts'] = 'C#N'
+    config_settings = read_yaml(input_path)
+    config_settings['output_ligands_info'] = True
+    config_settings['cache_directory'] = str(outdir / 'config_cache')
+    paths = {}
+    for name, content in {'original': settings, 'changed': changed_settings, 'config': config_settings}.items():
+        paths[name] = outdir / f'{name}.yml'
+        with open(paths[name], 'w') as file:
+            yaml.safe_dump(content, file, sort_keys=False)
+
+    def run(name, run_name, cache_dir=None):
+        if cache_dir is None:
+            monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+        else:
+            monkeypatch.setenv('DART_CACHE_DIR', str(cache_dir))
+        output_path = outdir / run_name / 'filtered_ligand_db.jsonlines'
+        ligandfilters(filter_input_path=paths[name], nmax=nmax, outpath=output_path)
+        return output_path.parent
+
+    # The cache is disabled by default.
+    uncached = {name: run(name, f'{name}_uncached') for name in ['original', 'changed']}
+    assert db_cache.get_cache_dir() is None
+
+    cache_dir = outdir / 'cache'
+    first = run('original', 'original_first', cache_dir)
+    cached = run('original', 'original_cached', cache_dir)
+    changed = run('changed', 'changed_cached', cache_dir)
+
+    assert_same_output(uncached['original'], first)
+    assert_same_output(uncached['original'], cached)
+    assert_same_output(uncached['changed'], changed)
+
+    # The cache directory can also be set in the input file.
+    config = run('config', 'config_first')
+    assert len(list((outdir / 'config_cache').glob('*.pkl'))) > 0
+    assert_same_output(uncached['original'], config)
+
+    # The least recently used entries are deleted if the cache gets too large.
+    max_cache_size = max(path.stat().st_size for path in cache_dir.glob('*.pkl'))
+    monkeypatch.setattr(db_cache, 'max_cache_size', max_cache_size)
+    cached = run('original', 'original_size_limit', cache_dir)
+    assert_same_output(uncached['original'], cached)
+    assert sum(path.stat().st_size for path in cache_dir.glob('*.pkl')) <= max_cache_size
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__])
@@ -3,8 +3,10 @@ Integration test for the filtering of ligands.
 """
 from DARTassembler.ligandfilters import ligandfilters
 from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
 from DARTassembler.src.ligand_extraction.io_custom import read_yaml
 from pathlib import Path
+import pandas as pd
 import shutil
 
 def test_filter_ligands(nmax=3000):
@@ -24,6 +26,44 @@ def test_filter_ligands(nmax=3000):
 
     return filters
 
+def test_lazy_filter_info_output(monkeypatch, nmax=1000):
+    """
+    The overview csv and the concatenated xyz files of the info output are generated from the ligands only after filtering. They must be the same as when they are generated from all ligands right after loading, before any filter is applied.
+    """
+    filter_ligands_path = project_path().extend('testing', 'integration_tests', 'ligandfilters', 'data_input', 'ligandfilters.yml')
+    outdir = project_path().extend('testing', 'integration_tests', 'ligandfilters', 'lazy_data_output')
+    monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    filters = ligandfilters(filter_input_path=filter_ligands_path, nmax=nmax, outpath=outdir / 'filtered_ligand_db.jsonlines')
+    written_df = pd.read_csv(Path(filters.outdir, 'ligands_overview.csv'), index_col='Ligand ID')
+
+    # Generate the info output from all ligands before filtering, as it was done before.
+    db = LigandDB.load_from_json(filters.ligand_db_path, n_max=nmax, show_progress=False)
+    all_xyz_strings = {ligand_id: ligand.get_xyz_file_format_string(comment=None, with_metal=True) for ligand_id, ligand in db.db.items()}
+    expected_df = pd.DataFrame.from_dict({uname: ligand.get_ligand_output_info(max_entries=5) for uname, ligand in db.db.items()}, orient='index')
+    expected_df['Filter'] = expected_df['Ligand ID'].map(written_df['Filter'])
+    expected_df.set_index('Ligand ID', inplace=True)
+    expected_df = expected_df[['Filter'] + [col for col in expected_df.columns if col != 'Filter']]
+    expected_df = expected_df.sort_values(by='Filter')
+    expected_df.to_csv(outdir / 'expected_ligands_overview.csv', index=True)
+    assert Path(filters.outdir, 'ligands_overview.csv').read_text() == (outdir / 'expected_ligands_overview.csv').read_text()
+
+    # Every ligand is written to the xyz file of the filter which removed it, or of the passed ligands.
+    modes = ['Passed'] + [tracking['unique_filtername'] for tracking in filters.filter_tracking]
+    assert set(written_df['Filter']) <= set(modes)
+    for mode in modes:
+        xyz_filename = f"concat_{mode.replace(' ', '').replace(':', '_')}.xyz"
+        expected_xyz = ''.join(all_xyz_strings[ligand_id] for ligand_id in expected_df.index[expected_df['Filter'] == mode])
+        assert Path(filters.xyz_outdir, xyz_filename).read_text() == expected_xyz, mode
+    assert (written_df['Filter'] == 'Passed').sum() == filters.n_ligands_after
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
 
 if __name__ == "__main__":
     nmax = 3000
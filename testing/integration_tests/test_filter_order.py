@@ -0,0 +1,141 @@
+"""
+Integration test for the order in which the ligand filters are applied. The planner applies cheap filters first, but the removed ligands and the number of removed ligands per filter must be the same as when the filters are applied one after another in the order of the user.
+"""
+import shutil
+
+import pytest
+import yaml
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_filters.FilteringStage import FilterStage
+from DARTassembler.src.ligand_filters.Ligand_Filters import LigandFilters, plan_filter_order, filter_costs, max_cheap_filter_cost
+from DARTassembler.src.ligand_filters.ligand_property_table import not_failed
+
+# Expensive filters at the start and cheap filters after them, which the planner applies first. The beta hydrogen filter and the atom count filter remove many of the same ligands.
+overlapping_filters = [
+    {'filter': 'remove_ligands_with_beta_hydrogens', 'remove_ligands_with_beta_hydrogens': True, 'apply_to_denticities': None},
+    {'filter': 'number_of_atoms', 'min': 1, 'max': 40, 'apply_to_denticities': None},
+    {'filter': 'atomic_neighbors', 'atom': 'C', 'neighbors': 'H3', 'apply_to_denticities': None},
+    {'filter': 'ligand_charges', 'ligand_charges': [-1, 0], 'apply_to_denticities': [1, 2]},
+    {'filter': 'planarity', 'min': 0.6, 'max': 1.0, 'apply_to_denticities': None},
+    {'filter': 'denticities', 'denticities': [1, 3, 4]},
+    {'filter': 'coordinating_atoms_composition', 'elements': ['C'], 'instruction': 'must_exclude', 'apply_to_denticities': None},
+]
+# Filters at the start which are pushed down into loading the database, then a filter that needs the full ligand and a cheap filter after it.
+push_down_filters = [
+    {'filter': 'denticities', 'denticities': [1, 2, 3]},
+    {'filter': 'ligand_charges', 'ligand_charges': [-1, 0], 'apply_to_denticities': [1, 2]},
+    {'filter': 'number_of_atoms', 'min': 1, 'max': 40, 'apply_to_denticities': None},
+    {'filter': 'coordinating_atoms_composition', 'elements': ['C'], 'instruction': 'must_exclude', 'apply_to_denticities': None},
+    {'filter': 'planarity', 'min': 0.3, 'max': 1.0, 'apply_to_denticities': None},
+    {'filter': 'atomic_neighbors', 'atom': 'C', 'neighbors': 'H3', 'apply_to_denticities': None},
+]
+
+
+def write_filter_input(path, filters: list[dict], output_ligands_info: bool) -> None:
+    settings = {
+        'input_db_file': None,
+        'output_db_file': str(path.parent / f'{path.stem}_output' / 'filtered_ligand_db.jsonlines'),
+        'output_ligands_info': output_ligands_info,
+        'filters': filters,
+    }
+    with open(path, 'w') as file:
+        yaml.safe_dump(settings, file, sort_keys=False)
+
+    return
+
+def apply_filters_in_user_order(filters: LigandFilters, nmax: int) -> FilterStage:
+    """
+    Applies the mandatory filters and then all filters one after another in the order of the user to a new filter stage.
+    """
+    filters.Filter = FilterStage(LigandDB.load_from_json(filters.ligand_db_path, n_max=nmax, show_progress=False))
+    filters.Filter.filter_charge_confidence(filter_for='confident')
+    filters.Filter.filter_unconnected_ligands()
+    for filter in filters.filters:
+        filters.apply_filter(filter)
+
+    return filters.Filter
+
+def test_filter_order(monkeypatch, nmax=300):
+    outdir = project_path().extend('testing', 'integration_tests', 'filter_order', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+    input_path = outdir / 'overlapping.yml'
+    write_filter_input(input_path, overlapping_filters, output_ligands_info=True)
+
+    # The planner changes the order, so that the cheap filters come first.
+    filters = LigandFilters(filepath=input_path, max_number=nmax)
+    order = plan_filter_order(filters.filters)
+    assert order != list(range(len(filters.filters)))
+    assert all(filter_costs[filters.filters[idx]['filter']] < max_cheap_filter_cost for idx in order[:4])
+    filters.get_filtered_db()
+
+    # Apply the same filters in the order of the user.
+    stage = apply_filters_in_user_order(LigandFilters(filepath=input_path, max_number=nmax), nmax=nmax)
+    failed_at = dict(zip(stage.get_names().tolist(), stage.get_failed_positions().tolist()))
+    n_ligands = [stage.get_n_ligands() - sum(stage.get_n_failed(position) for position in range(2))]
+    for position in range(2, len(overlapping_filters) + 2):
+        n_ligands.append(n_ligands[-1] - stage.get_n_failed(position))
+
+    # Same counts per filter. Every filter removes some ligands.
+    assert [(tracking['n_ligands_before'], tracking['n_ligands_after']) for tracking in filters.filter_tracking] == list(zip(n_ligands[:-1], n_ligands[1:]))
+    assert all(tracking['n_ligands_removed'] > 0 for tracking in filters.filter_tracking)
+    assert filters.n_ligands_after == n_ligands[-1]
+
+    # Same filter for each ligand. Ligands removed by the mandatory filters are attributed to the first filter in the info output.
+    filter_names = {position + 2: tracking['unique_filtername'] for position, tracking in enumerate(filters.filter_tracking)}
+    filter_names.update({0: filters.filter_tracking[0]['unique_filtername'], 1: filters.filter_tracking[0]['unique_filtername'], not_failed: 'Passed'})
+    assert filters.df_all_ligands['Filter'].to_dict() == {name: filter_names[position] for name, position in failed_at.items()}
+
+    # Ligands failing both the expensive beta hydrogen filter and the cheap atom count filter are attributed to the beta hydrogen filter, which comes first in the order of the user.
+    db = LigandDB.load_from_json(filters.ligand_db_path, n_max=nmax, show_progress=False).db
+    assert any(position == 2 and db[name].n_atoms > 40 for name, position in failed_at.items())
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+def test_filter_push_down(monkeypatch, nmax=300):
+    outdir = project_path().extend('testing', 'integration_tests', 'filter_order', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    monkeypatch.delenv('DART_CACHE_DIR', raising=False)
+
+    # Without the info output, the filters at the start are applied while loading the database. With the info output, all filters are applied after loading.
+    runs = {}
+    for output_ligands_info in (False, True):
+        input_path = outdir / f'push_down_{output_ligands_info}.yml'
+        write_filter_input(input_path, push_down_filters, output_ligands_info=output_ligands_info)
+        filters = LigandFilters(filepath=input_path, max_number=nmax)
+        db = filters.get_filtered_db()
+        runs[output_ligands_info] = (filters, db)
+    pushed, applied = runs[False][0], runs[True][0]
+    assert [tracking['applied'] for tracking in pushed.filter_tracking] == ['while loading'] * 4 + ['yes'] * 2
+    assert all(tracking['applied'] == 'yes' for tracking in applied.filter_tracking)
+
+    # Same counts per filter and after the mandatory filters, and every filter removes some ligands.
+    counts = lambda filters: [(tracking['n_ligands_before'], tracking['n_ligands_after']) for tracking in filters.filter_tracking]
+    assert counts(pushed) == counts(applied)
+    assert all(tracking['n_ligands_removed'] > 0 for tracking in pushed.filter_tracking)
+    mandatory_row = lambda filters: next((row['n_ligands_before'], row['n_ligands_after']) for row in filters.profile_rows if row['step'] == 'mandatory')
+    assert mandatory_row(pushed) == mandatory_row(applied)
+    assert mandatory_row(pushed)[1] == pushed.filter_tracking[0]['n_ligands_before']
+    assert pushed.n_ligands_before == applied.n_ligands_before == nmax
+
+    # Same ligands in the filtered database.
+    assert list(runs[False][1].db.keys()) == list(runs[True][1].db.keys())
+    assert pushed.n_ligands_after == applied.n_ligands_after == len(runs[False][1].db)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
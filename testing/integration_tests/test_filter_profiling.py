@@ -0,0 +1,87 @@
+"""
+Integration test for the profiling report of the ligand filters.
+"""
+import filecmp
+import json
+import shutil
+
+import pandas as pd
+import pytest
+import yaml
+
+from DARTassembler.ligandfilters import ligandfilters
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.io_custom import read_yaml
+from DARTassembler.src.ligand_filters import filter_profiling
+from DARTassembler.src.ligand_filters.filter_profiling import profile_csv_filename, profile_json_filename, reset_peak_memory, get_peak_memory
+
+
+def test_filter_profiling(monkeypatch, nmax=300):
+    input_path = project_path().extend('testing', 'integration_tests', 'ligandfilters', 'data_input', 'ligandfilters.yml')
+    outdir = project_path().extend('testing', 'integration_tests', 'filter_profiling', 'data_output')
+    monkeypatch.setenv('DART_CACHE_DIR', 'none')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    # Without info output, the first filters are applied while loading the database and the profile is saved next to the output ligand db.
+    settings = read_yaml(input_path)
+    settings['output_ligands_info'] = False
+    filter_input_path = outdir / 'ligandfilters.yml'
+    with open(filter_input_path, 'w') as file:
+        yaml.safe_dump(settings, file, sort_keys=False)
+
+    profiled = ligandfilters(filter_input_path=filter_input_path, nmax=nmax, outpath=outdir / 'profiled' / 'filtered_ligand_db.jsonlines', profile=True)
+    not_profiled = ligandfilters(filter_input_path=filter_input_path, nmax=nmax, outpath=outdir / 'not_profiled' / 'filtered_ligand_db.jsonlines')
+    assert filecmp.cmp(profiled.output_ligand_db_path, not_profiled.output_ligand_db_path, shallow=False)
+    assert not (not_profiled.output_ligand_db_path.parent / profile_csv_filename).exists()
+
+    report = pd.read_csv(profiled.output_ligand_db_path.parent / profile_csv_filename)
+    with open(profiled.output_ligand_db_path.parent / profile_json_filename, 'r') as file:
+        assert json.load(file) == json.loads(report.to_json(orient='records'))
+
+    # One row per filter in the order of the user with the same numbers of ligands as in the filter output, and rows for the other steps of the run.
+    steps = report.set_index('Step')
+    for tracking in profiled.filter_tracking:
+        row = steps.loc[tracking['unique_filtername']]
+        assert (row['Ligands in'], row['Ligands out']) == (tracking['n_ligands_before'], tracking['n_ligands_after'])
+        assert row['Applied'] == tracking['applied']
+        assert row['Wall time [s]'] >= 0 or tracking['applied'] != 'yes'
+    assert [tracking['unique_filtername'] for tracking in profiled.filter_tracking] == report['Step'].tolist()[3:-1]
+    assert report['Step'].tolist()[:3] == ['Load ligand db', 'Prepare filters', 'Mandatory filters'] and report['Step'].tolist()[-1] == 'Save ligand db'
+    assert steps.loc['Mandatory filters', 'Applied'] == 'while loading'
+    assert profiled.filter_tracking[0]['applied'] == 'while loading'
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+def test_reset_peak_memory(monkeypatch):
+    outdir = project_path().extend('testing', 'integration_tests', 'filter_profiling', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    # If the peak memory can't be reset on Linux, a warning is given and the delta is measured from the peak of the whole run.
+    monkeypatch.setattr(filter_profiling, '_proc_clear_refs_path', outdir)     # a directory can't be written
+    monkeypatch.setattr(filter_profiling.sys, 'platform', 'linux')
+    with pytest.warns(UserWarning, match='peak memory can\'t be reset'):
+        start_memory = reset_peak_memory()
+    assert start_memory is None or start_memory <= get_peak_memory()
+
+    # On other systems, the peak memory is not reset.
+    clear_refs_path = outdir / 'clear_refs'
+    monkeypatch.setattr(filter_profiling, '_proc_clear_refs_path', clear_refs_path)
+    monkeypatch.setattr(filter_profiling.sys, 'platform', 'darwin')
+    reset_peak_memory()
+    assert not clear_refs_path.exists()
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,115 @@
+"""
+Integration test for the FilterStage, which evaluates the filters as masks over a table of ligand properties. The removed ligands, the position of the first filter each ligand failed and the number of removed ligands per filter must be the same as when the filters are applied one after another to the database dictionary, as the FilterStage did before.
+"""
+import numpy as np
+import pytest
+
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_filters.FilteringStage import FilterStage
+from DARTassembler.src.ligand_filters.ligand_property_table import not_failed
+
+
+def min_max_filter(get_value, min=None, max=None, denticities=None):
+    """
+    Returns the check of a min/max filter on the ligand objects as it was done before the property table.
+    """
+    min = -np.inf if min is None else min
+    max = np.inf if max is None else max
+    denticities = list(range(-10, 100)) if denticities is None else denticities
+
+    def keep(ligand) -> bool:
+        if ligand.denticity not in denticities:
+            return True
+        value = get_value(ligand)
+        try:
+            return min <= value <= max
+        except TypeError:
+            return all(min <= v <= max for v in value)
+
+    return keep
+
+# Filters in the order of the user, as (method of the FilterStage with its arguments, check on a ligand object as done before the property table)
+filters = [
+    (lambda stage: stage.filter_charge_confidence(filter_for='confident'), lambda ligand: bool(ligand.pred_charge_is_confident)),
+    (lambda stage: stage.filter_unconnected_ligands(), lambda ligand: not ligand.denticity <= 0),
+    (lambda stage: stage.filter_occurrences(min=2), min_max_filter(lambda ligand: ligand.occurrences, min=2)),
+    (lambda stage: stage.filter_molecular_weight(denticities=[1, 2]), min_max_filter(lambda ligand: ligand.global_props['molecular_weight'], denticities=[1, 2])),
+    (lambda stage: stage.filter_interatomic_distances(min=0.8, max=10.0), min_max_filter(lambda ligand: ligand.get_all_inter_atomic_distances_as_list(), min=0.8, max=10.0)),
+    (lambda stage: stage.filter_ligand_charges(charge=[-1, 0], denticity=[1, 2]), lambda ligand: ligand.denticity not in [1, 2] or ligand.pred_charge in [-1, 0]),
+    (lambda stage: stage.filter_atom_count(max=25), min_max_filter(lambda ligand: ligand.n_atoms, max=25)),
+]
+
+
+def get_test_ligands(n_ligands: int) -> dict:
+    """
+    Returns ligands of the test database, some of which are changed so that the mandatory filters remove them and some of which have NaN values.
+    """
+    db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False).db
+    ligands = list(db.values())
+    for ligand in ligands[0::10]:
+        ligand.pred_charge_is_confident = False
+    for ligand in ligands[0::15]:     # some also have a not confident charge
+        ligand.denticity = -1
+    for ligand in ligands[3::7]:
+        ligand.occurrences = np.nan
+    for ligand in ligands[4::9]:
+        ligand.global_props['molecular_weight'] = np.nan
+    assert any(ligand.n_atoms < 2 for ligand in ligands)
+
+    return db
+
+def get_expected_failed_positions(db: dict) -> dict:
+    """
+    Applies the filters one after another to the database dictionary and returns the position of the filter which removed each ligand.
+    """
+    db = dict(db)
+    failed_positions = {name: not_failed for name in db}
+    for position, (_, keep) in enumerate(filters):
+        to_delete = [name for name, ligand in db.items() if not keep(ligand)]
+        for name in to_delete:
+            failed_positions[name] = position
+            del db[name]
+
+    return failed_positions
+
+def test_filter_stage_masks(n_ligands=300):
+    db = get_test_ligands(n_ligands)
+    expected = get_expected_failed_positions(db)
+    expected_counts = [list(expected.values()).count(position) for position in range(len(filters))]
+
+    # Every filter removes some ligands, including ligands with NaN values. Ligands with less than two atoms pass the interatomic distances filter.
+    assert all(n > 0 for n in expected_counts)
+    assert any(np.isnan(ligand.occurrences) and expected[name] == 2 for name, ligand in db.items())
+    assert any(np.isnan(ligand.global_props['molecular_weight']) and expected[name] == 3 for name, ligand in db.items())
+    assert any(ligand.n_atoms < 2 and expected[name] > 4 for name, ligand in db.items())
+    # Ligands failing both mandatory filters are attributed to the first one.
+    assert any(not ligand.pred_charge_is_confident and ligand.denticity <= 0 for ligand in db.values())
+    assert all(expected[name] == 0 for name, ligand in db.items() if not ligand.pred_charge_is_confident)
+
+    # The filters give the same results when applied in the order of the user and in any other order with their positions set.
+    orders = [list(range(len(filters))), list(range(len(filters)))[::-1], [4, 0, 6, 2, 1, 5, 3]]
+    for order in orders:
+        stage = FilterStage(LigandDB(dict(db)))
+        for position in order:
+            if order != orders[0]:
+                stage.set_filter_position(position)
+            filters[position][0](stage)
+        assert stage.get_failed_positions().tolist() == [expected[name] for name in stage.get_names()]
+        assert [stage.get_n_failed(position) for position in range(len(filters))] == expected_counts
+        assert stage.get_n_passed() == list(expected.values()).count(not_failed)
+        assert list(stage.database.db.keys()) == [name for name in db if expected[name] == not_failed]
+
+    return
+
+def test_filter_stage_invalid_charge(n_ligands=20):
+    db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False)
+    stage = FilterStage(db)
+    with pytest.raises(TypeError, match='charge'):
+        stage.filter_ligand_charges(charge=None, denticity=None)
+    assert stage.get_n_passed() == n_ligands
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
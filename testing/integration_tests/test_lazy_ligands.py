@@ -0,0 +1,55 @@
+"""
+Integration test for the lazy loading of ligands. Lazy ligands must behave like normal ligands, also after they were evicted from the cache.
+"""
+import json
+import shutil
+
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+
+
+def test_lazy_ligands(n_ligands=20):
+    outdir = project_path().extend('testing', 'integration_tests', 'lazy_ligands', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+
+    db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, lazy=True, cache_size=2, show_progress=False)
+    eager_db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False)
+    ligands = list(db.db.values())
+    loader = ligands[0]._loader
+    assert all(isinstance(ligand, RCA_Ligand) for ligand in ligands)
+
+    # Immutable properties in the index don't build the ligand and mutable ones are copies.
+    assert [ligand.denticity for ligand in ligands] == [ligand.denticity for ligand in eager_db.db.values()]
+    ligands[0].local_elements.append('Xx')
+    assert 'Xx' not in ligands[0].local_elements
+    assert loader.n_built_ligands == 0
+
+    # Changes in place and set attributes are kept after the ligand was evicted from the cache.
+    ligands[0].atomic_props['x'][0] = 1000.0
+    ligands[1].stoichiometry = 'C1000'
+    for ligand in ligands[2:]:
+        assert ligand.atomic_props == eager_db.db[ligand.unique_name].atomic_props
+    assert len(loader.cache) == 2
+    assert ligands[0].atomic_props['x'][0] == 1000.0
+    assert ligands[1].stoichiometry == 'C1000'
+
+    # Invalid ligands raise a ValueError with the path of the database.
+    invalid_path = outdir / 'invalid.jsonlines'
+    with open(invalid_path, 'w') as file:
+        file.write(json.dumps({'key': 'invalid', 'value': {'unique_name': 'invalid', 'denticity': 1}}) + '\n')
+    with pytest.raises(ValueError, match='invalid.jsonlines'):
+        LigandDB.load_from_json(invalid_path, lazy=True, show_progress=False)
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
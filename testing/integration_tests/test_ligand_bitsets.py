@@ -0,0 +1,52 @@
+"""
+Integration test for the bitsets of the common ligand properties of a ligand database.
+"""
+import shutil
+
+import numpy as np
+
+from DARTassembler.src.ligand_filters.ligand_bitsets import build_bitsets, read_bitsets, bitset_columns, item_bitset_columns, get_value_bitsets
+from DARTassembler.src.ligand_filters.ligand_property_table import LigandPropertyTable, ligand_columns
+from DARTassembler.src.ligand_extraction.ligand_predicates import check_elements
+from sidecar_test_utils import build_and_check_sidecar
+
+
+def test_ligand_bitsets():
+    db_path, bitsets, db = build_and_check_sidecar('bitsets', read=read_bitsets, build=build_bitsets)
+    ligands = list(db.db.values())
+
+    # Each ligand has exactly the bit of its value set, or the bits of all its items.
+    for key in bitset_columns + item_bitset_columns:
+        values, bits = get_value_bitsets(bitsets, key)
+        for idx, ligand in enumerate(ligands):
+            ligand_values = [values[code] for code in np.flatnonzero(bits[:, idx])]
+            expected = ligand_columns[key][0](ligand)
+            if key in item_bitset_columns:
+                assert sorted(ligand_values) == sorted(expected), f'Wrong items of {key} for ligand {idx}.'
+            else:
+                assert ligand_values == [expected], f'Wrong value of {key} for ligand {idx}.'
+
+    # Masks from the bitsets are the same as from the ligands. The table has the reverse order of the database and half of its ligands are not in the bitsets.
+    reversed_db = dict(reversed(db.db.items()))
+    table, table_with_bitsets = LigandPropertyTable(reversed_db), LigandPropertyTable(reversed_db)
+    bitsets_of_half = dict(bitsets)
+    bitsets_of_half['names'] = np.array([name if idx % 2 == 0 else f'unknown_{name}' for idx, name in enumerate(bitsets['names'].tolist())], dtype=str)
+    table_with_bitsets.set_bitsets(bitsets_of_half)
+    rows = np.arange(len(table)) % 3 != 0
+    for donors in (['N'], ['N', 'N'], ['C', 'O']):
+        for instruction in ('must_contain_and_only_contain', 'must_at_least_contain', 'must_exclude', 'must_only_contain_in_any_amount'):
+            check = lambda value: check_elements(value, atoms_of_interest=donors, instruction=instruction)
+            assert np.array_equal(table.get_mask_of_values('donors', check, rows), table_with_bitsets.get_mask_of_values('donors', check, rows))
+    for metals in (['Pd'], ['Fe', 'Ru'], ['Xx']):
+        assert np.array_equal(table.get_mask_of_any_item('metals', metals, rows), table_with_bitsets.get_mask_of_any_item('metals', metals, rows))
+    for key in ('denticity', 'has_betaH', 'has_good_bond_orders'):
+        assert np.array_equal(table.get_column(key, rows)[rows], table_with_bitsets.get_column(key, rows)[rows])
+
+    shutil.rmtree(db_path.parent, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+
+    test_ligand_bitsets()
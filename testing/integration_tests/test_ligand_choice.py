@@ -0,0 +1,89 @@
+"""
+Integration test for the choice of ligand combinations for the assembly of complexes.
+"""
+import itertools
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from DARTassembler.src.assembly.Assembly_Input import LigandCombinationError
+from DARTassembler.src.assembly.ligands import LigandChoice
+
+# Minimal ligands with only the attributes needed for the ligand choice.
+ligand_db = {
+    1: [SimpleNamespace(unique_name=f'mono_{idx}', pred_charge=charge, denticity=1) for idx, charge in enumerate([-1, -1, 0, -2, 0, -1, 1])],
+    2: [SimpleNamespace(unique_name=f'bi_{idx}', pred_charge=charge, denticity=2) for idx, charge in enumerate([0, -1, -2, -2, 0])],
+}
+# Ligand databases, topology and similarity of each test case
+cases = [
+    (ligand_db, [2, 1, 1], [1, 2, 3]),
+    ([ligand_db, ligand_db], [2, 1, 1], [1, 2, 2]),       # same_ligand_as_previous
+    ([ligand_db], [2, 2], [1, 1]),
+    ([ligand_db, ligand_db], [1, 1, 1], [1, 2, 2]),   # sites which are not interchangeable share ligands
+    (ligand_db, [1, 1, 1, 2], [1, 2, 3, 4]),
+]
+
+
+def get_valid_ligand_combinations(topology: list, instruction: list, target_charge: int) -> set[tuple]:
+    """
+    Returns the names of all ligand combinations with the correct sum of charges by brute force.
+    """
+    valid = set()
+    for ligands in itertools.product(*[ligand_db[denticity] for denticity in topology]):
+        ligands = list(ligands)
+        for idx in range(1, len(instruction)):
+            if instruction[idx] == instruction[idx - 1]:
+                ligands[idx] = ligands[idx - 1]
+        if sum(ligand.pred_charge for ligand in ligands) == target_charge:
+            valid.add(tuple(ligand.unique_name for ligand in ligands))
+
+    return valid
+
+@pytest.mark.parametrize('database, topology, instruction', cases)
+def test_random_ligand_choice(database, topology, instruction, n_samples=20_000):
+    random.seed(0)
+    choice = LigandChoice(database=database, topology=topology, instruction=instruction, metal_oxidation_state=2, total_complex_charge=0, max_num_assembled_complexes=10)
+    valid = get_valid_ligand_combinations(topology, instruction, target_charge=-2)
+
+    # Every random ligand combination is valid and all valid combinations are equally likely.
+    counts = Counter()
+    for _ in range(n_samples):
+        ligand_combination = choice._choose_random_ligand_combination_from_db()
+        choice._final_assertions_for_ligand_combination(ligand_combination)
+        counts[tuple(ligand.unique_name for ligand in ligand_combination)] += 1
+    assert set(counts) == valid
+    expected = n_samples / len(valid)
+    assert all(abs(count - expected) < 5 * expected**0.5 for count in counts.values())
+
+    return
+
+@pytest.mark.parametrize('database, topology, instruction', cases)
+def test_all_ligand_choice(database, topology, instruction):
+    choice = LigandChoice(database=database, topology=topology, instruction=instruction, metal_oxidation_state=2, total_complex_charge=0, max_num_assembled_complexes='all')
+
+    # Reference: all ligand combinations in the order of itertools.product(), keeping only the first one of each set of ligands.
+    expected, seen = [], set()
+    for ligands in itertools.product(*choice.site_ligand_lists):
+        ligand_combination = choice._choose_iterative_ligand_combination_from_db(iter([ligands]))
+        ligand_names = tuple(sorted(ligand.unique_name for ligand in ligand_combination))
+        if choice._check_good_ligand_charges(ligand_combination) and ligand_names not in seen:
+            seen.add(ligand_names)
+            expected.append(tuple(ligand.unique_name for ligand in ligand_combination))
+
+    chosen = [tuple(ligand.unique_name for ligand in ligands.values()) for ligands in choice.choose_ligands()]
+    assert chosen == expected
+
+    return
+
+def test_no_valid_ligand_choice():
+    choice = LigandChoice(database=ligand_db, topology=[2, 2], instruction=[1, 2], metal_oxidation_state=9, total_complex_charge=0, max_num_assembled_complexes=10)
+    with pytest.raises(LigandCombinationError):
+        next(choice.choose_ligands())
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,34 @@
+"""
+Integration test for the substructure screening fingerprints of a ligand database.
+"""
+import shutil
+
+import numpy as np
+
+from DARTassembler.src.ligand_extraction.db_fingerprints import build_fingerprints, read_fingerprints, fingerprint_variants, get_smarts_fingerprint, can_contain_pattern
+from DARTassembler.src.ligand_extraction.utilities_Molecule import has_smarts_pattern
+from sidecar_test_utils import build_and_check_sidecar
+
+
+def test_ligand_fingerprints():
+    db_path, fingerprints, db = build_and_check_sidecar('fingerprints', read=read_fingerprints, build=build_fingerprints)
+
+    # Ligands which contain a pattern must never be screened out, and ligands without fingerprint must be exactly the ligands without SMILES string.
+    patterns = ['N=N', '[C&H2]', 'C#N', '[OH]', 'S', 'O=C-[#7]', '[Cl,Br,I]', '[r5]', '[N;X3]', f'[{fingerprint_variants[1]}]~N']
+    for variant, with_metal in enumerate(fingerprint_variants):
+        smiles = [ligand.get_smiles(with_metal=with_metal) for ligand in db.db.values()]
+        valid = fingerprints['valid'][:, variant]
+        assert valid.tolist() == [s is not None for s in smiles]
+        for smarts in patterns:
+            contains = np.array([s is not None and has_smarts_pattern(smarts, s) for s in smiles])
+            can_contain = can_contain_pattern(fingerprints['fingerprints'][:, variant], get_smarts_fingerprint(smarts))
+            assert not np.any(contains & ~can_contain), f'Pattern {smarts} was screened out for a ligand which contains it.'
+
+    shutil.rmtree(db_path.parent, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+
+    test_ligand_fingerprints()
@@ -0,0 +1,88 @@
+"""
+Integration test for reading JSON Lines ligand databases with a pool of processes. Parallel loading must give exactly the same ligands in the same order as serial loading.
+"""
+import json
+import shutil
+
+import pytest
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.db_sidecars import iterate_ligand_values
+from DARTassembler.src.ligand_extraction.io_custom import get_jsonlines_byte_ranges, map_over_jsonlines_parallel, NumpyEncoder
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates, DenticityCondition, ChargeCondition, AtomCountCondition
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def copy_test_ligand_db(outdir, n_ligands):
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    db_path = outdir / 'test_metalig.jsonlines'
+    with open(input_path, 'r') as input_file, open(db_path, 'w') as output_file:
+        for _ in range(n_ligands):
+            output_file.write(input_file.readline())
+
+    return db_path
+
+def get_mol_dict_strings(db: LigandDB) -> list[str]:
+    return [json.dumps(ligand.write_to_mol_dict(), cls=NumpyEncoder, sort_keys=True) for ligand in db.db.values()]
+
+def get_stoichiometry(ligand) -> str:
+    return ligand.stoichiometry
+
+def get_key(key, value) -> str:
+    return key
+
+def test_parallel_loading(n_ligands=150):
+    outdir = project_path().extend('testing', 'integration_tests', 'parallel_loading', 'data_output')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(outdir, ignore_errors=True)
+    outdir.mkdir(parents=True)
+    db_path = copy_test_ligand_db(outdir, n_ligands)
+
+    # The byte ranges cover every line exactly once.
+    with open(db_path, 'rb') as file:
+        content = file.read()
+    for n_ranges in (1, 7, 10 * n_ligands):
+        ranges = get_jsonlines_byte_ranges(db_path, n_ranges=n_ranges)
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(content) and len(ranges) <= n_ranges
+        assert all(end == next_start for (_, end), (next_start, _) in zip(ranges[:-1], ranges[1:]))
+        assert all(start == 0 or content[start - 1:start] == b'\n' for start, _ in ranges)
+
+    # Parallel loading gives the same ligands in the same order, also when built with the trusted reader.
+    serial_db = LigandDB.load_from_json(db_path, show_progress=False, n_processes=1)
+    assert len(serial_db.db) == n_ligands
+    for trusted in (False, True):
+        parallel_db = LigandDB.load_from_json(db_path, show_progress=False, n_processes=3, trusted=trusted)
+        assert list(parallel_db.db.keys()) == list(serial_db.db.keys())
+        assert get_mol_dict_strings(parallel_db) == get_mol_dict_strings(serial_db)
+
+    # With predicates, the same ligands pass and the same numbers are rejected by each condition.
+    def get_predicates():
+        return LigandPredicates([DenticityCondition([1, 2, 3]), ChargeCondition([-1, 0], denticities=[1, 2]), AtomCountCondition(max=30)])
+    serial_predicates, parallel_predicates = get_predicates(), get_predicates()
+    serial_db = LigandDB.load_from_json(db_path, show_progress=False, n_processes=1, predicates=serial_predicates)
+    parallel_db = LigandDB.load_from_json(db_path, show_progress=False, n_processes=3, predicates=parallel_predicates)
+    assert 0 < len(serial_db.db) < n_ligands
+    assert list(parallel_db.db.keys()) == list(serial_db.db.keys())
+    assert get_mol_dict_strings(parallel_db) == get_mol_dict_strings(serial_db)
+    assert parallel_predicates.n_rejected == serial_predicates.n_rejected
+    assert sum(serial_predicates.n_rejected) == n_ligands - len(serial_db.db) and all(n > 0 for n in serial_predicates.n_rejected)
+
+    # The values of the sidecar files are computed in the same order as well.
+    serial_values = list(iterate_ligand_values(db_path, getter=get_stoichiometry, n_processes=1, show_progress=False))
+    assert list(iterate_ligand_values(db_path, getter=get_stoichiometry, n_processes=3, show_progress=False)) == serial_values
+    assert [name for name, _ in serial_values] == list(LigandDB.load_from_json(db_path, show_progress=False).db.keys())
+
+    # More processes than lines work as well.
+    (outdir / 'small').mkdir()
+    small_db_path = copy_test_ligand_db(outdir / 'small', 2)
+    assert list(map_over_jsonlines_parallel(small_db_path, get_key, n_processes=4, show_progress=False)) == list(LigandDB.load_from_json(small_db_path, show_progress=False).db.keys())
+
+    shutil.rmtree(outdir, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
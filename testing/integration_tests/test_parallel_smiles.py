@@ -0,0 +1,73 @@
+"""
+Integration test for computing the SMILES strings of the ligand property table with a pool of processes. The SMILES strings must be the same as when they are computed in a single process, and the number of processes must follow the CPUs this process is allowed to run on.
+"""
+import os
+
+import pytest
+
+from DARTassembler.src.ligand_extraction import io_custom
+from DARTassembler.src.ligand_extraction.DataBase import LigandDB
+from DARTassembler.src.ligand_extraction.io_custom import get_n_available_cpus, get_n_processes
+from DARTassembler.src.ligand_filters import ligand_property_table
+from DARTassembler.src.ligand_filters.FilteringStage import FilterStage
+from DARTassembler.src.ligand_filters.ligand_property_table import LigandPropertyTable, parallel_columns, min_ligands_per_process
+
+
+def test_parallel_smiles(monkeypatch, n_ligands=400, n_processes=2):
+    db = LigandDB.load_from_json('test_metalig', n_max=n_ligands, show_progress=False).db
+    assert n_ligands // min_ligands_per_process > n_processes    # enough ligands for the pool
+
+    # Count how often the pool is used.
+    n_pools = []
+    class CountedProcessPoolExecutor(ligand_property_table.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            n_pools.append(1)
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(ligand_property_table, 'ProcessPoolExecutor', CountedProcessPoolExecutor)
+
+    # Compute the SMILES strings first for every second ligand and then for the rest, so that the values must be put back into the right rows.
+    serial, parallel = LigandPropertyTable(db, n_processes=1), LigandPropertyTable(db, n_processes=n_processes)
+    every_second = serial.passed.copy()
+    every_second[1::2] = False
+    for key in parallel_columns:
+        for rows in (every_second, serial.passed):
+            assert parallel.get_column(key, rows=rows)[rows].tolist() == serial.get_column(key, rows=rows)[rows].tolist(), key
+        assert parallel.get_column(key, rows=parallel.passed).tolist() == [ligand.get_smiles(with_metal=None if key == 'smiles' else ligand_property_table.pseudo_metal) for ligand in db.values()]
+    assert len(n_pools) == 2 * len(parallel_columns)
+    assert any(smiles is None for smiles in serial.get_column('smiles', rows=serial.passed))    # ligands without valid SMILES string
+
+    # SMARTS filters give the same ligands with and without the pool.
+    passed_names = []
+    for n in (1, n_processes):
+        stage = FilterStage(LigandDB(dict(db)), n_processes=n)
+        stage.filter_smarts_substructure_search(smarts='[C&H2]', should_be_present=False, include_metal=False)
+        stage.filter_smarts_substructure_search(smarts='[#7]~[Cu]', should_be_present=True, include_metal=True)
+        passed_names.append(list(stage.database.db.keys()))
+    assert passed_names[0] == passed_names[1]
+    assert 0 < len(passed_names[0]) < n_ligands
+
+    return
+
+def test_n_available_cpus(monkeypatch):
+    # The CPU affinity is used if available, e.g. for a cluster job with only a part of the CPUs of a node.
+    if hasattr(os, 'sched_getaffinity'):
+        assert get_n_available_cpus() == len(os.sched_getaffinity(0))
+        monkeypatch.setattr(io_custom.os, 'sched_getaffinity', lambda pid: {0, 3})
+        monkeypatch.setattr(io_custom.os, 'cpu_count', lambda: 8)
+        assert get_n_available_cpus() == 2
+        assert get_n_processes(None) == 2
+        assert get_n_processes(3) == 3
+
+    # Otherwise, the number of CPUs is used, and one process if it is unknown.
+    monkeypatch.delattr(io_custom.os, 'sched_getaffinity', raising=False)
+    monkeypatch.setattr(io_custom.os, 'cpu_count', lambda: 8)
+    assert get_n_available_cpus() == 8
+    monkeypatch.setattr(io_custom.os, 'cpu_count', lambda: None)
+    assert get_n_available_cpus() == 1
+    assert get_n_processes(None) == 1
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
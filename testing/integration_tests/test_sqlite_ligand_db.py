@@ -0,0 +1,52 @@
+"""
+Integration test for converting a ligand database to the SQLite format, reading it back and querying it with ligand predicates.
+"""
+import json
+import shutil
+
+from DARTassembler.src.constants.Paths import project_path
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_json
+from DARTassembler.src.ligand_extraction.ligand_predicates import LigandPredicates, DenticityCondition, ChargeCondition, DonorElementsCondition
+from DARTassembler.src.metalig.sqlite_db import convert_jsonlines_to_sqlite_ligand_db, SQLiteLigandDB
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+
+def test_sqlite_ligand_db():
+    input_path = get_correct_ligand_db_path_from_input('test_metalig')
+    output_path = project_path().extend('testing', 'integration_tests', 'sqlite_db', 'data_output', 'test_metalig.sqlite')
+
+    # Delete output directory so that the test detects if files are not written.
+    shutil.rmtree(output_path.parent, ignore_errors=True)
+
+    convert_jsonlines_to_sqlite_ligand_db(input_path, output_path, show_progress=False)
+    assert get_correct_ligand_db_path_from_input(output_path) == output_path
+
+    # The SQLite database must contain exactly the same ligands in the same order as the jsonlines database.
+    jsonlines_db = list(iterate_over_json(input_path, show_progress=False))
+    sqlite_db = list(iterate_over_json(output_path, show_progress=False))
+    assert [name for name, _ in jsonlines_db] == [name for name, _ in sqlite_db]
+    for (_, old), (_, new) in zip(jsonlines_db, sqlite_db):
+        assert json.dumps(old, sort_keys=True) == json.dumps(new, sort_keys=True)
+
+    # Querying with predicates must give the same ligands and counts as checking the predicates in python.
+    conditions = [DenticityCondition([2, 3]), ChargeCondition([0, -1], denticities=[2]), DonorElementsCondition(['N', 'O'], 'must_only_contain_in_any_amount')]
+    expected_predicates, sqlite_predicates = LigandPredicates(conditions), LigandPredicates(conditions)
+    expected_names = []
+    for name, mol in jsonlines_db:
+        failed = expected_predicates.get_first_failed(mol)
+        if failed is None:
+            expected_names.append(name)
+        else:
+            expected_predicates.n_rejected[failed] += 1
+    db = SQLiteLigandDB(output_path)
+    assert [name for name, _, _ in db.iterate_index_records(predicates=sqlite_predicates)] == expected_names
+    assert sqlite_predicates.n_rejected == expected_predicates.n_rejected
+
+    shutil.rmtree(output_path.parent, ignore_errors=True)
+
+    return
+
+
+if __name__ == "__main__":
+
+    test_sqlite_ligand_db()
@@ -0,0 +1,57 @@
+"""
+Integration test for restoring ligands from a trusted ligand database. `RCA_Ligand.read_from_trusted_mol_dict()` takes over all stored properties instead of recomputing them, but the ligands must have the same attributes as ligands from `RCA_Ligand.read_from_mol_dict()`.
+"""
+import copy
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from DARTassembler.src.ligand_extraction.Molecule import RCA_Ligand
+from DARTassembler.src.ligand_extraction.io_custom import iterate_over_jsonlines
+from DARTassembler.src.metalig.metalig_utils import get_correct_ligand_db_path_from_input
+
+# Attributes which the trusted ligands only build when they are accessed
+lazy_attributes = ('graph', 'mol', 'coordinates')
+
+
+def is_equal(value1, value2) -> bool:
+    """
+    Returns True if both values are equal, with NaN equal to NaN.
+    """
+    if isinstance(value1, float) and isinstance(value2, float) and np.isnan(value1) and np.isnan(value2):
+        return True
+
+    return type(value1) == type(value2) and value1 == value2
+
+def test_trusted_ligands():
+    n_ligands = 0
+    for name, mol_dict in iterate_over_jsonlines(get_correct_ligand_db_path_from_input('test_metalig'), show_progress=False):
+        assert RCA_Ligand.can_read_from_trusted_mol_dict(mol_dict), name
+        ligand = RCA_Ligand.read_from_mol_dict(copy.deepcopy(mol_dict))
+        trusted_ligand = RCA_Ligand.read_from_trusted_mol_dict(copy.deepcopy(mol_dict))
+
+        # The trusted ligand only has the compact graph in addition, and builds the lazy attributes only when they are accessed.
+        assert set(vars(trusted_ligand)) == set(vars(ligand)) - set(lazy_attributes) | {'array_graph'}, name
+
+        # Same attributes, in the same order so that the ligands are written in the same way.
+        for attribute, value in vars(ligand).items():
+            if attribute in lazy_attributes:
+                continue
+            assert is_equal(getattr(trusted_ligand, attribute), value), (name, attribute)
+        assert [attribute for attribute in vars(trusted_ligand) if attribute != 'array_graph'] == [attribute for attribute in vars(ligand) if attribute not in lazy_attributes], name
+
+        # Same graph with the same order of nodes and edges, same ase molecule and same coordinates.
+        assert nx.utils.graphs_equal(trusted_ligand.graph, ligand.graph), name
+        assert list(trusted_ligand.graph.nodes(data=True)) == list(ligand.graph.nodes(data=True)), name
+        assert list(trusted_ligand.graph.edges(data=True)) == list(ligand.graph.edges(data=True)), name
+        assert trusted_ligand.mol == ligand.mol, name
+        assert trusted_ligand.coordinates == ligand.coordinates, name
+        n_ligands += 1
+    assert n_ligands == 1000
+
+    return
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])